@@ -1,11 +1,18 @@
 import os
+import sys
+import tempfile
 from datetime import timedelta
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# File logs directory; `manage.py test` writes to a throwaway directory, never to the real logs
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(BASE_DIR, "logs"))
+if sys.argv[1:2] == ["test"]:
+    LOG_DIR = tempfile.mkdtemp(prefix="mvpsale-test-logs-")
+
 # Ensure logs directory exists for file handlers
-os.makedirs(os.path.join(BASE_DIR, "logs"), exist_ok=True)
+os.makedirs(LOG_DIR, exist_ok=True)
 
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "dev-secret-key-change-me")
 DEBUG = os.getenv("DJANGO_DEBUG", "1") == "1"
@@ -83,6 +90,26 @@ DATABASES = {
     }
 }
 
+# Cache shared by every process (gunicorn workers, admin, run_import_worker, drain_payment_inbox).
+# The in-process caches (payment methods, card fee tiers) keep their version keys here, so a
+# multi-process deployment must set DJANGO_CACHE_LOCATION to a Redis URL (e.g. redis://localhost:6379/1)
+# or a memcached address with DJANGO_CACHE_BACKEND. Without it each process gets its own LocMemCache,
+# which is only correct for a single process (runserver, tests).
+if os.getenv("DJANGO_CACHE_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"),
+            "LOCATION": os.getenv("DJANGO_CACHE_LOCATION"),
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# Seconds between checks of a shared cache version by each process (writes made by this process apply at once)
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "2"))
+if sys.argv[1:2] == ["test"]:
+    # Tests clear the cache in setUp: versions must be re-read right away
+    CACHE_VERSION_CHECK_SECONDS = 0
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -153,6 +180,37 @@ PREVENT_NEGATIVE_STOCK = os.getenv("PREVENT_NEGATIVE_STOCK", "1") == "1"
 BLOCK_SALE_IF_ZERO_STOCK = os.getenv("BLOCK_SALE_IF_ZERO_STOCK", "1") == "1"
 CASHIER_REQUIRED_FOR_SALE = os.getenv("CASHIER_REQUIRED_FOR_SALE", "1") == "1"
 
+# Reorder suggestions: days of sales the suggested purchase should cover and which window drives velocity
+REORDER_COVER_DAYS = int(os.getenv("REORDER_COVER_DAYS", "30"))
+REORDER_VELOCITY_WINDOW = int(os.getenv("REORDER_VELOCITY_WINDOW", "30"))
+# Stock movements older than this (rounded down to month start) are moved to the archive by archive_stock_movements
+STOCK_MOVEMENT_RETENTION_DAYS = int(os.getenv("STOCK_MOVEMENT_RETENTION_DAYS", "365"))
+# Batch NF-e import: parser processes (0 = one per CPU), max XML files accepted per ZIP/directory/upload,
+# and files above which an API batch is queued as a job instead of imported inside the request
+NFE_IMPORT_WORKERS = int(os.getenv("NFE_IMPORT_WORKERS", "0"))
+NFE_BATCH_MAX_FILES = int(os.getenv("NFE_BATCH_MAX_FILES", "2000"))
+NFE_BATCH_SYNC_MAX_FILES = int(os.getenv("NFE_BATCH_SYNC_MAX_FILES", "20"))
+# NF-e item name matching (trigram similarity 0-1): auto-link at or above AUTO_LINK, queue for review at or above REVIEW
+PRODUCT_MATCH_AUTO_LINK = float(os.getenv("PRODUCT_MATCH_AUTO_LINK", "0.85"))
+PRODUCT_MATCH_REVIEW = float(os.getenv("PRODUCT_MATCH_REVIEW", "0.6"))
+# Trigrams found in more products than this are left out of the candidate search (still used for scoring)
+PRODUCT_MATCH_MAX_TRIGRAM_DF = int(os.getenv("PRODUCT_MATCH_MAX_TRIGRAM_DF", "1000"))
+# Queued NF-e imports: worker threads per run_import_worker, attempts on transient DB errors,
+# and seconds after which a job locked by a dead worker goes back to the queue
+NFE_JOB_CONCURRENCY = int(os.getenv("NFE_JOB_CONCURRENCY", "1"))
+NFE_JOB_MAX_ATTEMPTS = int(os.getenv("NFE_JOB_MAX_ATTEMPTS", "3"))
+NFE_JOB_LOCK_TIMEOUT = int(os.getenv("NFE_JOB_LOCK_TIMEOUT", "900"))
+# Purchase cost analytics: default look-back window (days) and unit-cost change (%) that raises an alert
+PURCHASE_COST_WINDOW_DAYS = int(os.getenv("PURCHASE_COST_WINDOW_DAYS", "90"))
+PURCHASE_COST_ALERT_PCT = float(os.getenv("PURCHASE_COST_ALERT_PCT", "10"))
+# Payment webhook inbox: events applied per batch and seconds before a stuck batch returns to the queue
+PAYMENT_INBOX_BATCH_SIZE = int(os.getenv("PAYMENT_INBOX_BATCH_SIZE", "500"))
+PAYMENT_INBOX_LOCK_TIMEOUT = int(os.getenv("PAYMENT_INBOX_LOCK_TIMEOUT", "300"))
+# Shared secret for the webhook signature (X-Webhook-Signature: HMAC-SHA256 of the body); empty refuses every call
+PAYMENT_WEBHOOK_SECRET = os.getenv("PAYMENT_WEBHOOK_SECRET", "")
+# Installment card sales: days between the due dates of consecutive installment receivables
+RECEIVABLE_INSTALLMENT_INTERVAL_DAYS = int(os.getenv("RECEIVABLE_INSTALLMENT_INTERVAL_DAYS", "30"))
+
 # Pricing configuration
 # Which cost basis to use for price suggestion/calculation: 'last' (last purchase cost) or 'average' (weighted avg cost)
 PRICE_COST_BASIS = os.getenv("PRICE_COST_BASIS", "last").lower()
@@ -170,6 +228,9 @@ WEBMANIA_CEP_ENABLED = os.getenv("WEBMANIA_CEP_ENABLED", "1") == "1"
 
 # Logging configuration (file + console). Purchase service writes to 'purchase' logger.
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# File logs rotate at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT backups (payment.log.1, .2, ...)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -185,18 +246,22 @@ LOGGING = {
             "level": LOG_LEVEL,
         },
         "purchase_file": {
-            "class": "logging.FileHandler",
-            "filename": os.path.join(BASE_DIR, "logs", "purchase.log"),
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": os.path.join(LOG_DIR, "purchase.log"),
             "formatter": "verbose",
             "level": "INFO",
             "encoding": "utf-8",
+            "maxBytes": LOG_MAX_BYTES,
+            "backupCount": LOG_BACKUP_COUNT,
         },
         "payment_file": {
-            "class": "logging.FileHandler",
-            "filename": os.path.join(BASE_DIR, "logs", "payment.log"),
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": os.path.join(LOG_DIR, "payment.log"),
             "formatter": "verbose",
             "level": "INFO",
             "encoding": "utf-8",
+            "maxBytes": LOG_MAX_BYTES,
+            "backupCount": LOG_BACKUP_COUNT,
         },
     },
     "loggers": {
@@ -7,9 +7,15 @@ from people.views import UserViewSet
 from stock.views import StockViewSet, StockMovementViewSet
 from purchase.views import (
     NFeImportView,
+    NFeBatchImportView,
     ReprocessInstallmentsView,
     InstallmentSummaryView,
+    CostHistoryView,
+    BestSuppliersView,
+    CostAlertsView,
     PurchaseInvoiceViewSet,
+    ProductMatchReviewViewSet,
+    NFeImportJobViewSet,
 )
 from sale.views import OrderViewSet
 from payment.views import (
@@ -18,6 +24,8 @@ from payment.views import (
     PaymentLogsView,
     CardBrandViewSet,
     CardFeeTierViewSet,
+    CashFlowView,
+    PaymentWebhookView,
 )
 from nfe.views import NFeInvoiceViewSet, CompanyViewSet
 from cashier.views import CashierSessionViewSet, CashMovementViewSet
@@ -50,6 +58,8 @@ router.register(r"nfe/companies", CompanyViewSet, basename="nfe-company")
 router.register(r"cashier/sessions", CashierSessionViewSet, basename="cashier-session")
 router.register(r"cashier/movements", CashMovementViewSet, basename="cashier-movement")
 router.register(r"purchase/invoices", PurchaseInvoiceViewSet, basename="purchase-invoice")
+router.register(r"purchase/import-jobs", NFeImportJobViewSet, basename="purchase-import-job")
+router.register(r"purchase/match-reviews", ProductMatchReviewViewSet, basename="purchase-match-review")
 
 urlpatterns += [
     # Compatibility route: some frontend code may call /api/people/cep/ directly.
@@ -57,6 +67,12 @@ urlpatterns += [
     path("people/cep/", CustomerViewSet.as_view({"get": "cep_lookup"}), name="people-cep-compat"),
     path("", include(router.urls)),
     path("purchase/import-xml/", NFeImportView.as_view(), name="purchase-import-xml"),
+    path("purchase/import-xml/batch/", NFeBatchImportView.as_view(), name="purchase-import-xml-batch"),
     path("purchase/reprocess-installments/", ReprocessInstallmentsView.as_view(), name="purchase-reprocess-installments"),
     path("purchase/installments/summary/", InstallmentSummaryView.as_view(), name="purchase-installments-summary"),
+    path("purchase/analytics/cost-history/", CostHistoryView.as_view(), name="purchase-cost-history"),
+    path("purchase/analytics/best-suppliers/", BestSuppliersView.as_view(), name="purchase-best-suppliers"),
+    path("purchase/analytics/cost-alerts/", CostAlertsView.as_view(), name="purchase-cost-alerts"),
+    path("payment/cashflow/", CashFlowView.as_view(), name="payment-cashflow"),
+    path("payment/webhooks/", PaymentWebhookView.as_view(), name="payment-webhooks"),
 ]
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+from catalog.services.matching import index_products, normalize_name
+
+
+class Command(BaseCommand):
+    help = "Recalcula name_key e o índice de trigramas usado para casar itens de NF-e com produtos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Produtos por lote (padrão: 1000)")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        last_id = 0
+        products = grams = 0
+        while True:
+            batch = list(Product.objects.filter(id__gt=last_id).order_by("id").only("id", "name", "name_key")[:batch_size])
+            if not batch:
+                break
+            changed = []
+            for p in batch:
+                key = normalize_name(p.name)
+                if key != p.name_key:
+                    p.name_key = key
+                    changed.append(p)
+            Product.objects.bulk_update(changed, ["name_key"], batch_size=200)
+            grams += index_products(batch)
+            products += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f"{products} produtos indexados ({grams} trigramas)"))
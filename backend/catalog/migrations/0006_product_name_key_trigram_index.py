@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:56
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Cópia congelada de catalog.services.matching (normalize_name/trigrams) como estava nesta
+# migração: mudanças futuras na normalização não alteram o que o histórico grava
+ABBREVIATIONS = {
+    "cx": "caixa",
+    "pct": "pacote",
+    "pc": "peca",
+    "pcs": "peca",
+    "und": "unidade",
+    "un": "unidade",
+    "unid": "unidade",
+    "emb": "embalagem",
+    "sext": "sextavado",
+    "transp": "transparente",
+}
+SLASH_ABBREVIATIONS = {"c": "com", "s": "sem", "p": "para"}
+NAME_KEY_MAX = 200
+
+
+def normalize_name(name):
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = re.sub(r"\b([csp])/", lambda m: f"{SLASH_ABBREVIATIONS[m.group(1)]} ", text)
+    text = re.sub(r"(\d)([a-z])", r"\1 \2", text)
+    text = re.sub(r"([a-z])(\d)", r"\1 \2", text)
+    tokens = re.findall(r"\d+(?:[.,]\d+)?|[a-z]+", text)
+    tokens = [ABBREVIATIONS.get(t, t).replace(",", ".") for t in tokens]
+    return " ".join(tokens)[:NAME_KEY_MAX]
+
+
+def trigrams(name_key):
+    grams = set()
+    for token in name_key.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def backfill_name_index(apps, schema_editor):
+    Product = apps.get_model("catalog", "Product")
+    ProductNameTrigram = apps.get_model("catalog", "ProductNameTrigram")
+    last_id = 0
+    while True:
+        batch = list(Product.objects.filter(id__gt=last_id).order_by("id").only("id", "name")[:1000])
+        if not batch:
+            break
+        for p in batch:
+            p.name_key = normalize_name(p.name)
+        Product.objects.bulk_update(batch, ["name_key"], batch_size=200)
+        ProductNameTrigram.objects.bulk_create(
+            [ProductNameTrigram(product_id=p.id, trigram=g) for p in batch for g in sorted(trigrams(p.name_key))],
+            batch_size=2000,
+        )
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_needs_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='needs_review',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.CreateModel(
+            name='ProductNameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_trigrams', to='catalog.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productnametrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'product'), name='uniq_product_trigram'),
+        ),
+        migrations.RunPython(backfill_name_index, migrations.RunPython.noop),
+    ]
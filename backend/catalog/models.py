@@ -6,6 +6,7 @@ from django.utils import timezone
 from django.conf import settings
 from decimal import Decimal
 from core.pricing import apply_rounding
+from .services.matching import normalize_name
 
 
 class TimeStampedModel(models.Model):
@@ -59,6 +60,8 @@ class Product(TimeStampedModel):
     needs_review = models.BooleanField(default=False, db_index=True)
     barcode = models.CharField(max_length=64, blank=True, db_index=True)
     active = models.BooleanField(default=True, db_index=True)
+    # Nome normalizado (sem acentos/pontuação, abreviações expandidas) para casar itens de NF-e
+    name_key = models.CharField(max_length=200, blank=True, db_index=True, editable=False)
 
     def clean(self):
         errors = {}
@@ -111,6 +114,13 @@ class Product(TimeStampedModel):
         calc = self._calc_sale_price()
         if calc is not None:
             self.sale_price = calc
+        name_key = normalize_name(self.name)
+        # Lido pelo sinal de reindexação de trigramas (catalog.signals)
+        self._name_key_changed = creating or name_key != self.name_key
+        self.name_key = name_key
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields and "name_key" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["name_key"]
         super().save(*args, **kwargs)
         if creating and not self.sku:
             self.sku = f"P{self.pk:06d}"
@@ -120,6 +130,21 @@ class Product(TimeStampedModel):
         return f"{self.name} ({self.sku})"
 
 
+class ProductNameTrigram(models.Model):
+    """Índice invertido trigrama -> produto sobre Product.name_key (busca de candidatos por similaridade)."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="name_trigrams")
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["trigram", "product"], name="uniq_product_trigram"),
+        ]
+
+    def __str__(self):
+        return f"{self.trigram!r} -> {self.product_id}"
+
+
 class Promotion(TimeStampedModel):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="promotions")
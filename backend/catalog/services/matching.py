@@ -0,0 +1,241 @@
+"""Chave de nome normalizada e índice de trigramas para casar descrições de fornecedor com produtos.
+
+A busca de candidatos parte dos trigramas do nome procurado (tabela indexada por trigrama),
+então o custo depende de quantos produtos compartilham esses trigramas, não do tamanho do catálogo.
+Trigramas de borda e os presentes em muitos produtos ficam fora da busca, e a contagem de
+trigramas em comum por produto é feita no banco: só os melhores candidatos de cada nome são lidos.
+"""
+from __future__ import annotations
+
+import math
+import re
+import sqlite3
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+
+# Abreviações comuns em descrições de NF-e (depois de normalizar acentos e caixa)
+ABBREVIATIONS = {
+    "cx": "caixa",
+    "pct": "pacote",
+    "pc": "peca",
+    "pcs": "peca",
+    "und": "unidade",
+    "un": "unidade",
+    "unid": "unidade",
+    "emb": "embalagem",
+    "sext": "sextavado",
+    "transp": "transparente",
+}
+SLASH_ABBREVIATIONS = {"c": "com", "s": "sem", "p": "para"}
+NAME_KEY_MAX = 200
+CANDIDATE_POOL = 50
+COMMON_TRIGRAMS_KEY = "catalog:common-trigrams"
+COMMON_TRIGRAMS_SECONDS = 3600
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Minúsculas, sem acentos, pontuação vira espaço, números separados das unidades e abreviações expandidas."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = re.sub(r"\b([csp])/", lambda m: f"{SLASH_ABBREVIATIONS[m.group(1)]} ", text)
+    text = re.sub(r"(\d)([a-z])", r"\1 \2", text)
+    text = re.sub(r"([a-z])(\d)", r"\1 \2", text)
+    tokens = re.findall(r"\d+(?:[.,]\d+)?|[a-z]+", text)
+    tokens = [ABBREVIATIONS.get(t, t).replace(",", ".") for t in tokens]
+    return " ".join(tokens)[:NAME_KEY_MAX]
+
+
+def trigrams(name_key: str) -> Set[str]:
+    """Trigramas por palavra, com borda (como o pg_trgm): 'cabo' -> '  c', ' ca', 'cab', 'abo', 'bo '."""
+    grams: Set[str] = set()
+    for token in name_key.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def numbers(name_key: str) -> Set[str]:
+    return {t for t in name_key.split() if t[0].isdigit()}
+
+
+def auto_link_threshold() -> float:
+    return float(getattr(settings, "PRODUCT_MATCH_AUTO_LINK", 0.85))
+
+
+def review_threshold() -> float:
+    return float(getattr(settings, "PRODUCT_MATCH_REVIEW", 0.6))
+
+
+def can_auto_link(candidate: Dict) -> bool:
+    """Vínculo automático só acima do limite e com as mesmas medidas: '10 mm' e '12 mm' são produtos diferentes."""
+    return candidate["score"] >= auto_link_threshold() and candidate["same_numbers"]
+
+
+def index_products(products: Iterable) -> int:
+    """(Re)grava os trigramas dos produtos informados. Retorna quantos trigramas foram gravados."""
+    from catalog.models import ProductNameTrigram
+
+    products = [p for p in products if p.pk]
+    if not products:
+        return 0
+    ProductNameTrigram.objects.filter(product_id__in=[p.pk for p in products]).delete()
+    rows = [
+        ProductNameTrigram(product_id=p.pk, trigram=gram)
+        for p in products
+        for gram in sorted(trigrams(p.name_key or normalize_name(p.name)))
+    ]
+    ProductNameTrigram.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def _ranked(key: str, grams: Set[str], products: Iterable, min_score: float, limit: int) -> List[Dict]:
+    wanted = numbers(key)
+    ranked = []
+    for product in products:
+        score = similarity(grams, trigrams(product.name_key))
+        if score >= min_score:
+            ranked.append(
+                {
+                    "product": product,
+                    "product_id": product.id,
+                    "name": product.name,
+                    "score": round(score, 4),
+                    "same_numbers": numbers(product.name_key) == wanted,
+                }
+            )
+    ranked.sort(key=lambda c: (-c["score"], c["product_id"]))
+    return ranked[:limit]
+
+
+def _search_grams(grams: Set[str], common: Set[str]) -> Set[str]:
+    """Trigramas usados na busca: sem os de borda ('  c', uma letra) nem os muito frequentes no catálogo.
+
+    A pontuação final continua usando todos; se o nome só tiver trigramas comuns, eles voltam.
+    """
+    search = {g for g in grams if not g.startswith("  ")}
+    return (search - common) or search or grams
+
+
+def common_trigrams() -> Set[str]:
+    """Trigramas presentes em mais de PRODUCT_MATCH_MAX_TRIGRAM_DF produtos (em cache por COMMON_TRIGRAMS_SECONDS)."""
+    from catalog.models import ProductNameTrigram
+
+    cutoff = int(getattr(settings, "PRODUCT_MATCH_MAX_TRIGRAM_DF", 1000))
+    key = f"{COMMON_TRIGRAMS_KEY}:{cutoff}"
+    common = cache.get(key)
+    if common is None:
+        common = set(
+            ProductNameTrigram.objects.values("trigram").annotate(n=Count("id")).filter(n__gt=cutoff).values_list("trigram", flat=True)
+        )
+        cache.set(key, common, COMMON_TRIGRAMS_SECONDS)
+    return common
+
+
+def _max_query_params() -> Optional[int]:
+    # O Django assume 999 no SQLite; o limite real da biblioteca (32766 desde a 3.32) vem da conexão
+    if connection.vendor == "sqlite":
+        connection.ensure_connection()
+        getlimit = getattr(connection.connection, "getlimit", None)
+        if getlimit is not None:
+            return getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return connection.features.max_query_params
+
+
+def _pool_chunks(search: Dict[str, Set[str]]) -> Iterator[List[Tuple[int, str]]]:
+    # (índice do nome, trigrama) por consulta, sem partir um nome entre consultas; limite de parâmetros do banco
+    budget = (_max_query_params() or 0) // 2 - 1
+    chunk: List[Tuple[int, str]] = []
+    for k, grams in enumerate(search.values()):
+        pairs = [(k, gram) for gram in sorted(grams)]
+        if chunk and budget > 0 and len(chunk) + len(pairs) > budget:
+            yield chunk
+            chunk = []
+        chunk.extend(pairs)
+    if chunk:
+        yield chunk
+
+
+def _candidate_pools(search: Dict[str, Set[str]]) -> Dict[str, List[Tuple[int, int]]]:
+    """(produto, trigramas em comum) dos CANDIDATE_POOL melhores de cada nome, contados no banco.
+
+    JOIN dos trigramas procurados com o índice, GROUP BY (nome, produto) e ROW_NUMBER por nome:
+    só os melhores de cada nome saem do banco, qualquer que seja o tamanho do catálogo.
+    """
+    from catalog.models import ProductNameTrigram
+
+    keys = list(search)
+    pools: Dict[str, List[Tuple[int, int]]] = {key: [] for key in keys}
+    table = connection.ops.quote_name(ProductNameTrigram._meta.db_table)
+    for chunk in _pool_chunks(search):
+        sql = f"""
+            WITH wanted(k, trigram) AS (VALUES {", ".join(["(%s, %s)"] * len(chunk))}),
+            hits AS (
+                SELECT w.k AS k, t.product_id AS product_id, COUNT(*) AS hits
+                FROM wanted w JOIN {table} t ON t.trigram = w.trigram
+                GROUP BY w.k, t.product_id
+            )
+            SELECT k, product_id, hits FROM (
+                SELECT k, product_id, hits, ROW_NUMBER() OVER (PARTITION BY k ORDER BY hits DESC, product_id) AS pos
+                FROM hits
+            ) ranked
+            WHERE pos <= %s
+            ORDER BY k, pos
+        """
+        params = [value for pair in chunk for value in pair] + [CANDIDATE_POOL]
+        with connection.cursor() as cur:
+            cur.execute(sql, params)
+            for k, product_id, hits in cur.fetchall():
+                pools[keys[k]].append((product_id, hits))
+    return pools
+
+
+def rank_candidates(name: str, limit: int = 5, min_score: Optional[float] = None) -> List[Dict]:
+    """Produtos mais parecidos com `name`, ordenados por similaridade de trigramas (Jaccard)."""
+    return rank_candidates_many([name], limit, min_score)[normalize_name(name)]
+
+
+def rank_candidates_many(names: Iterable[str], limit: int = 5, min_score: Optional[float] = None) -> Dict[str, List[Dict]]:
+    """rank_candidates para vários nomes de uma vez, indexado pelo nome normalizado.
+
+    A contagem de trigramas em comum é feita no banco (_candidate_pools), em uma consulta por lote
+    de nomes que caiba no limite de parâmetros (uma só no Postgres), e os produtos candidatos são
+    lidos numa consulta só.
+    """
+    from catalog.models import Product
+
+    if min_score is None:
+        min_score = review_threshold()
+    keys = {normalize_name(n) for n in names}
+    result: Dict[str, List[Dict]] = {key: [] for key in keys}
+    grams_by_key = {key: trigrams(key) for key in keys}
+    grams_by_key = {key: grams for key, grams in grams_by_key.items() if grams}
+    if not grams_by_key:
+        return result
+
+    common = common_trigrams()
+    search = {key: _search_grams(grams, common) for key, grams in grams_by_key.items()}
+    pools: Dict[str, List[int]] = {}
+    for key, rows in _candidate_pools(search).items():
+        # Jaccard >= s exige s * |grams| trigramas em comum; os que ficaram fora da busca podem faltar
+        grams = grams_by_key[key]
+        min_hits = max(1, math.ceil(min_score * len(grams)) - (len(grams) - len(search[key])))
+        pools[key] = [product_id for product_id, hits in rows if hits >= min_hits]
+    wanted = set().union(*pools.values())
+    if not wanted:
+        return result
+    products = Product.objects.in_bulk(wanted)
+    for key, pool in pools.items():
+        result[key] = _ranked(key, grams_by_key[key], (products[pid] for pid in pool if pid in products), min_score, limit)
+    return result
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Product
+from .services.matching import index_products
+
+
+@receiver(post_save, sender=Product)
+def reindex_product_name(sender, instance: Product, created: bool, update_fields=None, **kwargs):
+    # Só quando o nome normalizado mudou (saves parciais de custo/flag não reindexam)
+    if update_fields is not None and "name" not in update_fields:
+        return
+    if not getattr(instance, "_name_key_changed", True):
+        return
+    index_products([instance])
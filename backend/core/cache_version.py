@@ -0,0 +1,44 @@
+"""Versão compartilhada de caches em memória por processo (métodos de pagamento, faixas de taxa).
+
+A versão fica no cache do Django (CACHES), que precisa ser compartilhado entre os processos
+(Redis/memcached) para que uma gravação num processo invalide os outros. Cada processo só
+confere a versão compartilhada a cada CACHE_VERSION_CHECK_SECONDS: entre uma conferência e
+outra a leitura não toca no cache nem no banco, e uma gravação feita em outro processo aparece
+aqui em até esse intervalo. A troca feita pelo próprio processo vale na hora.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _new_version() -> str:
+    # Token aleatório, não contador: cache limpo ou reiniciado nunca repete uma versão já vista pelo processo
+    return uuid.uuid4().hex
+
+
+def check_interval() -> float:
+    return float(getattr(settings, "CACHE_VERSION_CHECK_SECONDS", 2))
+
+
+class SharedVersion:
+    def __init__(self, key: str):
+        self.key = key
+        self._version = None
+        self._checked_at = float("-inf")
+
+    def current(self) -> str:
+        now = time.monotonic()
+        if self._version is None or now - self._checked_at >= check_interval():
+            self._version = cache.get_or_set(self.key, _new_version, None)
+            self._checked_at = now
+        return self._version
+
+    def bump(self) -> str:
+        self._version = _new_version()
+        self._checked_at = time.monotonic()
+        cache.set(self.key, self._version, None)
+        return self._version
@@ -0,0 +1,9 @@
+"""Utilitários de banco compartilhados pelos apps (filas de importação de NF-e e de webhooks)."""
+from __future__ import annotations
+
+from django.db import InterfaceError, OperationalError
+
+
+def is_transient_db_error(exc: BaseException) -> bool:
+    """Lock, deadlock ou conexão perdida: vale tentar de novo a mesma operação."""
+    return isinstance(exc, (OperationalError, InterfaceError))
@@ -0,0 +1,173 @@
+"""Leitura do fim dos arquivos de log sem carregar o arquivo inteiro.
+
+O arquivo é lido de trás para frente em blocos (seek + read), então pegar as últimas N linhas
+custa proporcional a N, não ao tamanho do log. Linhas de continuação (traceback) ficam junto do
+registro a que pertencem. Com rotação (RotatingFileHandler: app.log, app.log.1, app.log.2...)
+a leitura segue para os backups só se o arquivo atual não bastar.
+
+O formato esperado é o "verbose" do settings: "%(asctime)s [%(levelname)s] %(name)s: %(message)s".
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+
+BLOCK_SIZE = 64 * 1024
+# Sem cabeçalho por muitas linhas seguidas: não é log no formato esperado, libera em pedaços
+MAX_CONTINUATION = 500
+
+HEADER = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d{3} \[(\w+)\] ([\w.]+): ")
+ORDER_IDS = re.compile(r"\border[=\s#](\d+)\b|\bAUTO-ORDER-(\d+)\b", re.IGNORECASE)
+RECEIVABLE_IDS = re.compile(r"\breceivable(?:_id)?[=\s#](\d+)\b", re.IGNORECASE)
+
+
+def _level_no(name: str) -> int:
+    value = logging.getLevelName(name)
+    return value if isinstance(value, int) else 0
+
+
+@dataclass
+class LogRecord:
+    lines: List[str]
+    timestamp: Optional[datetime.datetime] = None
+    level: str = ""
+    logger: str = ""
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+@dataclass
+class LogFilter:
+    level: Optional[str] = None  # nível mínimo (WARNING inclui ERROR e CRITICAL)
+    logger: Optional[str] = None  # prefixo: "sale" pega "sale.payment"
+    order: Optional[str] = None
+    receivable: Optional[str] = None
+    contains: Optional[str] = None
+    since: Optional[datetime.datetime] = None
+    until: Optional[datetime.datetime] = None
+    _min_level: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        # Registros têm hora local ingênua (asctime): since/until com fuso viram hora local do processo
+        for name in ("since", "until"):
+            value = getattr(self, name)
+            if value is not None and value.tzinfo is not None:
+                setattr(self, name, value.astimezone().replace(tzinfo=None))
+        if self.level:
+            value = logging.getLevelName(self.level.upper())
+            if not isinstance(value, int):
+                raise ValueError(f"Nível de log inválido: {self.level}")
+            self._min_level = value
+
+    @property
+    def active(self) -> bool:
+        return any((self.level, self.logger, self.order, self.receivable, self.contains, self.since, self.until))
+
+    def matches(self, record: LogRecord) -> bool:
+        if not self.active:
+            return True
+        if record.timestamp is None:
+            # Linhas fora do formato só aparecem sem filtro
+            return False
+        if self.until and record.timestamp > self.until:
+            return False
+        if self.since and record.timestamp < self.since:
+            return False
+        if self._min_level and _level_no(record.level) < self._min_level:
+            return False
+        if self.logger and not (record.logger == self.logger or record.logger.startswith(self.logger + ".")):
+            return False
+        text = record.text
+        if self.order and self.order not in {a or b for a, b in ORDER_IDS.findall(text)}:
+            return False
+        if self.receivable and self.receivable not in RECEIVABLE_IDS.findall(text):
+            return False
+        if self.contains and self.contains.lower() not in text.lower():
+            return False
+        return True
+
+
+def rotated_files(path: str) -> List[str]:
+    """Arquivo atual e backups existentes, do mais novo para o mais antigo."""
+    files = [path] if os.path.exists(path) else []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        files.append(f"{path}.{index}")
+        index += 1
+    return files
+
+
+def iter_reverse_lines(path: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Linhas do arquivo da última para a primeira, lendo blocos a partir do fim."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            parts = (f.read(step) + rest).split(b"\n")
+            # O primeiro pedaço pode ser o fim de uma linha que começa no bloco anterior
+            rest = parts.pop(0)
+            for raw in reversed(parts):
+                if raw.strip():
+                    yield raw.rstrip(b"\r").decode("utf-8", errors="replace")
+        if rest.strip():
+            yield rest.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+def iter_reverse_records(paths: Iterable[str]) -> Iterator[LogRecord]:
+    """Registros do mais novo para o mais antigo, atravessando os arquivos na ordem dada."""
+    for path in paths:
+        pending: List[str] = []
+        for line in iter_reverse_lines(path):
+            match = HEADER.match(line)
+            if match is None:
+                pending.append(line)
+                if len(pending) >= MAX_CONTINUATION:
+                    yield LogRecord(lines=pending[::-1])
+                    pending = []
+                continue
+            yield LogRecord(
+                lines=[line, *pending[::-1]],
+                timestamp=datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"),
+                level=match.group(2),
+                logger=match.group(3),
+            )
+            pending = []
+        if pending:
+            yield LogRecord(lines=pending[::-1])
+
+
+def search(paths: Iterable[str], filters: Optional[LogFilter] = None) -> Iterator[LogRecord]:
+    """Registros que passam no filtro, do mais novo para o mais antigo.
+
+    Com `since`, para no primeiro registro mais antigo: o log é cronológico, o resto do arquivo
+    (e os backups) nem é lido.
+    """
+    filters = filters or LogFilter()
+    for record in iter_reverse_records(paths):
+        if filters.since and record.timestamp is not None and record.timestamp < filters.since:
+            return
+        if filters.matches(record):
+            yield record
+
+
+def tail(paths: Iterable[str], limit: int, filters: Optional[LogFilter] = None) -> List[LogRecord]:
+    """Últimos `limit` registros que passam no filtro, em ordem cronológica."""
+    found: List[LogRecord] = []
+    if limit <= 0:
+        return found
+    for record in search(paths, filters):
+        found.append(record)
+        if len(found) >= limit:
+            break
+    found.reverse()
+    return found
@@ -0,0 +1,182 @@
+"""Paginação por chave (keyset) para listagens grandes, com contagem em cache.
+
+Com `?cursor=` (ou sem `page`), a página seguinte é lida a partir da última linha vista:
+WHERE (campo, id) além da posição ORDER BY campo, id LIMIT n. O custo não cresce com a
+profundidade, ao contrário do OFFSET. Vale quando a ordenação do queryset (já aplicada pelo
+OrderingFilter) é um dos `keyset_fields` da view, com ou sem "-"; fora disso, e com `?page=`,
+segue a paginação por número de página de sempre.
+
+NULL ordena como maior valor (depois dos preenchidos na subida, antes na descida), igual ao
+padrão do Postgres; preenchidos e NULL são lidos em consultas separadas, cada uma uma faixa
+do índice (campo, id).
+
+O COUNT(*) da consulta filtrada fica em cache por COUNT_CACHE_SECONDS: o total exibido pode
+atrasar alguns segundos em relação às escritas.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework import exceptions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+COUNT_CACHE_SECONDS = 60
+
+
+def cached_count(queryset, seconds: int = COUNT_CACHE_SECONDS) -> int:
+    """COUNT(*) do queryset, em cache pelo SQL gerado (filtros incluídos)."""
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    digest = hashlib.md5(f"{sql}|{params!r}".encode("utf-8")).hexdigest()
+    key = f"pagination:count:{queryset.model._meta.label_lower}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, seconds)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class KeysetPagination(PageNumberPagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    invalid_cursor_message = "Cursor inválido."
+    django_paginator_class = CachedCountPaginator
+    # Campos aceitos para keyset; a view pode sobrescrever com o atributo `keyset_fields`
+    keyset_fields: Tuple[str, ...] = ("created_at",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = self._keyset(queryset, view)
+        params = request.query_params
+        if self.keyset is None or (self.page_query_param in params and self.cursor_query_param not in params):
+            self.mode = "page"
+            return super().paginate_queryset(queryset, request, view)
+
+        self.mode = "keyset"
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        name, desc, nullable = self.keyset
+        position = self._decode(params.get(self.cursor_query_param))
+        reverse = bool(position and position[2])
+        # Página anterior: lê no sentido oposto a partir da primeira linha vista e inverte
+        increasing = desc if reverse else not desc
+        rows: List[Any] = []
+        for segment in self._segments(queryset, name, position, increasing, nullable):
+            if segment is None:
+                continue
+            rows.extend(segment[: page_size + 1 - len(rows)])
+            if len(rows) > page_size:
+                break
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = (position is not None) if reverse else more
+        self.has_previous = more if reverse else position is not None
+        self.count = cached_count(queryset)
+        self.rows = rows
+        return rows
+
+    def _keyset(self, queryset, view) -> Optional[Tuple[str, bool, bool]]:
+        allowed = getattr(view, "keyset_fields", None) or self.keyset_fields
+        order = [o for o in queryset.query.order_by if isinstance(o, str) and o.lstrip("-") not in ("id", "pk")]
+        if len(order) != 1 or order[0].lstrip("-") not in allowed:
+            return None
+        name = order[0].lstrip("-")
+        return name, order[0].startswith("-"), queryset.model._meta.get_field(name).null
+
+    @staticmethod
+    def _segments(queryset, name: str, position, increasing: bool, nullable: bool) -> List[Any]:
+        """Consultas, na ordem da página, com as linhas depois da posição; NULL conta como maior valor.
+
+        Valores preenchidos e NULL vão em consultas separadas: cada uma é uma faixa simples do
+        índice (campo, id), sem OR entre campo e IS NULL, que faria o banco varrer o índice inteiro.
+        """
+        sign = "" if increasing else "-"
+        cmp = "gt" if increasing else "lt"
+        filled = queryset.filter(**{f"{name}__isnull": False}) if nullable else queryset
+        filled = filled.order_by(f"{sign}{name}", f"{sign}pk")
+        nulls = queryset.filter(**{f"{name}__isnull": True}).order_by(f"{sign}pk") if nullable else None
+        if position is None:
+            return [filled, nulls] if increasing else [nulls, filled]
+        value, pk = position[0], position[1]
+        if value is None:
+            # Posição dentro dos NULL: subindo, só restam NULL; descendo, o resto dos NULL e depois os preenchidos
+            rest = nulls.filter(**{f"pk__{cmp}": pk})
+            return [rest] if increasing else [rest, filled]
+        # O limite (>= / <=) fica fora do OR: o banco usa o índice como faixa em vez de varrê-lo do início
+        after = filled.filter(**{f"{name}__{cmp}e": value}).filter(Q(**{f"{name}__{cmp}": value}) | Q(**{f"pk__{cmp}": pk}))
+        return [after, nulls] if increasing else [after]
+
+    def _decode(self, raw: Optional[str]):
+        if not raw:
+            return None
+        field = self.model._meta.get_field(self.keyset[0])
+        try:
+            data = json.loads(base64.urlsafe_b64decode(raw.encode("ascii") + b"=" * (-len(raw) % 4)))
+            value = data.get("v")
+            if value is not None:
+                value = field.to_python(value)
+            return value, int(data["id"]), bool(data.get("r"))
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError, UnicodeError):
+            # 400, não 404: cursor malformado é erro do cliente, não recurso ausente
+            raise exceptions.ValidationError({"detail": self.invalid_cursor_message})
+
+    def _encode(self, row, reverse: bool) -> str:
+        value = getattr(row, self.keyset[0])
+        data = {"v": value.isoformat() if value is not None else None, "id": row.pk}
+        if reverse:
+            data["r"] = 1
+        raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def _link(self, row, reverse: bool) -> str:
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self._encode(row, reverse))
+
+    def get_next_link(self):
+        if self.mode == "page":
+            return super().get_next_link()
+        return self._link(self.rows[-1], False) if self.has_next and self.rows else None
+
+    def get_previous_link(self):
+        if self.mode == "page":
+            return super().get_previous_link()
+        return self._link(self.rows[0], True) if self.has_previous and self.rows else None
+
+    def get_paginated_response(self, data):
+        if self.mode == "page":
+            return super().get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.count),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
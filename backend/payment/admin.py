@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PaymentMethod, Receivable, PaymentEvent, CardBrand, CardFeeTier
+from .models import PaymentMethod, Receivable, ReceivableDailyRollup, ReceivableOverdueWatermark, PaymentEvent, PaymentWebhookEvent, CardBrand, CardFeeTier
 
 
 @admin.register(PaymentMethod)
@@ -22,6 +22,25 @@ class ReceivableAdmin(admin.ModelAdmin):
     inlines = [PaymentEventInline]
 
 
+@admin.register(ReceivableDailyRollup)
+class ReceivableDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ("date", "method", "status", "count", "amount", "updated_at")
+    list_filter = ("status", "method")
+    date_hierarchy = "date"
+
+
+@admin.register(ReceivableOverdueWatermark)
+class ReceivableOverdueWatermarkAdmin(admin.ModelAdmin):
+    list_display = ("id", "last_ref_date", "last_run_at", "last_updated")
+
+
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "external_id", "status", "attempts", "created_at", "processed_at")
+    list_filter = ("status",)
+    search_fields = ("external_id",)
+
+
 @admin.register(CardBrand)
 class CardPaymentAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "active")
@@ -0,0 +1,98 @@
+import statistics
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from catalog.models import Brand, Category, Product
+from payment.models import PaymentMethod
+from payment.services import method_cache
+from payment.views import PaymentMethodViewSet
+from people.models import Seller
+from sale.models import Order, OrderItem, confirm_order
+from stock.models import StockMovement
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Conta as consultas por confirmação de pedido e por listagem de métodos do checkout, sem e "
+        "com o cache de métodos de pagamento. Gera os dados dentro de uma transação desfeita no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=50)
+        parser.add_argument("--methods", type=int, default=8)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(max(1, options["orders"]), max(1, options["methods"]))
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            # Métodos do benchmark foram desfeitos: o cache do processo não pode guardá-los
+            method_cache.bump_method_version()
+
+    def _fixture(self, orders: int, methods: int):
+        tag = uuid.uuid4().hex[:8]
+        cat = Category.objects.create(name=f"BENCH-CHECKOUT-{tag}")
+        brand = Brand.objects.create(name=f"BENCH-CHECKOUT-{tag}")
+        user = get_user_model().objects.create_user(username=f"bench-checkout-{tag}")
+        seller = Seller.objects.create(user=user, name=f"Bench {tag}", access_level="total")
+        product = Product.objects.create(
+            name=f"BENCH-CHECKOUT-{tag}", category=cat, brand=brand, cost_price=Decimal("1.00"), margin=Decimal("10.00")
+        )
+        StockMovement.objects.create(product=product, type="ENTRADA", quantity=Decimal(orders * 4), reference=f"BENCH {tag}")
+        pms = [
+            PaymentMethod.objects.create(code=f"bench-checkout-{tag}-{i}", name=f"Bench {i}", type="pix", fee_percent=Decimal("1.00"))
+            for i in range(methods)
+        ]
+        return seller, product, pms
+
+    def _confirm(self, seller, product, method, orders: int):
+        counts, method_reads = [], 0
+        for _ in range(orders):
+            order = Order.objects.create(seller=seller, payment_method_id=method.id)
+            OrderItem(order=order, product=product, quantity=Decimal("1"), unit_price=product.sale_price).save()
+            order = Order.objects.get(pk=order.pk)
+            with CaptureQueriesContext(connection) as ctx:
+                confirm_order(order)
+            counts.append(len(ctx.captured_queries))
+            method_reads += sum('"payment_paymentmethod"' in q["sql"] for q in ctx.captured_queries)
+        return statistics.mean(counts), method_reads / orders
+
+    def _list(self):
+        view = PaymentMethodViewSet.as_view({"get": "list"})
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(APIRequestFactory().get("/api/v1/payment/methods/"))
+        assert response.status_code == 200, response.data
+        return len(ctx.captured_queries)
+
+    def _run(self, orders: int, methods: int):
+        seller, product, pms = self._fixture(orders, methods)
+
+        # Sem cache: o mesmo caminho de quando há alteração pendente (leituras vão ao banco)
+        method_cache.hold()
+        cold_total, cold_reads = self._confirm(seller, product, pms[0], orders)
+        cold_list = self._list()
+
+        method_cache.bump_method_version()
+        method_cache.snapshot()
+        warm_total, warm_reads = self._confirm(seller, product, pms[0], orders)
+        warm_list = self._list()
+
+        self.stdout.write(f"Pedidos: {orders} | métodos cadastrados: {PaymentMethod.objects.count()}")
+        self.stdout.write(f"{'':<32} {'sem cache':>10} {'com cache':>10}")
+        self.stdout.write(f"{'consultas por confirmação':<32} {cold_total:>10.1f} {warm_total:>10.1f}")
+        self.stdout.write(f"{'  lendo payment_paymentmethod':<32} {cold_reads:>10.1f} {warm_reads:>10.1f}")
+        self.stdout.write(f"{'consultas na lista do checkout':<32} {cold_list:>10} {warm_list:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Consultas economizadas por confirmação: {cold_total - warm_total:.1f}"))
@@ -0,0 +1,98 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, F
+
+from payment.models import PaymentEvent, PaymentMethod, PaymentWebhookEvent, Receivable
+from payment.services import receivable_rollup
+from payment.services.inbox import drain, ingest
+
+PREFIX = "BENCH-INBOX-"
+METHOD_CODE = "bench-inbox"
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga da caixa de entrada de webhooks: grava N eventos, drena com várias threads "
+        "e confere que nenhuma baixa se perdeu. Usa dados próprios (BENCH-INBOX-*), removidos no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=5000)
+        parser.add_argument("--receivables", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--keep", action="store_true", help="Não remove os dados gerados")
+
+    def _cleanup(self):
+        PaymentWebhookEvent.objects.filter(external_id__startswith=PREFIX).delete()
+        Receivable.objects.filter(reference__startswith=PREFIX).delete()
+        PaymentMethod.objects.filter(code=METHOD_CODE).delete()
+
+    def handle(self, *args, **options):
+        events, receivables = max(1, options["events"]), max(1, options["receivables"])
+        size, concurrency = max(1, options["batch_size"]), max(1, options["concurrency"])
+        self._cleanup()
+
+        # Cada recebível vale exatamente a soma dos seus eventos (R$ 1,00 cada): o último o quita
+        per_rec = [events // receivables + (1 if i < events % receivables else 0) for i in range(receivables)]
+        method = PaymentMethod.objects.create(code=METHOD_CODE, name="Benchmark inbox", type="pix")
+        Receivable.objects.bulk_create(
+            [
+                Receivable(method=method, reference=f"{PREFIX}{i}", amount=Decimal(n), status="PENDENTE")
+                for i, n in enumerate(per_rec)
+                if n
+            ],
+            batch_size=1000,
+        )
+        receivable_rollup.shift(Receivable.objects.filter(reference__startswith=PREFIX), 1)
+
+        # Eventos intercalados entre recebíveis: cada lote e cada thread disputam os mesmos registros
+        payloads = [
+            {"external_id": f"{PREFIX}{n}", "reference": f"{PREFIX}{n % receivables}", "amount": "1.00", "fee_amount": "0.01"}
+            for n in range(events)
+        ]
+        started = time.perf_counter()
+        for start in range(0, events, size):
+            ingest(payloads[start:start + size])
+        ingest_s = time.perf_counter() - started
+
+        results = []
+
+        def loop():
+            try:
+                results.append(drain(once=True, size=size, poll_interval=0.05))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=loop, name=f"bench-inbox-{i}") for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        drain_s = time.perf_counter() - started
+
+        recs = Receivable.objects.filter(reference__startswith=PREFIX)
+        lost = recs.exclude(paid_amount=F("amount")).count() + recs.exclude(status="PAGO").count()
+        applied = PaymentEvent.objects.filter(receivable__reference__startswith=PREFIX).count()
+        pending = dict(
+            PaymentWebhookEvent.objects.filter(external_id__startswith=PREFIX)
+            .values_list("status")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        self.stdout.write(f"Eventos: {events} em {receivables} recebíveis, {concurrency} threads, lotes de {size}")
+        self.stdout.write(f"Ingestão: {ingest_s:.2f}s ({events / max(ingest_s, 1e-9):.0f} eventos/s)")
+        self.stdout.write(f"Aplicação: {drain_s:.2f}s ({events / max(drain_s, 1e-9):.0f} eventos/s)")
+        self.stdout.write(f"Status da caixa de entrada: {pending}")
+        self.stdout.write(f"Eventos gravados: {applied}")
+        ok = lost == 0 and applied == events
+        message = f"Atualizações perdidas: {lost}"
+        self.stdout.write(self.style.SUCCESS(message) if ok else self.style.ERROR(message))
+
+        if not options["keep"]:
+            self._cleanup()
@@ -0,0 +1,88 @@
+import datetime
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from core.pagination import KeysetPagination
+from payment.models import PaymentMethod, Receivable
+from payment.views import ReceivableViewSet
+
+PREFIX = "BENCH-PAGES-"
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a listagem de recebíveis por profundidade de página: OFFSET (?page=N) contra keyset "
+        "(?cursor=). Gera os dados dentro de uma transação desfeita no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--pages", default="1,100,1000", help="Páginas medidas, separadas por vírgula")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _time(self, view, url, repeat):
+        factory = APIRequestFactory()
+        timings = []
+        response = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = view(factory.get(url))
+            timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.data
+        return statistics.median(timings), response.data
+
+    def _run(self, options):
+        rows, repeat = max(1, options["rows"]), max(1, options["repeat"])
+        pages = [int(p) for p in options["pages"].split(",") if p.strip()]
+        methods = [PaymentMethod.objects.create(code=f"bench-pages-{i}", name=f"Bench {i}", type="pix") for i in range(3)]
+        base = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        batch = []
+        for n in range(rows):
+            batch.append(
+                Receivable(
+                    method=methods[n % 3],
+                    reference=f"{PREFIX}{n}",
+                    amount=Decimal("10.00"),
+                    due_date=(base + datetime.timedelta(hours=n)).date(),
+                    status=("PENDENTE", "PAGO", "ATRASADO")[n % 3],
+                )
+            )
+            if len(batch) == 5000:
+                Receivable.objects.bulk_create(batch)
+                batch = []
+        Receivable.objects.bulk_create(batch)
+        cache.clear()
+
+        view = ReceivableViewSet.as_view({"get": "list"})
+        paginator = KeysetPagination()
+        paginator.keyset = ("created_at", True, False)
+        size = paginator.page_size
+        self.stdout.write(f"Recebíveis: {rows} | mediana de {repeat} requisições por página (ms)")
+        self.stdout.write(f"{'página':>8} {'offset':>10} {'keyset':>10}")
+        for page in pages:
+            offset_ms, _ = self._time(view, f"/api/v1/payment/receivables/?page={page}", repeat)
+            # Cursor na última linha da página anterior, montado fora da medição
+            keyset_url = "/api/v1/payment/receivables/"
+            if page > 1:
+                last = Receivable.objects.order_by("-created_at", "-id")[(page - 1) * size - 1]
+                keyset_url += f"?cursor={paginator._encode(last, False)}"
+            keyset_ms, _ = self._time(view, keyset_url, repeat)
+            self.stdout.write(f"{page:>8} {offset_ms:>10.1f} {keyset_ms:>10.1f}")
@@ -0,0 +1,51 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from payment.services.inbox import batch_size, drain
+
+
+class Command(BaseCommand):
+    help = "Aplica os eventos de pagamento da caixa de entrada de webhooks (PaymentWebhookEvent) em lotes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Eventos por lote (padrão: PAYMENT_INBOX_BATCH_SIZE)")
+        parser.add_argument("--concurrency", type=int, default=1, help="Threads de trabalho")
+        parser.add_argument("--forever", action="store_true", help="Continua consultando a fila depois de esvaziar")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Segundos entre consultas à fila vazia")
+
+    def handle(self, *args, **options):
+        size = options["batch_size"] or batch_size()
+        once, poll = not options["forever"], options["poll_interval"]
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                # Termina o lote em andamento e sai
+                signal.signal(sig, lambda *_: stop.set())
+
+        results = []
+
+        def loop():
+            try:
+                results.append(drain(once=once, size=size, poll_interval=poll, stop=stop))
+            finally:
+                connection.close()
+
+        concurrency = max(1, options["concurrency"])
+        if concurrency == 1:
+            results.append(drain(once=once, size=size, poll_interval=poll, stop=stop))
+        else:
+            threads = [threading.Thread(target=loop, name=f"payment-inbox-{i}") for i in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        totals = {key: sum(r[key] for r in results) for key in ("batches", "processed", "ignored", "errors")}
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Lotes: {totals['batches']} | aplicados: {totals['processed']} | "
+                f"ignorados: {totals['ignored']} | com erro: {totals['errors']}"
+            )
+        )
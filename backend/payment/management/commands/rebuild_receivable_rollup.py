@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from payment.services.receivable_rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Recalcula o agregado diário de recebíveis (vencimento, método, status) a partir de Receivable"
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollup()
+        self.stdout.write(self.style.SUCCESS(f"Linhas do agregado: {rows}"))
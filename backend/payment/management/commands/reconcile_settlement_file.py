@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from payment.services.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = "Concilia o arquivo CSV de liquidação da adquirente com os recebíveis (idempotente por linha)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo CSV (separador ; ou ,)")
+        parser.add_argument("--dry-run", action="store_true", dest="dry", help="Só gera o relatório, sem baixar recebíveis")
+        parser.add_argument("--details", action="store_true", help="Imprime as linhas sem recebível/divergentes em JSON")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], "r", encoding="utf-8-sig", errors="replace", newline="") as stream:
+                report = reconcile(stream, dry_run=options["dry"])
+        except OSError as exc:
+            raise CommandError(f"Não foi possível ler o arquivo: {exc}")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f"Linhas: {report['lines']} | conciliadas: {report['matched']} "
+            f"({report['settled_receivables']} recebíveis, {report['settled_value']}) | "
+            f"sem recebível: {report['unmatched']} | divergentes: {report['divergent']} | "
+            f"já processadas: {report['already_processed']} | inválidas: {report['invalid']}"
+        )
+        if options.get("details"):
+            self.stdout.write(json.dumps(report["details"], cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
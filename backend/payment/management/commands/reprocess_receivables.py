@@ -0,0 +1,25 @@
+import datetime
+from django.core.management.base import BaseCommand
+from payment.services.overdue import mark_overdue
+
+
+class Command(BaseCommand):
+    help = "Reprocessa recebíveis, marcando como ATRASADO os pendentes vencidos desde a última execução"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", dest="date", help="Data de referência YYYY-MM-DD (opcional)")
+        parser.add_argument("--full", action="store_true", help="Ignora a marca d'água e varre todos os pendentes")
+
+    def handle(self, *args, **options):
+        ref_str = options.get("date")
+        if ref_str:
+            try:
+                ref_date = datetime.date.fromisoformat(ref_str)
+            except Exception:
+                self.stderr.write(self.style.ERROR("Data inválida. Use YYYY-MM-DD."))
+                return
+        else:
+            ref_date = datetime.date.today()
+
+        result = mark_overdue(ref_date, full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"Recebíveis marcados ATRASADO: {result['updated']}"))
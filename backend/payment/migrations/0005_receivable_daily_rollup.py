@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:22
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+def build_rollup(apps, schema_editor):
+    Receivable = apps.get_model("payment", "Receivable")
+    ReceivableDailyRollup = apps.get_model("payment", "ReceivableDailyRollup")
+    rows = (
+        Receivable.objects.values("due_date", "method_id", "status")
+        .annotate(n=Count("id"), total=Sum("amount"))
+        .order_by()
+    )
+    ReceivableDailyRollup.objects.bulk_create(
+        [
+            ReceivableDailyRollup(
+                date=row["due_date"], method_id=row["method_id"], status=row["status"], count=row["n"], amount=row["total"] or 0
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0004_alter_cardfeetier_fee_percent_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceivableDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PENDENTE', 'PENDENTE'), ('PAGO', 'PAGO'), ('ATRASADO', 'ATRASADO'), ('ESTORNADO', 'ESTORNADO')], max_length=12)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('method', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='payment.paymentmethod')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='receivabledailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'method', 'status'), name='receivable_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='receivabledailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', True)), fields=('method', 'status'), name='receivable_rollup_nodate_key'),
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0005_receivable_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceivableOverdueWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_ref_date', models.DateField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_updated', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['status', 'due_date'], name='receivable_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0007_payment_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['created_at', 'id'], name='receivable_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['status', 'created_at'], name='receivable_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['method', 'created_at'], name='receivable_method_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['due_date', 'id'], name='receivable_due_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['method', 'due_date'], name='receivable_method_due_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0008_receivable_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receivable',
+            name='installment',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='receivable',
+            name='installments',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='receivable',
+            index=models.Index(fields=['reference', 'installment'], name='receivable_ref_installment_idx'),
+        ),
+    ]
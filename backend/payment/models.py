@@ -56,11 +56,66 @@ class Receivable(TimeStampedModel):
     paid_date = models.DateField(null=True, blank=True)
     paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     fee_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    # Venda parcelada: parcela `installment` de `installments`, todas com a mesma reference
+    installment = models.PositiveSmallIntegerField(default=1)
+    installments = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Marcação de atrasados: status = PENDENTE AND due_date BETWEEN marca d'água e hoje
+            models.Index(fields=["status", "due_date"], name="receivable_status_due_idx"),
+            # Listagem (KeysetPagination): ordem padrão -created_at e por vencimento, com os filtros usados
+            models.Index(fields=["created_at", "id"], name="receivable_created_id_idx"),
+            models.Index(fields=["status", "created_at"], name="receivable_status_created_idx"),
+            models.Index(fields=["method", "created_at"], name="receivable_method_created_idx"),
+            models.Index(fields=["due_date", "id"], name="receivable_due_id_idx"),
+            models.Index(fields=["method", "due_date"], name="receivable_method_due_idx"),
+            # Parcelas de um pedido (conciliação e webhooks buscam por reference), em ordem
+            models.Index(fields=["reference", "installment"], name="receivable_ref_installment_idx"),
+        ]
 
     def __str__(self):
         return f"{self.method.code} {self.amount} ({self.status})"
 
 
+class ReceivableOverdueWatermark(models.Model):
+    """Linha única: até que vencimento a marcação de atrasados já rodou (`mark_receivables_overdue`)."""
+
+    last_ref_date = models.DateField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_updated = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Atrasados marcados até {self.last_ref_date}"
+
+
+class ReceivableDailyRollup(models.Model):
+    """Contagem e soma de recebíveis por (vencimento, método, status), base do resumo.
+
+    Mantida pelos signals de Receivable (deltas dentro da mesma transação da escrita);
+    `rebuild_receivable_rollup` recalcula tudo a partir da tabela de recebíveis.
+    """
+
+    date = models.DateField(null=True, blank=True)
+    method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, related_name="daily_rollups")
+    status = models.CharField(max_length=12, choices=RECEIVABLE_STATUS)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "method", "status"], name="receivable_rollup_key"),
+            # Recebíveis sem vencimento: NULL não entra na unicidade acima
+            models.UniqueConstraint(
+                fields=["method", "status"], condition=models.Q(date__isnull=True), name="receivable_rollup_nodate_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.method_id} {self.status}: {self.count} / {self.amount}"
+
+
 class PaymentEvent(TimeStampedModel):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
     receivable = models.ForeignKey(Receivable, on_delete=models.CASCADE, related_name="events")
@@ -75,7 +130,9 @@ class PaymentEvent(TimeStampedModel):
 
     @transaction.atomic
     def apply(self):
-        r = self.receivable
+        # Lock na linha: baixas simultâneas do mesmo recebível somam em fila, sem perder atualização
+        r = Receivable.objects.select_for_update().get(pk=self.receivable_id)
+        self.receivable = r
         if r.status in ("PAGO", "ESTORNADO"):
             return
         r.paid_amount = (r.paid_amount or Decimal("0.00")) + self.amount
@@ -86,6 +143,36 @@ class PaymentEvent(TimeStampedModel):
         r.save()
 
 
+WEBHOOK_STATUS = (
+    ("PENDENTE", "PENDENTE"),
+    ("PROCESSANDO", "PROCESSANDO"),
+    ("PROCESSADO", "PROCESSADO"),
+    ("IGNORADO", "IGNORADO"),
+    ("ERRO", "ERRO"),
+)
+
+
+class PaymentWebhookEvent(TimeStampedModel):
+    """Evento bruto recebido por webhook (caixa de entrada), aplicado em lotes por `drain_payment_inbox`."""
+
+    external_id = models.CharField(max_length=80, unique=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=12, choices=WEBHOOK_STATUS, default="PENDENTE")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="paywebhook_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.external_id} ({self.status})"
+
+
 class CardBrand(TimeStampedModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=80, unique=True)
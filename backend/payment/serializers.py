@@ -1,6 +1,21 @@
 from rest_framework import serializers
 from decimal import Decimal, InvalidOperation
 from .models import PaymentMethod, Receivable, CardBrand, CardFeeTier
+from .services import method_cache
+
+
+class CachedPaymentMethodField(serializers.PrimaryKeyRelatedField):
+    """PK de método de pagamento validada pelo cache por processo (sem consulta no pedido)."""
+
+    def to_internal_value(self, data):
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        method = method_cache.get_method(pk)
+        if method is None:
+            self.fail("does_not_exist", pk_value=data)
+        return method
 
 
 class PaymentMethodSerializer(serializers.ModelSerializer):
@@ -49,6 +64,8 @@ class ReceivableSerializer(serializers.ModelSerializer):
             "paid_date",
             "paid_amount",
             "fee_amount",
+            "installment",
+            "installments",
             "created_at",
             "updated_at",
         ]
@@ -103,3 +120,16 @@ class CardFeeTierSerializer(serializers.ModelSerializer):
             return value
         except (InvalidOperation, ValueError):
             raise serializers.ValidationError("Valor de fee_percent inválido")
+
+
+class FeeQuoteSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0"))
+    brand = serializers.UUIDField()
+    type = serializers.ChoiceField(choices=["card_credit", "card_debit"], default="card_credit")
+    installments = serializers.IntegerField(min_value=1, max_value=24, required=False)
+    date = serializers.DateField(required=False)
+
+
+class ReconciliationUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    dry_run = serializers.BooleanField(required=False, default=False)
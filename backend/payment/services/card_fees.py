@@ -0,0 +1,197 @@
+"""Cálculo de taxa de cartão a partir das faixas de parcelas (CardFeeTier).
+
+As faixas ativas são carregadas uma vez por processo num índice de intervalos por
+(bandeira, tipo): inícios ordenados + bisect, então achar a faixa de N parcelas não consulta
+o banco. O índice é refeito quando a versão compartilhada muda (signals de CardFeeTier/CardBrand;
+ver core.cache_version).
+"""
+from __future__ import annotations
+
+import bisect
+import datetime
+import threading
+import uuid
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.cache_version import SharedVersion
+
+from ..models import CardFeeTier, PaymentMethod
+
+VERSION_KEY = "payment:card-fee-tiers:version"
+CARD_TYPES = ("card_credit", "card_debit")
+MAX_INSTALLMENTS = 24
+CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class FeeTier:
+    start: int
+    end: int
+    fee_percent: Decimal
+    fee_fixed: Decimal
+    settlement_days: int
+
+
+class TierIndex:
+    """Faixas de uma (bandeira, tipo) sem sobreposição, ordenadas pelo início."""
+
+    def __init__(self, tiers: List[FeeTier]):
+        self.tiers = tiers
+        self.starts = [t.start for t in tiers]
+
+    @classmethod
+    def build(cls, rows: List[FeeTier]) -> "TierIndex":
+        # Faixas sobrepostas: vale a de menor início (mesma regra do PDV), as seguintes são recortadas
+        tiers: List[FeeTier] = []
+        covered = 0
+        for row in sorted(rows, key=lambda t: (t.start, t.end)):
+            start = max(row.start, covered + 1)
+            if start > row.end:
+                continue
+            tiers.append(FeeTier(start, row.end, row.fee_percent, row.fee_fixed, row.settlement_days))
+            covered = row.end
+        return cls(tiers)
+
+    def find(self, installments: int) -> Optional[FeeTier]:
+        pos = bisect.bisect_right(self.starts, installments) - 1
+        if pos < 0:
+            return None
+        tier = self.tiers[pos]
+        return tier if installments <= tier.end else None
+
+    @property
+    def max_installments(self) -> int:
+        return self.tiers[-1].end if self.tiers else 0
+
+
+_local: Dict[str, Any] = {"version": None, "index": {}}
+_lock = threading.Lock()
+
+
+_version = SharedVersion(VERSION_KEY)
+
+
+def bump_fee_version():
+    _version.bump()
+
+
+def _load() -> Dict[Tuple[str, str], TierIndex]:
+    grouped: Dict[Tuple[str, str], List[FeeTier]] = {}
+    rows = CardFeeTier.objects.filter(brand__active=True).values_list(
+        "brand_id", "type", "installments_min", "installments_max", "fee_percent", "fee_fixed", "settlement_days"
+    )
+    for brand_id, kind, start, end, pct, fixed, days in rows:
+        grouped.setdefault((str(brand_id), kind), []).append(FeeTier(start, end, pct, fixed, days))
+    return {key: TierIndex.build(tiers) for key, tiers in grouped.items()}
+
+
+def fee_index() -> Dict[Tuple[str, str], TierIndex]:
+    version = _version.current()
+    if _local["version"] != version:
+        with _lock:
+            if _local["version"] != version:
+                _local["index"] = _load()
+                _local["version"] = version
+    return _local["index"]
+
+
+def _brand_key(brand_id) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(brand_id)))
+    except ValueError:
+        return None
+
+
+def find_tier(brand_id, card_type: str, installments: int) -> Optional[FeeTier]:
+    index = fee_index().get((_brand_key(brand_id), card_type))
+    return index.find(installments) if index else None
+
+
+def compute_fee(amount: Decimal, fee_percent: Decimal, fee_fixed: Decimal) -> Decimal:
+    return (amount * (fee_percent or 0) / Decimal("100") + (fee_fixed or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _line(amount: Decimal, installments: int, pct: Decimal, fixed: Decimal, days: int, on_date: datetime.date) -> Dict[str, Any]:
+    fee = compute_fee(amount, pct, fixed)
+    return {
+        "installments": installments,
+        "fee_percent": pct,
+        "fee_fixed": fixed,
+        "fee": fee,
+        "net": amount - fee,
+        "installment_value": (amount / installments).quantize(CENT, rounding=ROUND_HALF_UP),
+        "settlement_days": days,
+        "settlement_date": on_date + datetime.timedelta(days=days),
+    }
+
+
+def quote(
+    amount: Decimal,
+    brand_id,
+    card_type: str = "card_credit",
+    max_installments: Optional[int] = None,
+    on_date: Optional[datetime.date] = None,
+) -> List[Dict[str, Any]]:
+    """Taxa, líquido e data de recebimento para 1..N parcelas; parcelas sem faixa cadastrada ficam de fora."""
+    on_date = on_date or datetime.date.today()
+    index = fee_index().get((_brand_key(brand_id), card_type))
+    if index is None:
+        return []
+    last = min(max_installments or index.max_installments, MAX_INSTALLMENTS)
+    quotes = []
+    for n in range(1, last + 1):
+        tier = index.find(n)
+        if tier is not None:
+            quotes.append(_line(amount, n, tier.fee_percent, tier.fee_fixed, tier.settlement_days, on_date))
+    return quotes
+
+
+def max_installments(method: PaymentMethod, brand_id=None) -> int:
+    """Maior número de parcelas aceito: o fim da última faixa da bandeira, limitado a MAX_INSTALLMENTS."""
+    if method.type != "card_credit":
+        return 1
+    index = fee_index().get((_brand_key(brand_id), method.type)) if brand_id else None
+    if index is None or not index.max_installments:
+        return MAX_INSTALLMENTS
+    return min(index.max_installments, MAX_INSTALLMENTS)
+
+
+def order_installments(method: PaymentMethod, metadata: Optional[Dict[str, Any]]) -> int:
+    """Parcelas do pedido validadas; só crédito parcela. Fora de 1..máximo levanta ValueError."""
+    meta = metadata if isinstance(metadata, dict) else {}
+    if method.type != "card_credit":
+        return 1
+    try:
+        installments = int(meta.get("installments") or 1)
+    except (TypeError, ValueError):
+        raise ValueError("Número de parcelas inválido.")
+    limit = max_installments(method, meta.get("card_brand"))
+    if not 1 <= installments <= limit:
+        raise ValueError(f"Número de parcelas deve ficar entre 1 e {limit}.")
+    return installments
+
+
+def order_fee(method: PaymentMethod, amount: Decimal, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Taxa de um pedido: faixa da bandeira/parcelas informadas ou, sem faixa, a taxa do método.
+
+    `installments` já vem validado (order_installments) e é o mesmo usado para gerar os recebíveis.
+    """
+    meta = metadata if isinstance(metadata, dict) else {}
+    installments = order_installments(method, meta)
+    tier = None
+    if method.type in CARD_TYPES and meta.get("card_brand"):
+        tier = find_tier(meta["card_brand"], method.type, installments)
+    if tier is not None:
+        pct, fixed, days = tier.fee_percent, tier.fee_fixed, tier.settlement_days
+    else:
+        pct, fixed, days = method.fee_percent or Decimal("0"), method.fee_fixed or Decimal("0"), int(method.settlement_days or 0)
+    return {
+        "installments": installments,
+        "fee_percent": pct,
+        "fee_fixed": fixed,
+        "fee": compute_fee(amount, pct, fixed),
+        "settlement_days": days,
+        "tier": tier is not None,
+    }
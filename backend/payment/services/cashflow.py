@@ -0,0 +1,118 @@
+"""Fluxo de caixa projetado: entradas (recebíveis em aberto) e saídas (parcelas a pagar) por dia ou semana.
+
+As entradas vêm do agregado diário de recebíveis (ReceivableDailyRollup, já por vencimento e
+método) e as saídas de PurchaseInstallment; as duas pontas saem numa única consulta
+UNION ALL com GROUP BY por data. Vencidos em aberto caem num grupo só (data NULL) e viram o
+bloco "overdue". O resultado fica em cache; a chave muda quando muda a versão do fluxo
+(escritas no agregado de recebíveis) ou a do resumo de parcelas (escritas em compras).
+"""
+from __future__ import annotations
+
+import calendar
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, DateField, F, IntegerField, Sum, Value, When
+
+from purchase.models import PurchaseInstallment
+from purchase.services.installment_summary import VERSION_KEY as INSTALLMENT_VERSION_KEY
+
+from ..models import ReceivableDailyRollup
+
+CACHE_SECONDS = 300
+VERSION_KEY = "payment:cashflow:version"
+OPEN_STATUSES = ("PENDENTE", "ATRASADO")
+GRANULARITIES = ("day", "week")
+MAX_MONTHS = 12
+
+
+def bump_cashflow_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def add_months(day: datetime.date, months: int) -> datetime.date:
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return datetime.date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _day(field: str, ref_date: datetime.date):
+    # Vencido antes da referência: agrupa tudo em NULL (bloco "overdue")
+    return Case(When(**{f"{field}__lt": ref_date}, then=Value(None)), default=F(field), output_field=DateField())
+
+
+def _rows(ref_date: datetime.date, until: datetime.date):
+    inflows = (
+        ReceivableDailyRollup.objects.filter(status__in=OPEN_STATUSES, count__gt=0, date__isnull=False, date__lt=until)
+        .values(day=_day("date", ref_date), pay_method=F("method_id"))
+        .annotate(kind=Value("in", output_field=CharField()), total=Sum("amount"))
+        .values_list("day", "kind", "pay_method", "total")
+        .order_by()
+    )
+    outflows = (
+        PurchaseInstallment.objects.filter(status__in=OPEN_STATUSES, due_date__lt=until)
+        .values(day=_day("due_date", ref_date), pay_method=Value(None, output_field=IntegerField()))
+        .annotate(kind=Value("out", output_field=CharField()), total=Sum("value"))
+        .values_list("day", "kind", "pay_method", "total")
+        .order_by()
+    )
+    return inflows.union(outflows, all=True)
+
+
+def _period_start(day: datetime.date, granularity: str) -> datetime.date:
+    return day - datetime.timedelta(days=day.weekday()) if granularity == "week" else day
+
+
+def compute_cashflow(ref_date: datetime.date, granularity: str = "day", months: int = MAX_MONTHS) -> Dict[str, Any]:
+    until = add_months(ref_date, months)
+    zero = Decimal("0.00")
+    periods: Dict[datetime.date, Dict[str, Decimal]] = {}
+    overdue = {"inflow": zero, "outflow": zero}
+    by_method: Dict[int, Decimal] = {}
+    for day, kind, method_id, total in _rows(ref_date, until):
+        total = Decimal(str(total or 0))
+        side = "inflow" if kind == "in" else "outflow"
+        if day is None:
+            overdue[side] += total
+            continue
+        if kind == "in":
+            by_method[method_id] = by_method.get(method_id, zero) + total
+        if isinstance(day, str):
+            day = datetime.date.fromisoformat(day)
+        slot = periods.setdefault(_period_start(day, granularity), {"inflow": zero, "outflow": zero})
+        slot[side] += total
+
+    balance = zero
+    lines = []
+    for start in sorted(periods):
+        slot = periods[start]
+        net = slot["inflow"] - slot["outflow"]
+        balance += net
+        lines.append({"start": start, "inflow": slot["inflow"], "outflow": slot["outflow"], "net": net, "balance": balance})
+    inflow = sum((p["inflow"] for p in lines), zero)
+    outflow = sum((p["outflow"] for p in lines), zero)
+    return {
+        "reference_date": ref_date,
+        "until": until,
+        "granularity": granularity,
+        "overdue": {**overdue, "net": overdue["inflow"] - overdue["outflow"]},
+        "totals": {"inflow": inflow, "outflow": outflow, "net": inflow - outflow},
+        "inflow_by_method": [{"method_id": k, "value": v} for k, v in sorted(by_method.items())],
+        "periods": lines,
+    }
+
+
+def cashflow(ref_date: datetime.date, granularity: str = "day", months: Optional[int] = None) -> Dict[str, Any]:
+    months = months or MAX_MONTHS
+    version = f"{cache.get_or_set(VERSION_KEY, 1, None)}.{cache.get_or_set(INSTALLMENT_VERSION_KEY, 1, None)}"
+    key = f"payment:cashflow:{version}:{granularity}:{months}:{ref_date.isoformat()}"
+    data = cache.get(key)
+    if data is None:
+        data = compute_cashflow(ref_date, granularity, months)
+        cache.set(key, data, CACHE_SECONDS)
+    return data
@@ -0,0 +1,366 @@
+"""Caixa de entrada de webhooks de pagamento (PaymentWebhookEvent) e o laço que a drena.
+
+O webhook só grava o evento bruto (um INSERT, external_id único: reenvio do gateway não
+duplica) e responde. `drain` reserva lotes com UPDATE condicional (PENDENTE -> PROCESSANDO,
+como a fila de importação de NF-e) e aplica cada lote numa transação: recebíveis travados
+com select_for_update em ordem de id, eventos em bulk_create e baixa com UPDATE em conjunto
+(CASE por id). Vários workers podem drenar ao mesmo tempo sem perder atualização.
+
+Payload esperado: external_id, amount, fee_amount (opcional), paid_date (opcional, padrão
+hoje), metadata (opcional) e o recebível por `receivable` (id), `receivable_external_id` ou
+`reference` com `installment` (opcional). Por reference sem parcela, os eventos vão para as
+parcelas em aberto do pedido em ordem (InstallmentPicker).
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import threading
+import uuid
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Case, DateField, DecimalField, F, Value, When
+from django.utils import timezone
+
+from core.db import is_transient_db_error
+
+from ..models import PaymentEvent, PaymentWebhookEvent, Receivable
+from . import receivable_rollup
+from .installments import InstallmentPicker
+
+log = logging.getLogger("payment")
+
+CHUNK = 500
+APPLY_ATTEMPTS = 6
+# Espera antes de cada nova tentativa do mesmo lote: base * 2^(tentativa-1) segundos
+RETRY_BACKOFF_SECONDS = 0.05
+CLOSED_STATUSES = ("PAGO", "ESTORNADO")
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def batch_size() -> int:
+    return max(1, int(getattr(settings, "PAYMENT_INBOX_BATCH_SIZE", 500)))
+
+
+def lock_timeout() -> int:
+    return int(getattr(settings, "PAYMENT_INBOX_LOCK_TIMEOUT", 300))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:90]
+
+
+def valid_signature(body: bytes, signature: str) -> bool:
+    """Confere a assinatura do webhook: HMAC-SHA256 do corpo com PAYMENT_WEBHOOK_SECRET, em hex
+    (aceita o prefixo "sha256="). Sem segredo configurado nenhuma chamada é aceita."""
+    secret = getattr(settings, "PAYMENT_WEBHOOK_SECRET", "")
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().removeprefix("sha256=").lower())
+
+
+def ingest(events: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Grava os eventos na caixa de entrada; external_id já recebido conta como duplicado."""
+    rows: Dict[str, PaymentWebhookEvent] = {}
+    for event in events:
+        external_id = str(event.get("external_id") or "").strip()[:80]
+        if not external_id:
+            raise ValueError("Evento sem external_id.")
+        rows.setdefault(external_id, PaymentWebhookEvent(external_id=external_id, payload=event))
+    known = set()
+    ids = list(rows)
+    for start in range(0, len(ids), CHUNK):
+        known.update(
+            PaymentWebhookEvent.objects.filter(external_id__in=ids[start:start + CHUNK]).values_list("external_id", flat=True)
+        )
+    fresh = [row for key, row in rows.items() if key not in known]
+    # ignore_conflicts: o mesmo evento chegando em paralelo por outra requisição não derruba o lote
+    PaymentWebhookEvent.objects.bulk_create(fresh, batch_size=CHUNK, ignore_conflicts=True)
+    return {"received": len(rows), "accepted": len(fresh), "duplicates": len(rows) - len(fresh)}
+
+
+def requeue_stale() -> int:
+    """Devolve à fila lotes travados por workers que morreram no meio da aplicação."""
+    limit = timezone.now() - datetime.timedelta(seconds=lock_timeout())
+    return PaymentWebhookEvent.objects.filter(status="PROCESSANDO", locked_at__lt=limit).update(
+        status="PENDENTE", locked_by="", locked_at=None, updated_at=timezone.now()
+    )
+
+
+def claim_batch(worker: str, size: Optional[int] = None) -> List[PaymentWebhookEvent]:
+    ids = list(
+        PaymentWebhookEvent.objects.filter(status="PENDENTE").order_by("id").values_list("id", flat=True)[: size or batch_size()]
+    )
+    if not ids:
+        return []
+    token = f"{worker}:{uuid.uuid4().hex[:8]}"
+    now = timezone.now()
+    PaymentWebhookEvent.objects.filter(pk__in=ids, status="PENDENTE").update(
+        status="PROCESSANDO", locked_by=token, locked_at=now, attempts=F("attempts") + 1, updated_at=now
+    )
+    # Só o que este worker conseguiu reservar: outro pode ter pego parte dos ids no meio
+    return list(PaymentWebhookEvent.objects.filter(pk__in=ids, locked_by=token).order_by("id"))
+
+
+def _parse(payload: Dict[str, Any], received: datetime.datetime) -> Dict[str, Any]:
+    if not isinstance(payload, dict):
+        raise ValueError("payload inválido")
+    amount = Decimal(str(payload.get("amount", ""))).quantize(Decimal("0.01"))
+    fee = Decimal(str(payload.get("fee_amount") or "0")).quantize(Decimal("0.01"))
+    if amount < 0 or fee < 0:
+        raise ValueError("valor negativo")
+    raw_date = payload.get("paid_date")
+    paid_date = datetime.date.fromisoformat(str(raw_date)[:10]) if raw_date else timezone.localdate(received)
+    target = {name: str(payload[name]).strip() for name in ("receivable", "receivable_external_id", "reference") if payload.get(name)}
+    if not target:
+        raise ValueError("evento sem recebível (receivable, receivable_external_id ou reference)")
+    raw_installment = str(payload.get("installment") or "").strip()
+    if raw_installment and not (raw_installment.isdigit() and int(raw_installment) > 0):
+        raise ValueError("parcela inválida")
+    metadata = payload.get("metadata")
+    return {
+        "amount": amount,
+        "fee": fee,
+        "paid_date": paid_date,
+        "target": target,
+        "installment": int(raw_installment) if raw_installment else None,
+        "metadata": metadata if isinstance(metadata, dict) else {},
+    }
+
+
+def _resolve(parsed: List[Tuple[PaymentWebhookEvent, Dict[str, Any]]]) -> Dict[int, int]:
+    """Id do evento da caixa -> id do recebível, em uma consulta por campo usado no lote.
+
+    Por reference, cada evento passa pelo InstallmentPicker do pedido na ordem do lote: N pagamentos
+    de um pedido parcelado quitam N parcelas, não a primeira N vezes.
+    """
+    wanted: Dict[str, set] = {}
+    for _row, data in parsed:
+        for name, value in data["target"].items():
+            wanted.setdefault(name, set()).add(value)
+    found: Dict[Tuple[str, str], int] = {}
+    pks = {v for v in wanted.get("receivable", ()) if v.isdigit()}
+    if pks:
+        found.update((("receivable", str(pk)), pk) for pk in Receivable.objects.filter(pk__in=pks).values_list("id", flat=True))
+    if wanted.get("receivable_external_id"):
+        opened = set()
+        rows = Receivable.objects.filter(external_id__in=wanted["receivable_external_id"]).order_by("-id").values_list("id", "external_id", "status")
+        for pk, value, st in rows:
+            # external_id repetido: vale o mais antigo em aberto, senão o mais antigo
+            key = ("receivable_external_id", value)
+            if st in receivable_rollup.OPEN_STATUSES:
+                found[key] = pk
+                opened.add(key)
+            elif key not in opened:
+                found[key] = pk
+    by_reference: Dict[str, List[Receivable]] = {}
+    if wanted.get("reference"):
+        rows = (
+            Receivable.objects.filter(reference__in=wanted["reference"])
+            .only("id", "reference", "installment", "amount", "paid_amount", "status")
+            .order_by("reference", "installment", "id")
+        )
+        for rec in rows:
+            by_reference.setdefault(rec.reference, []).append(rec)
+    pickers = {ref: InstallmentPicker(recs) for ref, recs in by_reference.items()}
+
+    targets: Dict[int, int] = {}
+    for row, data in parsed:
+        target = data["target"]
+        rec_id = next(
+            (found[(name, target[name])] for name in ("receivable", "receivable_external_id") if (name, target.get(name)) in found),
+            None,
+        )
+        if rec_id is None and target.get("reference") in pickers:
+            rec = pickers[target["reference"]].pick(data["amount"], data["installment"])
+            rec_id = rec.id if rec is not None else None
+        if rec_id is not None:
+            targets[row.id] = rec_id
+    return targets
+
+
+def _mark(ids: List[int], status: str, error: str = ""):
+    if ids:
+        now = timezone.now()
+        PaymentWebhookEvent.objects.filter(pk__in=ids).update(
+            status=status, error=error, processed_at=now, locked_by="", locked_at=None, updated_at=now
+        )
+
+
+def _applied(external_ids: List[str]) -> set:
+    return set(PaymentEvent.objects.filter(external_id__in=external_ids).values_list("external_id", flat=True))
+
+
+def _apply_parsed(
+    parsed: List[Tuple[PaymentWebhookEvent, Dict[str, Any]]], seen: set, errors: Dict[str, List[int]]
+) -> Tuple[List[int], List[int], Dict[str, List[int]]]:
+    """Uma tentativa do lote numa transação; devolve (processados, ignorados, erros por mensagem)."""
+    errors = {message: list(ids) for message, ids in errors.items()}
+    ignored: List[int] = []
+    processed: List[int] = []
+    with transaction.atomic():
+        # Só os eventos novos passam pelo picker: evento já aplicado não consome parcela
+        found = _resolve([(row, data) for row, data in parsed if row.external_id not in seen])
+        todo: List[Tuple[PaymentWebhookEvent, Dict[str, Any], int]] = []
+        for row, data in parsed:
+            rec_id = found.get(row.id)
+            if row.external_id in seen:
+                ignored.append(row.id)
+            elif rec_id is None:
+                errors.setdefault("recebível não encontrado", []).append(row.id)
+            else:
+                todo.append((row, data, rec_id))
+
+        locked = {
+            rec.id: rec
+            for rec in Receivable.objects.select_for_update()
+            .filter(pk__in={rec_id for _, _, rec_id in todo})
+            .only("id", "amount", "paid_amount", "fee_amount", "paid_date", "status")
+            .order_by("id")
+        }
+        events: List[PaymentEvent] = []
+        changed: Dict[int, Receivable] = {}
+        for row, data, rec_id in todo:
+            events.append(
+                PaymentEvent(
+                    receivable_id=rec_id,
+                    amount=data["amount"],
+                    fee_amount=data["fee"],
+                    paid_date=data["paid_date"],
+                    external_id=row.external_id,
+                    metadata={**data["metadata"], "webhook": True},
+                )
+            )
+            processed.append(row.id)
+            rec = locked[rec_id]
+            # Mesma regra de PaymentEvent.apply, em memória sobre a linha travada
+            if rec.status in CLOSED_STATUSES:
+                continue
+            rec.paid_amount = (rec.paid_amount or Decimal("0.00")) + data["amount"]
+            rec.fee_amount = (rec.fee_amount or Decimal("0.00")) + data["fee"]
+            rec.paid_date = data["paid_date"]
+            if rec.paid_amount >= rec.amount:
+                rec.status = "PAGO"
+            changed[rec_id] = rec
+
+        PaymentEvent.objects.bulk_create(events, batch_size=CHUNK)
+        ids = sorted(changed)
+        for start in range(0, len(ids), CHUNK):
+            chunk = [changed[rec_id] for rec_id in ids[start:start + CHUNK]]
+            qs = Receivable.objects.filter(pk__in=[rec.id for rec in chunk])
+            receivable_rollup.shift(qs, -1)
+            qs.update(
+                paid_amount=Case(*[When(pk=rec.id, then=Value(rec.paid_amount)) for rec in chunk], output_field=MONEY),
+                fee_amount=Case(*[When(pk=rec.id, then=Value(rec.fee_amount)) for rec in chunk], output_field=MONEY),
+                paid_date=Case(*[When(pk=rec.id, then=Value(rec.paid_date)) for rec in chunk], output_field=DateField()),
+                status=Case(*[When(pk=rec.id, then=Value(rec.status)) for rec in chunk]),
+                updated_at=timezone.now(),
+            )
+            receivable_rollup.shift(qs, 1)
+        _mark(processed, "PROCESSADO")
+        _mark(ignored, "IGNORADO")
+        for message, error_ids in errors.items():
+            _mark(error_ids, "ERRO", message)
+    return processed, ignored, errors
+
+
+def apply_batch(rows: List[PaymentWebhookEvent]) -> Dict[str, int]:
+    """Aplica um lote reservado; devolve a contagem por resultado (processed, ignored, errors)."""
+    parsed: List[Tuple[PaymentWebhookEvent, Dict[str, Any]]] = []
+    errors: Dict[str, List[int]] = {}
+    for row in rows:
+        try:
+            parsed.append((row, _parse(row.payload, row.created_at)))
+        except (ValueError, TypeError, InvalidOperation) as exc:
+            message = "valor inválido" if isinstance(exc, InvalidOperation) else str(exc) or "payload inválido"
+            errors.setdefault(message, []).append(row.id)
+
+    external_ids = [row.external_id for row, _ in parsed]
+    # Mesmo external_id já baixado pelo endpoint settle ou por outro caminho: ignora
+    seen = _applied(external_ids)
+    while True:
+        try:
+            processed, ignored, errors = _apply_parsed(parsed, seen, errors)
+            break
+        except IntegrityError:
+            # external_id gravado em paralelo entre a leitura e o INSERT (ex.: endpoint settle): só esses
+            # eventos passam a ignorados e o resto do lote vai de novo; sem duplicado novo, o erro é outro
+            fresh = _applied(external_ids)
+            if fresh <= seen:
+                raise
+            seen = fresh
+
+    result = {"processed": len(processed), "ignored": len(ignored), "errors": sum(len(v) for v in errors.values())}
+    log.info("[payment] inbox batch size=%s processed=%s ignored=%s errors=%s", len(rows), *result.values())
+    return result
+
+
+def _release(rows: List[PaymentWebhookEvent]):
+    PaymentWebhookEvent.objects.filter(pk__in=[row.id for row in rows], status="PROCESSANDO").update(
+        status="PENDENTE", locked_by="", locked_at=None, updated_at=timezone.now()
+    )
+
+
+def _apply_reserved(rows: List[PaymentWebhookEvent], stop: threading.Event) -> Optional[Dict[str, int]]:
+    """Aplica o lote já reservado; erro transitório (lock, conexão) tenta de novo o mesmo lote com espera crescente."""
+    for attempt in range(1, APPLY_ATTEMPTS + 1):
+        try:
+            return apply_batch(rows)
+        except Exception as exc:
+            if not is_transient_db_error(exc):
+                log.exception("[payment] inbox batch failed")
+                _mark([row.id for row in rows], "ERRO", str(exc) or exc.__class__.__name__)
+                return None
+            if attempt == APPLY_ATTEMPTS or stop.is_set():
+                log.warning("[payment] inbox lote devolvido à fila após %s tentativas: %s", attempt, exc)
+                try:
+                    _release(rows)
+                except Exception:
+                    # Sem banco nem para devolver: requeue_stale devolve depois do timeout
+                    pass
+                return None
+            stop.wait(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return None
+
+
+def drain(
+    once: bool = True,
+    size: Optional[int] = None,
+    poll_interval: float = 1.0,
+    stop: Optional[threading.Event] = None,
+) -> Dict[str, int]:
+    """Laço do worker: aplica lotes até a fila esvaziar (once=True) ou até `stop` ser sinalizado."""
+    worker = worker_id()
+    totals = {"batches": 0, "processed": 0, "ignored": 0, "errors": 0}
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        if not connection.in_atomic_block:
+            close_old_connections()
+        try:
+            requeue_stale()
+            rows = claim_batch(worker, size)
+        except Exception as exc:
+            if not is_transient_db_error(exc):
+                raise
+            log.warning("[payment] inbox indisponível: %s", exc)
+            stop.wait(RETRY_BACKOFF_SECONDS)
+            continue
+        if rows:
+            result = _apply_reserved(rows, stop)
+            if result is not None:
+                totals["batches"] += 1
+                for key, value in result.items():
+                    totals[key] += value
+            continue
+        if once and not PaymentWebhookEvent.objects.filter(status="PENDENTE").exists():
+            break
+        stop.wait(poll_interval)
+    return totals
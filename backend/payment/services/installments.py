@@ -0,0 +1,99 @@
+"""Recebíveis de uma venda: um por parcela, gravados de uma vez com bulk_create.
+
+A primeira parcela vence no prazo de liquidação (faixa da bandeira ou método); as seguintes,
+a cada RECEIVABLE_INSTALLMENT_INTERVAL_DAYS dias. O total é dividido em centavos e a sobra
+da divisão fica na primeira parcela; nunca há mais parcelas que centavos. Todas levam a mesma reference do pedido, com o número
+da parcela em `installment`.
+
+bulk_create não dispara os signals: os deltas do agregado diário são aplicados aqui, na mesma
+transação, então resumo e fluxo de caixa já enxergam cada parcela no seu vencimento.
+"""
+from __future__ import annotations
+
+import datetime
+from decimal import ROUND_DOWN, Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import PaymentMethod, Receivable
+from .card_fees import CENT
+from .cashflow import bump_cashflow_version
+from .receivable_rollup import OPEN_STATUSES, apply_delta, rollup_key
+
+
+def _interval_days() -> int:
+    return max(1, int(getattr(settings, "RECEIVABLE_INSTALLMENT_INTERVAL_DAYS", 30)))
+
+
+def split_amount(total: Decimal, installments: int) -> List[Decimal]:
+    """Valores das parcelas somando exatamente `total`; centavos que sobram vão na primeira.
+
+    Nunca gera parcela zerada: com menos centavos que parcelas, o número de parcelas cai para
+    a quantidade de centavos (0,05 em 10x vira 5 parcelas de 0,01).
+    """
+    n = max(1, min(installments, int(total / CENT)))
+    part = (total / n).quantize(CENT, rounding=ROUND_DOWN)
+    return [total - part * (n - 1)] + [part] * (n - 1)
+
+
+@transaction.atomic
+def create_receivables(
+    method: PaymentMethod,
+    reference: str,
+    total: Decimal,
+    installments: int,
+    first_due: datetime.date,
+) -> List[Receivable]:
+    # `installments` já validado contra o máximo da faixa (card_fees.order_installments)
+    amounts = split_amount(total, max(1, int(installments or 1)))
+    n = len(amounts)
+    if n == 1:
+        return [Receivable.objects.create(method=method, reference=reference, due_date=first_due, amount=total)]
+    step = datetime.timedelta(days=_interval_days())
+    recs = Receivable.objects.bulk_create(
+        [
+            Receivable(
+                method=method,
+                reference=reference,
+                due_date=first_due + step * k,
+                amount=amount,
+                installment=k + 1,
+                installments=n,
+            )
+            for k, amount in enumerate(amounts)
+        ]
+    )
+    # Um vencimento por parcela: um delta por linha do agregado
+    for rec in recs:
+        apply_delta(rollup_key(rec), 1, rec.amount)
+    transaction.on_commit(bump_cashflow_version)
+    return recs
+
+
+class InstallmentPicker:
+    """Escolhe a parcela de uma reference para cada pagamento (conciliação e webhooks).
+
+    Pagamento com número de parcela vai para ela (a aberta, se a parcela se repetir). Sem número,
+    vai para a primeira parcela em aberto que ainda tem saldo; o saldo desconta cada pagamento
+    atribuído, então N linhas de um pedido caem em N parcelas em ordem. Sem parcela em aberto,
+    fica a primeira, e quem chama trata como divergência/baixa sem efeito.
+    """
+
+    def __init__(self, rows: Iterable[Receivable]):
+        self.rows = sorted(rows, key=lambda rec: (rec.installment, rec.id))
+        self.left: Dict[int, Decimal] = {
+            rec.id: rec.amount - (rec.paid_amount or Decimal("0.00")) for rec in self.rows if rec.status in OPEN_STATUSES
+        }
+
+    def pick(self, amount: Decimal, installment: Optional[int] = None) -> Optional[Receivable]:
+        rows = self.rows if installment is None else [rec for rec in self.rows if rec.installment == installment]
+        if installment is None:
+            rec = next((r for r in rows if self.left.get(r.id, 0) > 0), None)
+        else:
+            rec = next((r for r in rows if r.id in self.left), None)
+        rec = rec or (rows[0] if rows else None)
+        if rec is not None and rec.id in self.left:
+            self.left[rec.id] -= amount
+        return rec
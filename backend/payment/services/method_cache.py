@@ -0,0 +1,138 @@
+"""Cache por processo dos métodos de pagamento e das bandeiras de cartão.
+
+Métodos e bandeiras quase nunca mudam, mas são lidos em toda confirmação de pedido e em toda
+tela de checkout. As duas tabelas (poucas linhas) são carregadas uma vez por processo,
+indexadas por id e código (bandeiras por id), e recarregadas quando a versão no cache muda,
+como o índice de faixas de card_fees.
+
+A versão é compartilhada entre os processos (core.cache_version), então gravações de outro
+processo também invalidam este, em até CACHE_VERSION_CHECK_SECONDS. Ao gravar um método ou
+bandeira, os signals suspendem o cache no thread que gravou até o fim da transação: no commit
+a versão é trocada; num rollback a suspensão cai quando a transação externa termina. Enquanto isso as leituras desse thread vão direto ao banco: uma
+alteração ainda não confirmada (ou desfeita) nunca fica guardada. Id ou código fora do cache
+também caem no banco. As instâncias devolvidas são cópias; alterá-las não afeta o cache.
+"""
+from __future__ import annotations
+
+import copy
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+
+from core.cache_version import SharedVersion
+
+from ..models import CardBrand, PaymentMethod
+
+VERSION_KEY = "payment:methods:version"
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    by_id: Dict[int, PaymentMethod]
+    by_code: Dict[str, PaymentMethod]
+    ordered: List[PaymentMethod]
+    brands: Dict[str, CardBrand]
+
+
+_local: Dict[str, Any] = {"version": None, "snapshot": None}
+_lock = threading.Lock()
+_version = SharedVersion(VERSION_KEY)
+# Suspensões do thread: uma por gravação ainda não confirmada
+_holds = threading.local()
+
+
+def release():
+    """Volta a usar o cache neste thread, mesmo com gravações ainda não confirmadas."""
+    _holds.tokens = set()
+
+
+def bump_method_version():
+    release()
+    _version.bump()
+
+
+def hold():
+    """Alteração pendente neste thread: lê do banco até o commit trocar a versão ou a transação terminar."""
+    token = object()
+    _holds.tokens = getattr(_holds, "tokens", set()) | {token}
+    transaction.on_commit(bump_method_version)
+
+
+def _held() -> bool:
+    if not getattr(_holds, "tokens", None):
+        return False
+    # Fora de transação a gravação já terminou: o commit chamou bump_method_version; se a
+    # suspensão continua aqui, a transação foi desfeita e não há nada novo a esperar
+    if not transaction.get_connection().in_atomic_block:
+        release()
+        return False
+    return True
+
+
+def _load() -> Snapshot:
+    methods = list(PaymentMethod.objects.order_by("name", "id"))
+    return Snapshot(
+        by_id={m.id: m for m in methods},
+        by_code={m.code: m for m in methods},
+        ordered=methods,
+        brands={str(b.id): b for b in CardBrand.objects.all()},
+    )
+
+
+def snapshot() -> Optional[Snapshot]:
+    if _held():
+        return None
+    version = _version.current()
+    if _local["version"] != version:
+        with _lock:
+            if _local["version"] != version:
+                _local["snapshot"] = _load()
+                _local["version"] = version
+    return _local["snapshot"]
+
+
+def _pk(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_method(pk) -> Optional[PaymentMethod]:
+    key = _pk(pk)
+    if key is None:
+        return None
+    snap = snapshot()
+    if snap is not None and key in snap.by_id:
+        return copy.copy(snap.by_id[key])
+    return PaymentMethod.objects.filter(pk=key).first()
+
+
+def get_method_by_code(code: str) -> Optional[PaymentMethod]:
+    snap = snapshot()
+    if snap is not None and code in snap.by_code:
+        return copy.copy(snap.by_code[code])
+    # Código fora do cache: confere no banco (criado por outro processo antes da troca de versão chegar aqui)
+    return PaymentMethod.objects.filter(code=code).first()
+
+
+def all_methods() -> List[PaymentMethod]:
+    """Todos os métodos ordenados por nome (listagem do checkout)."""
+    snap = snapshot()
+    if snap is None:
+        return list(PaymentMethod.objects.order_by("name", "id"))
+    return [copy.copy(m) for m in snap.ordered]
+
+
+def get_brand(pk) -> Optional[CardBrand]:
+    try:
+        key = str(uuid.UUID(str(pk)))
+    except ValueError:
+        return None
+    snap = snapshot()
+    if snap is not None and key in snap.brands:
+        return copy.copy(snap.brands[key])
+    return CardBrand.objects.filter(pk=key).first()
@@ -0,0 +1,60 @@
+"""Marcação de recebíveis vencidos: PENDENTE com vencimento anterior à data de referência vira ATRASADO.
+
+Um único UPDATE coberto pelo índice (status, due_date), com a linha da marca d'água travada. A marca
+(ReceivableOverdueWatermark.last_ref_date) guarda a data da última execução: tudo que venceu
+antes dela já foi marcado, então a próxima execução só olha a faixa [marca, referência).
+Recebível criado depois já vencido (data retroativa) fica de fora da faixa: `full=True` varre tudo.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+from typing import Any, Dict, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Receivable, ReceivableOverdueWatermark
+from . import receivable_rollup
+
+log = logging.getLogger("payment")
+
+WATERMARK_ID = 1
+
+
+@transaction.atomic
+def mark_overdue(ref_date: Optional[datetime.date] = None, full: bool = False) -> Dict[str, Any]:
+    ref_date = ref_date or datetime.date.today()
+    # Lock na linha da marca d'água: execuções simultâneas rodam em fila e não contam o agregado duas vezes
+    ReceivableOverdueWatermark.objects.get_or_create(pk=WATERMARK_ID)
+    mark = ReceivableOverdueWatermark.objects.select_for_update().get(pk=WATERMARK_ID)
+    since = None if full else mark.last_ref_date
+
+    qs = Receivable.objects.filter(status="PENDENTE", due_date__lt=ref_date)
+    if since is not None:
+        qs = qs.filter(due_date__gte=since)
+
+    # Um UPDATE indexado (status, due_date). As linhas que ele mudou ficam travadas até o commit e são
+    # reconhecidas pelo updated_at desta execução: o agregado sai delas depois, sem baixa concorrente
+    # entre a leitura e a escrita e sem carregar ids
+    now = timezone.now()
+    updated = qs.update(status="ATRASADO", updated_at=now)
+    if updated:
+        changed = Receivable.objects.filter(status="ATRASADO", updated_at=now, due_date__lt=ref_date)
+        if since is not None:
+            changed = changed.filter(due_date__gte=since)
+        receivable_rollup.shift_status(changed, "PENDENTE")
+
+    # A marca só avança: rodar com data passada não reabre a faixa já processada
+    if mark.last_ref_date is None or ref_date > mark.last_ref_date:
+        mark.last_ref_date = ref_date
+    mark.last_run_at = timezone.now()
+    mark.last_updated = updated
+    mark.save()
+    log.info("[payment] overdue marked=%s ref_date=%s since=%s full=%s", updated, ref_date, since, full)
+    return {
+        "updated": updated,
+        "reference_date": str(ref_date),
+        "since": str(since) if since else None,
+        "watermark": str(mark.last_ref_date),
+    }
@@ -0,0 +1,138 @@
+"""Agregado diário de recebíveis (ReceivableDailyRollup) e o resumo servido a partir dele.
+
+Cada escrita em Receivable aplica um delta na linha (vencimento, método, status): UPDATE com
+F() e, se a linha ainda não existe, INSERT. O resumo lê só o agregado, então o custo depende
+do número de dias com vencimento, não do número de recebíveis.
+"""
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from ..models import Receivable, ReceivableDailyRollup
+from .cashflow import bump_cashflow_version
+
+RollupKey = Tuple[Optional[datetime.date], int, str]
+OPEN_STATUSES = ("PENDENTE", "ATRASADO")
+
+
+def rollup_key(receivable: Receivable) -> RollupKey:
+    return receivable.due_date, receivable.method_id, receivable.status
+
+
+def apply_delta(key: RollupKey, count: int, amount: Decimal) -> None:
+    if not count and not amount:
+        return
+    day, method_id, status = key
+    rows = ReceivableDailyRollup.objects.filter(date=day, method_id=method_id, status=status)
+    changes = {"count": F("count") + count, "amount": F("amount") + amount, "updated_at": timezone.now()}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            ReceivableDailyRollup.objects.create(date=day, method_id=method_id, status=status, count=count, amount=amount)
+    except IntegrityError:
+        # Outra transação criou a linha entre o UPDATE e o INSERT
+        rows.update(**changes)
+
+
+def move(old: Optional[Tuple[RollupKey, Decimal]], new: Optional[Tuple[RollupKey, Decimal]]) -> None:
+    """Tira o recebível da linha antiga e soma na nova; nada a fazer se chave e valor não mudaram."""
+    if old == new:
+        return
+    transaction.on_commit(bump_cashflow_version)
+    if old is not None:
+        apply_delta(old[0], -1, -old[1])
+    if new is not None:
+        apply_delta(new[0], 1, new[1])
+
+
+def shift(queryset, sign: int) -> None:
+    """Aplica ao agregado o grupo (vencimento, método, status) de um queryset, com sinal.
+
+    Para escritas em massa (update/bulk_create não disparam signals): shift(qs, -1) antes do
+    UPDATE e shift(qs, 1) depois, na mesma transação.
+    """
+    transaction.on_commit(bump_cashflow_version)
+    rows = queryset.values("due_date", "method_id", "status").annotate(n=Count("id"), total=Sum("amount")).order_by()
+    for row in rows:
+        apply_delta((row["due_date"], row["method_id"], row["status"]), sign * row["n"], sign * (row["total"] or 0))
+
+
+def shift_status(queryset, old_status: str) -> None:
+    """Linhas que um UPDATE em massa acabou de tirar de `old_status`: uma consulta agrupada tira
+    cada grupo do status antigo e soma no atual. O queryset deve selecionar só essas linhas."""
+    transaction.on_commit(bump_cashflow_version)
+    rows = queryset.values("due_date", "method_id", "status").annotate(n=Count("id"), total=Sum("amount")).order_by()
+    for row in rows:
+        total = row["total"] or 0
+        apply_delta((row["due_date"], row["method_id"], old_status), -row["n"], -total)
+        apply_delta((row["due_date"], row["method_id"], row["status"]), row["n"], total)
+
+
+@transaction.atomic
+def rebuild_rollup() -> int:
+    """Recalcula o agregado inteiro com uma consulta agrupada sobre Receivable."""
+    ReceivableDailyRollup.objects.all().delete()
+    rows = [
+        ReceivableDailyRollup(
+            date=row["due_date"], method_id=row["method_id"], status=row["status"], count=row["n"], amount=row["total"] or 0
+        )
+        for row in Receivable.objects.values("due_date", "method_id", "status")
+        .annotate(n=Count("id"), total=Sum("amount"))
+        .order_by()
+    ]
+    ReceivableDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    transaction.on_commit(bump_cashflow_version)
+    return len(rows)
+
+
+def _block(count, value) -> Dict[str, Any]:
+    return {"count": count or 0, "value": value or 0}
+
+
+def receivable_summary(method_id: Optional[str], ref_date: datetime.date) -> Dict[str, Any]:
+    """Mesmo formato do resumo calculado direto em Receivable: totais, status, atraso, 7/30 dias e meses."""
+    qs = ReceivableDailyRollup.objects.filter(count__gt=0)
+    if method_id:
+        qs = qs.filter(method_id=method_id)
+    days = datetime.timedelta
+    windows = {
+        "overdue": Q(date__lt=ref_date, status__in=OPEN_STATUSES),
+        "in_7": Q(date__gte=ref_date, date__lte=ref_date + days(7)),
+        "in_30": Q(date__gt=ref_date + days(7), date__lte=ref_date + days(30)),
+    }
+    aggregates = {"n": Sum("count"), "total": Sum("amount")}
+    for name, cond in windows.items():
+        aggregates[f"{name}_n"] = Sum("count", filter=cond)
+        aggregates[f"{name}_total"] = Sum("amount", filter=cond)
+    rows = list(qs.values("status").annotate(**aggregates).order_by("status"))
+
+    def sum_of(field):
+        return sum((row[field] or 0) for row in rows)
+
+    monthly = (
+        qs.filter(date__gte=ref_date, date__lt=ref_date + days(31 * 6))
+        .annotate(month=TruncMonth("date"))
+        .values("month")
+        .annotate(n=Sum("count"), total=Sum("amount"))
+        .order_by("month")
+    )
+    return {
+        "total": _block(sum_of("n"), sum_of("total")),
+        "by_status": {row["status"]: _block(row["n"], row["total"]) for row in rows},
+        "overdue": _block(sum_of("overdue_n"), sum_of("overdue_total")),
+        "upcoming": {
+            "7d": _block(sum_of("in_7_n"), sum_of("in_7_total")),
+            "30d": _block(sum_of("in_30_n"), sum_of("in_30_total")),
+        },
+        "monthly_next": [
+            {"month": row["month"].strftime("%Y-%m"), "count": row["n"], "value": row["total"] or 0} for row in monthly
+        ],
+    }
@@ -0,0 +1,299 @@
+"""Conciliação do arquivo de liquidação da adquirente (CSV diário) contra os recebíveis.
+
+O arquivo é lido em streaming; os recebíveis citados são carregados em blocos para mapas
+por external_id e reference, os eventos entram com bulk_create e os recebíveis são baixados
+com UPDATE em conjunto (CASE por id), sem o settle um a um.
+
+As parcelas de uma venda têm a mesma reference: a linha vai para a parcela informada na coluna
+de parcela ou, sem ela, para a próxima parcela em aberto do pedido (InstallmentPicker).
+
+Cada linha gera um PaymentEvent com external_id "CONC-<chave>" (NSU da linha ou, sem NSU,
+transação + parcela + data + valor e a ocorrência no arquivo): reprocessar o mesmo arquivo só
+conta as linhas como já processadas.
+"""
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import IO, Any, Dict, Iterable, Iterator, List, Tuple
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from ..models import PaymentEvent, Receivable
+from . import receivable_rollup
+from .installments import InstallmentPicker
+
+log = logging.getLogger("payment")
+
+EVENT_PREFIX = "CONC-"
+CHUNK = 500
+MAX_DETAILS = 500
+OPEN_STATUSES = ("PENDENTE", "ATRASADO")
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+# Nomes aceitos no cabeçalho (minúsculas, sem espaços nas pontas)
+COLUMNS = {
+    "nsu": ("nsu", "id_linha", "line_id"),
+    "external_id": ("external_id", "transacao", "tid", "codigo_autorizacao"),
+    "reference": ("reference", "referencia", "pedido"),
+    "installment": ("installment", "parcela", "numero_parcela"),
+    "paid_date": ("paid_date", "data_pagamento", "data"),
+    "amount": ("amount", "valor_bruto", "valor"),
+    "fee": ("fee", "fee_amount", "taxa"),
+    "net": ("net", "valor_liquido", "liquido"),
+}
+
+
+class ReconciliationLine:
+    __slots__ = ("number", "key", "external_id", "reference", "installment", "paid_date", "amount", "fee")
+
+    def __init__(self, number, key, external_id, reference, installment, paid_date, amount, fee):
+        self.number = number
+        self.key = key
+        self.external_id = external_id
+        self.reference = reference
+        self.installment = installment
+        self.paid_date = paid_date
+        self.amount = amount
+        self.fee = fee
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "line": self.number,
+            "external_id": self.external_id,
+            "reference": self.reference,
+            "installment": self.installment,
+            "paid_date": self.paid_date,
+            "amount": self.amount,
+        }
+
+
+def _money(raw: str) -> Decimal:
+    value = (raw or "").strip().replace("R$", "").replace(" ", "")
+    if "," in value:
+        # Formato brasileiro: 1.234,56
+        value = value.replace(".", "").replace(",", ".")
+    return Decimal(value or "0").quantize(Decimal("0.01"))
+
+
+def _date(raw: str) -> datetime.date:
+    value = (raw or "").strip()
+    if "/" in value:
+        return datetime.datetime.strptime(value[:10], "%d/%m/%Y").date()
+    return datetime.date.fromisoformat(value[:10])
+
+
+def _header_map(fieldnames: Iterable[str]) -> Dict[str, str]:
+    names = {(name or "").strip().lower(): name for name in fieldnames}
+    mapping = {}
+    for column, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                mapping[column] = names[alias]
+                break
+    return mapping
+
+
+def iter_lines(stream: IO[str], errors: List[Dict[str, Any]]) -> Iterator[ReconciliationLine]:
+    """Lê o CSV (`;` ou `,`) linha a linha; linhas inválidas vão para `errors`."""
+    head = stream.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(head, delimiters=";,")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(_chain(head, stream), dialect=dialect)
+    cols = _header_map(reader.fieldnames or [])
+    missing = [c for c in ("paid_date", "amount") if c not in cols]
+    if missing or not ({"external_id", "reference"} & set(cols)):
+        raise ValueError("Cabeçalho inválido: informe data, valor e transação (external_id) ou referência.")
+
+    def get(row, column):
+        name = cols.get(column)
+        return (row.get(name) or "").strip() if name else ""
+
+    occurrences: Dict[str, int] = {}
+    for number, row in enumerate(reader, start=2):
+        try:
+            external_id, reference = get(row, "external_id"), get(row, "reference")
+            if not external_id and not reference:
+                raise ValueError("linha sem transação e sem referência")
+            raw_installment = get(row, "installment")
+            if raw_installment and not (raw_installment.isdigit() and int(raw_installment) > 0):
+                raise ValueError("parcela inválida")
+            installment = int(raw_installment) if raw_installment else None
+            paid_date = _date(get(row, "paid_date"))
+            amount = _money(get(row, "amount"))
+            if get(row, "fee"):
+                fee = _money(get(row, "fee"))
+            elif get(row, "net"):
+                fee = amount - _money(get(row, "net"))
+            else:
+                fee = Decimal("0.00")
+        except (ValueError, InvalidOperation) as exc:
+            errors.append({"line": number, "detail": str(exc) or "valor inválido"})
+            continue
+        key = get(row, "nsu")
+        if not key:
+            # Sem NSU, parcelas iguais do mesmo pedido no mesmo dia só se distinguem pela ordem no arquivo
+            base = f"{external_id or reference}{f'/{installment}' if installment else ''}:{paid_date.isoformat()}:{amount}"
+            occurrences[base] = occurrences.get(base, 0) + 1
+            key = base if occurrences[base] == 1 else f"{base}:{occurrences[base]}"
+        yield ReconciliationLine(
+            number, (EVENT_PREFIX + key)[:80], external_id, reference, installment, paid_date, amount, fee
+        )
+
+
+def _chain(head: str, stream: IO[str]) -> Iterator[str]:
+    # Devolve ao csv o trecho já lido pelo Sniffer sem reler o arquivo
+    yield from io.StringIO(head + stream.readline())
+    yield from stream
+
+
+def _chunks(values: List[Any]) -> Iterator[List[Any]]:
+    for start in range(0, len(values), CHUNK):
+        yield values[start:start + CHUNK]
+
+
+def _preload(lines: List[ReconciliationLine]) -> Tuple[Dict[str, Receivable], Dict[str, InstallmentPicker], set]:
+    """Mapas external_id -> recebível, reference -> parcelas do pedido e chaves de evento já gravadas."""
+    external_ids = sorted({ln.external_id for ln in lines if ln.external_id})
+    references = sorted({ln.reference for ln in lines if ln.reference})
+    by_external: Dict[str, Receivable] = {}
+    by_reference: Dict[str, List[Receivable]] = {}
+    fields = ("id", "external_id", "reference", "installment", "amount", "paid_amount", "status")
+    for chunk in _chunks(external_ids):
+        for rec in Receivable.objects.filter(external_id__in=chunk).only(*fields).order_by("id"):
+            by_external.setdefault(rec.external_id, rec)
+    for chunk in _chunks(references):
+        for rec in Receivable.objects.filter(reference__in=chunk).only(*fields).order_by("reference", "installment", "id"):
+            by_reference.setdefault(rec.reference, []).append(rec)
+    seen = set()
+    for chunk in _chunks(sorted({ln.key for ln in lines})):
+        seen.update(PaymentEvent.objects.filter(external_id__in=chunk).values_list("external_id", flat=True))
+    return by_external, {ref: InstallmentPicker(recs) for ref, recs in by_reference.items()}, seen
+
+
+def _settle(groups: Dict[int, List[ReconciliationLine]]) -> List[int]:
+    """Baixa os recebíveis conciliados: eventos em bulk_create e um UPDATE com CASE por bloco de ids.
+
+    Devolve os ids que deixaram de estar em aberto entre a leitura e o lock (baixados em paralelo).
+    """
+    skipped: List[int] = []
+    now = timezone.now()
+    for chunk in _chunks(sorted(groups)):
+        open_ids = set(
+            Receivable.objects.select_for_update()
+            .filter(pk__in=chunk, status__in=OPEN_STATUSES)
+            .values_list("id", flat=True)
+        )
+        skipped.extend(rec_id for rec_id in chunk if rec_id not in open_ids)
+        ids = [rec_id for rec_id in chunk if rec_id in open_ids]
+        if not ids:
+            continue
+        PaymentEvent.objects.bulk_create(
+            [
+                PaymentEvent(
+                    receivable_id=rec_id,
+                    amount=ln.amount,
+                    fee_amount=ln.fee,
+                    paid_date=ln.paid_date,
+                    external_id=ln.key,
+                    metadata={"conciliacao": True, "linha": ln.number},
+                )
+                for rec_id in ids
+                for ln in groups[rec_id]
+            ]
+        )
+        fees = [When(pk=rec_id, then=Value(sum(ln.fee for ln in groups[rec_id]))) for rec_id in ids]
+        dates = [When(pk=rec_id, then=Value(max(ln.paid_date for ln in groups[rec_id]))) for rec_id in ids]
+        qs = Receivable.objects.filter(pk__in=ids)
+        receivable_rollup.shift(qs, -1)
+        qs.update(
+            status="PAGO",
+            paid_amount=F("amount"),
+            fee_amount=F("fee_amount") + Case(*fees, output_field=MONEY),
+            paid_date=Case(*dates),
+            updated_at=now,
+        )
+        receivable_rollup.shift(qs, 1)
+    return skipped
+
+
+def reconcile(stream: IO[str], dry_run: bool = False) -> Dict[str, Any]:
+    """Concilia o arquivo e devolve o relatório: conciliadas, sem recebível, divergentes e já processadas.
+
+    Só liquida recebíveis em aberto cujo total das linhas do arquivo fecha com o saldo; divergências
+    (valor diferente, recebível já baixado/estornado) ficam no relatório para tratamento manual.
+    """
+    errors: List[Dict[str, Any]] = []
+    lines = list(iter_lines(stream, errors))
+    by_external, by_reference, seen = _preload(lines)
+
+    unmatched: List[Dict[str, Any]] = []
+    divergent: List[Dict[str, Any]] = []
+    already = 0
+    groups: Dict[int, List[ReconciliationLine]] = {}
+    receivables: Dict[int, Receivable] = {}
+    keys = set()
+    for ln in lines:
+        if ln.key in seen or ln.key in keys:
+            already += 1
+            continue
+        keys.add(ln.key)
+        rec = by_external.get(ln.external_id) if ln.external_id else None
+        if rec is None and ln.reference in by_reference:
+            rec = by_reference[ln.reference].pick(ln.amount, ln.installment)
+        if rec is None:
+            unmatched.append(ln.describe())
+            continue
+        receivables[rec.id] = rec
+        groups.setdefault(rec.id, []).append(ln)
+
+    settle: Dict[int, List[ReconciliationLine]] = {}
+    matched_lines = 0
+    for rec_id, group in groups.items():
+        rec = receivables[rec_id]
+        paid = sum(ln.amount for ln in group)
+        balance = rec.amount - (rec.paid_amount or 0)
+        reason = None
+        if rec.status not in OPEN_STATUSES:
+            reason = f"recebível {rec.status.lower()}"
+        elif paid != balance:
+            reason = f"valor {paid} difere do saldo {balance}"
+        if reason:
+            divergent.extend({**ln.describe(), "receivable_id": rec_id, "detail": reason} for ln in group)
+            continue
+        settle[rec_id] = group
+        matched_lines += len(group)
+
+    if settle and not dry_run:
+        with transaction.atomic():
+            for rec_id in _settle(settle):
+                group = settle.pop(rec_id)
+                matched_lines -= len(group)
+                divergent.extend({**ln.describe(), "receivable_id": rec_id, "detail": "recebível baixado durante a conciliação"} for ln in group)
+    log.info(
+        "[payment] reconciliation lines=%s matched=%s unmatched=%s divergent=%s already=%s errors=%s dry_run=%s",
+        len(lines) + len(errors), matched_lines, len(unmatched), len(divergent), already, len(errors), dry_run,
+    )
+    return {
+        "lines": len(lines) + len(errors),
+        "matched": matched_lines,
+        "settled_receivables": len(settle),
+        "settled_value": sum((ln.amount for group in settle.values() for ln in group), Decimal("0.00")),
+        "unmatched": len(unmatched),
+        "divergent": len(divergent),
+        "already_processed": already,
+        "invalid": len(errors),
+        "dry_run": dry_run,
+        "details": {
+            "unmatched": unmatched[:MAX_DETAILS],
+            "divergent": divergent[:MAX_DETAILS],
+            "invalid": errors[:MAX_DETAILS],
+        },
+    }
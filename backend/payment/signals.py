@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import CardBrand, CardFeeTier, PaymentMethod, Receivable
+from .services import method_cache
+from .services.card_fees import bump_fee_version
+from .services.receivable_rollup import move, rollup_key
+
+ROLLUP_FIELDS = ("due_date", "method_id", "status", "amount")
+
+
+def _snapshot(instance):
+    return rollup_key(instance), Decimal(str(instance.amount or 0))
+
+
+@receiver(post_init, sender=Receivable)
+def remember_rollup_state(sender, instance, **kwargs):
+    # Só com os campos já carregados: ler um campo adiado aqui custaria uma consulta por instância
+    if instance.pk and all(name in instance.__dict__ for name in ROLLUP_FIELDS):
+        instance._rollup_state = _snapshot(instance)
+
+
+@receiver(pre_save, sender=Receivable)
+def load_rollup_state(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, "_rollup_state"):
+        return
+    row = Receivable.objects.filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+    instance._rollup_state = ((row["due_date"], row["method_id"], row["status"]), row["amount"] or Decimal("0")) if row else None
+
+
+@receiver(post_save, sender=Receivable)
+def update_rollup(sender, instance, created, **kwargs):
+    state = _snapshot(instance)
+    move(None if created else instance._rollup_state, state)
+    instance._rollup_state = state
+
+
+@receiver(post_delete, sender=Receivable)
+def remove_from_rollup(sender, instance, **kwargs):
+    move(getattr(instance, "_rollup_state", _snapshot(instance)), None)
+
+
+@receiver(post_save, sender=CardFeeTier)
+@receiver(post_delete, sender=CardFeeTier)
+@receiver(post_save, sender=CardBrand)
+@receiver(post_delete, sender=CardBrand)
+def invalidate_fee_index(sender, **kwargs):
+    # Índice de faixas em memória por processo: nova versão força a recarga após o commit
+    transaction.on_commit(bump_fee_version)
+
+
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+@receiver(post_save, sender=CardBrand)
+@receiver(post_delete, sender=CardBrand)
+def invalidate_method_cache(sender, **kwargs):
+    # Suspende o cache no thread que gravou (nada não confirmado fica guardado) e troca a versão no commit
+    method_cache.hold()
@@ -0,0 +1,97 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Brand, Product
+from payment.models import CardBrand, CardFeeTier, PaymentMethod, Receivable
+from payment.services.card_fees import FeeTier, TierIndex, find_tier
+from people.models import Seller
+from sale.models import Order, OrderItem, confirm_order
+from stock.models import Stock
+
+
+User = get_user_model()
+
+
+def _tier(start, end, pct="1.00"):
+    return FeeTier(start, end, Decimal(pct), Decimal("0"), 30)
+
+
+class CardFeeEngineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.visa = CardBrand.objects.create(name="Visa")
+        for start, end, pct, fixed, days in [(1, 1, "2.00", "0.00", 30), (2, 6, "3.50", "0.50", 30), (7, 12, "5.00", "0.00", 60)]:
+            CardFeeTier.objects.create(
+                brand=self.visa, type="card_credit", installments_min=start, installments_max=end,
+                fee_percent=Decimal(pct), fee_fixed=Decimal(fixed), settlement_days=days,
+            )
+
+    def test_interval_index_lookup(self):
+        index = TierIndex.build([_tier(7, 12, "5"), _tier(1, 1, "2"), _tier(2, 8, "3"), _tier(15, 18, "9")])
+        assert [(t.start, t.end) for t in index.tiers] == [(1, 1), (2, 8), (9, 12), (15, 18)]
+        assert index.find(0) is None
+        assert index.find(8).fee_percent == Decimal("3")
+        assert index.find(9).fee_percent == Decimal("5")
+        assert index.find(13) is None and index.find(19) is None
+        assert index.max_installments == 18
+
+    def test_quote_endpoint_and_cached_index(self):
+        r = self.client.get(
+            f"/api/v1/payment/card-fees/quote/?amount=1000.00&brand={self.visa.id}&installments=8&date=2025-03-01"
+        )
+        assert r.status_code == 200, r.content
+        quotes = r.json()["quotes"]
+        assert [q["installments"] for q in quotes] == list(range(1, 9))
+        assert (quotes[0]["fee"], quotes[0]["net"], quotes[0]["settlement_date"]) == (20.0, 980.0, "2025-03-31")
+        assert (quotes[2]["fee"], quotes[2]["installment_value"]) == (35.5, 333.33)
+        assert (quotes[7]["fee"], quotes[7]["settlement_date"]) == (50.0, "2025-04-30")
+
+        # Índice já em memória: nenhuma consulta ao banco
+        with self.assertNumQueries(0):
+            assert find_tier(self.visa.id, "card_credit", 4).fee_percent == Decimal("3.50")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CardFeeTier.objects.filter(installments_min=2).update(fee_percent=Decimal("9.99"))
+            CardFeeTier.objects.create(brand=self.visa, type="card_credit", installments_min=13, installments_max=18)
+        assert find_tier(self.visa.id, "card_credit", 15) is not None
+        # update() não dispara signal: a faixa 2-6 só muda na próxima invalidação (o create acima já fez uma)
+        assert find_tier(self.visa.id, "card_credit", 4).fee_percent == Decimal("9.99")
+
+        assert self.client.get("/api/v1/payment/card-fees/quote/?amount=10").status_code == 400
+
+    def test_confirm_order_uses_server_side_fee(self):
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        product = Product.objects.create(name="Item", category=cat, brand=brand, cost_price="50.00", margin="100.00")
+        Stock.objects.create(product=product, quantity_current=Decimal("10"))
+        seller = Seller.objects.create(user=self.user, name="Vend", access_level="total")
+        method = PaymentMethod.objects.create(
+            code="credito", name="Crédito", type="card_credit", fee_percent=Decimal("1.00"), settlement_days=15
+        )
+        order = Order.objects.create(
+            seller=seller, payment_method=method,
+            # Taxa vinda do PDV é ignorada: vale a faixa de 3 parcelas da bandeira
+            payment_metadata={"card_brand": str(self.visa.id), "installments": 3, "fee_percent": "0.00", "fee_value": "0.00"},
+        )
+        OrderItem(order=order, product=product, quantity=Decimal("1"), unit_price=Decimal("100.00")).save()
+        order.refresh_from_db()
+        confirm_order(order)
+
+        order.refresh_from_db()
+        assert order.payment_fee == Decimal("4.00")
+        assert (order.payment_metadata["fee_percent"], order.payment_metadata["fee_value"]) == ("3.50", "4.00")
+        # 3 parcelas: um recebível por parcela, o primeiro no prazo da faixa
+        rec = Receivable.objects.get(reference=f"ORDER {order.id}", installment=1)
+        assert rec.due_date == datetime.date.today() + datetime.timedelta(days=30)
+        assert Receivable.objects.filter(reference=f"ORDER {order.id}", installments=3).count() == 3
@@ -0,0 +1,95 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from payment.models import PaymentMethod, Receivable
+from payment.services.cashflow import add_months, cashflow, compute_cashflow
+from people.models import Supplier
+from purchase.models import PurchaseInstallment, PurchaseInvoice
+
+
+User = get_user_model()
+D = datetime.date
+
+
+class CashFlowTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix")
+        self.card = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit")
+        self.ref = D(2025, 3, 10)  # segunda-feira
+        for method, due, amount, st in [
+            (self.pix, D(2025, 3, 1), "40.00", "ATRASADO"),
+            (self.pix, D(2025, 3, 10), "100.00", "PENDENTE"),
+            (self.card, D(2025, 3, 12), "50.00", "PENDENTE"),
+            (self.card, D(2025, 3, 12), "25.00", "PAGO"),
+            (self.card, D(2025, 3, 17), "30.00", "PENDENTE"),
+            (self.card, D(2026, 3, 10), "999.00", "PENDENTE"),  # fora do horizonte de 12 meses
+        ]:
+            Receivable.objects.create(method=method, due_date=due, amount=Decimal(amount), status=st)
+        supplier = Supplier.objects.create(corporate_name="Forn", cnpj="11111111111111")
+        self.invoice = PurchaseInvoice.objects.create(number="1", series="1", supplier=supplier, total_value=0, xml="<xml/>")
+        for number, due, value, st in [
+            ("1", D(2025, 2, 20), "15.00", "ATRASADO"),
+            ("2", D(2025, 3, 11), "80.00", "PENDENTE"),
+            ("3", D(2025, 3, 18), "60.00", "PENDENTE"),
+            ("4", D(2025, 3, 18), "10.00", "PAGO"),
+        ]:
+            PurchaseInstallment.objects.create(invoice=self.invoice, number=number, due_date=due, value=Decimal(value), status=st)
+
+    def test_daily_and_weekly_projection(self):
+        with self.assertNumQueries(1):
+            daily = compute_cashflow(self.ref, "day")
+        assert daily["until"] == D(2026, 3, 10)
+        assert daily["overdue"] == {"inflow": Decimal("40.00"), "outflow": Decimal("15.00"), "net": Decimal("25.00")}
+        assert [(p["start"], p["inflow"], p["outflow"], p["balance"]) for p in daily["periods"]] == [
+            (D(2025, 3, 10), Decimal("100.00"), Decimal("0.00"), Decimal("100.00")),
+            (D(2025, 3, 11), Decimal("0.00"), Decimal("80.00"), Decimal("20.00")),
+            (D(2025, 3, 12), Decimal("50.00"), Decimal("0.00"), Decimal("70.00")),
+            (D(2025, 3, 17), Decimal("30.00"), Decimal("0.00"), Decimal("100.00")),
+            (D(2025, 3, 18), Decimal("0.00"), Decimal("60.00"), Decimal("40.00")),
+        ]
+        assert daily["totals"] == {"inflow": Decimal("180.00"), "outflow": Decimal("140.00"), "net": Decimal("40.00")}
+        assert daily["inflow_by_method"] == [
+            {"method_id": self.pix.id, "value": Decimal("100.00")},
+            {"method_id": self.card.id, "value": Decimal("80.00")},
+        ]
+
+        weekly = compute_cashflow(self.ref, "week")
+        assert [(p["start"], p["net"]) for p in weekly["periods"]] == [
+            (D(2025, 3, 10), Decimal("70.00")),
+            (D(2025, 3, 17), Decimal("-30.00")),
+        ]
+        assert add_months(D(2025, 1, 31), 1) == D(2025, 2, 28)
+
+    def test_cached_and_invalidated_on_writes(self):
+        first = cashflow(self.ref)
+        with self.assertNumQueries(0):
+            assert cashflow(self.ref) == first
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Receivable.objects.create(method=self.pix, due_date=D(2025, 3, 20), amount=Decimal("5.00"))
+        assert cashflow(self.ref)["totals"]["inflow"] == Decimal("185.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseInstallment.objects.create(invoice=self.invoice, number="5", due_date=D(2025, 4, 1), value=Decimal("7.00"))
+        assert cashflow(self.ref)["totals"]["outflow"] == Decimal("147.00")
+
+    def test_endpoint(self):
+        r = self.client.get("/api/v1/payment/cashflow/?date=2025-03-10&granularity=week&months=1")
+        assert r.status_code == 200, r.content
+        data = r.json()
+        assert (data["until"], data["totals"]["net"]) == ("2025-04-10", 40.0)
+        assert len(data["periods"]) == 2
+        for query in ("date=x", "granularity=month", "months=13"):
+            assert self.client.get(f"/api/v1/payment/cashflow/?{query}").status_code == 400
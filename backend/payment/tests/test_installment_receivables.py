@@ -0,0 +1,159 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from catalog.models import Brand, Category, Product
+from payment.models import CardBrand, CardFeeTier, PaymentMethod, Receivable, ReceivableDailyRollup
+from payment.services.inbox import drain, ingest
+from payment.services.reconciliation import reconcile
+from payment.services.installments import split_amount
+from people.models import Seller
+from sale.models import Order, OrderItem, confirm_order
+from stock.models import Stock
+
+
+User = get_user_model()
+
+
+def _rollup_rows():
+    return sorted(
+        (str(r.date), r.method_id, r.status, r.count, r.amount)
+        for r in ReceivableDailyRollup.objects.filter(count__gt=0)
+    )
+
+
+class InstallmentReceivablesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username="tester", password="pass1234")
+        self.seller = Seller.objects.create(user=user, name="Vend", access_level="total")
+        self.product = Product.objects.create(
+            name="Item", category=Category.objects.create(name="A"), brand=Brand.objects.create(name="B"),
+            cost_price="50.00", margin="100.00",
+        )
+        Stock.objects.create(product=self.product, quantity_current=Decimal("10"))
+        self.visa = CardBrand.objects.create(name="Visa")
+        CardFeeTier.objects.create(
+            brand=self.visa, type="card_credit", installments_min=2, installments_max=6,
+            fee_percent=Decimal("3.00"), fee_fixed=Decimal("0.00"), settlement_days=30,
+        )
+        self.credit = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit", settlement_days=15)
+        self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix", settlement_days=1)
+
+    def _order(self, method, installments):
+        order = Order.objects.create(
+            seller=self.seller, payment_method=method,
+            payment_metadata={"card_brand": str(self.visa.id), "installments": installments},
+        )
+        OrderItem(order=order, product=self.product, quantity=Decimal("1"), unit_price=Decimal("100.00")).save()
+        return Order.objects.get(pk=order.pk)
+
+    def test_split_amount_keeps_total(self):
+        assert split_amount(Decimal("100.00"), 3) == [Decimal("33.34"), Decimal("33.33"), Decimal("33.33")]
+        assert split_amount(Decimal("0.05"), 4) == [Decimal("0.02"), Decimal("0.01"), Decimal("0.01"), Decimal("0.01")]
+        assert split_amount(Decimal("10.00"), 1) == [Decimal("10.00")]
+        # Menos centavos que parcelas: nenhuma parcela zerada
+        assert split_amount(Decimal("0.05"), 10) == [Decimal("0.01")] * 5
+        assert split_amount(Decimal("0.00"), 3) == [Decimal("0.00")]
+
+    def test_tiny_total_never_creates_zero_receivables(self):
+        cheap = Product.objects.create(
+            name="Bala", category=self.product.category, brand=self.product.brand, cost_price="0.01", margin="0.00",
+        )
+        Stock.objects.create(product=cheap, quantity_current=Decimal("10"))
+        order = Order.objects.create(
+            seller=self.seller, payment_method=self.credit,
+            payment_metadata={"card_brand": str(self.visa.id), "installments": 6},
+        )
+        OrderItem(order=order, product=cheap, quantity=Decimal("3"), unit_price=Decimal("0.01")).save()
+        confirm_order(Order.objects.get(pk=order.pk))
+        recs = list(Receivable.objects.filter(reference=f"ORDER {order.id}").order_by("installment"))
+        assert [(r.installment, r.installments, r.amount) for r in recs] == [(k, 3, Decimal("0.01")) for k in (1, 2, 3)]
+
+    def test_credit_installments_create_one_receivable_each(self):
+        order = self._order(self.credit, 3)
+        with CaptureQueriesContext(connection) as ctx:
+            confirm_order(order)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "payment_receivable"')]
+        assert len(inserts) == 1
+
+        today = datetime.date.today()
+        recs = list(Receivable.objects.filter(reference=f"ORDER {order.id}").order_by("installment"))
+        assert [(r.installment, r.installments, r.amount, r.due_date) for r in recs] == [
+            (1, 3, Decimal("33.34"), today + datetime.timedelta(days=30)),
+            (2, 3, Decimal("33.33"), today + datetime.timedelta(days=60)),
+            (3, 3, Decimal("33.33"), today + datetime.timedelta(days=90)),
+        ]
+        # bulk_create sem signals: o agregado recebeu os deltas de cada parcela
+        live = _rollup_rows()
+        call_command("rebuild_receivable_rollup", stdout=StringIO())
+        assert live == _rollup_rows() and len(live) == 3
+
+        # Webhook pela reference do pedido: baixa a parcela mais antiga em aberto
+        ingest([{"external_id": "p1", "reference": f"ORDER {order.id}", "amount": "33.34"}])
+        drain(once=True, poll_interval=0)
+        ingest([{"external_id": "p2", "reference": f"ORDER {order.id}", "amount": "33.33"}])
+        drain(once=True, poll_interval=0)
+        statuses = list(Receivable.objects.filter(reference=f"ORDER {order.id}").order_by("installment").values_list("status", flat=True))
+        assert statuses == ["PAGO", "PAGO", "PENDENTE"]
+
+    def test_payments_without_installment_fill_installments_in_order(self):
+        order = self._order(self.credit, 3)
+        confirm_order(order)
+        ref = f"ORDER {order.id}"
+        # Mesmo lote: cada evento vai para a próxima parcela em aberto, não todos para a primeira
+        ingest([{"external_id": f"w{k}", "reference": ref, "amount": amount} for k, amount in enumerate(["33.34", "33.33"])])
+        drain(once=True, poll_interval=0)
+        recs = list(Receivable.objects.filter(reference=ref).order_by("installment"))
+        assert [(r.status, r.paid_amount) for r in recs] == [
+            ("PAGO", Decimal("33.34")), ("PAGO", Decimal("33.33")), ("PENDENTE", Decimal("0.00")),
+        ]
+        # Parcela informada no payload tem precedência
+        ingest([{"external_id": "w9", "reference": ref, "installment": 3, "amount": "33.33"}])
+        drain(once=True, poll_interval=0)
+        assert Receivable.objects.get(reference=ref, installment=3).status == "PAGO"
+
+    def test_reconciliation_lines_fill_installments_in_order(self):
+        order = self._order(self.credit, 3)
+        confirm_order(order)
+        ref = f"ORDER {order.id}"
+        # Sem NSU e sem coluna de parcela: as duas linhas iguais são parcelas diferentes
+        csv = f"referencia;data_pagamento;valor_bruto\n{ref};10/03/2025;33,34\n{ref};10/03/2025;33,33\n{ref};10/03/2025;33,33\n"
+        report = reconcile(StringIO(csv))
+        assert (report["matched"], report["settled_receivables"], report["divergent"]) == (3, 3, 0)
+        assert set(Receivable.objects.filter(reference=ref).values_list("status", flat=True)) == {"PAGO"}
+        assert reconcile(StringIO(csv))["already_processed"] == 3
+
+        other = self._order(self.credit, 2)
+        confirm_order(other)
+        ref = f"ORDER {other.id}"
+        report = reconcile(StringIO(f"referencia;parcela;data_pagamento;valor_bruto\n{ref};2;10/03/2025;50,00\n"))
+        assert report["matched"] == 1
+        statuses = list(Receivable.objects.filter(reference=ref).order_by("installment").values_list("status", flat=True))
+        assert statuses == ["PENDENTE", "PAGO"]
+
+    def test_installments_above_tier_maximum_are_refused(self):
+        # A bandeira só tem faixa até 6x: 7x recusa a venda em vez de virar 7 recebíveis
+        order = self._order(self.credit, 7)
+        with self.assertRaises(ValidationError):
+            confirm_order(order)
+        assert not Receivable.objects.exists()
+        assert Stock.objects.get(product=self.product).quantity_current == Decimal("10")
+        order = self._order(self.credit, -1)
+        with self.assertRaises(ValidationError):
+            confirm_order(order)
+
+    def test_single_receivable_outside_credit_installments(self):
+        order = self._order(self.pix, 5)
+        confirm_order(order)
+        rec = Receivable.objects.get(reference=f"ORDER {order.id}")
+        assert (rec.installment, rec.installments, rec.amount) == (1, 1, Decimal("100.00"))
+        assert rec.due_date == datetime.date.today() + datetime.timedelta(days=1)
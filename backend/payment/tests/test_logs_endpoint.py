@@ -1,9 +1,14 @@
+import datetime
 import os
-from django.test import TestCase
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
+from core.logtail import LogFilter, iter_reverse_lines, rotated_files, tail
+
 
 User = get_user_model()
 
@@ -18,15 +23,78 @@ class PaymentLogsEndpointTest(TestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
 
     def test_logs_endpoint_returns_tail(self):
-        log_dir = os.path.join(settings.BASE_DIR, "logs")
-        os.makedirs(log_dir, exist_ok=True)
-        log_path = os.path.join(log_dir, "payment.log")
+        log_path = os.path.join(settings.LOG_DIR, "payment.log")
         with open(log_path, "a", encoding="utf-8") as f:
-            f.write("test line 1\n")
-            f.write("test line 2\n")
+            f.write("2025-03-10 10:00:00,000 [INFO] payment: test line 1\n")
+            f.write("2025-03-10 10:00:01,000 [INFO] payment: test line 2\n")
         r = self.client.get("/api/v1/payment/logs/")
         assert r.status_code == 200, r.content
         data = r.json()
         assert data["count"] >= 2
         assert any("test line" in ln for ln in data["lines"]) 
 
+
+
+def _write_log(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in records:
+            f.write(line + "\n")
+
+
+class LogTailTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "payment.log")
+
+    def test_reverse_reader_matches_readlines_with_small_blocks(self):
+        lines = [f"2025-03-10 10:00:{i % 60:02d},000 [INFO] payment: linha {i} " + "x" * (i % 37) for i in range(500)]
+        _write_log(self.path, lines)
+        assert list(iter_reverse_lines(self.path, block_size=64)) == lines[::-1]
+        assert [r.text for r in tail([self.path], 3)] == lines[-3:]
+
+    def test_filters_multiline_records_and_rotation(self):
+        _write_log(self.path + ".1", [
+            "2025-03-09 23:59:00,000 [INFO] payment: [payment] settled receivable=7 amount=10.00",
+        ])
+        _write_log(self.path, [
+            "2025-03-10 08:00:00,000 [INFO] sale.payment: [sale] receivable created order=42 method=pix",
+            "2025-03-10 08:00:01,000 [ERROR] payment: falha ao baixar receivable=9",
+            "Traceback (most recent call last):",
+            '  File "x.py", line 1',
+            "2025-03-10 08:00:02,000 [INFO] sale.payment: [sale] receivable auto-settled order=420 method=pix",
+        ])
+        files = rotated_files(self.path)
+        assert files == [self.path, self.path + ".1"]
+
+        errors = tail(files, 10, LogFilter(level="warning"))
+        assert len(errors) == 1 and errors[0].lines[1] == "Traceback (most recent call last):"
+        assert [r.logger for r in tail(files, 10, LogFilter(order="42"))] == ["sale.payment"]
+        assert len(tail(files, 10, LogFilter(logger="sale"))) == 2
+        # Registro do backup só entra quando o atual não basta
+        assert "receivable=7" in tail(files, 10, LogFilter(receivable="7"))[0].text
+        since = datetime.datetime(2025, 3, 10, 8, 0, 1)
+        assert len(tail(files, 10, LogFilter(since=since))) == 2
+        # Com fuso: convertido para a hora local em que o log foi escrito
+        aware = since.astimezone().astimezone(datetime.timezone.utc)
+        assert LogFilter(since=aware).since == since
+
+        with override_settings(LOG_DIR=self.tmp):
+            r = self.client.get("/api/v1/payment/logs/?level=ERROR")
+            assert r.status_code == 200, r.content
+            assert r.json()["count"] == 1 and r.json()["files"] == 2
+            r = self.client.get("/api/v1/payment/logs/?limit=2")
+            assert [ln[:19] for ln in r.json()["lines"]] == ["2025-03-10 08:00:01", "2025-03-10 08:00:02"]
+            r = self.client.get("/api/v1/payment/logs/?stream=1&logger=payment")
+            body = b"".join(r.streaming_content).decode()
+            assert body.startswith("2025-03-10 08:00:01") and "receivable=7" in body
+            assert self.client.get("/api/v1/payment/logs/?level=NADA").status_code == 400
+            for value in ("2025-03-10T11:00:01Z", "2025-03-10T08:00:01-03:00"):
+                r = self.client.get("/api/v1/payment/logs/", {"since": value})
+                assert r.status_code == 200, r.content
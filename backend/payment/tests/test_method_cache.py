@@ -0,0 +1,140 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from catalog.models import Brand, Category, Product
+from payment.models import CardBrand, PaymentMethod, Receivable
+from payment.services import method_cache
+from people.models import Seller
+from sale.models import Order, OrderItem, confirm_order
+from stock.models import Stock
+
+
+User = get_user_model()
+
+
+def _method_queries(ctx):
+    return [q["sql"] for q in ctx.captured_queries if '"payment_paymentmethod"' in q["sql"]]
+
+
+class PaymentMethodCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        # Gravações confirmadas: o commit troca a versão e libera o cache
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix", auto_settle=True)
+            self.card = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit", fee_percent=Decimal("2.00"))
+            self.visa = CardBrand.objects.create(name="Visa")
+
+    def test_lookups_hit_memory_and_follow_saves(self):
+        method_cache.snapshot()
+        with self.assertNumQueries(0):
+            assert method_cache.get_method(self.card.id).fee_percent == Decimal("2.00")
+            assert method_cache.get_method(str(self.pix.id)).code == "pix"
+            assert method_cache.get_method_by_code("credito").id == self.card.id
+            assert [m.code for m in method_cache.all_methods()] == ["credito", "pix"]
+            assert method_cache.get_brand(self.visa.id).name == "Visa"
+            assert method_cache.get_method("abc") is None and method_cache.get_brand("abc") is None
+            # Cópias: alterar o objeto devolvido não mexe no cache
+            method_cache.get_method(self.card.id).fee_percent = Decimal("99")
+            assert method_cache.get_method(self.card.id).fee_percent == Decimal("2.00")
+
+        # Alteração ainda não confirmada: leituras vão ao banco e enxergam o valor novo
+        with self.captureOnCommitCallbacks(execute=True):
+            self.card.fee_percent = Decimal("3.00")
+            self.card.save()
+            assert method_cache.get_method(self.card.id).fee_percent == Decimal("3.00")
+        method_cache.snapshot()
+        with CaptureQueriesContext(connection) as ctx:
+            assert method_cache.get_method(self.card.id).fee_percent == Decimal("3.00")
+        assert _method_queries(ctx) == []
+
+    def test_unknown_code_checks_db(self):
+        method_cache.snapshot()
+        # Código gravado por outro processo antes de a versão nova chegar aqui: conferido no banco
+        PaymentMethod.objects.bulk_create([PaymentMethod(code="boleto", name="Boleto", type="boleto")])
+        assert method_cache.get_method_by_code("boleto").name == "Boleto"
+        r = self.client.post("/api/v1/payment/methods/", {"code": "boleto", "name": "Outro", "type": "boleto"}, format="json")
+        assert r.status_code == 200 and r.json()["code"] == "boleto"
+        assert PaymentMethod.objects.filter(code="boleto").count() == 1
+
+    @override_settings(CACHE_VERSION_CHECK_SECONDS=60)
+    def test_shared_version_is_checked_after_interval(self):
+        method_cache.bump_method_version()
+        method_cache.snapshot()
+        # Troca feita por outro processo: dentro do intervalo nem o cache compartilhado é lido
+        cache.set(method_cache.VERSION_KEY, "outro-processo", None)
+        with mock.patch.object(cache, "get_or_set", wraps=cache.get_or_set) as get_or_set, self.assertNumQueries(0):
+            assert method_cache.get_method(self.card.id).fee_percent == Decimal("2.00")
+        get_or_set.assert_not_called()
+        with override_settings(CACHE_VERSION_CHECK_SECONDS=0), self.assertNumQueries(2):
+            # Intervalo vencido: versão nova, recarga (métodos + bandeiras)
+            method_cache.snapshot()
+
+    def test_checkout_endpoints_use_cache(self):
+        method_cache.snapshot()
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get("/api/v1/payment/methods/")
+        assert r.status_code == 200 and [m["code"] for m in r.json()["results"]] == ["credito", "pix"]
+        assert _method_queries(ctx) == []
+        # Com filtro, a listagem volta ao queryset
+        assert [m["code"] for m in self.client.get("/api/v1/payment/methods/?type=pix").json()["results"]] == ["pix"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.post("/api/v1/payment/methods/", {"code": "pix", "name": "Outro", "type": "pix", "fee_percent": "0"}, format="json")
+        assert r.status_code == 200 and r.json()["id"] == self.pix.id
+        assert _method_queries(ctx) == []
+
+        r = self.client.get(f"/api/v1/payment/card-fees/quote/?amount=100.00&brand={self.visa.id}")
+        assert r.status_code == 200 and r.json()["brand_name"] == "Visa"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visa.active = False
+            self.visa.save()
+        assert self.client.get(f"/api/v1/payment/card-fees/quote/?amount=100.00&brand={self.visa.id}").status_code == 400
+
+    def test_confirm_order_reads_method_from_cache(self):
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        product = Product.objects.create(name="Item", category=cat, brand=brand, cost_price="50.00", margin="100.00")
+        Stock.objects.create(product=product, quantity_current=Decimal("10"))
+        seller = Seller.objects.create(user=self.user, name="Vend", access_level="total")
+        r = self.client.post("/api/v1/sale/orders/", {"seller": seller.id, "payment_method": 9999}, format="json")
+        assert r.status_code == 400 and "payment_method" in r.json()
+
+        method_cache.snapshot()
+        order = Order.objects.create(seller=seller, payment_method_id=self.pix.id)
+        OrderItem(order=order, product=product, quantity=Decimal("1"), unit_price=Decimal("100.00")).save()
+        order = Order.objects.get(pk=order.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            confirm_order(order)
+        assert _method_queries(ctx) == []
+        rec = Receivable.objects.get(reference=f"ORDER {order.id}")
+        # auto_settle do método em cache: recebível criado e baixado na confirmação
+        assert (rec.method_id, rec.status, rec.paid_amount) == (self.pix.id, "PAGO", Decimal("100.00"))
+
+
+class PaymentMethodCacheRollbackTest(TransactionTestCase):
+    def test_rolled_back_save_releases_hold(self):
+        card = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit", fee_percent=Decimal("2.00"))
+        method_cache.snapshot()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                card.fee_percent = Decimal("5.00")
+                card.save()
+                assert method_cache.snapshot() is None
+                raise RuntimeError()
+        # Gravação desfeita: o cache volta a valer sem esperar outra troca de versão
+        with self.assertNumQueries(0):
+            assert method_cache.get_method(card.id).fee_percent == Decimal("2.00")
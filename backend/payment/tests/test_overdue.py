@@ -0,0 +1,95 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from payment.models import PaymentMethod, Receivable, ReceivableDailyRollup, ReceivableOverdueWatermark
+from payment.services.cashflow import bump_cashflow_version
+from payment.services.overdue import mark_overdue
+
+
+User = get_user_model()
+D = datetime.date
+
+
+def _rollup_rows():
+    return sorted(
+        (str(r.date), r.method_id, r.status, r.count, r.amount)
+        for r in ReceivableDailyRollup.objects.filter(count__gt=0)
+    )
+
+
+class ReceivableOverdueTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix")
+        rows = [
+            (D(2025, 2, 1), "100.00", "PENDENTE"),
+            (D(2025, 2, 1), "40.00", "PENDENTE"),
+            (D(2025, 2, 20), "20.00", "PAGO"),
+            (D(2025, 3, 5), "10.00", "PENDENTE"),
+            (D(2025, 3, 20), "30.00", "PENDENTE"),
+            (None, "1.00", "PENDENTE"),
+        ]
+        self.recs = [
+            Receivable.objects.create(method=self.pix, due_date=d, amount=Decimal(a), status=s) for d, a, s in rows
+        ]
+
+    def _statuses(self):
+        return [Receivable.objects.get(pk=r.pk).status for r in self.recs]
+
+    def test_marks_only_newly_due_and_keeps_rollup(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = mark_overdue(D(2025, 3, 1))
+        # Agregado mudou: a previsão de caixa em cache é invalidada no commit
+        assert bump_cashflow_version in callbacks
+        assert (result["updated"], result["since"], result["watermark"]) == (2, None, "2025-03-01")
+        assert self._statuses() == ["ATRASADO", "ATRASADO", "PAGO", "PENDENTE", "PENDENTE", "PENDENTE"]
+
+        # Backdated receivable: below the watermark, only a full run sees it
+        late = Receivable.objects.create(method=self.pix, due_date=D(2025, 1, 10), amount=Decimal("5.00"), status="PENDENTE")
+        with CaptureQueriesContext(connection) as ctx:
+            result = mark_overdue(D(2025, 3, 10))
+        # One set-based UPDATE on receivables, no per-row writes and no id list loaded into Python
+        assert sum(q["sql"].startswith('UPDATE "payment_receivable" ') for q in ctx.captured_queries) == 1
+        reads = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT") and 'FROM "payment_receivable"' in q["sql"]]
+        assert len(reads) == 1 and "GROUP BY" in reads[0], reads
+        assert (result["updated"], result["since"]) == (1, "2025-03-01")
+        assert Receivable.objects.get(pk=late.pk).status == "PENDENTE"
+        assert self._statuses()[3] == "ATRASADO"
+
+        # Older reference date does not move the watermark back
+        assert mark_overdue(D(2025, 2, 1))["watermark"] == "2025-03-10"
+        assert mark_overdue(D(2025, 3, 10), full=True)["updated"] == 1
+        assert Receivable.objects.get(pk=late.pk).status == "ATRASADO"
+
+        live = _rollup_rows()
+        call_command("rebuild_receivable_rollup", stdout=StringIO())
+        assert live == _rollup_rows()
+
+    def test_command_and_endpoint(self):
+        out = StringIO()
+        call_command("reprocess_receivables", "--date", "2025-03-01", stdout=out)
+        assert "Recebíveis marcados ATRASADO: 2" in out.getvalue()
+        assert ReceivableOverdueWatermark.objects.get().last_ref_date == D(2025, 3, 1)
+
+        # Só administrador dispara a marcação pela API
+        url = "/api/v1/payment/receivables/mark-overdue/"
+        assert self.client.post(url, {"date": "2025-03-25"}, format="json").status_code == 403
+        self.user.is_staff = True
+        self.user.save(update_fields=["is_staff"])
+        r = self.client.post(url, {"date": "2025-03-25"}, format="json")
+        assert r.status_code == 200, r.content
+        assert r.json() == {"updated": 2, "reference_date": "2025-03-25", "since": "2025-03-01", "watermark": "2025-03-25"}
+        assert self.client.post("/api/v1/payment/receivables/mark-overdue/", {"date": "x"}, format="json").status_code == 400
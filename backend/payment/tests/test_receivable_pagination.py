@@ -0,0 +1,88 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from payment.models import PaymentMethod, Receivable
+
+
+User = get_user_model()
+URL = "/api/v1/payment/receivables/"
+
+
+class ReceivableKeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix")
+        self.card = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit")
+        # Vencimentos repetidos e vazios: o desempate por id e os NULL precisam atravessar páginas
+        days = [3, 1, None, 2, 1, None, 3, 2, 1, None, 4, 1, 2]
+        self.recs = [
+            Receivable.objects.create(
+                method=self.pix if n % 2 else self.card,
+                amount=Decimal("10.00"),
+                due_date=datetime.date(2025, 3, d) if d else None,
+                reference=f"R{n}",
+            )
+            for n, d in enumerate(days)
+        ]
+
+    def _walk(self, url):
+        pages, first = [], self.client.get(url)
+        assert first.status_code == 200, first.content
+        data = first.json()
+        pages.append([r["id"] for r in data["results"]])
+        while data["next"]:
+            data = self.client.get(data["next"]).json()
+            pages.append([r["id"] for r in data["results"]])
+        back = [pages[-1]]
+        while data["previous"]:
+            data = self.client.get(data["previous"]).json()
+            back.append([r["id"] for r in data["results"]])
+        return pages, back[::-1]
+
+    def _expected(self, descending, method=None):
+        recs = [r for r in self.recs if method is None or r.method_id == method]
+        nulls = sorted((r.id for r in recs if r.due_date is None), reverse=descending)
+        filled = [r.id for r in sorted((r for r in recs if r.due_date), key=lambda r: (r.due_date, r.id), reverse=descending)]
+        # NULL como maior valor: no fim subindo, no começo descendo
+        return nulls + filled if descending else filled + nulls
+
+    def test_due_date_cursor_walks_both_directions(self):
+        for ordering, descending in (("due_date", False), ("-due_date", True)):
+            pages, back = self._walk(f"{URL}?ordering={ordering}&page_size=4")
+            assert [i for page in pages for i in page] == self._expected(descending), ordering
+            assert [len(p) for p in pages] == [4, 4, 4, 1]
+            assert back == pages
+
+        pages, _ = self._walk(f"{URL}?ordering=due_date&page_size=2&method={self.pix.id}")
+        assert [i for page in pages for i in page] == self._expected(False, self.pix.id)
+
+    def test_default_ordering_uses_cursor_and_cached_count(self):
+        r = self.client.get(f"{URL}?page_size=5")
+        data = r.json()
+        assert data["count"] == 13 and "cursor=" in data["next"] and data["previous"] is None
+        assert [x["id"] for x in data["results"]] == [r.id for r in self.recs[::-1][:5]]
+
+        Receivable.objects.create(method=self.pix, amount=Decimal("1.00"))
+        # Contagem em cache: atualiza só quando expira
+        assert self.client.get(f"{URL}?page_size=5").json()["count"] == 13
+        cache.clear()
+        assert self.client.get(f"{URL}?page_size=5").json()["count"] == 14
+
+        # ?page= continua funcionando (frontend atual), e ordenação fora do keyset também
+        data = self.client.get(f"{URL}?page=2&page_size=5").json()
+        assert "page=3" in data["next"] and len(data["results"]) == 5
+        assert self.client.get(f"{URL}?ordering=amount").status_code == 200
+        r = self.client.get(f"{URL}?cursor=abc")
+        assert r.status_code == 400 and r.json() == {"detail": "Cursor inválido."}
+        assert self.client.get(f"{URL}?cursor=zzz").status_code == 400
@@ -0,0 +1,136 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from payment.models import PaymentEvent, PaymentMethod, Receivable, ReceivableDailyRollup
+from payment.services.receivable_rollup import receivable_summary
+
+
+User = get_user_model()
+D = datetime.date
+
+
+def _legacy_summary(method, ref_date):
+    """Resumo anterior, calculado direto em Receivable (referência do formato)."""
+    qs = Receivable.objects.all()
+    if method:
+        qs = qs.filter(method_id=method)
+
+    def block(agg):
+        return {"count": agg.get("count") or 0, "value": agg.get("value") or 0}
+
+    agg = {"count": Count("id"), "value": Sum("amount")}
+    days = datetime.timedelta
+    return {
+        "total": block(qs.aggregate(**agg)),
+        "by_status": {
+            row["status"]: {"count": row["count"], "value": row["value"] or 0}
+            for row in qs.values("status").annotate(**agg).order_by("status")
+        },
+        "overdue": block(qs.filter(due_date__lt=ref_date, status__in=["PENDENTE", "ATRASADO"]).aggregate(**agg)),
+        "upcoming": {
+            "7d": block(qs.filter(due_date__gte=ref_date, due_date__lte=ref_date + days(7)).aggregate(**agg)),
+            "30d": block(qs.filter(due_date__gt=ref_date + days(7), due_date__lte=ref_date + days(30)).aggregate(**agg)),
+        },
+        "monthly_next": [
+            {"month": row["month"].strftime("%Y-%m"), "count": row["count"], "value": row["value"] or 0}
+            for row in qs.filter(due_date__gte=ref_date, due_date__lt=ref_date + days(31 * 6))
+            .annotate(month=TruncMonth("due_date"))
+            .values("month")
+            .annotate(**agg)
+            .order_by("month")
+        ],
+    }
+
+
+def _rollup_rows():
+    return sorted(
+        (str(r.date), r.method_id, r.status, r.count, r.amount)
+        for r in ReceivableDailyRollup.objects.filter(count__gt=0)
+    )
+
+
+class ReceivableRollupTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix")
+        self.card = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit")
+        self.ref = D(2025, 3, 10)
+
+    def _receivables(self):
+        rows = [
+            (self.pix, D(2025, 2, 1), "100.00", "PENDENTE"),
+            (self.pix, D(2025, 3, 1), "50.00", "ATRASADO"),
+            (self.pix, D(2025, 3, 12), "10.00", "PENDENTE"),
+            (self.card, D(2025, 3, 15), "30.00", "PENDENTE"),
+            (self.card, D(2025, 3, 15), "20.00", "PAGO"),
+            (self.card, D(2025, 4, 2), "70.00", "PENDENTE"),
+            (self.card, D(2025, 7, 20), "5.00", "ESTORNADO"),
+            (self.card, None, "1.00", "PENDENTE"),
+        ]
+        return [Receivable.objects.create(method=m, due_date=d, amount=Decimal(a), status=s) for m, d, a, s in rows]
+
+    def test_summary_matches_direct_aggregation(self):
+        self._receivables()
+        for method in (None, str(self.pix.id), str(self.card.id)):
+            with self.assertNumQueries(2):
+                summary = receivable_summary(method, self.ref)
+            assert summary == _legacy_summary(method, self.ref), method
+
+        r = self.client.get(f"/api/v1/payment/receivables/summary/?date=2025-03-10&method={self.card.id}")
+        assert r.status_code == 200, r.content
+        data = r.json()
+        assert data["total"] == {"count": 5, "value": 126.0}
+        assert data["upcoming"]["7d"] == {"count": 2, "value": 50.0}
+        assert self.client.get("/api/v1/payment/receivables/summary/?date=x").status_code == 400
+
+    def test_write_paths_keep_rollup_in_sync(self):
+        recs = self._receivables()
+        pending = recs[3]
+        evt = PaymentEvent.objects.create(receivable=pending, amount=Decimal("30.00"), paid_date=self.ref)
+        evt.apply()
+
+        moved = Receivable.objects.get(pk=recs[0].pk)
+        moved.due_date = D(2025, 5, 1)
+        moved.amount = Decimal("90.00")
+        moved.save()
+        # Instância com campos adiados: o estado anterior vem do banco no pre_save
+        deferred = Receivable.objects.only("id", "status").get(pk=recs[1].pk)
+        deferred.status = "PAGO"
+        deferred.save()
+        recs[5].delete()
+
+        r = self.client.post(
+            f"/api/v1/payment/receivables/{recs[2].pk}/settle/",
+            {"amount": "10.00", "paid_date": "2025-03-10", "external_id": "evt-1"},
+            format="json",
+        )
+        assert r.status_code == 200, r.content
+
+        live = _rollup_rows()
+        call_command("rebuild_receivable_rollup", stdout=StringIO())
+        assert live == _rollup_rows()
+        assert receivable_summary(None, self.ref) == _legacy_summary(None, self.ref)
+
+    def test_rebuild_repairs_bulk_updates(self):
+        self._receivables()
+        # update() não dispara signals: o agregado fica defasado até o rebuild
+        Receivable.objects.filter(status="PENDENTE", due_date__lt=self.ref).update(status="ATRASADO")
+        assert receivable_summary(None, self.ref) != _legacy_summary(None, self.ref)
+
+        out = StringIO()
+        call_command("rebuild_receivable_rollup", stdout=out)
+        assert "Linhas do agregado: 8" in out.getvalue()
+        assert receivable_summary(None, self.ref) == _legacy_summary(None, self.ref)
@@ -0,0 +1,118 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from payment.models import PaymentEvent, PaymentMethod, Receivable, ReceivableDailyRollup
+from payment.services.reconciliation import reconcile
+
+
+User = get_user_model()
+
+CSV = (
+    "nsu;transacao;referencia;data_pagamento;valor_bruto;taxa\n"
+    "1;T1;;10/03/2025;100,00;2,50\n"
+    "2;;ORDER 2;10/03/2025;50,00;1,00\n"
+    "3;T3;;10/03/2025;70,00;1,00\n"
+    "4;T4;;10/03/2025;20,00;0,00\n"
+    "5;T9;;10/03/2025;10,00;0,00\n"
+    "6;T5;;10/03/2025;30,00;0,60\n"
+    "7;T5;;11/03/2025;30,00;0,60\n"
+    "8;T1;;31/02/2025;1,00;0,00\n"
+)
+
+
+def _rollup():
+    return sorted((r.status, r.count, r.amount) for r in ReceivableDailyRollup.objects.filter(count__gt=0))
+
+
+class ReconciliationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.method = PaymentMethod.objects.create(code="credito", name="Crédito", type="card_credit")
+
+    def _rec(self, amount, external_id="", reference="", status="PENDENTE"):
+        return Receivable.objects.create(
+            method=self.method, amount=Decimal(amount), external_id=external_id, reference=reference, status=status,
+            due_date="2025-03-10",
+        )
+
+    def test_reconcile_file_report_and_idempotency(self):
+        r1 = self._rec("100.00", external_id="T1")
+        r2 = self._rec("50.00", reference="ORDER 2")
+        r3 = self._rec("80.00", external_id="T3")
+        self._rec("20.00", external_id="T4", status="PAGO")
+        r5 = self._rec("60.00", external_id="T5")
+
+        upload = SimpleUploadedFile("liquidacao.csv", CSV.encode("utf-8"), content_type="text/csv")
+        r = self.client.post("/api/v1/payment/receivables/reconcile/", {"file": upload}, format="multipart")
+        assert r.status_code == 200, r.content
+        report = r.json()
+        counts = {k: report[k] for k in ("lines", "matched", "settled_receivables", "unmatched", "divergent", "already_processed", "invalid")}
+        assert counts == {
+            "lines": 8, "matched": 4, "settled_receivables": 3, "unmatched": 1, "divergent": 2, "already_processed": 0, "invalid": 1,
+        }
+        assert report["settled_value"] == 210.0
+        assert [d["external_id"] for d in report["details"]["unmatched"]] == ["T9"]
+        assert sorted(d["external_id"] for d in report["details"]["divergent"]) == ["T3", "T4"]
+
+        for rec in (r1, r2, r5):
+            rec.refresh_from_db()
+            assert (rec.status, rec.paid_amount) == ("PAGO", rec.amount)
+        assert r1.fee_amount == Decimal("2.50") and r5.fee_amount == Decimal("1.20")
+        assert str(r5.paid_date) == "2025-03-11"
+        r3.refresh_from_db()
+        assert r3.status == "PENDENTE"
+        assert PaymentEvent.objects.count() == 4
+
+        # Agregado do resumo acompanha o UPDATE em massa
+        live = _rollup()
+        call_command("rebuild_receivable_rollup", stdout=io.StringIO())
+        assert live == _rollup()
+
+        again = reconcile(io.StringIO(CSV))
+        assert (again["matched"], again["already_processed"], again["unmatched"]) == (0, 4, 1)
+        assert PaymentEvent.objects.count() == 4
+
+    def test_command_dry_run_and_bulk_query_count(self):
+        lines = ["external_id,paid_date,amount,net"]
+        for i in range(300):
+            self._rec("10.00", external_id=f"X{i}")
+            lines.append(f"X{i},2025-03-10,10.00,9.70")
+        path = self._write("\n".join(lines) + "\n")
+
+        out = io.StringIO()
+        call_command("reconcile_settlement_file", path, "--dry-run", stdout=out)
+        assert "conciliadas: 300" in out.getvalue()
+        assert not PaymentEvent.objects.exists()
+
+        with CaptureQueriesContext(connection) as ctx, open(path, encoding="utf-8") as stream:
+            report = reconcile(stream)
+        assert report["settled_receivables"] == 300
+        assert len(ctx.captured_queries) < 30, len(ctx.captured_queries)
+        assert Receivable.objects.filter(status="PAGO", fee_amount=Decimal("0.30")).count() == 300
+
+    def test_invalid_header(self):
+        upload = SimpleUploadedFile("x.csv", b"foo,bar\n1,2\n", content_type="text/csv")
+        r = self.client.post("/api/v1/payment/receivables/reconcile/", {"file": upload}, format="multipart")
+        assert r.status_code == 400
+
+    def _write(self, text):
+        handle = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8")
+        handle.write(text)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
@@ -0,0 +1,144 @@
+import datetime
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from payment.models import PaymentEvent, PaymentMethod, PaymentWebhookEvent, Receivable, ReceivableDailyRollup
+from payment.services import inbox
+from payment.services.inbox import drain, ingest
+
+
+User = get_user_model()
+
+
+def _rollup_rows():
+    return sorted(
+        (str(r.date), r.method_id, r.status, r.count, r.amount)
+        for r in ReceivableDailyRollup.objects.filter(count__gt=0)
+    )
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRET="segredo")
+class PaymentWebhookInboxTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.pix = PaymentMethod.objects.create(code="pix", name="PIX", type="pix")
+        self.rec = Receivable.objects.create(method=self.pix, amount=Decimal("30.00"), reference="ORDER 1", external_id="tx-1")
+        self.paid = Receivable.objects.create(method=self.pix, amount=Decimal("5.00"), reference="ORDER 2", status="PAGO")
+
+    def _post_signed(self, data, secret="segredo"):
+        body = json.dumps(data).encode("utf-8")
+        signature = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        # Sem credenciais: o gateway só tem a assinatura
+        return APIClient().post(
+            "/api/v1/payment/webhooks/", body, content_type="application/json", HTTP_X_WEBHOOK_SIGNATURE=f"sha256={signature}"
+        )
+
+    def test_webhook_endpoint_stores_raw_events(self):
+        event = {"external_id": "evt-1", "reference": "ORDER 1", "amount": "10.00"}
+        r = self._post_signed(event)
+        assert r.status_code == 202, r.content
+        assert r.json() == {"received": 1, "accepted": 1, "duplicates": 0}
+
+        r = self._post_signed([event, {"external_id": "evt-2", "receivable": self.rec.id, "amount": "1.00"}])
+        assert r.json() == {"received": 2, "accepted": 1, "duplicates": 1}
+        assert PaymentWebhookEvent.objects.filter(status="PENDENTE").count() == 2
+        # Nada é baixado na requisição
+        assert Receivable.objects.get(pk=self.rec.pk).paid_amount == Decimal("0.00")
+
+        assert self._post_signed({"amount": "1.00"}).status_code == 400
+        assert self._post_signed(["x"]).status_code == 400
+
+    def test_webhook_endpoint_requires_signature(self):
+        event = {"external_id": "evt-1", "reference": "ORDER 1", "amount": "10.00"}
+        # Token de usuário não basta: sem assinatura válida nada entra na caixa
+        assert self.client.post("/api/v1/payment/webhooks/", event, format="json").status_code == 403
+        assert self._post_signed(event, secret="outro").status_code == 403
+        with override_settings(PAYMENT_WEBHOOK_SECRET=""):
+            assert self._post_signed(event, secret="").status_code == 403
+        assert not PaymentWebhookEvent.objects.exists()
+
+    def test_event_settled_in_parallel_is_ignored_not_the_batch(self):
+        ingest(
+            [
+                {"external_id": "race", "receivable": str(self.rec.id), "amount": "10.00"},
+                {"external_id": "ok", "reference": "ORDER 1", "amount": "5.00"},
+            ]
+        )
+        real = inbox._applied
+        calls = []
+
+        def stale(external_ids):
+            # Primeira leitura não vê o evento que o endpoint settle grava logo depois
+            calls.append(1)
+            if len(calls) == 1:
+                PaymentEvent.objects.create(receivable=self.rec, amount=Decimal("10.00"), paid_date=datetime.date(2025, 3, 1), external_id="race")
+                return set()
+            return real(external_ids)
+
+        with mock.patch.object(inbox, "_applied", side_effect=stale):
+            totals = drain(once=True, poll_interval=0)
+        assert totals == {"batches": 1, "processed": 1, "ignored": 1, "errors": 0}
+        statuses = dict(PaymentWebhookEvent.objects.values_list("external_id", "status"))
+        assert statuses == {"race": "IGNORADO", "ok": "PROCESSADO"}
+        assert Receivable.objects.get(pk=self.rec.pk).paid_amount == Decimal("5.00")
+
+    def test_drain_applies_batches_without_lost_updates(self):
+        PaymentEvent.objects.create(receivable=self.paid, amount=Decimal("5.00"), paid_date=datetime.date(2025, 3, 1), external_id="dup")
+        ingest(
+            [
+                {"external_id": "a", "reference": "ORDER 1", "amount": "10.00", "fee_amount": "0.50", "paid_date": "2025-03-01"},
+                {"external_id": "b", "receivable_external_id": "tx-1", "amount": "10.00", "paid_date": "2025-03-02"},
+                {"external_id": "c", "receivable": str(self.rec.id), "amount": "10.00", "paid_date": "2025-03-03"},
+                {"external_id": "d", "reference": "ORDER 2", "amount": "1.00"},
+                {"external_id": "e", "reference": "ORDER 404", "amount": "1.00"},
+                {"external_id": "f", "reference": "ORDER 1", "amount": "abc"},
+                {"external_id": "dup", "reference": "ORDER 2", "amount": "5.00"},
+            ]
+        )
+        totals = drain(once=True, size=2, poll_interval=0)
+        assert totals == {"batches": 4, "processed": 4, "ignored": 1, "errors": 2}
+
+        rec = Receivable.objects.get(pk=self.rec.pk)
+        assert (rec.paid_amount, rec.fee_amount, rec.status, rec.paid_date) == (
+            Decimal("30.00"), Decimal("0.50"), "PAGO", datetime.date(2025, 3, 3)
+        )
+        # Recebível já pago: o evento fica registrado, o saldo não muda
+        paid = Receivable.objects.get(pk=self.paid.pk)
+        assert paid.paid_amount == Decimal("0.00") and PaymentEvent.objects.filter(external_id="d").exists()
+        statuses = dict(PaymentWebhookEvent.objects.values_list("external_id", "status"))
+        assert statuses == {"a": "PROCESSADO", "b": "PROCESSADO", "c": "PROCESSADO", "d": "PROCESSADO", "e": "ERRO", "f": "ERRO", "dup": "IGNORADO"}
+        assert PaymentWebhookEvent.objects.get(external_id="e").error == "recebível não encontrado"
+
+        live = _rollup_rows()
+        call_command("rebuild_receivable_rollup", stdout=StringIO())
+        assert live == _rollup_rows()
+
+        out = StringIO()
+        ingest([{"external_id": "g", "reference": "ORDER 1", "amount": "1.00"}])
+        call_command("drain_payment_inbox", stdout=out)
+        assert "aplicados: 1" in out.getvalue()
+
+    def test_apply_locks_and_rereads_receivable(self):
+        stale = Receivable.objects.get(pk=self.rec.pk)
+        first = PaymentEvent.objects.create(receivable=self.rec, amount=Decimal("10.00"), paid_date=datetime.date(2025, 3, 1))
+        first.apply()
+        # Instância lida antes da primeira baixa: sem o lock + releitura, os 10,00 anteriores se perderiam
+        second = PaymentEvent.objects.create(receivable=stale, amount=Decimal("20.00"), paid_date=datetime.date(2025, 3, 2))
+        second.apply()
+        rec = Receivable.objects.get(pk=self.rec.pk)
+        assert (rec.paid_amount, rec.status) == (Decimal("30.00"), "PAGO")
+        assert second.receivable.status == "PAGO"
@@ -1,16 +1,30 @@
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncMonth
 from rest_framework import viewsets, mixins, status
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema_view, extend_schema
 from django.conf import settings
+from django.http import StreamingHttpResponse
+import io
+import itertools
 import os
 import datetime
 
+from core.logtail import LogFilter, rotated_files, search, tail
+from core.pagination import KeysetPagination
 from .models import PaymentMethod, Receivable, PaymentEvent, CardBrand, CardFeeTier
-from .serializers import PaymentMethodSerializer, ReceivableSerializer, SettleSerializer, CardBrandSerializer, CardFeeTierSerializer
+from .services.receivable_rollup import receivable_summary
+from .services import card_fees, method_cache
+from .services.reconciliation import reconcile
+from .services.overdue import mark_overdue
+from .services.cashflow import GRANULARITIES, MAX_MONTHS, cashflow
+from .services.inbox import ingest, valid_signature
+from .serializers import (
+    PaymentMethodSerializer, ReceivableSerializer, SettleSerializer, CardBrandSerializer, CardFeeTierSerializer, FeeQuoteSerializer,
+    ReconciliationUploadSerializer,
+)
 import logging
 logger = logging.getLogger("payment")
 
@@ -34,10 +48,21 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
     search_fields = ["name", "code"]
     ordering_fields = ["name", "created_at", "updated_at"]
 
+    def list(self, request, *args, **kwargs):
+        # Tela de checkout (sem filtros/busca/ordenação): lista servida do cache de métodos
+        plain = {self.paginator.page_query_param} if self.paginator else set()
+        if set(request.query_params) - plain:
+            return super().list(request, *args, **kwargs)
+        methods = method_cache.all_methods()
+        page = self.paginate_queryset(methods)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(methods, many=True).data)
+
     def create(self, request, *args, **kwargs):
         code = request.data.get("code")
         if code:
-            existing = PaymentMethod.objects.filter(code=code).first()
+            existing = method_cache.get_method_by_code(code)
             if existing:
                 ser = self.get_serializer(existing)
                 return Response(ser.data, status=status.HTTP_200_OK)
@@ -54,6 +79,8 @@ class ReceivableViewSet(viewsets.ModelViewSet):
     serializer_class = ReceivableSerializer
     lookup_field = "pk"
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_fields = ("created_at", "due_date")
     from django_filters.rest_framework import DjangoFilterBackend
     from rest_framework import filters as drf_filters
     filter_backends = [DjangoFilterBackend, drf_filters.SearchFilter, drf_filters.OrderingFilter]
@@ -89,7 +116,32 @@ class ReceivableViewSet(viewsets.ModelViewSet):
         )
         evt.apply()
         logger.info("[payment] settled receivable=%s amount=%s fee=%s external_id=%s", r.id, data["amount"], data.get("fee_amount") or 0, data.get("external_id") or "")
-        return Response(ReceivableSerializer(r).data)
+        return Response(ReceivableSerializer(evt.receivable).data)
+
+    @extend_schema(request=ReconciliationUploadSerializer, tags=["payment"], summary="Conciliar arquivo de liquidação da adquirente (CSV)")
+    @action(detail=False, methods=["post"], url_path="reconcile", parser_classes=[MultiPartParser, FormParser])
+    def reconcile(self, request):
+        ser = ReconciliationUploadSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        upload = ser.validated_data["file"]
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            report = reconcile(stream, dry_run=ser.validated_data["dry_run"])
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @extend_schema(tags=["payment"], summary="Reprocessar recebíveis para marcar atrasos")
+    @action(detail=False, methods=["post"], url_path="mark-overdue", permission_classes=[IsAdminUser])
+    def mark_overdue(self, request):
+        ref = request.data.get("date")
+        try:
+            ref_date = datetime.date.fromisoformat(ref) if ref else datetime.date.today()
+        except Exception:
+            return Response({"detail": "Data inválida. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        full = str(request.data.get("full", "")).lower() in ("1", "true", "yes")
+        return Response(mark_overdue(ref_date, full=full), status=status.HTTP_200_OK)
 
     @extend_schema(tags=["payment"], summary="Resumo de recebíveis")
     @action(detail=False, methods=["get"], url_path="summary")
@@ -101,69 +153,93 @@ class ReceivableViewSet(viewsets.ModelViewSet):
         except Exception:
             return Response({"detail": "Data inválida."}, status=status.HTTP_400_BAD_REQUEST)
 
-        qs = Receivable.objects.select_related("method")
-        if method:
-            qs = qs.filter(method_id=method)
+        # Lido do agregado diário (ReceivableDailyRollup), não da tabela de recebíveis
+        return Response(receivable_summary(method, ref_date))
 
-        total = qs.aggregate(count=Count("id"), value=Sum("amount"))
-        by_status_qs = qs.values("status").annotate(count=Count("id"), value=Sum("amount")).order_by("status")
-        by_status = {row["status"]: {"count": row["count"], "value": row["value"] or 0} for row in by_status_qs}
 
-        overdue = qs.filter(due_date__lt=ref_date, status__in=["PENDENTE", "ATRASADO"]).aggregate(
-            count=Count("id"), value=Sum("amount")
-        )
+class PaymentWebhookView(APIView):
+    # O gateway não tem sessão nem token: a autenticação é a assinatura HMAC do corpo
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
-        in_7 = qs.filter(due_date__gte=ref_date, due_date__lte=ref_date + datetime.timedelta(days=7)).aggregate(
-            count=Count("id"), value=Sum("amount")
-        )
-        in_30 = qs.filter(due_date__gt=ref_date + datetime.timedelta(days=7), due_date__lte=ref_date + datetime.timedelta(days=30)).aggregate(
-            count=Count("id"), value=Sum("amount")
-        )
+    @extend_schema(tags=["payment"], summary="Receber eventos de pagamento (webhook): grava na caixa de entrada e responde 202")
+    def post(self, request):
+        # Corpo cru antes do parse (request.data): a assinatura é sobre os bytes recebidos
+        if not valid_signature(request.body, request.headers.get("X-Webhook-Signature", "")):
+            return Response({"detail": "Assinatura do webhook inválida."}, status=status.HTTP_403_FORBIDDEN)
+        # Um evento (objeto) ou vários (lista); a baixa é feita depois por `drain_payment_inbox`
+        events = request.data if isinstance(request.data, list) else [request.data]
+        if not events or not all(isinstance(e, dict) for e in events):
+            return Response({"detail": "Envie um evento (objeto JSON) ou uma lista de eventos."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = ingest(events)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_202_ACCEPTED)
 
-        six_months_ahead = ref_date + datetime.timedelta(days=31 * 6)
-        monthly_qs = (
-            qs.filter(due_date__gte=ref_date, due_date__lt=six_months_ahead)
-            .annotate(month=TruncMonth("due_date"))
-            .values("month")
-            .annotate(count=Count("id"), value=Sum("amount"))
-            .order_by("month")
-        )
-        monthly_next = [
-            {"month": row["month"].strftime("%Y-%m"), "count": row["count"], "value": row["value"] or 0}
-            for row in monthly_qs
-        ]
 
-        return Response(
-            {
-                "total": {"count": total.get("count") or 0, "value": total.get("value") or 0},
-                "by_status": by_status,
-                "overdue": {"count": overdue.get("count") or 0, "value": overdue.get("value") or 0},
-                "upcoming": {
-                    "7d": {"count": in_7.get("count") or 0, "value": in_7.get("value") or 0},
-                    "30d": {"count": in_30.get("count") or 0, "value": in_30.get("value") or 0},
-                },
-                "monthly_next": monthly_next,
-            }
-        )
+class CashFlowView(APIView):
+    @extend_schema(tags=["payment"], summary="Fluxo de caixa projetado: recebíveis (entradas) e parcelas a pagar (saídas)")
+    def get(self, request):
+        ref = request.query_params.get("date")
+        granularity = request.query_params.get("granularity") or "day"
+        try:
+            ref_date = datetime.date.fromisoformat(ref) if ref else datetime.date.today()
+            months = int(request.query_params.get("months") or MAX_MONTHS)
+        except Exception:
+            return Response({"detail": "Parâmetros inválidos. Use date=YYYY-MM-DD e months inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+        if granularity not in GRANULARITIES:
+            return Response({"detail": "granularity deve ser day ou week."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= months <= MAX_MONTHS:
+            return Response({"detail": f"months deve estar entre 1 e {MAX_MONTHS}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(cashflow(ref_date, granularity, months))
+
+
+MAX_LOG_LINES = 5000
+
+
+def _log_datetime(raw):
+    return datetime.datetime.fromisoformat(raw) if raw else None
 
 
 class PaymentLogsView(viewsets.ViewSet):
-    @extend_schema(tags=["payment"], summary="Últimos logs de pagamento")
+    @extend_schema(
+        tags=["payment"],
+        summary="Últimos logs de pagamento",
+        description=(
+            "Lê o fim de logs/payment.log (e backups da rotação) sem carregar o arquivo. Filtros: "
+            "level (mínimo), logger (prefixo), order, receivable, q (texto), since/until (ISO). "
+            "stream=1 devolve texto corrido, do mais novo para o mais antigo."
+        ),
+    )
     def list(self, request):
+        params = request.query_params
         try:
-            limit = int(request.query_params.get("limit", 200))
-        except ValueError:
-            return Response({"detail": "limit inválido"}, status=status.HTTP_400_BAD_REQUEST)
-        log_path = os.path.join(settings.BASE_DIR, "logs", "payment.log")
-        if not os.path.exists(log_path):
-            return Response({"lines": [], "path": log_path})
+            limit = min(int(params.get("limit", 200)), MAX_LOG_LINES)
+            filters = LogFilter(
+                level=params.get("level") or None,
+                logger=params.get("logger") or None,
+                order=params.get("order") or None,
+                receivable=params.get("receivable") or None,
+                contains=params.get("q") or None,
+                since=_log_datetime(params.get("since")),
+                until=_log_datetime(params.get("until")),
+            )
+        except ValueError as exc:
+            return Response({"detail": f"Parâmetro inválido: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+        log_path = os.path.join(settings.LOG_DIR, "payment.log")
+        files = rotated_files(log_path)
+        if not files:
+            return Response({"lines": [], "path": log_path, "count": 0})
+        if str(params.get("stream") or "").lower() in ("1", "true"):
+            records = itertools.islice(search(files, filters), limit)
+            return StreamingHttpResponse((record.text + "\n" for record in records), content_type="text/plain; charset=utf-8")
         try:
-            with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()
-        except Exception as e:
+            lines = [record.text for record in tail(files, limit, filters)]
+        except OSError as e:
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        tail = [ln.rstrip("\n") for ln in lines[-limit:]]
-        return Response({"lines": tail, "path": log_path, "count": len(tail)})
+        return Response({"lines": lines, "path": log_path, "files": len(files), "count": len(lines)})
 
 
 @extend_schema_view(
@@ -203,3 +279,17 @@ class CardFeeTierViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
     filterset_fields = {"brand": ["exact"], "type": ["exact"], "created_at": ["gte", "lte"], "updated_at": ["gte", "lte"]}
     ordering_fields = ["installments_min", "installments_max", "created_at", "updated_at"]
+
+    @extend_schema(parameters=[FeeQuoteSerializer], tags=["payment"], summary="Simular taxa, líquido e recebimento de 1 a N parcelas")
+    @action(detail=False, methods=["get"], url_path="quote")
+    def quote(self, request):
+        ser = FeeQuoteSerializer(data=request.query_params)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+        brand = method_cache.get_brand(data["brand"])
+        if brand is None or not brand.active:
+            return Response({"detail": "Bandeira inexistente ou inativa."}, status=status.HTTP_400_BAD_REQUEST)
+        quotes = card_fees.quote(data["amount"], data["brand"], data["type"], data.get("installments"), data.get("date"))
+        return Response(
+            {"amount": data["amount"], "brand": data["brand"], "brand_name": brand.name, "type": data["type"], "quotes": quotes}
+        )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SupplierProduct, PurchaseInvoice, PurchaseInstallment
+from .models import NFeImportJob, ProductMatchReview, SupplierProduct, PurchaseInvoice, PurchaseInvoiceItem, PurchaseInstallment
 
 
 @admin.register(SupplierProduct)
@@ -15,10 +15,43 @@ class PurchaseInstallmentInline(admin.TabularInline):
     extra = 0
 
 
+class PurchaseInvoiceItemInline(admin.TabularInline):
+    model = PurchaseInvoiceItem
+    extra = 0
+    fields = ("line", "supplier_code", "name", "product", "quantity", "unit_cost", "total_value", "ncm", "cfop")
+    readonly_fields = fields
+    can_delete = False
+
+
 @admin.register(PurchaseInvoice)
 class PurchaseInvoiceAdmin(admin.ModelAdmin):
     list_display = ("id", "number", "series", "supplier", "issue_date", "total_value")
     search_fields = ("number", "series", "supplier__corporate_name")
     list_filter = ("issue_date", "supplier")
-    inlines = [PurchaseInstallmentInline]
+    inlines = [PurchaseInvoiceItemInline, PurchaseInstallmentInline]
+    exclude = ("xml",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("xml")
+
+
+
+@admin.register(ProductMatchReview)
+class ProductMatchReviewAdmin(admin.ModelAdmin):
+    list_display = ("id", "item_name", "supplier", "product", "score", "status", "created_at")
+    search_fields = ("item_name", "supplier_code", "supplier__corporate_name")
+    list_filter = ("status",)
+    autocomplete_fields = ("product", "resolved_product")
+    readonly_fields = ("candidates",)
+
+
+@admin.register(NFeImportJob)
+class NFeImportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "uuid", "kind", "status", "filename", "attempts", "processed_items", "total_items", "created_at")
+    list_filter = ("status", "kind")
+    search_fields = ("uuid", "filename")
+    exclude = ("payload",)
+    readonly_fields = ("warnings", "result", "error")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("payload")
@@ -5,3 +5,6 @@ class PurchaseConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "purchase"
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from purchase.models import PurchaseInvoice
+from purchase.services.nfe_import import backfill_invoice_items
+
+
+class Command(BaseCommand):
+    help = "Grava as linhas (PurchaseInvoiceItem) das notas importadas antes delas existirem, a partir do XML"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=200, help="Notas por transação")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        pending = PurchaseInvoice.objects.filter(items__isnull=True).select_related("supplier").defer("xml").order_by("id")
+        self.stdout.write(f"Notas sem linhas gravadas: {pending.count()}")
+        last_id = invoices = lines = failed = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                for inv in batch:
+                    try:
+                        with transaction.atomic():
+                            count = backfill_invoice_items(inv)
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f"Nota {inv.id}: {exc}")
+                        continue
+                    invoices += 1
+                    lines += count
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f"Notas processadas: {invoices} ({lines} linhas, {failed} com erro)"))
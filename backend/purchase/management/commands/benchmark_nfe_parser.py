@@ -0,0 +1,93 @@
+import statistics
+import time
+import tracemalloc
+
+import xmltodict
+from django.core.management.base import BaseCommand
+
+from purchase.services.nfe_parser import iter_items, parse_nfe
+
+
+DET_TEMPLATE = (
+    '<det nItem="{n}"><prod><cProd>C{n:06d}</cProd><cEAN>789{n:010d}</cEAN><xProd>Produto {n}</xProd>'
+    "<NCM>12345678</NCM><CFOP>5102</CFOP><uCom>UN</uCom><qCom>2.0000</qCom><vUnCom>10.00</vUnCom>"
+    "<vProd>20.00</vProd><cEANTrib>789{n:010d}</cEANTrib><uTrib>UN</uTrib></prod>"
+    "<imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST></ICMS00></ICMS>"
+    "<IPI><cEnq>999</cEnq><IPINT><CST>53</CST></IPINT></IPI>"
+    "<PIS><PISAliq><CST>01</CST><pPIS>1.65</pPIS></PISAliq></PIS>"
+    "<COFINS><COFINSAliq><CST>01</CST><pCOFINS>7.60</pCOFINS></COFINSAliq></COFINS></imposto></det>"
+)
+
+
+def build_sample_nfe(lines: int) -> str:
+    """NF-e sintética (com namespace) com `lines` itens, para medição."""
+    dets = "".join(DET_TEMPLATE.format(n=i + 1) for i in range(lines))
+    return (
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe>'
+        "<ide><nNF>1</nNF><serie>1</serie><dhEmi>2025-01-15T12:00:00-03:00</dhEmi></ide>"
+        "<emit><CNPJ>12345678000190</CNPJ><xNome>Fornecedor</xNome></emit>"
+        f"{dets}<total><ICMSTot><vNF>{20 * lines}.00</vNF></ICMSTot></total>"
+        "<cobr><dup><nDup>1</nDup><dVenc>2025-02-15</dVenc><vDup>20.00</vDup></dup></cobr>"
+        "</infNFe></NFe></nfeProc>"
+    )
+
+
+def legacy_parse(xml_text: str):
+    """Caminho anterior: documento inteiro em dict via xmltodict e leitura com .get()."""
+    doc = xmltodict.parse(xml_text)
+    nfe = doc.get("nfeProc", {}).get("NFe") or doc.get("NFe")
+    inf = nfe["infNFe"] if "infNFe" in nfe else nfe
+    det_list = inf.get("det")
+    det_list = det_list if isinstance(det_list, list) else [det_list]
+    out = []
+    for det in det_list:
+        prod = det.get("prod", {})
+        imposto = det.get("imposto", {})
+        icms = imposto.get("ICMS", {})
+        if isinstance(icms, dict) and len(icms) == 1:
+            icms = list(icms.values())[0]
+        out.append((prod.get("cProd"), prod.get("qCom"), prod.get("vUnCom"), icms.get("CST")))
+    return out
+
+
+def stream_items(xml_text: str):
+    """Consumo item a item, sem reter a lista (como um importador em streaming faria)."""
+    count = 0
+    for _ in iter_items(xml_text):
+        count += 1
+    return count
+
+
+def _measure(fn, xml_text: str, repeat: int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(xml_text)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn(xml_text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+class Command(BaseCommand):
+    help = "Compara o parser em streaming da NF-e com o parser xmltodict anterior (tempo e pico de memória)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, nargs="+", default=[1, 5000], help="Quantidade de itens por nota")
+        parser.add_argument("--repeat", type=int, default=5, help="Execuções por medição (mediana)")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        for lines in options["lines"]:
+            xml_text = build_sample_nfe(lines)
+            legacy_t, legacy_mem = _measure(legacy_parse, xml_text, repeat)
+            parse_t, parse_mem = _measure(parse_nfe, xml_text, repeat)
+            stream_t, stream_mem = _measure(stream_items, xml_text, repeat)
+            self.stdout.write(
+                f"{lines} itens ({len(xml_text) / 1024:.0f} KiB): "
+                f"xmltodict {legacy_t * 1000:.2f} ms / {legacy_mem / 1024:.0f} KiB pico | "
+                f"parse_nfe {parse_t * 1000:.2f} ms / {parse_mem / 1024:.0f} KiB pico | "
+                f"iter_items {stream_t * 1000:.2f} ms / {stream_mem / 1024:.0f} KiB pico"
+            )
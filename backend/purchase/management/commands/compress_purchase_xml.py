@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from purchase.services.xml_storage import compress_legacy_xml, legacy_xml_queryset, vacuum
+
+
+class Command(BaseCommand):
+    help = "Compacta o XML das notas de compra antigas (coluna de texto -> blob zlib), em lotes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=500, help="Notas por transação")
+        parser.add_argument("--dry-run", action="store_true", dest="dry", help="Apenas conta as notas pendentes")
+        parser.add_argument("--vacuum", action="store_true", dest="vacuum", help="Executa VACUUM no SQLite ao final")
+
+    def handle(self, *args, **options):
+        pending = legacy_xml_queryset().count()
+        self.stdout.write(f"Notas com XML não compactado: {pending}")
+        if options.get("dry") or not pending:
+            return
+        totals = compress_legacy_xml(batch_size=max(1, options["batch_size"]))
+        ratio = totals["stored_bytes"] / totals["raw_bytes"] if totals["raw_bytes"] else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Notas compactadas: {totals['invoices']} "
+                f"({totals['raw_bytes']} -> {totals['stored_bytes']} bytes, {ratio:.0%})"
+            )
+        )
+        if options.get("vacuum") and vacuum():
+            self.stdout.write("VACUUM concluído")
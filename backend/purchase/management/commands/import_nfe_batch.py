@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from purchase.services.nfe_batch import import_nfe_batch, sources_from_path
+
+
+class Command(BaseCommand):
+    help = "Importa XMLs de NFe em lote a partir de um arquivo ZIP ou diretório"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Arquivo .zip ou diretório com os XMLs")
+        parser.add_argument("--workers", type=int, dest="workers", help="Processos de parsing (padrão: NFE_IMPORT_WORKERS)")
+        parser.add_argument("--chunksize", type=int, default=4, dest="chunksize", help="Arquivos enviados por vez a cada processo")
+        parser.add_argument("--verbose-files", action="store_true", dest="verbose_files", help="Lista o resultado de cada arquivo")
+
+    def handle(self, *args, **options):
+        try:
+            sources = sources_from_path(options["path"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not sources:
+            self.stdout.write("Nenhum XML encontrado.")
+            return
+
+        report = import_nfe_batch(sources, workers=options.get("workers"), chunksize=options["chunksize"])
+        for row in report["files"]:
+            if options.get("verbose_files") or row["status"] == "error":
+                detail = row.get("detail") or f"nota {row.get('invoice_id')}"
+                self.stdout.write(f"[{row['status']}] {row['file']}: {detail}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Arquivos: {report['total']} | importados: {report['imported']} | duplicados: {report['duplicate']} | "
+                f"erros: {report['error']} | {report['files_per_second']} arquivos/s ({report['workers']} processos)"
+            )
+        )
@@ -1,6 +1,7 @@
 import datetime
 from django.core.management.base import BaseCommand
 from purchase.models import PurchaseInstallment
+from purchase.services.installment_summary import bump_summary_version
 
 
 class Command(BaseCommand):
@@ -22,5 +23,7 @@ class Command(BaseCommand):
 
         qs = PurchaseInstallment.objects.filter(status="PENDENTE", due_date__lt=ref_date)
         count = qs.update(status="ATRASADO")
+        if count:
+            bump_summary_version()
         self.stdout.write(self.style.SUCCESS(f"Parcelas marcadas ATRASADO: {count}"))
 
@@ -0,0 +1,48 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from purchase.services.import_jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Processa a fila de importação de NF-e (NFeImportJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=None, help="Threads de trabalho (padrão: NFE_JOB_CONCURRENCY)"
+        )
+        parser.add_argument("--once", action="store_true", help="Sai quando a fila esvaziar")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Segundos entre consultas à fila vazia")
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"] or int(getattr(settings, "NFE_JOB_CONCURRENCY", 1))
+        concurrency = max(1, concurrency)
+        once, poll = options["once"], options["poll_interval"]
+        stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                # Termina o job em andamento e sai
+                signal.signal(sig, lambda *_: stop.set())
+
+        if concurrency == 1:
+            processed = run_worker(once=once, poll_interval=poll, stop=stop)
+        else:
+            counts = []
+
+            def loop():
+                try:
+                    counts.append(run_worker(once=once, poll_interval=poll, stop=stop))
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=loop, name=f"nfe-job-{i}") for i in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            processed = sum(counts)
+        self.stdout.write(self.style.SUCCESS(f"Jobs processados: {processed}"))
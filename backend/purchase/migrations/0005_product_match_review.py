@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0002_customer_uuid_seller_permissions_seller_uuid_and_more'),
+        ('catalog', '0006_product_name_key_trigram_index'),
+        ('purchase', '0004_supplierproduct_cost_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMatchReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('supplier_code', models.CharField(blank=True, max_length=60)),
+                ('item_name', models.CharField(max_length=200)),
+                ('score', models.DecimalField(decimal_places=4, max_digits=5)),
+                ('candidates', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('PENDENTE', 'PENDENTE'), ('VINCULADO', 'VINCULADO'), ('DESCARTADO', 'DESCARTADO')], db_index=True, default='PENDENTE', max_length=12)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_reviews', to='purchase.purchaseinvoice')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='match_reviews', to='catalog.product')),
+                ('resolved_product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.product')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_reviews', to='people.supplier')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
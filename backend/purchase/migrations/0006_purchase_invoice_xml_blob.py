@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0005_product_match_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseInvoiceXML',
+            fields=[
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='xml_blob', serialize=False, to='purchase.purchaseinvoice')),
+                ('codec', models.CharField(default='zlib', max_length=10)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='purchaseinvoice',
+            name='xml',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
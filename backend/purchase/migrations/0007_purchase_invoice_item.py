@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_product_name_key_trigram_index'),
+        ('purchase', '0006_purchase_invoice_xml_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseInvoiceItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.PositiveIntegerField()),
+                ('supplier_code', models.CharField(blank=True, max_length=60)),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('barcode', models.CharField(blank=True, max_length=64)),
+                ('universal_code', models.CharField(blank=True, max_length=64)),
+                ('ncm', models.CharField(blank=True, max_length=10)),
+                ('cfop', models.CharField(blank=True, max_length=10)),
+                ('uCom', models.CharField(blank=True, max_length=6)),
+                ('quantity', models.DecimalField(decimal_places=4, max_digits=15)),
+                ('unit_cost', models.DecimalField(decimal_places=10, max_digits=21)),
+                ('total_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='purchase.purchaseinvoice')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase_items', to='catalog.product')),
+            ],
+            options={
+                'ordering': ['invoice', 'line'],
+                'indexes': [models.Index(fields=['product', 'invoice'], name='purchaseitem_product_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='purchaseinvoiceitem',
+            constraint=models.UniqueConstraint(fields=('invoice', 'line'), name='uniq_purchase_item_line'),
+        ),
+    ]
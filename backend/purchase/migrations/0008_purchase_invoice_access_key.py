@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:06
+
+import zlib
+
+from django.db import migrations, models
+
+from purchase.services.nfe_parser import scan_access_key
+
+
+def backfill_access_key(apps, schema_editor):
+    PurchaseInvoice = apps.get_model("purchase", "PurchaseInvoice")
+    PurchaseInvoiceXML = apps.get_model("purchase", "PurchaseInvoiceXML")
+    seen = set()
+    last_id = 0
+    while True:
+        batch = list(PurchaseInvoice.objects.filter(id__gt=last_id).order_by("id").only("id", "xml")[:500])
+        if not batch:
+            break
+        blobs = dict(PurchaseInvoiceXML.objects.filter(invoice_id__in=[inv.id for inv in batch]).values_list("invoice_id", "payload"))
+        changed = []
+        for inv in batch:
+            raw = zlib.decompress(bytes(blobs[inv.id])) if inv.id in blobs else inv.xml
+            key = scan_access_key(raw)
+            # Notas repetidas (mesma chave com outro fornecedor/série): só a primeira fica com a chave
+            if key and key not in seen:
+                seen.add(key)
+                inv.access_key = key
+                changed.append(inv)
+        PurchaseInvoice.objects.bulk_update(changed, ["access_key"], batch_size=200)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0007_purchase_invoice_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='access_key',
+            field=models.CharField(blank=True, max_length=44, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_access_key, migrations.RunPython.noop),
+    ]
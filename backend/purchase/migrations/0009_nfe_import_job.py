@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:08
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0008_purchase_invoice_access_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NFeImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('uuid', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, unique=True)),
+                ('kind', models.CharField(choices=[('XML', 'XML'), ('LOTE', 'LOTE')], default='XML', max_length=5)),
+                ('status', models.CharField(choices=[('PENDENTE', 'PENDENTE'), ('PROCESSANDO', 'PROCESSANDO'), ('CONCLUIDO', 'CONCLUIDO'), ('ERRO', 'ERRO')], default='PENDENTE', max_length=12)),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('payload', models.BinaryField(default=bytes)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('total_items', models.PositiveIntegerField(default=0)),
+                ('processed_items', models.PositiveIntegerField(default=0)),
+                ('created_products', models.PositiveIntegerField(default=0)),
+                ('warnings', models.JSONField(blank=True, default=list)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='nfejob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:15
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+import django.db.models.deletion
+
+
+def backfill_supplier_and_date(apps, schema_editor):
+    PurchaseInvoice = apps.get_model("purchase", "PurchaseInvoice")
+    PurchaseInvoiceItem = apps.get_model("purchase", "PurchaseInvoiceItem")
+    invoice = PurchaseInvoice.objects.filter(pk=OuterRef("invoice_id"))
+    PurchaseInvoiceItem.objects.update(
+        supplier_id=Subquery(invoice.values("supplier_id")[:1]),
+        issue_date=Coalesce(
+            Subquery(invoice.values("issue_date")[:1]),
+            Subquery(invoice.annotate(day=TruncDate("created_at")).values("day")[:1]),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0002_customer_uuid_seller_permissions_seller_uuid_and_more'),
+        ('purchase', '0009_nfe_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseinvoiceitem',
+            name='issue_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='purchaseinvoiceitem',
+            name='supplier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='purchase_items', to='people.supplier'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseinvoiceitem',
+            index=models.Index(fields=['product', 'issue_date'], name='purchaseitem_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseinvoiceitem',
+            index=models.Index(fields=['supplier', 'product', 'issue_date'], name='purchaseitem_sup_prod_date_idx'),
+        ),
+        migrations.RunPython(backfill_supplier_and_date, migrations.RunPython.noop),
+    ]
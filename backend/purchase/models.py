@@ -1,5 +1,8 @@
 from decimal import Decimal
+from functools import cached_property
+import zlib
 from django.db import models
+from django.utils import timezone
 import uuid
 from django.core.validators import MinValueValidator
 
@@ -57,18 +60,86 @@ class PurchaseInvoice(TimeStampedModel):
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name="purchase_invoices")
     issue_date = models.DateField(null=True, blank=True)
     total_value = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
-    xml = models.TextField()
+    # Chave de acesso da NF-e (44 dígitos); nula em notas sem chave válida no XML
+    access_key = models.CharField(max_length=44, unique=True, null=True, blank=True)
+    # Legado: notas novas guardam o XML compactado em PurchaseInvoiceXML (compress_purchase_xml migra as antigas)
+    xml = models.TextField(blank=True, default="")
     pdf_path = models.CharField(max_length=255, blank=True)
 
     def __str__(self):
         return f"NF {self.number}/{self.series} - {self.supplier}"
 
+    @cached_property
+    def xml_text(self) -> str:
+        """XML original; descompacta sob demanda (uma consulta ao blob na primeira leitura)."""
+        try:
+            blob = self.xml_blob
+        except PurchaseInvoiceXML.DoesNotExist:
+            return self.xml
+        return blob.text()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["supplier", "number", "series"], name="uniq_invoice_supplier_number_series"),
         ]
 
 
+class PurchaseInvoiceXML(models.Model):
+    """XML da nota compactado (zlib), fora da tabela de notas para não pesar nas listagens."""
+
+    invoice = models.OneToOneField(PurchaseInvoice, on_delete=models.CASCADE, primary_key=True, related_name="xml_blob")
+    codec = models.CharField(max_length=10, default="zlib")
+    size = models.PositiveIntegerField(default=0)  # bytes do XML original (UTF-8)
+    payload = models.BinaryField()
+
+    @classmethod
+    def pack(cls, invoice, xml_text: str) -> "PurchaseInvoiceXML":
+        raw = (xml_text or "").encode("utf-8")
+        return cls(invoice=invoice, codec="zlib", size=len(raw), payload=zlib.compress(raw, 6))
+
+    def text(self) -> str:
+        return zlib.decompress(bytes(self.payload)).decode("utf-8")
+
+    def __str__(self):
+        return f"XML {self.invoice_id} ({self.size} bytes)"
+
+
+class PurchaseInvoiceItem(models.Model):
+    """Linha da nota já normalizada na importação: o detalhe e as consultas por produto não leem o XML."""
+
+    invoice = models.ForeignKey(PurchaseInvoice, on_delete=models.CASCADE, related_name="items")
+    line = models.PositiveIntegerField()
+    # Copiados da nota para as consultas de histórico de custo não precisarem de join
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, null=True, blank=True, related_name="purchase_items")
+    issue_date = models.DateField(null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="purchase_items")
+    supplier_code = models.CharField(max_length=60, blank=True)
+    name = models.CharField(max_length=200, blank=True)
+    barcode = models.CharField(max_length=64, blank=True)
+    universal_code = models.CharField(max_length=64, blank=True)
+    ncm = models.CharField(max_length=10, blank=True)
+    cfop = models.CharField(max_length=10, blank=True)
+    uCom = models.CharField(max_length=6, blank=True)
+    # Como vieram no XML (qCom até 4 casas, vUnCom até 10)
+    quantity = models.DecimalField(max_digits=15, decimal_places=4)
+    unit_cost = models.DecimalField(max_digits=21, decimal_places=10)
+    total_value = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        ordering = ["invoice", "line"]
+        constraints = [
+            models.UniqueConstraint(fields=["invoice", "line"], name="uniq_purchase_item_line"),
+        ]
+        indexes = [
+            models.Index(fields=["product", "invoice"], name="purchaseitem_product_idx"),
+            models.Index(fields=["product", "issue_date"], name="purchaseitem_product_date_idx"),
+            models.Index(fields=["supplier", "product", "issue_date"], name="purchaseitem_sup_prod_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.invoice_id} #{self.line} {self.name}"
+
+
 class PurchaseInstallment(TimeStampedModel):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
     invoice = models.ForeignKey(PurchaseInvoice, on_delete=models.CASCADE, related_name="installments")
@@ -79,3 +150,83 @@ class PurchaseInstallment(TimeStampedModel):
 
     def __str__(self):
         return f"Parcela {self.number} - {self.invoice}"
+
+
+IMPORT_JOB_STATUS = (
+    ("PENDENTE", "PENDENTE"),
+    ("PROCESSANDO", "PROCESSANDO"),
+    ("CONCLUIDO", "CONCLUIDO"),
+    ("ERRO", "ERRO"),
+)
+IMPORT_JOB_KINDS = (
+    ("XML", "XML"),
+    ("LOTE", "LOTE"),
+)
+
+
+class NFeImportJob(TimeStampedModel):
+    """Importação enfileirada (XML único ou ZIP), processada por `run_import_worker`."""
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
+    kind = models.CharField(max_length=5, choices=IMPORT_JOB_KINDS, default="XML")
+    status = models.CharField(max_length=12, choices=IMPORT_JOB_STATUS, default="PENDENTE")
+    filename = models.CharField(max_length=255, blank=True)
+    # Arquivo enviado compactado (zlib); esvaziado quando o job conclui
+    payload = models.BinaryField(default=bytes)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Progresso: linhas da nota (XML) ou arquivos (LOTE)
+    total_items = models.PositiveIntegerField(default=0)
+    processed_items = models.PositiveIntegerField(default=0)
+    created_products = models.PositiveIntegerField(default=0)
+    warnings = models.JSONField(default=list, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="nfejob_queue_idx"),
+        ]
+
+    def raw(self) -> bytes:
+        return zlib.decompress(bytes(self.payload))
+
+    @property
+    def duration_s(self):
+        if self.started_at is None:
+            return None
+        end = self.finished_at or timezone.now()
+        return round((end - self.started_at).total_seconds(), 3)
+
+    def __str__(self):
+        return f"Importação {self.uuid} ({self.status})"
+
+
+MATCH_REVIEW_STATUS = (
+    ("PENDENTE", "PENDENTE"),
+    ("VINCULADO", "VINCULADO"),
+    ("DESCARTADO", "DESCARTADO"),
+)
+
+
+class ProductMatchReview(TimeStampedModel):
+    """Item de NF-e com candidatos parecidos, mas abaixo do limite de vínculo automático."""
+
+    invoice = models.ForeignKey(PurchaseInvoice, on_delete=models.CASCADE, related_name="match_reviews")
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="match_reviews")
+    supplier_code = models.CharField(max_length=60, blank=True)
+    item_name = models.CharField(max_length=200)
+    # Produto criado para a linha na importação
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="match_reviews")
+    score = models.DecimalField(max_digits=5, decimal_places=4)
+    candidates = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=12, choices=MATCH_REVIEW_STATUS, default="PENDENTE", db_index=True)
+    resolved_product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Revisão {self.item_name} ({self.status})"
@@ -1,11 +1,28 @@
 from rest_framework import serializers
-from .models import PurchaseInvoice
+from .models import NFeImportJob, ProductMatchReview, PurchaseInvoice, PurchaseInvoiceItem
 
 
 class NFeImportSerializer(serializers.Serializer):
     xml_text = serializers.CharField(required=False, allow_blank=True)
 
 
+class NFeImportJobSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(source='uuid', read_only=True)
+    duration_s = serializers.FloatField(read_only=True, allow_null=True)
+    result = serializers.SerializerMethodField()
+
+    class Meta:
+        model = NFeImportJob
+        fields = [
+            'id', 'kind', 'status', 'filename', 'attempts', 'total_items', 'processed_items', 'created_products',
+            'warnings', 'error', 'result', 'created_at', 'started_at', 'finished_at', 'duration_s',
+        ]
+        read_only_fields = fields
+
+    def get_result(self, obj):
+        return obj.result if obj.status == 'CONCLUIDO' else None
+
+
 class PurchaseInvoiceSerializer(serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.corporate_name', read_only=True)
 
@@ -17,7 +34,62 @@ class PurchaseInvoiceSerializer(serializers.ModelSerializer):
         read_only_fields = ['uuid', 'created_at', 'updated_at']
 
 
+class XmlDecimalField(serializers.DecimalField):
+    """Decimal sem os zeros de preenchimento da coluna (10.0000000000 -> 10.00), como no XML."""
+
+    def __init__(self, min_places=2, **kwargs):
+        self.min_places = min_places
+        kwargs.setdefault('max_digits', None)
+        kwargs.setdefault('decimal_places', None)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        places = max(self.min_places, -value.normalize().as_tuple().exponent)
+        return f"{value:.{places}f}"
+
+
+class PurchaseInvoiceItemSerializer(serializers.ModelSerializer):
+    """Mesmas chaves do XML (antigo extract_items), mais o produto vinculado."""
+
+    cProd = serializers.CharField(source='supplier_code')
+    xProd = serializers.CharField(source='name')
+    qCom = XmlDecimalField(source='quantity', min_places=3)
+    vUnCom = XmlDecimalField(source='unit_cost')
+    vProd = XmlDecimalField(source='total_value')
+    NCM = serializers.CharField(source='ncm')
+    CFOP = serializers.CharField(source='cfop')
+    cEAN = serializers.CharField(source='barcode')
+    cEANTrib = serializers.CharField(source='universal_code')
+
+    class Meta:
+        model = PurchaseInvoiceItem
+        fields = ['line', 'product', 'cProd', 'xProd', 'qCom', 'vUnCom', 'vProd', 'NCM', 'CFOP', 'uCom', 'cEAN', 'cEANTrib']
+        read_only_fields = fields
+
+
 class PurchaseInvoiceDetailSerializer(PurchaseInvoiceSerializer):
+    items = PurchaseInvoiceItemSerializer(many=True, read_only=True)
+
     class Meta(PurchaseInvoiceSerializer.Meta):
-        fields = PurchaseInvoiceSerializer.Meta.fields + ['xml']
-        read_only_fields = PurchaseInvoiceSerializer.Meta.read_only_fields + ['xml']
+        fields = PurchaseInvoiceSerializer.Meta.fields + ['items']
+        read_only_fields = PurchaseInvoiceSerializer.Meta.read_only_fields + ['items']
+
+
+class ProductMatchReviewSerializer(serializers.ModelSerializer):
+    invoice_number = serializers.CharField(source='invoice.number', read_only=True)
+    supplier_name = serializers.CharField(source='supplier.corporate_name', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True, default=None)
+
+    class Meta:
+        model = ProductMatchReview
+        fields = [
+            'id', 'invoice', 'invoice_number', 'supplier', 'supplier_name', 'supplier_code', 'item_name',
+            'product', 'product_name', 'score', 'candidates', 'status', 'resolved_product', 'resolved_at',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+
+class ProductMatchResolveSerializer(serializers.Serializer):
+    # Sem product: descarta a sugestão e mantém o produto criado na importação
+    product = serializers.IntegerField(required=False, allow_null=True)
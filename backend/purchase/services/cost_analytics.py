@@ -0,0 +1,220 @@
+"""Histórico de custo de compra por produto e fornecedor, a partir das linhas de nota (PurchaseInvoiceItem).
+
+As linhas já carregam fornecedor e data de emissão (copiados da nota), então tudo sai de uma
+tabela indexada: a variação entre compras usa LAG() particionado por (produto, fornecedor) e o
+ranking de fornecedores é uma consulta agrupada percorrida uma única vez, sem laço por produto.
+"""
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, Max, Min, Sum, Window
+from django.db.models.functions import Abs, Cast, Lag, NullIf
+
+from ..models import PurchaseInvoiceItem
+
+COST = DecimalField(max_digits=21, decimal_places=10)
+# Mínimo de histórico antes da janela para achar a compra anterior de cada linha dos alertas
+ALERT_LOOKBACK_DAYS = 365
+CENT = Decimal("0.0001")
+
+
+def window_days() -> int:
+    return int(getattr(settings, "PURCHASE_COST_WINDOW_DAYS", 90))
+
+
+def alert_threshold() -> float:
+    return float(getattr(settings, "PURCHASE_COST_ALERT_PCT", 10))
+
+
+def _q(value) -> Optional[Decimal]:
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(CENT)
+
+
+def _pct(value) -> Optional[float]:
+    return None if value is None else round(float(value), 2)
+
+
+def _weighted_cost():
+    """Custo médio ponderado pela quantidade comprada.
+
+    Em float: o SQLite guarda decimais inteiros ("10") como INTEGER e faria divisão inteira.
+    """
+    spent = Cast(Sum(F("quantity") * F("unit_cost"), output_field=COST), FloatField())
+    return ExpressionWrapper(spent / NullIf(Sum("quantity"), 0), output_field=FloatField())
+
+
+def _previous(field: str, *partition: str):
+    return Window(Lag(field), partition_by=[F(p) for p in partition], order_by=[F("issue_date").asc(), F("id").asc()])
+
+
+def _change_pct():
+    diff = Cast(F("unit_cost") - F("prev_cost"), FloatField())
+    return ExpressionWrapper(diff * 100 / NullIf(F("prev_cost"), 0), output_field=FloatField())
+
+
+def _lines():
+    return PurchaseInvoiceItem.objects.filter(product__isnull=False, supplier__isnull=False, issue_date__isnull=False)
+
+
+def cost_history(
+    product_id: int,
+    supplier_id: Optional[int] = None,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+) -> Dict[str, Any]:
+    """Compras do produto em ordem cronológica, com a variação sobre a compra anterior do mesmo fornecedor."""
+    qs = _lines().filter(product_id=product_id)
+    if supplier_id:
+        qs = qs.filter(supplier_id=supplier_id)
+    if date_to:
+        qs = qs.filter(issue_date__lte=date_to)
+    # date_from fica fora do WHERE: a primeira compra do período ainda compara com a anterior a ele
+    rows = (
+        qs.annotate(prev_cost=_previous("unit_cost", "supplier_id"))
+        .annotate(change_pct=_change_pct())
+        .values(
+            "id", "invoice_id", "invoice__number", "issue_date", "supplier_id", "supplier__corporate_name",
+            "quantity", "unit_cost", "prev_cost", "change_pct",
+        )
+        .order_by("issue_date", "id")
+    )
+    history: List[Dict[str, Any]] = []
+    last_cost: Dict[int, Decimal] = {}
+    for row in rows:
+        last_cost[row["supplier_id"]] = row["unit_cost"]
+        if date_from and row["issue_date"] < date_from:
+            continue
+        history.append(
+            {
+                "date": row["issue_date"],
+                "invoice_id": row["invoice_id"],
+                "invoice_number": row["invoice__number"],
+                "supplier_id": row["supplier_id"],
+                "supplier_name": row["supplier__corporate_name"],
+                "quantity": row["quantity"],
+                "unit_cost": _q(row["unit_cost"]),
+                "previous_cost": _q(row["prev_cost"]),
+                "change_pct": _pct(row["change_pct"]),
+            }
+        )
+
+    grouped = qs.filter(issue_date__gte=date_from) if date_from else qs
+    suppliers = [
+        {
+            "supplier_id": row["supplier_id"],
+            "supplier_name": row["supplier__corporate_name"],
+            "purchases": row["purchases"],
+            "quantity": row["qty"],
+            "avg_cost": _q(row["avg_cost"]),
+            "min_cost": _q(row["min_cost"]),
+            "max_cost": _q(row["max_cost"]),
+            "last_cost": _q(last_cost.get(row["supplier_id"])),
+            "last_date": row["last_date"],
+        }
+        for row in grouped.values("supplier_id", "supplier__corporate_name")
+        .annotate(
+            purchases=Count("id"),
+            qty=Sum("quantity"),
+            avg_cost=_weighted_cost(),
+            min_cost=Min("unit_cost"),
+            max_cost=Max("unit_cost"),
+            last_date=Max("issue_date"),
+        )
+        .order_by("avg_cost", "supplier_id")
+    ]
+    return {"product_id": product_id, "history": history, "suppliers": suppliers}
+
+
+def best_suppliers(
+    ref_date: datetime.date, days: Optional[int] = None, product_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Fornecedor de menor custo médio ponderado por produto na janela [ref_date - days, ref_date]."""
+    days = window_days() if days is None else days
+    qs = _lines().filter(issue_date__gte=ref_date - datetime.timedelta(days=days), issue_date__lte=ref_date)
+    if product_id:
+        qs = qs.filter(product_id=product_id)
+    rows = (
+        qs.values("product_id", "product__name", "supplier_id", "supplier__corporate_name")
+        .annotate(purchases=Count("id"), qty=Sum("quantity"), avg_cost=_weighted_cost(), last_date=Max("issue_date"))
+        .order_by("product__name", "product_id", "avg_cost", "-last_date", "supplier_id")
+    )
+    # Linhas já vêm ordenadas por produto e custo: o primeiro fornecedor de cada produto é o melhor
+    result: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    for row in rows:
+        if current is None or current["product_id"] != row["product_id"]:
+            current = {"product_id": row["product_id"], "product_name": row["product__name"], "suppliers": []}
+            result.append(current)
+        current["suppliers"].append(
+            {
+                "rank": len(current["suppliers"]) + 1,
+                "supplier_id": row["supplier_id"],
+                "supplier_name": row["supplier__corporate_name"],
+                "purchases": row["purchases"],
+                "quantity": row["qty"],
+                "avg_cost": _q(row["avg_cost"]),
+                "last_date": row["last_date"],
+            }
+        )
+    for entry in result:
+        best, worst = entry["suppliers"][0], entry["suppliers"][-1]
+        entry["best"] = best
+        entry["savings_pct"] = (
+            _pct((worst["avg_cost"] - best["avg_cost"]) * 100 / worst["avg_cost"])
+            if len(entry["suppliers"]) > 1 and worst["avg_cost"]
+            else None
+        )
+    return result
+
+
+def cost_alerts(
+    ref_date: datetime.date, days: Optional[int] = None, threshold: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Compras da janela cujo custo variou `threshold`% ou mais sobre a compra anterior do mesmo fornecedor."""
+    days = window_days() if days is None else days
+    threshold = alert_threshold() if threshold is None else threshold
+    start = ref_date - datetime.timedelta(days=days)
+    bought = _lines().filter(issue_date__gte=start, issue_date__lte=ref_date).values("product_id")
+    qs = _lines().filter(
+        product_id__in=bought,
+        issue_date__gte=start - datetime.timedelta(days=ALERT_LOOKBACK_DAYS),
+        issue_date__lte=ref_date,
+    )
+    rows = (
+        qs.annotate(
+            prev_cost=_previous("unit_cost", "product_id", "supplier_id"),
+            prev_date=_previous("issue_date", "product_id", "supplier_id"),
+        )
+        .annotate(change_pct=_change_pct())
+        .annotate(abs_change=Abs(F("change_pct")))
+        # Filtro sobre a janela: vira QUALIFY/subconsulta, a compra anterior continua visível ao LAG
+        .filter(abs_change__gte=threshold)
+        .values(
+            "id", "invoice_id", "issue_date", "product_id", "product__name", "supplier_id",
+            "supplier__corporate_name", "unit_cost", "prev_cost", "prev_date", "change_pct",
+        )
+        .order_by("-issue_date", "-id")
+    )
+    return [
+        {
+            "product_id": row["product_id"],
+            "product_name": row["product__name"],
+            "supplier_id": row["supplier_id"],
+            "supplier_name": row["supplier__corporate_name"],
+            "invoice_id": row["invoice_id"],
+            "date": row["issue_date"],
+            "unit_cost": _q(row["unit_cost"]),
+            "previous_cost": _q(row["prev_cost"]),
+            "previous_date": row["prev_date"],
+            "change_pct": _pct(row["change_pct"]),
+            "direction": "alta" if row["change_pct"] > 0 else "queda",
+        }
+        for row in rows
+        if row["issue_date"] >= start
+    ]
@@ -0,0 +1,194 @@
+"""Fila de importação de NF-e no banco (NFeImportJob) e o laço do worker.
+
+O upload só grava o arquivo e devolve o job; `run_import_worker` consome a fila. A reserva
+é um UPDATE condicional (status PENDENTE -> PROCESSANDO), então vários workers, em threads
+ou em máquinas diferentes, nunca pegam o mesmo job, tanto no SQLite quanto no Postgres.
+"""
+from __future__ import annotations
+
+import datetime
+import io
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from core.db import is_transient_db_error
+
+from ..models import NFeImportJob
+from .nfe_batch import import_nfe_batch, sources_from_zip
+from .nfe_import import DUPLICATE_KEY_MESSAGE, DuplicateInvoiceError, known_access_keys, write_nfe
+from .nfe_parser import parse_nfe, scan_access_key
+
+log = logging.getLogger(__name__)
+
+MAX_WARNINGS = 200
+# Espera antes de cada nova tentativa: base * 2^(tentativa-1) segundos
+RETRY_BACKOFF_SECONDS = 2
+
+
+def max_attempts() -> int:
+    return max(1, int(getattr(settings, "NFE_JOB_MAX_ATTEMPTS", 3)))
+
+
+def lock_timeout() -> int:
+    return int(getattr(settings, "NFE_JOB_LOCK_TIMEOUT", 900))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:100]
+
+
+def enqueue_import(raw: bytes, filename: str = "", kind: str = "XML") -> NFeImportJob:
+    return NFeImportJob.objects.create(kind=kind, filename=filename[:255], payload=zlib.compress(raw, 6))
+
+
+def requeue_stale() -> int:
+    """Devolve à fila jobs travados por workers que morreram no meio do processamento."""
+    limit = timezone.now() - datetime.timedelta(seconds=lock_timeout())
+    return NFeImportJob.objects.filter(status="PROCESSANDO", locked_at__lt=limit).update(
+        status="PENDENTE", locked_by="", locked_at=None, updated_at=timezone.now()
+    )
+
+
+def claim_next(worker: str) -> Optional[NFeImportJob]:
+    now = timezone.now()
+    candidates = (
+        NFeImportJob.objects.filter(status="PENDENTE", available_at__lte=now)
+        .order_by("available_at", "id")
+        .values_list("id", flat=True)[:5]
+    )
+    for job_id in candidates:
+        claimed = NFeImportJob.objects.filter(pk=job_id, status="PENDENTE").update(
+            status="PROCESSANDO",
+            locked_by=worker,
+            locked_at=now,
+            started_at=now,
+            finished_at=None,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return NFeImportJob.objects.get(pk=job_id)
+    return None
+
+
+def _progress(job: NFeImportJob, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    fields["updated_at"] = timezone.now()
+    NFeImportJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def _match_warnings(result: Dict[str, Any], prefix: str = "") -> List[str]:
+    return [
+        f"{prefix}Linha {m['line']} ({m['name']}): vínculo de produto aguardando revisão"
+        for m in result.get("matches", [])
+        if m["action"] == "review"
+    ]
+
+
+def _run_xml(job: NFeImportJob) -> Dict[str, Any]:
+    raw = job.raw()
+    if known_access_keys([scan_access_key(raw)]):
+        raise DuplicateInvoiceError(DUPLICATE_KEY_MESSAGE)
+    xml_text = raw.decode("utf-8", errors="ignore")
+    doc = parse_nfe(xml_text)
+    _progress(job, total_items=len(doc.items))
+    result = write_nfe(doc, xml_text)
+    _progress(
+        job,
+        processed_items=len(doc.items),
+        created_products=len(result["created_products"]),
+        warnings=_match_warnings(result)[:MAX_WARNINGS],
+    )
+    return result
+
+
+def _run_batch(job: NFeImportJob) -> Dict[str, Any]:
+    sources = sources_from_zip(io.BytesIO(job.raw()))
+    _progress(job, total_items=len(sources))
+    state = {"processed": 0, "created": 0, "warnings": []}
+
+    def on_file(row: Dict[str, Any]):
+        state["processed"] += 1
+        state["created"] += len(row.get("created_products", []))
+        if row["status"] != "imported":
+            state["warnings"].append(f"{row['file']}: {row.get('detail', row['status'])}")
+        state["warnings"].extend(_match_warnings(row, prefix=f"{row['file']}: "))
+        _progress(
+            job,
+            processed_items=state["processed"],
+            created_products=state["created"],
+            warnings=state["warnings"][:MAX_WARNINGS],
+        )
+
+    return import_nfe_batch(sources, on_file=on_file)
+
+
+def run_job(job: NFeImportJob) -> NFeImportJob:
+    """Processa um job já reservado. Erro transitório de banco devolve o job à fila com espera crescente."""
+    started = time.perf_counter()
+    try:
+        result = _run_batch(job) if job.kind == "LOTE" else _run_xml(job)
+    except Exception as exc:
+        now = timezone.now()
+        if is_transient_db_error(exc) and job.attempts < max_attempts():
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+            log.warning("[nfe_job] %s erro transitório, nova tentativa em %ss: %s", job.uuid, delay, exc)
+            _progress(
+                job, status="PENDENTE", locked_by="", locked_at=None,
+                available_at=now + datetime.timedelta(seconds=delay), error=str(exc),
+            )
+            return job
+        if not isinstance(exc, ValueError):
+            log.exception("[nfe_job] %s falhou", job.uuid)
+        _progress(job, status="ERRO", error=str(exc) or exc.__class__.__name__, finished_at=now, locked_by="", locked_at=None)
+        return job
+    _progress(job, status="CONCLUIDO", result=result, error="", payload=b"", finished_at=timezone.now(), locked_by="", locked_at=None)
+    log.info("[nfe_job] %s concluído em %.2fs", job.uuid, time.perf_counter() - started)
+    return job
+
+
+def _queue_empty() -> bool:
+    # Jobs aguardando nova tentativa ainda contam: once=True espera por eles
+    return not NFeImportJob.objects.filter(status="PENDENTE").exists()
+
+
+def run_worker(once: bool = False, poll_interval: float = 1.0, stop: Optional[threading.Event] = None) -> int:
+    """Laço do worker: executa jobs até a fila esvaziar (once=True) ou até `stop` ser sinalizado.
+
+    Retorna quantas execuções fez (uma nova tentativa conta de novo).
+    """
+    worker = worker_id()
+    processed = 0
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        if not connection.in_atomic_block:
+            # Processo de longa duração: descarta conexões quebradas ou além do CONN_MAX_AGE
+            close_old_connections()
+        try:
+            requeue_stale()
+            job = claim_next(worker)
+        except Exception as exc:
+            if not is_transient_db_error(exc):
+                raise
+            log.warning("[nfe_job] fila indisponível: %s", exc)
+            job = None
+        if job is None:
+            if once and _queue_empty():
+                break
+            stop.wait(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
+
@@ -0,0 +1,129 @@
+"""Resumo de parcelas a pagar (InstallmentSummaryView).
+
+Uma consulta agrupada por (fornecedor, status) com agregações condicionais cobre totais,
+status, atraso, janelas de vencimento e faixas de atraso; uma segunda traz os meses seguintes.
+O resultado fica em cache por (fornecedor, data) e a versão do cache muda a cada escrita em
+parcelas, notas ou fornecedores (signals + chamadas explícitas após bulk_create/update).
+"""
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from ..models import PurchaseInstallment
+
+CACHE_SECONDS = 300
+VERSION_KEY = "purchase:installment-summary:version"
+# Faixas com contagem e soma condicionais (filtros em _buckets)
+BUCKETS = ("overdue", "in_7", "in_30", "overdue_1_7", "overdue_8_30", "overdue_gt_30")
+
+
+def bump_summary_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def _version() -> int:
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def _buckets(ref_date: datetime.date) -> Dict[str, Q]:
+    days = datetime.timedelta
+    return {
+        "overdue": Q(due_date__lt=ref_date),
+        "in_7": Q(status="PENDENTE", due_date__gte=ref_date, due_date__lte=ref_date + days(7)),
+        "in_30": Q(status="PENDENTE", due_date__gt=ref_date + days(7), due_date__lte=ref_date + days(30)),
+        "overdue_1_7": Q(due_date__lt=ref_date, due_date__gte=ref_date - days(7)),
+        "overdue_8_30": Q(due_date__lt=ref_date - days(7), due_date__gte=ref_date - days(30)),
+        "overdue_gt_30": Q(due_date__lt=ref_date - days(30)),
+    }
+
+
+def _money(value):
+    # Mesmo formato do resumo anterior: soma vazia ou zerada vira 0
+    return value or 0
+
+
+def compute_summary(supplier_id: Optional[str], ref_date: datetime.date) -> Dict[str, Any]:
+    qs = PurchaseInstallment.objects.all()
+    if supplier_id:
+        qs = qs.filter(invoice__supplier_id=supplier_id)
+
+    aggregates: Dict[str, Any] = {"total_count": Count("id"), "total_value": Sum("value")}
+    for name, cond in _buckets(ref_date).items():
+        aggregates[f"{name}_count"] = Count("id", filter=cond)
+        aggregates[f"{name}_value"] = Sum("value", filter=cond)
+    rows = list(
+        qs.values("invoice__supplier_id", "invoice__supplier__corporate_name", "status").annotate(**aggregates).order_by()
+    )
+
+    zero = Decimal("0")
+    totals = {"total_count": 0, "total_value": zero}
+    totals.update({f"{b}_count": 0 for b in BUCKETS})
+    totals.update({f"{b}_value": zero for b in BUCKETS})
+    by_status: Dict[str, Dict[str, Any]] = {}
+    suppliers: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key] or 0
+        st = by_status.setdefault(row["status"], {"count": 0, "value": zero})
+        st["count"] += row["total_count"]
+        st["value"] += row["total_value"] or zero
+        sup = suppliers.setdefault(
+            row["invoice__supplier_id"],
+            {
+                "supplier_id": row["invoice__supplier_id"],
+                "supplier_name": row["invoice__supplier__corporate_name"],
+                "count": 0,
+                "value": zero,
+                "overdue_count": 0,
+                "overdue_value": zero,
+            },
+        )
+        sup["count"] += row["total_count"]
+        sup["value"] += row["total_value"] or zero
+        sup["overdue_count"] += row["overdue_count"]
+        sup["overdue_value"] += row["overdue_value"] or zero
+
+    monthly = (
+        qs.filter(due_date__gte=ref_date, due_date__lt=ref_date + datetime.timedelta(days=31 * 6))
+        .annotate(month=TruncMonth("due_date"))
+        .values("month")
+        .annotate(count=Count("id"), value=Sum("value"))
+        .order_by("month")
+    )
+
+    def bucket(name):
+        return {"count": totals[f"{name}_count"], "value": _money(totals[f"{name}_value"])}
+
+    return {
+        "total": {"count": totals["total_count"], "value": _money(totals["total_value"])},
+        "by_status": {k: {"count": v["count"], "value": _money(v["value"])} for k, v in sorted(by_status.items())},
+        "overdue": bucket("overdue"),
+        "suppliers": [
+            {**sup, "value": _money(sup["value"]), "overdue_value": _money(sup["overdue_value"])}
+            for sup in sorted(suppliers.values(), key=lambda s: (s["supplier_name"], s["supplier_id"]))
+        ],
+        "upcoming": {"7d": bucket("in_7"), "30d": bucket("in_30")},
+        "overdue_buckets": {"1-7": bucket("overdue_1_7"), "8-30": bucket("overdue_8_30"), ">30": bucket("overdue_gt_30")},
+        "monthly_next": [
+            {"month": row["month"].strftime("%Y-%m"), "count": row["count"], "value": _money(row["value"])}
+            for row in monthly
+        ],
+    }
+
+
+def installment_summary(supplier_id: Optional[str], ref_date: datetime.date) -> Dict[str, Any]:
+    key = f"purchase:installment-summary:{_version()}:{supplier_id or 'all'}:{ref_date.isoformat()}"
+    data = cache.get(key)
+    if data is None:
+        data = compute_summary(supplier_id, ref_date)
+        cache.set(key, data, CACHE_SECONDS)
+    return data
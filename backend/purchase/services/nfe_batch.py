@@ -0,0 +1,186 @@
+"""Importação de NF-e em lote (ZIP ou diretório).
+
+Parsing/normalização rodam num pool de processos; a gravação é feita por um único
+escritor, na ordem dos arquivos, uma transação por nota. Com um só escritor os
+lotes não disputam locks entre si (fornecedor, produto e estoque compartilhados).
+"""
+from __future__ import annotations
+
+import io
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from django.conf import settings
+
+from core.db import is_transient_db_error
+
+from .nfe_import import DUPLICATE_KEY_MESSAGE, DuplicateInvoiceError, known_access_keys, write_nfe
+from .nfe_parser import parse_nfe_source, scan_access_key
+
+log = logging.getLogger(__name__)
+
+Source = Tuple[str, bytes]
+
+
+def _max_files() -> int:
+    return int(getattr(settings, "NFE_BATCH_MAX_FILES", 2000))
+
+
+def sync_max_files() -> int:
+    """Acima disso o lote enviado pela API vai para a fila de jobs em vez de rodar na requisição."""
+    return int(getattr(settings, "NFE_BATCH_SYNC_MAX_FILES", 20))
+
+
+def _check_limit(count: int):
+    if count > _max_files():
+        raise ValueError(f"Lote excede o limite de {_max_files()} arquivos XML.")
+
+
+def sources_from_zip(fileobj: Union[str, Path, BinaryIO]) -> List[Source]:
+    """Lê os .xml de um ZIP (ordenados pelo nome)."""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ValueError("Arquivo ZIP inválido.")
+    with archive:
+        names = sorted(
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".xml") and not info.filename.startswith("__MACOSX/")
+        )
+        _check_limit(len(names))
+        return [(name, archive.read(name)) for name in names]
+
+
+def sources_from_dir(path: Union[str, Path]) -> List[Source]:
+    """Lê os .xml de um diretório, recursivamente (ordenados pelo caminho relativo)."""
+    root = Path(path)
+    files = sorted(p for p in root.rglob("*") if p.is_file() and p.suffix.lower() == ".xml")
+    _check_limit(len(files))
+    return [(str(p.relative_to(root)), p.read_bytes()) for p in files]
+
+
+def sources_from_uploads(files) -> List[Source]:
+    """Lê vários XMLs enviados (na ordem do envio), com o mesmo limite de arquivos do ZIP."""
+    _check_limit(len(files))
+    return [(f.name, f.read()) for f in files]
+
+
+def sources_to_zip(sources: List[Source]) -> bytes:
+    """Empacota os arquivos num ZIP, o formato que o worker de jobs lê."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, raw in sources:
+            zf.writestr(name, raw)
+    return buf.getvalue()
+
+
+def sources_from_path(path: Union[str, Path]) -> List[Source]:
+    p = Path(path)
+    if p.is_dir():
+        return sources_from_dir(p)
+    if p.is_file() and zipfile.is_zipfile(p):
+        return sources_from_zip(p)
+    raise ValueError("Informe um arquivo ZIP ou um diretório com XMLs.")
+
+
+# Tentativas de gravar uma nota quando o banco devolve erro transitório (lock, deadlock, conexão)
+WRITE_ATTEMPTS = 3
+
+
+def _write(data, xml_text: str) -> Dict[str, Any]:
+    for attempt in range(1, WRITE_ATTEMPTS + 1):
+        try:
+            return write_nfe(data, xml_text)
+        except Exception as exc:
+            if not is_transient_db_error(exc) or attempt == WRITE_ATTEMPTS:
+                raise
+            log.warning("[nfe_batch] erro transitório (tentativa %s): %s", attempt, exc)
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", errors="ignore")
+
+
+def _write_row(name: str, data, error: Optional[str], raw: bytes) -> Dict[str, Any]:
+    row: Dict[str, Any] = {"file": name}
+    if error is not None:
+        row.update(status="error", detail=error)
+        return row
+    try:
+        row.update(status="imported", **_write(data, _decode(raw)))
+    except DuplicateInvoiceError as exc:
+        row.update(status="duplicate", detail=str(exc))
+    except Exception as exc:
+        log.exception("[nfe_batch] falha ao gravar %s", name)
+        row.update(status="error", detail=str(exc))
+    return row
+
+
+def _parsed(sources: List[Source], workers: int, chunksize: int) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    if workers <= 1 or len(sources) <= 1:
+        yield from map(parse_nfe_source, sources)
+        return
+    # spawn: os workers não herdam conexões de banco nem threads do servidor;
+    # parse_nfe_source fica em nfe_parser, que não importa o Django
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # map preserva a ordem de entrada; o escritor consome enquanto o pool segue parseando
+        yield from pool.map(parse_nfe_source, sources, chunksize=chunksize)
+
+
+def import_nfe_batch(
+    sources: Iterable[Source],
+    workers: Optional[int] = None,
+    chunksize: int = 4,
+    on_file: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Importa várias NF-e e devolve o relatório por arquivo (imported/duplicate/error) e a vazão.
+
+    `on_file` recebe a linha do relatório de cada arquivo assim que ele é gravado (progresso de jobs).
+    """
+    sources = list(sources)
+    started = time.perf_counter()
+    # Pré-checagem pela chave de acesso: notas já importadas não vão para o pool de parsing
+    keys = {name: scan_access_key(raw) for name, raw in sources}
+    known = known_access_keys(keys.values())
+    to_parse = [(name, raw) for name, raw in sources if keys[name] not in known]
+
+    if workers is None:
+        workers = int(getattr(settings, "NFE_IMPORT_WORKERS", 0))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(to_parse) or 1))
+
+    files: List[Dict[str, Any]] = []
+    counts = {"imported": 0, "duplicate": 0, "error": 0}
+    parsed = _parsed(to_parse, workers, max(1, chunksize))
+    for name, raw in sources:
+        if keys[name] in known:
+            row = {"file": name, "status": "duplicate", "detail": DUPLICATE_KEY_MESSAGE}
+        else:
+            _, data, error = next(parsed)
+            row = _write_row(name, data, error, raw)
+        counts[row["status"]] += 1
+        files.append(row)
+        if on_file is not None:
+            on_file(row)
+    parsed.close()
+    elapsed = time.perf_counter() - started
+
+    log.info("[nfe_batch] %s arquivos em %.2fs (%s)", len(files), elapsed, counts)
+    return {
+        "total": len(files),
+        **counts,
+        "skipped_by_key": len(sources) - len(to_parse),
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "files_per_second": round(len(files) / elapsed, 2) if elapsed else 0.0,
+        "files": files,
+    }
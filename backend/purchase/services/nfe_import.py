@@ -1,22 +1,42 @@
 from __future__ import annotations
 
 import datetime
+import uuid
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 import logging
 
-import xmltodict
 from django.db import transaction
+from django.utils import timezone
 
 from catalog.models import Category, Brand, Product
+from catalog.services.matching import can_auto_link, index_products, normalize_name, rank_candidates_many
 from people.models import Supplier
-from stock.models import StockMovement
-from ..models import PurchaseInvoice, PurchaseInstallment, SupplierProduct
+from stock.models import Stock, StockMovement
+from ..models import (
+    ProductMatchReview,
+    PurchaseInstallment,
+    PurchaseInvoice,
+    PurchaseInvoiceItem,
+    PurchaseInvoiceXML,
+    SupplierProduct,
+)
 from django.conf import settings as s
 from core.pricing import apply_rounding
+from .installment_summary import bump_summary_version
+from .nfe_parser import NFeDocument, NFeItem, iter_items, parse_nfe, scan_access_key
 
 log = logging.getLogger(__name__)
 
+SUPPLIER_PRODUCT_FIELDS = [
+    "supplier_code", "universal_code", "barcode", "ncm", "cfop", "cest", "icms_cst", "icms_origem",
+    "ipi_cenq", "ipi_cst", "pis_cst", "pis_aliq", "cofins_cst", "cofins_aliq", "uCom", "uTrib",
+    "last_cost", "last_purchase_date",
+]
+ZERO = Decimal("0")
+# bulk_update gera um CASE por coluna; lotes menores evitam CASEs enormes (custo quadrático no SQLite)
+BULK_UPDATE_BATCH = 100
+
 
 def _ensure_default_catalog() -> tuple[Category, Brand]:
     cat, _ = Category.objects.get_or_create(name="Geral")
@@ -24,283 +44,459 @@ def _ensure_default_catalog() -> tuple[Category, Brand]:
     return cat, brand
 
 
-def _as_list(x):
-    if x is None:
-        return []
-    return x if isinstance(x, list) else [x]
+class DuplicateInvoiceError(ValueError):
+    """Nota já importada (mesma chave de acesso ou mesmo fornecedor/número/série)."""
+
+
+DUPLICATE_KEY_MESSAGE = "Nota fiscal já importada (chave de acesso)."
+
+
+def known_access_keys(keys) -> set:
+    keys = [k for k in keys if k]
+    if not keys:
+        return set()
+    return set(PurchaseInvoice.objects.filter(access_key__in=keys).values_list("access_key", flat=True))
 
 
-@transaction.atomic
 def import_nfe_xml(xml_text: str) -> Dict[str, Any]:
-    log.info("[nfe_import] start parse")
-    doc = xmltodict.parse(xml_text)
-    nfe = (
-        doc.get("nfeProc", {}).get("NFe")
-        or doc.get("NFe")
-    )
-    if not nfe:
-        raise ValueError("XML NFe inválido")
-
-    inf = nfe["infNFe"] if "infNFe" in nfe else nfe
-    ide = inf.get("ide", {})
-    emit = inf.get("emit", {})
-    det_list = _as_list(inf.get("det"))
-    cobr = inf.get("cobr", {})
-    dup_list = _as_list(cobr.get("dup"))
-    total = inf.get("total", {}).get("ICMSTot", {})
-
-    # Supplier
-    supplier_cnpj = (emit.get("CNPJ") or emit.get("CPF") or "").strip()
-    supplier_name = (emit.get("xNome") or "Fornecedor").strip()
+    # Reenvio da mesma nota: recusado pela chave antes de parsear o XML
+    if known_access_keys([scan_access_key(xml_text)]):
+        raise DuplicateInvoiceError(DUPLICATE_KEY_MESSAGE)
+    return write_nfe(parse_nfe(xml_text), xml_text)
+
+
+class _ProductMatcher:
+    """Mapas de busca de produto carregados uma vez por nota (barcode, cProd do fornecedor, nome).
+
+    Mantém a prioridade do import item a item: 1) barcode 2) SupplierProduct (fornecedor, cProd)
+    3) nome normalizado (Product.name_key). Produtos criados por linhas anteriores da mesma nota
+    entram nos mapas, como aconteceria com as consultas sequenciais.
+    """
+
+    def __init__(self, supplier: Supplier, items: List[NFeItem]):
+        self.products: Dict[int, Product] = {}
+        self.supplier_products: Dict[int, SupplierProduct] = {}
+        self.by_barcode: Dict[str, Product] = {}
+        self.by_code: Dict[str, Product] = {}
+        self.by_name: Dict[str, Product] = {}
+
+        barcodes = {i.barcode for i in items if i.barcode}
+        codes = {i.supplier_code for i in items if i.supplier_code}
+        names = {(i.name or "Produto") for i in items}
+        keys = {normalize_name(n) for n in names}
+        # order_by("id"): o primeiro de cada chave é o que .first() devolveria
+        if barcodes:
+            for p in Product.objects.filter(barcode__in=barcodes).order_by("id"):
+                self.by_barcode.setdefault(p.barcode, self.register(p))
+        if codes:
+            for sp in SupplierProduct.objects.select_related("product").filter(supplier=supplier, supplier_code__in=codes).order_by("id"):
+                self.supplier_products.setdefault(sp.product_id, sp)
+                self.by_code.setdefault(sp.supplier_code, self.register(sp.product))
+        for p in Product.objects.filter(name_key__in=keys).order_by("id"):
+            self.by_name.setdefault(p.name_key, self.register(p))
+
+    def register(self, product: Product) -> Product:
+        # Uma única instância por produto, mesmo vindo de consultas diferentes
+        if product.pk is None:
+            return product
+        return self.products.setdefault(product.pk, product)
+
+    def match(self, item: NFeItem) -> Optional[Product]:
+        product = None
+        if item.barcode:
+            product = self.by_barcode.get(item.barcode)
+        if product is None and item.supplier_code:
+            product = self.by_code.get(item.supplier_code)
+        if product is None:
+            product = self.by_name.get(normalize_name(item.name or "Produto"))
+        return product
+
+    def remember(self, item: NFeItem, product: Product):
+        if item.barcode:
+            self.by_barcode.setdefault(item.barcode, product)
+        if item.supplier_code:
+            self.by_code.setdefault(item.supplier_code, product)
+        self.by_name.setdefault(normalize_name(item.name or "Produto"), product)
+
+
+def _update_costs(product: Product, unit_cost: Decimal, qCom: Decimal, cur_qty: Decimal):
+    """Atualiza custos do produto (last e average) e sinaliza revisão de preço."""
+    product.last_cost_price = unit_cost
+    # média ponderada usando o estoque antes desta entrada
+    total_qty = cur_qty + qCom
+    if total_qty > 0:
+        # usa avg anterior se houver, senão cost_price
+        cur_avg = Decimal(str(product.avg_cost_price or product.cost_price or unit_cost))
+        new_avg = ((cur_avg * cur_qty) + (unit_cost * qCom)) / total_qty
+        # duas casas decimais
+        product.avg_cost_price = new_avg.quantize(Decimal("0.01"))
+    else:
+        product.avg_cost_price = unit_cost.quantize(Decimal("0.01"))
+    # Sinalizar revisão de preço conforme threshold ou condições operacionais
+    try:
+        threshold = Decimal(str(getattr(s, "PRICE_REVIEW_THRESHOLD", 0.05)))
+        basis = getattr(s, "PRICE_COST_BASIS", "last")
+        pricing_cost = unit_cost if basis == "last" else (product.avg_cost_price or unit_cost)
+        margin = Decimal(str(product.margin or 0))
+        if margin == 0:
+            suggested = Decimal("0.00")
+        else:
+            base = pricing_cost + (pricing_cost * (margin / Decimal("100")))
+            suggested = apply_rounding(base, getattr(s, "PRICE_ROUNDING", "none"))
+        price_diff_pct = None
+        if product.sale_price and product.sale_price != 0:
+            price_diff_pct = (Decimal(str(suggested)) - Decimal(str(product.sale_price))) / Decimal(str(product.sale_price))
+        cost_diff_pct = None
+        if product.avg_cost_price and product.avg_cost_price != 0:
+            cost_diff_pct = (unit_cost - Decimal(str(product.avg_cost_price))) / Decimal(str(product.avg_cost_price))
+        flag = False
+        if price_diff_pct is not None and abs(price_diff_pct) >= threshold:
+            flag = True
+        if not flag and cost_diff_pct is not None and abs(cost_diff_pct) >= threshold:
+            flag = True
+        # Regra adicional: produto sem margem/preço definido deve ir para revisão
+        if not flag and (margin == 0 or Decimal(str(product.sale_price or 0)) == 0):
+            flag = True
+        if flag:
+            product.needs_review = True
+            log.info("[price_review] flagged product id=%s sku=%s name=%s suggested=%s current=%s diff=%.4f",
+                     product.id, product.sku, product.name, suggested, product.sale_price, float(price_diff_pct or 0))
+    except Exception:
+        pass
+
+
+def _create_products(new_products: List[Product]):
+    """bulk_create com SKU provisório (único) e depois o SKU definitivo P + id, como Product.save faz."""
+    if not new_products:
+        return
+    cat, brand = _ensure_default_catalog()
+    for p in new_products:
+        p.category = cat
+        p.brand = brand
+        p.sku = f"TMP{uuid.uuid4().hex[:17]}"
+        p.name_key = normalize_name(p.name)
+        calc = p._calc_sale_price()
+        if calc is not None:
+            p.sale_price = calc
+    Product.objects.bulk_create(new_products)
+    for p in new_products:
+        p.sku = f"P{p.pk:06d}"
+    Product.objects.bulk_update(new_products, ["sku"], batch_size=BULK_UPDATE_BATCH)
+    index_products(new_products)
+
+
+def _lock_stocks(product_ids: List[int], needed: set) -> Dict[int, Stock]:
+    """Saldos das linhas da nota sob lock (ordem de product_id); cria os que faltam para entradas."""
+    stocks = {st.product_id: st for st in Stock.objects.select_for_update().filter(product_id__in=product_ids).order_by("product_id")}
+    missing = sorted(needed - set(stocks))
+    if missing:
+        Stock.objects.bulk_create([Stock(product_id=pid) for pid in missing], ignore_conflicts=True)
+        stocks.update(
+            {st.product_id: st for st in Stock.objects.select_for_update().filter(product_id__in=missing).order_by("product_id")}
+        )
+    return stocks
+
+
+def invoice_item_rows(inv: PurchaseInvoice, lines) -> List[PurchaseInvoiceItem]:
+    """Linhas normalizadas da nota, na ordem do XML: [(NFeItem, produto ou None)] -> PurchaseInvoiceItem."""
+    return [
+        PurchaseInvoiceItem(
+            invoice=inv,
+            line=position,
+            supplier_id=inv.supplier_id,
+            issue_date=inv.issue_date or timezone.localdate(inv.created_at),
+            product=product,
+            supplier_code=item.supplier_code,
+            name=item.name[:200],
+            barcode=item.barcode,
+            universal_code=item.universal_code,
+            ncm=item.ncm,
+            cfop=item.cfop,
+            uCom=item.uCom,
+            quantity=item.quantity,
+            unit_cost=item.unit_cost,
+            total_value=item.total_value,
+        )
+        for position, (item, product) in enumerate(lines, start=1)
+    ]
+
+
+def _record_matches(inv: PurchaseInvoice, supplier: Supplier, fuzzy) -> List[Dict[str, Any]]:
+    """Resultado da busca por similaridade de cada linha; abaixo do limite de vínculo automático vai para revisão."""
+    matches, reviews = [], []
+    for item, product, ranked in fuzzy:
+        candidates = [{"product_id": c["product_id"], "name": c["name"], "score": c["score"]} for c in ranked]
+        if candidates and candidates[0]["product_id"] == product.id:
+            action = "linked"
+        elif candidates:
+            action = "review"
+            reviews.append(
+                ProductMatchReview(
+                    invoice=inv,
+                    supplier=supplier,
+                    supplier_code=item.supplier_code,
+                    item_name=(item.name or "Produto")[:200],
+                    product=product,
+                    score=Decimal(str(candidates[0]["score"])),
+                    candidates=candidates,
+                )
+            )
+        else:
+            action = "created"
+        matches.append(
+            {
+                "line": item.number,
+                "name": item.name,
+                "action": action,
+                "product_id": product.id,
+                "score": candidates[0]["score"] if candidates else None,
+                "candidates": candidates,
+            }
+        )
+    ProductMatchReview.objects.bulk_create(reviews)
+    return matches
+
+
+@transaction.atomic
+def write_nfe(data: NFeDocument, xml_text: str) -> Dict[str, Any]:
+    """Grava a NF-e já normalizada por parse_nfe (fornecedor, nota, itens, estoque e parcelas).
+
+    As buscas de produto/fornecedor/estoque são feitas por IN uma vez por nota e as gravações em bulk,
+    então o número de consultas não cresce com a quantidade de linhas.
+    """
     supplier, sup_created = Supplier.objects.get_or_create(
-        cnpj="".join(ch for ch in supplier_cnpj if ch.isdigit()).zfill(14)[:14],
-        defaults={"corporate_name": supplier_name},
+        cnpj=data.supplier_cnpj,
+        defaults={"corporate_name": data.supplier_name},
     )
     log.info("[nfe_import] supplier %s (created=%s)", supplier.id, sup_created)
 
-    # Invoice
-    number = ide.get("nNF") or "0"
-    series = str(ide.get("serie") or "")
-    issue_raw = ide.get("dhEmi") or ide.get("dEmi")
-    if issue_raw:
-        try:
-            issue_date = datetime.date.fromisoformat(issue_raw[:10])
-        except Exception:
-            issue_date = None
-    else:
-        issue_date = None
-    vNF = Decimal(str(total.get("vNF") or "0"))
+    number = data.number
+    series = data.series
+    issue_date = data.issue_date
+    vNF = data.total_value
 
     # Prevent duplicates
-    existing = PurchaseInvoice.objects.filter(supplier=supplier, number=str(number), series=series).first()
-    if existing:
+    if data.access_key and PurchaseInvoice.objects.filter(access_key=data.access_key).exists():
+        raise DuplicateInvoiceError(DUPLICATE_KEY_MESSAGE)
+    if PurchaseInvoice.objects.filter(supplier=supplier, number=number, series=series).exists():
         log.warning("[nfe_import] duplicate invoice supplier=%s number=%s series=%s", supplier.id, number, series)
-        raise ValueError("Nota fiscal já importada para este fornecedor (número/série).")
+        raise DuplicateInvoiceError("Nota fiscal já importada para este fornecedor (número/série).")
 
     inv = PurchaseInvoice.objects.create(
-        number=str(number),
+        number=number,
         series=series,
         supplier=supplier,
         issue_date=issue_date,
         total_value=vNF,
-        xml=xml_text,
+        access_key=data.access_key or None,
     )
+    PurchaseInvoiceXML.pack(inv, xml_text).save(force_insert=True)
     log.info("[nfe_import] invoice created id=%s number=%s series=%s total=%s", inv.id, number, series, vNF)
 
-    # Catalog defaults
-    cat, brand = _ensure_default_catalog()
-
-    # Items
-    created_products: List[int] = []
-    for det in det_list:
-        prod = det.get("prod", {})
-        imposto = det.get("imposto", {})
-        q_raw = Decimal(str(prod.get("qCom") or "0"))
-        # Normalize quantity to 3 decimal places to satisfy StockMovement constraint
-        qCom = q_raw.quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
-        cProd = str(prod.get("cProd") or "").strip()
-        xProd = str(prod.get("xProd") or "Produto").strip()
-        barcode = str(prod.get("cEAN") or "").strip()
-        ncm = str(prod.get("NCM") or "").strip()
-        cfop = str(prod.get("CFOP") or "").strip()
-        cest = str(prod.get("CEST") or "").strip()
-        uCom = str(prod.get("uCom") or "UN").strip()
-        uTrib = str(prod.get("uTrib") or uCom).strip()
-
-        # Taxes
-        icms = imposto.get("ICMS", {})
-        # ICMS can be nested like ICMS -> ICMS00 -> orig, CST
-        if isinstance(icms, dict) and len(icms) == 1:
-            icms = list(icms.values())[0]
-        icms_origem = str(icms.get("orig") or "").strip()
-        icms_cst = str(icms.get("CST") or icms.get("CSOSN") or "").strip()
-
-        ipi = imposto.get("IPI", {})
-        if isinstance(ipi, dict) and len(ipi) == 1 and isinstance(list(ipi.values())[0], dict):
-            # e.g. IPI -> IPITrib or IPINT
-            ipi_data = list(ipi.values())[0]
-        else:
-            ipi_data = ipi or {}
-        ipi_cenq = str(ipi.get("cEnq") or ipi_data.get("cEnq") or "").strip()
-        ipi_cst = str(ipi_data.get("CST") or "").strip()
-
-        pis = imposto.get("PIS", {})
-        if isinstance(pis, dict) and len(pis) == 1:
-            pis = list(pis.values())[0]
-        pis_cst = str(pis.get("CST") or "").strip()
-        pis_aliq = Decimal(str(pis.get("pPIS") or 0))
-
-        cofins = imposto.get("COFINS", {})
-        if isinstance(cofins, dict) and len(cofins) == 1:
-            cofins = list(cofins.values())[0]
-        cofins_cst = str(cofins.get("CST") or "").strip()
-        cofins_aliq = Decimal(str(cofins.get("pCOFINS") or 0))
-
-        # Product: avoid duplicates. Try matches in this order:
-        # 1) barcode
-        # 2) SupplierProduct by (supplier, supplier_code)
-        # 3) Product by exact name (case-insensitive)
-        product = None
-        if barcode:
-            product = Product.objects.filter(barcode=barcode).first()
-        if product is None and cProd:
-            sp_match = SupplierProduct.objects.select_related("product").filter(supplier=supplier, supplier_code=cProd).first()
-            if sp_match and sp_match.product_id:
-                product = sp_match.product
+    # Product: avoid duplicates (barcode, SupplierProduct, nome), resolvido com os mapas pré-carregados
+    matcher = _ProductMatcher(supplier, data.items)
+    lines = []
+    new_products: List[Product] = []
+    fuzzy = []
+    # Último recurso: similaridade de nome (trigramas), calculada de uma vez para as linhas sem match exato
+    candidates = rank_candidates_many(item.name or "Produto" for item in data.items if matcher.match(item) is None)
+    for item in data.items:
+        product = matcher.match(item)
+        ranked = None
         if product is None:
-            product = Product.objects.filter(name__iexact=xProd).first()
+            ranked = candidates[normalize_name(item.name or "Produto")]
+            if ranked and can_auto_link(ranked[0]):
+                product = matcher.register(ranked[0]["product"])
         if product is None:
-            product = Product.objects.create(
-                name=xProd,
+            product = Product(
+                name=item.name or "Produto",
                 description="",
-                category=cat,
-                brand=brand,
-                cost_price=Decimal(str(prod.get("vUnCom") or 0)),
+                cost_price=item.unit_cost,
                 margin=Decimal("0"),
-                barcode=barcode or "",
+                barcode=item.barcode or "",
             )
-            created_products.append(product.id)
-            log.info("[nfe_import] product created id=%s name=%s barcode=%s", product.id, xProd, barcode)
-        else:
-            log.info("[nfe_import] product matched id=%s (barcode=%s, cProd=%s)", product.id, barcode, cProd)
+            new_products.append(product)
+        if ranked is not None:
+            fuzzy.append((item, product, ranked))
+        matcher.remember(item, product)
+        lines.append((item, product))
+    _create_products(new_products)
+    matches = _record_matches(inv, supplier, fuzzy)
+    created_products: List[int] = [p.id for p in new_products]
+    for p in new_products:
+        log.info("[nfe_import] product created id=%s name=%s barcode=%s", p.id, p.name, p.barcode)
 
-        # SupplierProduct map
-        sp, sp_created = SupplierProduct.objects.update_or_create(
-            supplier=supplier,
-            product=product,
-            defaults={
-                "supplier_code": cProd,
-                "universal_code": str(prod.get("cEANTrib") or ""),
-                "barcode": barcode,
-                "ncm": ncm,
-                "cfop": cfop,
-                "cest": cest,
-                "icms_cst": icms_cst,
-                "icms_origem": icms_origem,
-                "ipi_cenq": ipi_cenq,
-                "ipi_cst": ipi_cst,
-                "pis_cst": pis_cst,
-                "pis_aliq": pis_aliq,
-                "cofins_cst": cofins_cst,
-                "cofins_aliq": cofins_aliq,
-                "uCom": uCom,
-                "uTrib": uTrib,
-                "last_cost": Decimal(str(prod.get("vUnCom") or 0)),
-                "last_purchase_date": issue_date or datetime.date.today(),
-            },
-        )
-        log.info("[nfe_import] supplier_product %s (created=%s)", sp.id, sp_created)
+    line_products: Dict[int, Product] = {p.id: p for _, p in lines}
+
+    # SupplierProduct dos produtos que casaram por barcode/nome e ainda não vieram pelo cProd
+    missing_sp = set(line_products) - set(matcher.supplier_products) - set(created_products)
+    if missing_sp:
+        for sp in SupplierProduct.objects.filter(supplier=supplier, product_id__in=missing_sp):
+            matcher.supplier_products[sp.product_id] = sp
+
+    stocks = _lock_stocks(sorted(line_products), {p.id for item, p in lines if item.quantity > 0})
+
+    now = timezone.now()
+    purchase_date = issue_date or datetime.date.today()
+    new_sps: List[SupplierProduct] = []
+    changed_sps: Dict[int, SupplierProduct] = {}
+    sp_fields: set = set()
+    movements: List[StockMovement] = []
+    for item, product in lines:
+        # Normalize quantity to 3 decimal places to satisfy StockMovement constraint
+        qCom = item.quantity.quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
+        unit_cost = item.unit_cost
+        uCom = item.uCom or "UN"
+
+        # SupplierProduct map (update_or_create em memória; a última linha do mesmo produto prevalece)
+        values = {
+            "supplier_code": item.supplier_code,
+            "universal_code": item.universal_code,
+            "barcode": item.barcode,
+            "ncm": item.ncm,
+            "cfop": item.cfop,
+            "cest": item.cest,
+            "icms_cst": item.icms_cst,
+            "icms_origem": item.icms_origem,
+            "ipi_cenq": item.ipi_cenq,
+            "ipi_cst": item.ipi_cst,
+            "pis_cst": item.pis_cst,
+            "pis_aliq": item.pis_aliq,
+            "cofins_cst": item.cofins_cst,
+            "cofins_aliq": item.cofins_aliq,
+            "uCom": uCom,
+            "uTrib": item.uTrib or uCom,
+            "last_cost": unit_cost,
+            "last_purchase_date": purchase_date,
+        }
+        sp = matcher.supplier_products.get(product.id)
+        if sp is None:
+            sp = SupplierProduct(supplier=supplier, product=product, **values)
+            matcher.supplier_products[product.id] = sp
+            new_sps.append(sp)
+        else:
+            changed = [field for field, value in values.items() if getattr(sp, field) != value]
+            for field in changed:
+                setattr(sp, field, values[field])
+            if sp.pk and changed:
+                sp.updated_at = now
+                changed_sps[sp.pk] = sp
+                sp_fields.update(changed)
 
         # Stock movement ENTRADA
+        stock = stocks.get(product.id)
+        cur_qty = (stock.quantity_current or ZERO) if stock else ZERO
         if qCom and qCom > 0:
-            StockMovement.objects.create(product=product, type="ENTRADA", quantity=qCom, reference=f"NF {number}")
-            log.info("[nfe_import] stock entry product=%s qty=%s", product.id, qCom)
-        # Atualizar custos do produto (last e average)
+            mv = StockMovement(product=product, type="ENTRADA", quantity=qCom, reference=f"NF {number}")
+            mv.clean()
+            movements.append(mv)
+            stock.quantity_current = cur_qty + qCom
         try:
-            unit_cost = Decimal(str(prod.get("vUnCom") or 0))
-            product.last_cost_price = unit_cost
-            # calcular média ponderada usando estoque atual antes desta entrada
-            from stock.models import Stock
-            cur_qty = Decimal("0")
-            try:
-                st = Stock.objects.get(product=product)
-                cur_qty = st.quantity_current or Decimal("0")
-            except Stock.DoesNotExist:
-                cur_qty = Decimal("0")
-            total_qty = (cur_qty or Decimal("0")) + (qCom or Decimal("0"))
-            if total_qty > 0:
-                # usa avg anterior se houver, senão cost_price
-                cur_avg = Decimal(str(product.avg_cost_price or product.cost_price or unit_cost))
-                new_avg = ((cur_avg * cur_qty) + (unit_cost * qCom)) / total_qty
-                # duas casas decimais
-                product.avg_cost_price = new_avg.quantize(Decimal("0.01"))
-            else:
-                product.avg_cost_price = unit_cost.quantize(Decimal("0.01"))
-            # Sinalizar revisão de preço conforme threshold ou condições operacionais
-            try:
-                threshold = Decimal(str(getattr(s, "PRICE_REVIEW_THRESHOLD", 0.05)))
-                basis = getattr(s, "PRICE_COST_BASIS", "last")
-                pricing_cost = unit_cost if basis == "last" else (product.avg_cost_price or unit_cost)
-                margin = Decimal(str(product.margin or 0))
-                if margin == 0:
-                    suggested = Decimal("0.00")
-                else:
-                    base = pricing_cost + (pricing_cost * (margin / Decimal("100")))
-                    suggested = apply_rounding(base, getattr(s, "PRICE_ROUNDING", "none"))
-                price_diff_pct = None
-                if product.sale_price and product.sale_price != 0:
-                    price_diff_pct = (Decimal(str(suggested)) - Decimal(str(product.sale_price))) / Decimal(str(product.sale_price))
-                cost_diff_pct = None
-                if product.avg_cost_price and product.avg_cost_price != 0:
-                    cost_diff_pct = (unit_cost - Decimal(str(product.avg_cost_price))) / Decimal(str(product.avg_cost_price))
-                flag = False
-                if price_diff_pct is not None and abs(price_diff_pct) >= threshold:
-                    flag = True
-                if not flag and cost_diff_pct is not None and abs(cost_diff_pct) >= threshold:
-                    flag = True
-                # Regra adicional: produto sem margem/preço definido deve ir para revisão
-                if not flag and (margin == 0 or Decimal(str(product.sale_price or 0)) == 0):
-                    flag = True
-                if flag:
-                    product.needs_review = True
-                    log.info("[price_review] flagged product id=%s sku=%s name=%s suggested=%s current=%s diff=%.4f",
-                             product.id, product.sku, product.name, suggested, product.sale_price, float(price_diff_pct or 0))
-            except Exception:
-                pass
-            product.save(update_fields=["last_cost_price", "avg_cost_price", "needs_review", "updated_at"])
+            _update_costs(product, unit_cost, qCom, cur_qty)
         except Exception:
             pass
 
+    SupplierProduct.objects.bulk_create(new_sps)
+    if changed_sps:
+        # Só as colunas que mudaram em alguma linha (em recompras, normalmente custo e data)
+        fields = [f for f in SUPPLIER_PRODUCT_FIELDS if f in sp_fields] + ["updated_at"]
+        SupplierProduct.objects.bulk_update(list(changed_sps.values()), fields, batch_size=BULK_UPDATE_BATCH)
+    StockMovement.objects.bulk_create(movements)
+    PurchaseInvoiceItem.objects.bulk_create(invoice_item_rows(inv, lines), batch_size=500)
+    touched = [stocks[pid] for pid in sorted({mv.product_id for mv in movements})]
+    for st in touched:
+        st.recalc_status()
+        st.updated_at = now
+    Stock.objects.bulk_update(touched, ["quantity_current", "status", "updated_at"], batch_size=BULK_UPDATE_BATCH)
+    for p in line_products.values():
+        p.updated_at = now
+    Product.objects.bulk_update(list(line_products.values()), ["last_cost_price", "avg_cost_price", "needs_review", "updated_at"], batch_size=BULK_UPDATE_BATCH)
+    log.info("[nfe_import] items=%s new_products=%s new_supplier_products=%s updated_supplier_products=%s stock_entries=%s",
+             len(lines), len(new_products), len(new_sps), len(changed_sps), len(movements))
+
     # Installments
-    for dup in dup_list:
-        nDup = str(dup.get("nDup") or "1")
-        dVenc = dup.get("dVenc")
-        vDup = Decimal(str(dup.get("vDup") or 0))
-        due = None
-        try:
-            if dVenc:
-                due = datetime.date.fromisoformat(dVenc)
-        except Exception:
-            due = None
-        PurchaseInstallment.objects.create(
-            invoice=inv, number=nDup, due_date=due or (issue_date or datetime.date.today()), value=vDup
-        )
-        log.info("[nfe_import] installment created nDup=%s value=%s", nDup, vDup)
+    PurchaseInstallment.objects.bulk_create(
+        [
+            PurchaseInstallment(
+                invoice=inv, number=dup.number, due_date=dup.due_date or (issue_date or datetime.date.today()), value=dup.value
+            )
+            for dup in data.installments
+        ]
+    )
+    if data.installments:
+        # bulk_create não dispara signals: invalida o resumo de parcelas quando a nota for confirmada
+        transaction.on_commit(bump_summary_version)
+
+    log.info("[nfe_import] finish invoice_id=%s items=%s", inv.id, len(data.items))
+    return {"invoice_id": inv.id, "created_products": created_products, "matches": matches}
 
-    log.info("[nfe_import] finish invoice_id=%s items=%s", inv.id, len(det_list))
-    return {"invoice_id": inv.id, "created_products": created_products}
+
+def _link_supplier_code(review: ProductMatchReview, product: Product):
+    mappings = SupplierProduct.objects.select_for_update().filter(supplier_id=review.supplier_id)
+    imported = mappings.filter(supplier_code=review.supplier_code, product_id=review.product_id).first()
+    target = mappings.filter(product=product).first()
+    if imported is None:
+        if target is None:
+            SupplierProduct.objects.create(supplier_id=review.supplier_id, product=product, supplier_code=review.supplier_code)
+        elif target.supplier_code != review.supplier_code:
+            target.supplier_code = review.supplier_code
+            target.save(update_fields=["supplier_code", "updated_at"])
+    elif target is None:
+        imported.product = product
+        imported.save(update_fields=["product", "updated_at"])
+    elif target.pk != imported.pk:
+        # (fornecedor, produto) é único: os dados da nota vão para o vínculo que já existia
+        for field in SUPPLIER_PRODUCT_FIELDS:
+            setattr(target, field, getattr(imported, field))
+        target.save(update_fields=SUPPLIER_PRODUCT_FIELDS + ["updated_at"])
+
+
+@transaction.atomic
+def resolve_match_review(review: ProductMatchReview, product: Optional[Product]) -> ProductMatchReview:
+    """Fecha a revisão: com `product`, o cProd do fornecedor passa a apontar para ele nas próximas notas.
+
+    O vínculo gravado pela importação (NCM, CFOP, unidades, último custo) é reaproveitado: passa para
+    `product` ou, se o fornecedor já tinha vínculo com ele, tem os campos copiados para esse vínculo.
+    O estoque já lançado no produto criado pela importação não é movido.
+    """
+    if product is None:
+        review.status = "DESCARTADO"
+    else:
+        if review.supplier_code:
+            _link_supplier_code(review, product)
+        review.status = "VINCULADO"
+        review.resolved_product = product
+    review.resolved_at = timezone.now()
+    review.save(update_fields=["status", "resolved_product", "resolved_at", "updated_at"])
+    return review
+
+
+def backfill_invoice_items(inv: PurchaseInvoice) -> int:
+    """Grava as linhas de uma nota importada antes de PurchaseInvoiceItem, casando produtos como o import."""
+    items = list(iter_items(inv.xml_text))
+    matcher = _ProductMatcher(inv.supplier, items)
+    rows = invoice_item_rows(inv, [(item, matcher.match(item)) for item in items])
+    PurchaseInvoiceItem.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
 
 
 def extract_items(xml_text: str) -> List[Dict[str, Any]]:
-    """Lightweight item extraction from stored XML just for display purposes."""
+    """Lightweight item extraction from stored XML just for display purposes (notas ainda sem PurchaseInvoiceItem)."""
     try:
-        doc = xmltodict.parse(xml_text)
-        nfe = (doc.get("nfeProc", {}).get("NFe") or doc.get("NFe"))
-        if not nfe:
-            return []
-        inf = nfe["infNFe"] if "infNFe" in nfe else nfe
-        det_list = inf.get("det")
-        if det_list is None:
-            return []
-        if not isinstance(det_list, list):
-            det_list = [det_list]
-        items: List[Dict[str, Any]] = []
-        for det in det_list:
-            prod = det.get("prod", {})
-            items.append(
-                {
-                    "cProd": str(prod.get("cProd") or ""),
-                    "xProd": str(prod.get("xProd") or ""),
-                    "qCom": str(prod.get("qCom") or "0"),
-                    "vUnCom": str(prod.get("vUnCom") or "0"),
-                    "vProd": str(prod.get("vProd") or "0"),
-                    "NCM": str(prod.get("NCM") or ""),
-                    "CFOP": str(prod.get("CFOP") or ""),
-                    "uCom": str(prod.get("uCom") or ""),
-                    "cEAN": str(prod.get("cEAN") or ""),
-                    "cEANTrib": str(prod.get("cEANTrib") or ""),
-                }
-            )
-        return items
+        return [
+            {
+                "cProd": item.supplier_code,
+                "xProd": item.name,
+                "qCom": str(item.quantity),
+                "vUnCom": str(item.unit_cost),
+                "vProd": str(item.total_value),
+                "NCM": item.ncm,
+                "CFOP": item.cfop,
+                "uCom": item.uCom,
+                "cEAN": item.barcode,
+                "cEANTrib": item.universal_code,
+            }
+            for item in iter_items(xml_text)
+        ]
     except Exception:
         return []
@@ -0,0 +1,281 @@
+"""Leitura e normalização do XML da NF-e, sem acesso ao banco.
+
+Parser em streaming (ElementTree.iterparse): cada `det` vira um NFeItem assim que
+termina de ser lido e o conteúdo do elemento é descartado, então notas com milhares
+de linhas não montam a árvore inteira em memória.
+
+Roda tanto no processo da requisição quanto nos workers do import em lote,
+por isso não importa nada do Django: os registros são dataclasses (picklable).
+"""
+from __future__ import annotations
+
+import datetime
+import io
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+XMLSource = Union[str, bytes]
+
+ROOT_TAGS = ("nfeProc", "NFe")
+# Grupos de cabeçalho lidos como {tag: texto} e descartados em seguida
+HEADER_TAGS = ("ide", "emit", "ICMSTot", "dup", "infProt")
+
+# Chave de acesso (44 dígitos): atributo Id="NFe..." do infNFe ou chNFe do protocolo
+_ACCESS_KEY_BYTES = re.compile(rb"""Id\s*=\s*["']NFe(\d{44})["']|<(?:\w+:)?chNFe>\s*(\d{44})\s*<""")
+_ACCESS_KEY_TEXT = re.compile(_ACCESS_KEY_BYTES.pattern.decode("ascii"))
+
+
+@dataclass
+class NFeItem:
+    """Uma linha `det` da nota (grupo prod + impostos), com os valores como vieram no XML."""
+
+    number: int
+    # prod
+    supplier_code: str = ""
+    name: str = ""
+    barcode: str = ""
+    universal_code: str = ""
+    ncm: str = ""
+    cfop: str = ""
+    cest: str = ""
+    uCom: str = ""
+    uTrib: str = ""
+    quantity: Decimal = Decimal("0")
+    unit_cost: Decimal = Decimal("0")
+    total_value: Decimal = Decimal("0")
+    # ICMS
+    icms_origem: str = ""
+    icms_cst: str = ""
+    # IPI
+    ipi_cenq: str = ""
+    ipi_cst: str = ""
+    # PIS / COFINS
+    pis_cst: str = ""
+    pis_aliq: Decimal = Decimal("0")
+    cofins_cst: str = ""
+    cofins_aliq: Decimal = Decimal("0")
+
+
+@dataclass
+class NFeInstallment:
+    number: str
+    due_date: Optional[datetime.date]
+    value: Decimal
+
+
+@dataclass
+class NFeDocument:
+    supplier_cnpj: str
+    supplier_name: str
+    number: str
+    series: str
+    issue_date: Optional[datetime.date]
+    total_value: Decimal
+    access_key: str = ""
+    items: List[NFeItem] = field(default_factory=list)
+    installments: List[NFeInstallment] = field(default_factory=list)
+
+
+_LOCAL_NAMES: Dict[str, str] = {}
+
+
+def _local(tag: str) -> str:
+    # NF-e real vem com xmlns="http://www.portalfiscal.inf.br/nfe"; poucas tags distintas, então memoriza
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = _LOCAL_NAMES[tag] = tag.rsplit("}", 1)[-1]
+    return name
+
+
+def _texts(elem: Optional[ET.Element]) -> Dict[str, str]:
+    if elem is None:
+        return {}
+    return {_local(child.tag): (child.text or "").strip() for child in elem}
+
+
+def _child(elem: Optional[ET.Element], name: str) -> Optional[ET.Element]:
+    if elem is None:
+        return None
+    for child in elem:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _tax_group(imposto: Optional[ET.Element], name: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """(campos diretos, campos do subgrupo) de ICMS/IPI/PIS/COFINS, ex.: ICMS -> ICMS00 -> {orig, CST}."""
+    tax = _child(imposto, name)
+    if tax is None:
+        return {}, {}
+    nested = next((_texts(child) for child in tax if len(child)), {})
+    return _texts(tax), nested
+
+
+def _dec(value: Optional[str]) -> Decimal:
+    return Decimal(value or "0")
+
+
+def _parse_date(raw):
+    if not raw:
+        return None
+    try:
+        return datetime.date.fromisoformat(raw[:10])
+    except Exception:
+        return None
+
+
+def _item(det: ET.Element) -> NFeItem:
+    prod = _texts(_child(det, "prod"))
+    imposto = _child(det, "imposto")
+    _, icms = _tax_group(imposto, "ICMS")
+    ipi, ipi_data = _tax_group(imposto, "IPI")
+    _, pis = _tax_group(imposto, "PIS")
+    _, cofins = _tax_group(imposto, "COFINS")
+    try:
+        number = int(det.get("nItem") or 0)
+    except ValueError:
+        number = 0
+    return NFeItem(
+        number=number,
+        supplier_code=prod.get("cProd", ""),
+        name=prod.get("xProd", ""),
+        barcode=prod.get("cEAN", ""),
+        universal_code=prod.get("cEANTrib", ""),
+        ncm=prod.get("NCM", ""),
+        cfop=prod.get("CFOP", ""),
+        cest=prod.get("CEST", ""),
+        uCom=prod.get("uCom", ""),
+        uTrib=prod.get("uTrib", ""),
+        quantity=_dec(prod.get("qCom")),
+        unit_cost=_dec(prod.get("vUnCom")),
+        total_value=_dec(prod.get("vProd")),
+        icms_origem=icms.get("orig", ""),
+        icms_cst=icms.get("CST") or icms.get("CSOSN", ""),
+        ipi_cenq=ipi.get("cEnq") or ipi_data.get("cEnq", ""),
+        ipi_cst=ipi_data.get("CST", ""),
+        pis_cst=pis.get("CST", ""),
+        pis_aliq=_dec(pis.get("pPIS")),
+        cofins_cst=cofins.get("CST", ""),
+        cofins_aliq=_dec(cofins.get("pCOFINS")),
+    )
+
+
+def is_valid_access_key(key: Optional[str]) -> bool:
+    """44 dígitos com dígito verificador módulo 11 (pesos 2..9 da direita para a esquerda)."""
+    if not key or len(key) != 44 or not key.isdigit():
+        return False
+    total = sum(int(digit) * (2 + i % 8) for i, digit in enumerate(reversed(key[:43])))
+    dv = 11 - total % 11
+    return int(key[43]) == (0 if dv >= 10 else dv)
+
+
+def scan_access_key(source: XMLSource) -> Optional[str]:
+    """Chave de acesso por busca direta no texto/bytes, sem montar o XML (pré-checagem de duplicidade)."""
+    regex = _ACCESS_KEY_TEXT if isinstance(source, str) else _ACCESS_KEY_BYTES
+    for match in regex.finditer(source):
+        key = match.group(1) or match.group(2)
+        if isinstance(key, bytes):
+            key = key.decode("ascii")
+        if is_valid_access_key(key):
+            return key
+    return None
+
+
+def _open(source: XMLSource):
+    if isinstance(source, str):
+        # Texto já decodificado: ignora o encoding declarado no prólogo
+        return io.BytesIO(source.encode("utf-8")), ET.XMLParser(encoding="utf-8")
+    return io.BytesIO(source), None
+
+
+def iter_records(source: XMLSource) -> Iterator[Tuple[str, Any]]:
+    """Percorre a nota em streaming.
+
+    Emite ("det", NFeItem), (grupo, {tag: texto}) para ide/emit/ICMSTot/dup/infProt, ("infNFe", Id)
+    e ("NFe", None) ao fechar a nota.
+    Só eventos "end": cada grupo é lido quando fecha e limpo logo em seguida.
+    """
+    stream, parser = _open(source)
+    elem = None
+    for _, elem in ET.iterparse(stream, events=("end",), parser=parser):
+        tag = _local(elem.tag)
+        if tag == "det":
+            yield "det", _item(elem)
+            elem.clear()
+        elif tag in HEADER_TAGS:
+            yield tag, _texts(elem)
+            elem.clear()
+        elif tag == "infNFe":
+            yield "infNFe", elem.get("Id") or ""
+        elif tag == "NFe":
+            yield "NFe", None
+    # O último "end" é o da raiz
+    if elem is None or _local(elem.tag) not in ROOT_TAGS:
+        raise ValueError("XML NFe inválido")
+
+
+def iter_items(source: XMLSource) -> Iterator[NFeItem]:
+    for kind, payload in iter_records(source):
+        if kind == "det":
+            yield payload
+
+
+def parse_nfe(source: XMLSource) -> NFeDocument:
+    """Extrai emitente, cabeçalho, itens e duplicatas da NF-e. Levanta ValueError se não for NF-e."""
+    ide: Dict[str, str] = {}
+    emit: Dict[str, str] = {}
+    total: Dict[str, str] = {}
+    items: List[NFeItem] = []
+    installments: List[NFeInstallment] = []
+    keys: List[str] = []
+    seen_nfe = False
+    for kind, payload in iter_records(source):
+        if kind == "det":
+            items.append(payload)
+        elif kind == "dup":
+            installments.append(
+                NFeInstallment(
+                    number=payload.get("nDup") or "1",
+                    due_date=_parse_date(payload.get("dVenc")),
+                    value=_dec(payload.get("vDup")),
+                )
+            )
+        elif kind == "ide":
+            ide = payload
+        elif kind == "emit":
+            emit = payload
+        elif kind == "ICMSTot":
+            total = payload
+        elif kind == "infNFe":
+            keys.append(payload[3:] if payload.startswith("NFe") else payload)
+        elif kind == "infProt":
+            keys.append(payload.get("chNFe", ""))
+        elif kind == "NFe":
+            seen_nfe = True
+    if not seen_nfe:
+        raise ValueError("XML NFe inválido")
+
+    supplier_cnpj = emit.get("CNPJ") or emit.get("CPF") or ""
+    return NFeDocument(
+        supplier_cnpj="".join(ch for ch in supplier_cnpj if ch.isdigit()).zfill(14)[:14],
+        supplier_name=emit.get("xNome") or "Fornecedor",
+        number=ide.get("nNF") or "0",
+        series=ide.get("serie", ""),
+        issue_date=_parse_date(ide.get("dhEmi") or ide.get("dEmi")),
+        total_value=_dec(total.get("vNF")),
+        access_key=next((k for k in keys if is_valid_access_key(k)), ""),
+        items=items,
+        installments=installments,
+    )
+
+
+def parse_nfe_source(source: Tuple[str, bytes]) -> Tuple[str, Optional[NFeDocument], Optional[str]]:
+    """Alvo do pool de processos no import em lote: (nome, bytes) -> (nome, documento, erro)."""
+    name, raw = source
+    try:
+        return name, parse_nfe(raw), None
+    except Exception as exc:
+        return name, None, str(exc) or exc.__class__.__name__
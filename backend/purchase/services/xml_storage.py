@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from django.db import connection, transaction
+
+from ..models import PurchaseInvoice, PurchaseInvoiceXML
+
+
+def legacy_xml_queryset():
+    """Notas com o XML ainda na coluna de texto."""
+    return PurchaseInvoice.objects.filter(xml_blob__isnull=True).exclude(xml="")
+
+
+def compress_batch(batch_size: int = 500) -> Dict[str, int]:
+    """Move um lote de XMLs para PurchaseInvoiceXML e esvazia a coluna legada."""
+    with transaction.atomic():
+        rows = list(legacy_xml_queryset().select_for_update().order_by("id").only("id", "xml")[:batch_size])
+        if not rows:
+            return {"invoices": 0, "raw_bytes": 0, "stored_bytes": 0}
+        blobs = [PurchaseInvoiceXML.pack(inv, inv.xml) for inv in rows]
+        PurchaseInvoiceXML.objects.bulk_create(blobs)
+        PurchaseInvoice.objects.filter(id__in=[inv.id for inv in rows]).update(xml="")
+    return {
+        "invoices": len(rows),
+        "raw_bytes": sum(b.size for b in blobs),
+        "stored_bytes": sum(len(b.payload) for b in blobs),
+    }
+
+
+def compress_legacy_xml(batch_size: int = 500) -> Dict[str, int]:
+    totals = {"invoices": 0, "raw_bytes": 0, "stored_bytes": 0}
+    while True:
+        done = compress_batch(batch_size)
+        if not done["invoices"]:
+            return totals
+        for key, value in done.items():
+            totals[key] += value
+
+
+def vacuum() -> bool:
+    """Devolve ao disco o espaço liberado (SQLite não encolhe o arquivo sozinho)."""
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cur:
+        cur.execute("VACUUM")
+    return True
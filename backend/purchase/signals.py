@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from people.models import Supplier
+from .models import PurchaseInstallment, PurchaseInvoice
+from .services.installment_summary import bump_summary_version
+
+
+@receiver(post_save, sender=PurchaseInstallment)
+@receiver(post_delete, sender=PurchaseInstallment)
+@receiver(post_save, sender=PurchaseInvoice)
+@receiver(post_delete, sender=PurchaseInvoice)
+@receiver(post_save, sender=Supplier)
+def invalidate_installment_summary(sender, **kwargs):
+    # Resumo em cache por (fornecedor, data): qualquer escrita troca a versão, após o commit
+    transaction.on_commit(bump_summary_version)
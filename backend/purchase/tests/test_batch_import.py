@@ -0,0 +1,129 @@
+import io
+import tempfile
+import zipfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+
+from purchase.models import NFeImportJob, PurchaseInvoice
+from purchase.services import nfe_batch
+from purchase.services.nfe_batch import import_nfe_batch
+from purchase.services.nfe_import import DuplicateInvoiceError, import_nfe_xml
+from purchase.services.nfe_parser import is_valid_access_key, parse_nfe_source
+from purchase.tests.test_import_xml import MIN_XML
+
+
+User = get_user_model()
+
+
+def _xml(number):
+    return MIN_XML.replace("<nNF>123</nNF>", f"<nNF>{number}</nNF>").encode("utf-8")
+
+
+def _keyed_xml(number):
+    base = f"35250158840448000284550010{number:09d}19022749"
+    key = next(k for k in (base + d for d in "0123456789") if is_valid_access_key(k))
+    return MIN_XML.replace("<nNF>123</nNF>", f"<nNF>{number}</nNF>").replace("<infNFe>", f'<infNFe Id="NFe{key}">'), key
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, raw in files:
+            zf.writestr(name, raw)
+    buf.seek(0)
+    buf.name = "lote.zip"
+    return buf
+
+
+class NFeBatchImportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    @override_settings(NFE_IMPORT_WORKERS=1)
+    def test_zip_endpoint_reports_each_file(self):
+        upload = _zip([("b.xml", _xml(2)), ("a.xml", _xml(1)), ("c.xml", _xml(1)), ("d.xml", b"<nada/>"), ("leia.txt", b"x")])
+        r = self.client.post("/api/v1/purchase/import-xml/batch/", {"file": upload}, format="multipart")
+        assert r.status_code == 200, r.content
+        data = r.json()
+        assert [(f["file"], f["status"]) for f in data["files"]] == [
+            ("a.xml", "imported"),
+            ("b.xml", "imported"),
+            ("c.xml", "duplicate"),
+            ("d.xml", "error"),
+        ]
+        assert (data["imported"], data["duplicate"], data["error"]) == (2, 1, 1)
+        assert "files_per_second" in data
+        assert PurchaseInvoice.objects.count() == 2
+
+    def test_invalid_zip_rejected(self):
+        upload = io.BytesIO(b"not a zip")
+        upload.name = "lote.zip"
+        r = self.client.post("/api/v1/purchase/import-xml/batch/", {"file": upload}, format="multipart")
+        assert r.status_code == 400
+
+    @override_settings(NFE_BATCH_MAX_FILES=3, NFE_BATCH_SYNC_MAX_FILES=2)
+    def test_xml_parts_limit_and_large_batches_are_queued(self):
+        def uploads(n):
+            files = []
+            for i in range(n):
+                f = io.BytesIO(_xml(20 + i))
+                f.name = f"nf{i}.xml"
+                files.append(f)
+            return {"xml": files}
+
+        r = self.client.post("/api/v1/purchase/import-xml/batch/", uploads(4), format="multipart")
+        assert r.status_code == 400 and "limite de 3" in r.json()["detail"]
+        # Na requisição, sem pool de processos
+        r = self.client.post("/api/v1/purchase/import-xml/batch/", uploads(2), format="multipart")
+        assert r.status_code == 200 and r.json()["workers"] == 1 and r.json()["imported"] == 2
+        # Acima do limite síncrono: vai para a fila mesmo sem async=1
+        r = self.client.post("/api/v1/purchase/import-xml/batch/", uploads(3), format="multipart")
+        assert r.status_code == 202 and r.json()["kind"] == "LOTE"
+        assert NFeImportJob.objects.get().filename == "3 arquivos"
+
+    def test_process_pool_keeps_file_order(self):
+        sources = [(f"{i:02d}.xml", _xml(i)) for i in range(6)]
+        report = import_nfe_batch(sources, workers=2, chunksize=1)
+        assert report["workers"] == 2
+        assert report["imported"] == 6
+        assert [f["file"] for f in report["files"]] == [name for name, _ in sources]
+        numbers = list(PurchaseInvoice.objects.order_by("id").values_list("number", flat=True))
+        assert numbers == [str(i) for i in range(6)]
+
+    def test_command_reads_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                Path(tmp, f"nf{i}.xml").write_bytes(_xml(10 + i))
+            out = StringIO()
+            call_command("import_nfe_batch", tmp, "--workers", "1", stdout=out)
+        assert PurchaseInvoice.objects.count() == 3
+        assert "importados: 3" in out.getvalue()
+
+    def test_known_access_keys_skip_parsing(self):
+        old, old_key = _keyed_xml(1)
+        new, new_key = _keyed_xml(2)
+        assert PurchaseInvoice.objects.get(pk=import_nfe_xml(old)["invoice_id"]).access_key == old_key
+        # Reenvio com outro número: recusado pela chave, sem parsear
+        with mock.patch("purchase.services.nfe_import.parse_nfe") as parse:
+            with self.assertRaises(DuplicateInvoiceError):
+                import_nfe_xml(old.replace("<nNF>1</nNF>", "<nNF>99</nNF>"))
+        parse.assert_not_called()
+
+        sources = [("old.xml", old.encode("utf-8")), ("new.xml", new.encode("utf-8")), ("new2.xml", new.encode("utf-8"))]
+        with mock.patch.object(nfe_batch, "parse_nfe_source", wraps=parse_nfe_source) as parse_source:
+            report = import_nfe_batch(sources, workers=1)
+        assert [call.args[0][0] for call in parse_source.call_args_list] == ["new.xml", "new2.xml"]
+        assert [f["status"] for f in report["files"]] == ["duplicate", "imported", "duplicate"]
+        assert report["skipped_by_key"] == 1
+        assert PurchaseInvoice.objects.filter(access_key=new_key).count() == 1
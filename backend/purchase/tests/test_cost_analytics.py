@@ -0,0 +1,115 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Brand, Product
+from people.models import Supplier
+from purchase.models import PurchaseInvoice, PurchaseInvoiceItem
+from purchase.services.cost_analytics import best_suppliers, cost_alerts
+from purchase.services.nfe_import import import_nfe_xml
+from purchase.tests.test_import_bulk import _det, _nfe
+
+
+User = get_user_model()
+D = datetime.date
+
+
+class CostAnalyticsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        self.cabo = Product.objects.create(name="Cabo", category=cat, brand=brand, cost_price="5.00", margin="10.00")
+        self.fita = Product.objects.create(name="Fita", category=cat, brand=brand, cost_price="5.00", margin="10.00")
+        self.alfa = Supplier.objects.create(corporate_name="Alfa", cnpj="11111111000111")
+        self.beta = Supplier.objects.create(corporate_name="Beta", cnpj="22222222000122")
+        self.seq = 0
+
+    def _buy(self, supplier, product, day, qty, cost):
+        self.seq += 1
+        inv = PurchaseInvoice.objects.create(number=str(self.seq), supplier=supplier, issue_date=day, total_value="0")
+        return PurchaseInvoiceItem.objects.create(
+            invoice=inv, line=1, supplier=supplier, issue_date=day, product=product,
+            quantity=Decimal(qty), unit_cost=Decimal(cost), total_value=Decimal(qty) * Decimal(cost),
+        )
+
+    def test_import_fills_supplier_and_issue_date(self):
+        result = import_nfe_xml(_nfe([_det("A1", "Cabo", "1", "2.00")]))
+        item = PurchaseInvoiceItem.objects.get(invoice_id=result["invoice_id"])
+        assert item.supplier.cnpj == "12345678000190"
+        assert item.issue_date == D(2025, 1, 15)
+
+    def test_cost_history_with_change_and_weighted_average(self):
+        self._buy(self.alfa, self.cabo, D(2025, 1, 10), "10", "10.00")
+        self._buy(self.beta, self.cabo, D(2025, 2, 1), "5", "9.00")
+        self._buy(self.alfa, self.cabo, D(2025, 3, 1), "30", "11.00")
+        self._buy(self.alfa, self.fita, D(2025, 3, 1), "1", "99.00")
+
+        r = self.client.get(f"/api/v1/purchase/analytics/cost-history/?product={self.cabo.id}")
+        assert r.status_code == 200, r.content
+        data = r.json()
+        history = [(h["supplier_name"], h["unit_cost"], h["previous_cost"], h["change_pct"]) for h in data["history"]]
+        assert history == [
+            ("Alfa", 10.0, None, None),
+            ("Beta", 9.0, None, None),
+            ("Alfa", 11.0, 10.0, 10.0),
+        ]
+        alfa = next(s for s in data["suppliers"] if s["supplier_name"] == "Alfa")
+        assert (alfa["purchases"], alfa["avg_cost"], alfa["last_cost"]) == (2, 10.75, 11.0)
+        assert [s["supplier_name"] for s in data["suppliers"]] == ["Beta", "Alfa"]
+
+        # A compra anterior ao período ainda serve de base para a variação
+        r = self.client.get(f"/api/v1/purchase/analytics/cost-history/?product={self.cabo.id}&date_from=2025-02-15")
+        data = r.json()
+        assert [(h["previous_cost"], h["change_pct"]) for h in data["history"]] == [(10.0, 10.0)]
+        assert [(s["supplier_name"], s["avg_cost"]) for s in data["suppliers"]] == [("Alfa", 11.0)]
+
+        assert self.client.get("/api/v1/purchase/analytics/cost-history/").status_code == 400
+        assert self.client.get("/api/v1/purchase/analytics/cost-history/?product=x").status_code == 400
+
+    def test_best_suppliers_ranks_per_product_in_one_query(self):
+        self._buy(self.alfa, self.cabo, D(2025, 3, 1), "10", "10.00")
+        self._buy(self.beta, self.cabo, D(2025, 3, 2), "10", "8.00")
+        self._buy(self.alfa, self.fita, D(2025, 3, 3), "1", "4.00")
+        self._buy(self.beta, self.fita, D(2025, 3, 3), "1", "5.00")
+        # Fora da janela: não conta
+        self._buy(self.alfa, self.cabo, D(2024, 1, 1), "100", "1.00")
+
+        with self.assertNumQueries(1):
+            result = best_suppliers(D(2025, 3, 31), days=60)
+        assert [(e["product_name"], e["best"]["supplier_name"]) for e in result] == [("Cabo", "Beta"), ("Fita", "Alfa")]
+        assert result[0]["savings_pct"] == 20.0
+        assert [s["rank"] for s in result[0]["suppliers"]] == [1, 2]
+
+        r = self.client.get(f"/api/v1/purchase/analytics/best-suppliers/?date=2025-03-31&days=60&product={self.fita.id}")
+        assert r.status_code == 200, r.content
+        assert [e["best"]["supplier_name"] for e in r.json()] == ["Alfa"]
+
+    def test_cost_alerts_compare_with_previous_purchase_of_same_supplier(self):
+        self._buy(self.alfa, self.cabo, D(2024, 12, 1), "1", "10.00")
+        self._buy(self.alfa, self.cabo, D(2025, 3, 1), "1", "12.00")  # +20% sobre compra fora da janela
+        self._buy(self.beta, self.cabo, D(2025, 3, 1), "1", "12.50")  # primeira do fornecedor: sem base
+        self._buy(self.alfa, self.fita, D(2025, 2, 1), "1", "5.00")
+        self._buy(self.alfa, self.fita, D(2025, 3, 5), "1", "5.20")  # +4%
+        self._buy(self.alfa, self.fita, D(2025, 3, 10), "1", "4.00")  # queda de ~23%
+
+        with self.assertNumQueries(1):
+            alerts = cost_alerts(D(2025, 3, 31), days=30, threshold=10)
+        assert [(a["product_name"], a["change_pct"], a["direction"]) for a in alerts] == [
+            ("Fita", -23.08, "queda"),
+            ("Cabo", 20.0, "alta"),
+        ]
+        assert alerts[1]["previous_date"] == D(2024, 12, 1)
+
+        r = self.client.get("/api/v1/purchase/analytics/cost-alerts/?date=2025-03-31&days=30&threshold=3")
+        assert r.status_code == 200, r.content
+        assert len(r.json()) == 3
+        assert self.client.get("/api/v1/purchase/analytics/cost-alerts/?date=31/03").status_code == 400
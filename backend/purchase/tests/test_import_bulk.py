@@ -0,0 +1,89 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from catalog.models import Category, Brand, Product
+from people.models import Supplier
+from purchase.management.commands.benchmark_nfe_parser import DET_TEMPLATE, build_sample_nfe
+from purchase.models import SupplierProduct
+from purchase.services.nfe_import import import_nfe_xml
+from stock.models import Stock, StockMovement
+
+
+def _nfe(dets, number="1", cnpj="12345678000190"):
+    return (
+        "<nfeProc><NFe><infNFe>"
+        f"<ide><nNF>{number}</nNF><serie>1</serie><dhEmi>2025-01-15T12:00:00-03:00</dhEmi></ide>"
+        f"<emit><CNPJ>{cnpj}</CNPJ><xNome>Fornecedor</xNome></emit>"
+        f"{''.join(dets)}<total><ICMSTot><vNF>100.00</vNF></ICMSTot></total>"
+        "</infNFe></NFe></nfeProc>"
+    )
+
+
+def _det(code, name, qty, cost, barcode=""):
+    return (
+        f"<det><prod><cProd>{code}</cProd><cEAN>{barcode}</cEAN><xProd>{name}</xProd>"
+        f"<uCom>UN</uCom><qCom>{qty}</qCom><vUnCom>{cost}</vUnCom></prod></det>"
+    )
+
+
+class NFeBulkImportTest(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="A")
+        self.brand = Brand.objects.create(name="B")
+        self.supplier = Supplier.objects.create(corporate_name="Fornecedor", cnpj="12345678000190")
+
+    def _product(self, name, **kwargs):
+        return Product.objects.create(name=name, category=self.cat, brand=self.brand, cost_price="5.00", margin="10.00", **kwargs)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        # Primeira nota cria fornecedor, categoria/marca padrão e o catálogo; as seguintes só casam itens existentes
+        import_nfe_xml(build_sample_nfe(60).replace("<nNF>1</nNF>", "<nNF>0</nNF>"))
+        counts = []
+        for number, lines in ((1, 5), (2, 60)):
+            xml = build_sample_nfe(lines).replace("<nNF>1</nNF>", f"<nNF>{number}</nNF>")
+            with CaptureQueriesContext(connection) as ctx:
+                import_nfe_xml(xml)
+            counts.append(len(ctx.captured_queries))
+        # 12x mais linhas: só os lotes de INSERT/UPDATE do SQLite podem acrescentar consultas
+        assert counts[1] <= counts[0] + 3, counts
+        assert counts[1] < 40, counts
+        assert Product.objects.filter(sku__startswith="TMP").count() == 0
+        assert StockMovement.objects.count() == 125
+
+    def test_matching_priority_and_repeated_lines(self):
+        by_barcode = self._product("Por barcode", barcode="7890000000001")
+        by_code = self._product("Por codigo")
+        SupplierProduct.objects.create(supplier=self.supplier, product=by_code, supplier_code="SUP-2")
+        by_name = self._product("Cabo HDMI")
+        xml = _nfe(
+            [
+                _det("X1", "Outro nome", "1", "5.00", barcode="7890000000001"),
+                _det("SUP-2", "Nome diferente", "2", "5.00"),
+                _det("X3", "cabo hdmi", "3", "5.00"),
+                _det("NOVO", "Produto Novo", "4", "8.00"),
+                _det("NOVO", "Produto Novo", "1", "8.00"),
+            ]
+        )
+        result = import_nfe_xml(xml)
+        new = Product.objects.get(name="Produto Novo")
+        assert result["created_products"] == [new.id]
+        assert new.sku == f"P{new.id:06d}"
+        assert new.needs_review is True
+        qty = dict(Stock.objects.values_list("product_id", "quantity_current"))
+        assert qty == {by_barcode.id: Decimal("1"), by_code.id: Decimal("2"), by_name.id: Decimal("3"), new.id: Decimal("5")}
+        assert SupplierProduct.objects.get(supplier=self.supplier, product=by_name).supplier_code == "X3"
+        assert SupplierProduct.objects.filter(supplier=self.supplier, product=new).count() == 1
+
+    def test_average_cost_uses_stock_before_entry(self):
+        product = self._product("Mouse")
+        Product.objects.filter(pk=product.pk).update(avg_cost_price=Decimal("5.00"))
+        StockMovement.objects.create(product=product, type="ENTRADA", quantity=Decimal("10"))
+        import_nfe_xml(_nfe([_det("M1", "Mouse", "10", "10.00")]))
+        product.refresh_from_db()
+        # (5 * 10 + 10 * 10) / 20
+        assert product.avg_cost_price == Decimal("7.50")
+        assert product.last_cost_price == Decimal("10.00")
+        assert product.stock.quantity_current == Decimal("20")
@@ -0,0 +1,101 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from purchase.models import NFeImportJob, PurchaseInvoice
+from purchase.services import import_jobs
+from purchase.services.import_jobs import run_worker
+from purchase.tests.test_batch_import import _xml, _zip
+from purchase.tests.test_import_xml import MIN_XML
+
+
+User = get_user_model()
+
+
+class NFeImportJobTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_async_upload_returns_job_and_worker_reports_progress(self):
+        r = self.client.post("/api/v1/purchase/import-xml/?async=1", {"xml_text": MIN_XML}, format="json")
+        assert r.status_code == 202, r.content
+        job_id = r.json()["id"]
+        assert r.json()["status"] == "PENDENTE"
+        assert PurchaseInvoice.objects.count() == 0
+
+        out = StringIO()
+        call_command("run_import_worker", "--once", stdout=out)
+        assert "Jobs processados: 1" in out.getvalue()
+
+        r2 = self.client.get(f"/api/v1/purchase/import-jobs/{job_id}/")
+        assert r2.status_code == 200, r2.content
+        job = r2.json()
+        assert job["status"] == "CONCLUIDO"
+        assert (job["total_items"], job["processed_items"], job["created_products"]) == (1, 1, 1)
+        assert job["duration_s"] is not None
+        assert job["result"]["invoice_id"] == PurchaseInvoice.objects.get().id
+        assert NFeImportJob.objects.get(uuid=job_id).payload in (b"", memoryview(b""))
+
+    @override_settings(NFE_IMPORT_WORKERS=1)
+    def test_async_batch_counts_files(self):
+        upload = _zip([("a.xml", _xml(1)), ("b.xml", _xml(2)), ("c.xml", _xml(1))])
+        r = self.client.post("/api/v1/purchase/import-xml/batch/?async=1", {"file": upload}, format="multipart")
+        assert r.status_code == 202, r.content
+        assert run_worker(once=True) == 1
+        job = NFeImportJob.objects.get(uuid=r.json()["id"])
+        assert (job.status, job.total_items, job.processed_items, job.created_products) == ("CONCLUIDO", 3, 3, 1)
+        assert job.result["imported"] == 2
+        assert len(job.warnings) == 1 and job.warnings[0].startswith("c.xml:")
+
+    @override_settings(NFE_JOB_MAX_ATTEMPTS=2)
+    def test_transient_errors_are_retried_then_fail(self):
+        job = import_jobs.enqueue_import(MIN_XML.encode("utf-8"))
+        with mock.patch.object(import_jobs, "write_nfe", side_effect=OperationalError("database is locked")):
+            import_jobs.run_job(import_jobs.claim_next("teste"))
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == ("PENDENTE", 1)
+        assert job.available_at > timezone.now()
+
+        NFeImportJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+        assert run_worker(once=True) == 1
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == ("CONCLUIDO", 2)
+
+        failing = import_jobs.enqueue_import(MIN_XML.replace("<nNF>123</nNF>", "<nNF>9</nNF>").encode("utf-8"))
+        with mock.patch.object(import_jobs, "RETRY_BACKOFF_SECONDS", 0), mock.patch.object(
+            import_jobs, "write_nfe", side_effect=OperationalError("database is locked")
+        ):
+            # once=True espera a nova tentativa antes de sair
+            assert run_worker(once=True, poll_interval=0.01) == 2
+        failing.refresh_from_db()
+        assert (failing.status, failing.attempts) == ("ERRO", 2)
+        assert "locked" in failing.error
+
+    def test_stale_job_goes_back_to_queue(self):
+        job = import_jobs.enqueue_import(MIN_XML.encode("utf-8"))
+        NFeImportJob.objects.filter(pk=job.pk).update(
+            status="PROCESSANDO", locked_by="morto", locked_at=timezone.now() - datetime.timedelta(hours=1), attempts=1
+        )
+        assert run_worker(once=True) == 1
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == ("CONCLUIDO", 2)
+
+    def test_duplicate_is_reported_as_error(self):
+        self.client.post("/api/v1/purchase/import-xml/", {"xml_text": MIN_XML}, format="json")
+        job = import_jobs.enqueue_import(MIN_XML.encode("utf-8"))
+        run_worker(once=True)
+        job.refresh_from_db()
+        assert job.status == "ERRO"
+        assert "já importada" in job.error
@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Brand, Product
+from people.models import Supplier
+from purchase.models import PurchaseInvoice, PurchaseInvoiceItem, SupplierProduct
+from purchase.services.nfe_import import import_nfe_xml
+from purchase.tests.test_import_bulk import _det, _nfe
+from purchase.tests.test_import_xml import MIN_XML
+
+
+User = get_user_model()
+
+
+class PurchaseInvoiceItemsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_import_persists_lines_and_detail_skips_xml(self):
+        result = import_nfe_xml(MIN_XML)
+        inv = PurchaseInvoice.objects.get(pk=result["invoice_id"])
+        item = PurchaseInvoiceItem.objects.get(invoice=inv)
+        product = Product.objects.get(barcode="7891234567890")
+        assert (item.line, item.product_id, item.ncm, item.cfop) == (1, product.id, "12345678", "5102")
+
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(f"/api/v1/purchase/invoices/{inv.uuid}/")
+        assert r.status_code == 200, r.content
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        assert '"xml"' not in sql and "payload" not in sql
+        data = r.json()
+        assert "xml" not in data
+        row = data["items"][0]
+        assert row["product"] == product.id
+        assert (row["cProd"], row["qCom"], row["vUnCom"], row["vProd"]) == ("ABC001", "2.000", "10.00", "0.00")
+
+    def test_filter_invoices_by_product(self):
+        import_nfe_xml(_nfe([_det("A1", "Cabo", "1", "2.00"), _det("B1", "Fita", "1", "3.00")], number="1"))
+        import_nfe_xml(_nfe([_det("B1", "Fita", "2", "3.00")], number="2"))
+        import_nfe_xml(_nfe([_det("C1", "Plug", "2", "3.00")], number="3"))
+        fita = SupplierProduct.objects.get(supplier_code="B1").product_id
+        r = self.client.get(f"/api/v1/purchase/invoices/?product={fita}")
+        assert r.status_code == 200, r.content
+        assert sorted(row["number"] for row in r.json()["results"]) == ["1", "2"]
+        assert self.client.get("/api/v1/purchase/invoices/?product=abc").status_code == 400
+
+    def test_backfill_command(self):
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        cabo = Product.objects.create(name="Cabo", category=cat, brand=brand, cost_price="5.00", margin="10.00")
+        supplier = Supplier.objects.create(corporate_name="Fornecedor", cnpj="12345678000190")
+        xml = _nfe([_det("A1", "Cabo", "1", "2.00"), _det("Z9", "Sem cadastro", "1", "4.50")])
+        legacy = PurchaseInvoice.objects.create(number="1", supplier=supplier, total_value="6.50", xml=xml)
+
+        out = StringIO()
+        call_command("backfill_purchase_items", stdout=out)
+        assert "Notas processadas: 1 (2 linhas" in out.getvalue()
+        rows = list(PurchaseInvoiceItem.objects.filter(invoice=legacy).values_list("line", "product_id", "unit_cost"))
+        assert [(line, pid) for line, pid, _ in rows] == [(1, cabo.id), (2, None)]
+        assert str(rows[1][2].normalize()) == "4.5"
+
+        call_command("backfill_purchase_items", stdout=StringIO())
+        assert PurchaseInvoiceItem.objects.filter(invoice=legacy).count() == 2
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from purchase.management.commands.benchmark_nfe_parser import build_sample_nfe
+from purchase.services.nfe_import import extract_items
+from purchase.services.nfe_parser import is_valid_access_key, iter_items, parse_nfe, scan_access_key
+from purchase.tests.test_import_xml import MIN_XML
+
+
+ACCESS_KEY = "35251058840448000284550010001958131902274946"
+
+
+class NFeParserTest(SimpleTestCase):
+    def test_header_items_and_taxes(self):
+        doc = parse_nfe(MIN_XML)
+        assert (doc.supplier_cnpj, doc.number, doc.series) == ("12345678000190", "123", "1")
+        assert str(doc.issue_date) == "2025-01-15"
+        assert doc.total_value == Decimal("20.00")
+        item = doc.items[0]
+        assert (item.number, item.supplier_code, item.barcode) == (1, "ABC001", "7891234567890")
+        assert item.quantity == Decimal("2.000")
+        assert (item.icms_origem, item.icms_cst) == ("0", "00")
+        assert (item.pis_cst, item.pis_aliq) == ("01", Decimal("1.65"))
+        assert item.cofins_aliq == Decimal("7.60")
+        assert [(d.number, str(d.due_date), d.value) for d in doc.installments] == [("1", "2025-02-15", Decimal("20.00"))]
+
+    def test_namespaced_document_and_ipi(self):
+        items = list(iter_items(build_sample_nfe(3)))
+        assert [i.supplier_code for i in items] == ["C000001", "C000002", "C000003"]
+        assert (items[0].ipi_cenq, items[0].ipi_cst) == ("999", "53")
+
+    def test_extract_items_keeps_display_format(self):
+        rows = extract_items(MIN_XML)
+        assert rows[0]["qCom"] == "2.000"
+        assert rows[0]["vUnCom"] == "10.00"
+        assert rows[0]["cEAN"] == "7891234567890"
+        assert extract_items("<nada/>") == []
+
+    def test_access_key_scan_and_parse(self):
+        xml = MIN_XML.replace("<infNFe>", f'<infNFe versao="4.00" Id="NFe{ACCESS_KEY}">')
+        assert scan_access_key(xml) == ACCESS_KEY
+        assert scan_access_key(xml.encode("utf-8")) == ACCESS_KEY
+        assert parse_nfe(xml).access_key == ACCESS_KEY
+        prot = MIN_XML.replace("</nfeProc>", f"<protNFe><infProt><chNFe>{ACCESS_KEY}</chNFe></infProt></protNFe></nfeProc>")
+        assert scan_access_key(prot) == ACCESS_KEY
+        assert parse_nfe(prot).access_key == ACCESS_KEY
+        # Dígito verificador errado: tratado como nota sem chave
+        wrong = ACCESS_KEY[:-1] + "5"
+        assert not is_valid_access_key(wrong)
+        assert scan_access_key(xml.replace(ACCESS_KEY, wrong)) is None
+        assert parse_nfe(MIN_XML).access_key == ""
+
+    def test_rejects_non_nfe(self):
+        for xml in ("<nada/>", "<nfeProc><outro/></nfeProc>"):
+            with self.assertRaises(ValueError):
+                parse_nfe(xml)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_nfe_parser", "--lines", "1", "20", "--repeat", "1", stdout=out)
+        assert "20 itens" in out.getvalue()
@@ -0,0 +1,147 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Brand, Product, ProductNameTrigram
+from catalog.services.matching import common_trigrams, normalize_name, rank_candidates
+from purchase.models import ProductMatchReview, SupplierProduct
+from purchase.services.nfe_import import import_nfe_xml
+from purchase.tests.test_import_bulk import _det, _nfe
+
+
+User = get_user_model()
+
+
+class ProductMatchingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.cat = Category.objects.create(name="A")
+        self.brand = Brand.objects.create(name="B")
+
+    def _product(self, name):
+        return Product.objects.create(name=name, category=self.cat, brand=self.brand, cost_price="5.00", margin="10.00")
+
+    def test_normalize_name(self):
+        assert normalize_name("Cabo Flexível 2,5mm c/ 100m - CX") == "cabo flexivel 2.5 mm com 100 m caixa"
+        assert normalize_name("PARAFUSO SEXT. 10MM") == normalize_name("parafuso sextavado 10 mm")
+
+    def test_index_follows_renames_and_ranking(self):
+        cabo = self._product("Cabo Flexivel 2,5mm Azul")
+        self._product("Fita Isolante 20m")
+        assert ProductNameTrigram.objects.filter(product=cabo).exists()
+        ranked = rank_candidates("CABO FLEXÍVEL 2.5 MM AZUL")
+        assert ranked[0]["product_id"] == cabo.id
+        assert ranked[0]["score"] == 1.0
+
+        cabo.name = "Disjuntor 32A"
+        cabo.save()
+        assert rank_candidates("cabo flexivel 2,5mm azul") == []
+        assert rank_candidates("disjuntor 32 a")[0]["product_id"] == cabo.id
+
+    def test_import_auto_links_variant_spelling(self):
+        cabo = self._product("Cabo Flexivel 2,5mm Azul Rolo com 100 metros")
+        result = import_nfe_xml(_nfe([_det("F-1", "CABO FLEXÍVEL 2,5MM AZUL ROLO C/ 100 METRO", "3", "50.00")]))
+        assert result["created_products"] == []
+        assert result["matches"][0]["action"] == "linked"
+        assert result["matches"][0]["product_id"] == cabo.id
+        assert SupplierProduct.objects.get(supplier_code="F-1").product_id == cabo.id
+
+    def test_similar_name_goes_to_review_and_resolve_links(self):
+        existing = self._product("Parafuso Sextavado Zincado 10mm")
+        result = import_nfe_xml(_nfe([_det("P-12", "Parafuso Sextavado Zincado 12mm", "10", "0.50")]))
+        # Medida diferente: nunca vincula sozinho, mesmo com nome parecido
+        assert result["matches"][0]["action"] == "review"
+        assert len(result["created_products"]) == 1
+
+        r = self.client.get("/api/v1/purchase/match-reviews/?status=PENDENTE")
+        assert r.status_code == 200, r.content
+        rows = r.json()["results"]
+        assert len(rows) == 1
+        assert rows[0]["candidates"][0]["product_id"] == existing.id
+        review_id = rows[0]["id"]
+
+        SupplierProduct.objects.filter(supplier_code="P-12").update(ncm="73181500", cfop="5102")
+        other = SupplierProduct.objects.create(supplier=SupplierProduct.objects.get().supplier, product=self._product("Arruela"), supplier_code="A-1")
+        r2 = self.client.post(f"/api/v1/purchase/match-reviews/{review_id}/resolve/", {"product": existing.id}, format="json")
+        assert r2.status_code == 200, r2.content
+        assert r2.json()["status"] == "VINCULADO"
+        # O vínculo da importação muda de produto com os dados fiscais; os demais ficam
+        sp = SupplierProduct.objects.get(supplier_code="P-12")
+        assert (sp.product_id, sp.ncm, sp.cfop, sp.uCom, sp.last_cost) == (existing.id, "73181500", "5102", "UN", Decimal("0.50"))
+        assert SupplierProduct.objects.filter(pk=other.pk).exists()
+
+        # Próxima nota do mesmo fornecedor casa pelo cProd
+        again = import_nfe_xml(_nfe([_det("P-12", "Parafuso Sextavado Zincado 12mm", "5", "0.50")], number="2"))
+        assert again["created_products"] == []
+        assert again["matches"] == []
+
+        r3 = self.client.post(f"/api/v1/purchase/match-reviews/{review_id}/resolve/", {}, format="json")
+        assert r3.status_code == 400
+        assert ProductMatchReview.objects.get(pk=review_id).resolved_product_id == existing.id
+
+    def test_resolve_copies_import_data_to_existing_mapping(self):
+        existing = self._product("Parafuso Sextavado Zincado 10mm")
+        result = import_nfe_xml(_nfe([_det("OLD-10", "Parafuso Sextavado Zincado 10mm", "1", "0.40")]))
+        assert result["created_products"] == []
+        import_nfe_xml(_nfe([_det("P-12", "Parafuso Sextavado Zincado 12mm", "10", "0.50")], number="2"))
+        review = ProductMatchReview.objects.get()
+        SupplierProduct.objects.filter(supplier_code="P-12").update(ncm="73181500")
+
+        r = self.client.post(f"/api/v1/purchase/match-reviews/{review.id}/resolve/", {"product": existing.id}, format="json")
+        assert r.status_code == 200, r.content
+        sp = SupplierProduct.objects.get(product=existing)
+        assert (sp.supplier_code, sp.ncm, sp.last_cost) == ("P-12", "73181500", Decimal("0.50"))
+        assert SupplierProduct.objects.filter(product=review.product).exists()
+
+    def test_new_products_are_ranked_in_sql_with_few_queries(self):
+        def reads(number, lines):
+            dets = [_det(f"N{number}-{i}", f"Interruptor Simples Modelo {number}{i:03d}", "1", "2.00") for i in range(lines)]
+            with CaptureQueriesContext(connection) as ctx:
+                result = import_nfe_xml(_nfe(dets, number=str(number)))
+            assert len(result["created_products"]) == lines
+            return [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().startswith(("SELECT", "WITH"))]
+
+        # Primeira nota: depois dela as linhas novas sempre têm candidatos parecidos para carregar
+        reads(1, 5)
+        few = reads(2, 5)
+        many = reads(3, 200)
+        ranking = [sql for sql in many if '"catalog_productnametrigram"' in sql]
+        # Contagem no banco (GROUP BY + ROW_NUMBER), uma consulta para as 200 linhas
+        assert all("GROUP BY" in sql and "ROW_NUMBER" in sql for sql in ranking)
+        assert len(ranking) == 1, len(ranking)
+        assert len(many) == len(few)
+
+    def test_common_trigrams_are_left_out_of_the_search(self):
+        cabo = self._product("Cabo Flexivel 2,5mm Azul")
+        for i in range(4):
+            self._product(f"Cabo Paralelo {i}")
+        with override_settings(PRODUCT_MATCH_MAX_TRIGRAM_DF=3):
+            common = common_trigrams()
+            assert {" ca", "cab", "abo", "bo "} <= common and "fle" not in common
+            with CaptureQueriesContext(connection) as ctx:
+                ranked = rank_candidates("cabo flexivel 2.5 mm azul")
+        assert ranked[0]["product_id"] == cabo.id and ranked[0]["score"] == 1.0
+        search = next(q["sql"] for q in ctx.captured_queries if "ROW_NUMBER" in q["sql"])
+        assert "'cab'" not in search and "'  c'" not in search and "'fle'" in search
+
+    def test_rebuild_command(self):
+        p = self._product("Tomada 10A")
+        Product.objects.filter(pk=p.pk).update(name_key="")
+        ProductNameTrigram.objects.all().delete()
+        call_command("rebuild_product_match_index", stdout=StringIO())
+        p.refresh_from_db()
+        assert p.name_key == "tomada 10 a"
+        assert rank_candidates("TOMADA 10A")[0]["product_id"] == p.id
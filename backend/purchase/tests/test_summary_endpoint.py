@@ -1,16 +1,83 @@
 import datetime
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from purchase.models import PurchaseInvoice, PurchaseInstallment
+from purchase.services.installment_summary import compute_summary
 from people.models import Supplier
 
 
 User = get_user_model()
 
 
+def _legacy_summary(supplier_id, ref_date):
+    """Implementação anterior (uma consulta por bloco), mantida como referência do formato."""
+    qs = PurchaseInstallment.objects.select_related("invoice", "invoice__supplier")
+    if supplier_id:
+        qs = qs.filter(invoice__supplier_id=supplier_id)
+    days = datetime.timedelta
+
+    def window(**filters):
+        agg = qs.filter(**filters).aggregate(count=Count("id"), value=Sum("value"))
+        return {"count": agg.get("count") or 0, "value": agg.get("value") or 0}
+
+    by_status_qs = qs.values("status").annotate(count=Count("id"), total_value=Sum("value")).order_by("status")
+    overdue = qs.filter(due_date__lt=ref_date).aggregate(count=Count("id"), value=Sum("value"))
+    supplier_group_qs = (
+        qs.values("invoice__supplier_id", "invoice__supplier__corporate_name")
+        .annotate(
+            count=Count("id"),
+            total_value=Sum("value"),
+            overdue_count=Count("id", filter=Q(due_date__lt=ref_date)),
+            overdue_value=Sum("value", filter=Q(due_date__lt=ref_date)),
+        )
+        .order_by("invoice__supplier__corporate_name")
+    )
+    monthly_qs = (
+        qs.filter(due_date__gte=ref_date, due_date__lt=ref_date + days(31 * 6))
+        .annotate(month=TruncMonth("due_date"))
+        .values("month")
+        .annotate(count=Count("id"), value=Sum("value"))
+        .order_by("month")
+    )
+    return {
+        "total": {"count": qs.count(), "value": qs.aggregate(total_value=Sum("value")).get("total_value") or 0},
+        "by_status": {row["status"]: {"count": row["count"], "value": row["total_value"] or 0} for row in by_status_qs},
+        "overdue": {"count": overdue.get("count") or 0, "value": overdue.get("value") or 0},
+        "suppliers": [
+            {
+                "supplier_id": row["invoice__supplier_id"],
+                "supplier_name": row["invoice__supplier__corporate_name"],
+                "count": row["count"],
+                "value": row["total_value"] or 0,
+                "overdue_count": row["overdue_count"] or 0,
+                "overdue_value": row["overdue_value"] or 0,
+            }
+            for row in supplier_group_qs
+        ],
+        "upcoming": {
+            "7d": window(status="PENDENTE", due_date__gte=ref_date, due_date__lte=ref_date + days(7)),
+            "30d": window(status="PENDENTE", due_date__gt=ref_date + days(7), due_date__lte=ref_date + days(30)),
+        },
+        "overdue_buckets": {
+            "1-7": window(due_date__lt=ref_date, due_date__gte=ref_date - days(7)),
+            "8-30": window(due_date__lt=ref_date - days(7), due_date__gte=ref_date - days(30)),
+            ">30": window(due_date__lt=ref_date - days(30)),
+        },
+        "monthly_next": [
+            {"month": row["month"].strftime("%Y-%m"), "count": row["count"], "value": row["value"] or 0} for row in monthly_qs
+        ],
+    }
+
+
 class InstallmentSummaryEndpointTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(username="tester", password="pass1234")
         token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
@@ -44,3 +111,38 @@ class InstallmentSummaryEndpointTest(TestCase):
         # Overdue for sup1: 1
         assert data["overdue"]["count"] == 1
 
+
+    def test_matches_previous_implementation(self):
+        today = datetime.date.today()
+        sup3 = Supplier.objects.create(corporate_name="Forn 3", cnpj="33333333333333")
+        inv = PurchaseInvoice.objects.create(number="30", series="1", supplier=sup3, total_value=0, xml="<xml/>")
+        for i, (offset, value, st) in enumerate(
+            [(-3, "10.50", "ATRASADO"), (-15, "20.00", "PENDENTE"), (-45, "30.25", "ATRASADO"), (0, "0.00", "PENDENTE"),
+             (7, "5.00", "PENDENTE"), (8, "6.00", "PENDENTE"), (30, "7.00", "PAGO"), (90, "8.00", "PENDENTE"), (200, "9.00", "PENDENTE")]
+        ):
+            PurchaseInstallment.objects.create(
+                invoice=inv, number=str(i), due_date=today + datetime.timedelta(days=offset), value=value, status=st
+            )
+        for supplier_id in (None, str(self.sup1.id), str(sup3.id), "999"):
+            for ref in (today, today - datetime.timedelta(days=20), today + datetime.timedelta(days=40)):
+                assert compute_summary(supplier_id, ref) == _legacy_summary(supplier_id, ref), (supplier_id, ref)
+
+    def test_two_queries_then_cached_until_installments_change(self):
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get("/api/v1/purchase/installments/summary/")
+        summary_queries = [q for q in ctx.captured_queries if "purchase_purchaseinstallment" in q["sql"]]
+        assert len(summary_queries) == 2, [q["sql"] for q in summary_queries]
+
+        with CaptureQueriesContext(connection) as ctx:
+            r2 = self.client.get("/api/v1/purchase/installments/summary/")
+        assert not [q for q in ctx.captured_queries if "purchase_purchaseinstallment" in q["sql"]]
+        assert r2.json() == r.json()
+
+        inv = PurchaseInvoice.objects.get(number="20")
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseInstallment.objects.create(invoice=inv, number="2", due_date=datetime.date.today(), value=5, status="PENDENTE")
+        assert self.client.get("/api/v1/purchase/installments/summary/").json()["total"]["count"] == 4
+
+        r3 = self.client.post("/api/v1/purchase/reprocess-installments/", {}, format="json")
+        assert r3.status_code == 200
+        assert self.client.get("/api/v1/purchase/installments/summary/").json()["by_status"]["ATRASADO"]["count"] == 1
@@ -0,0 +1,63 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from people.models import Supplier
+from purchase.models import PurchaseInvoice, PurchaseInvoiceXML
+from purchase.services.nfe_import import import_nfe_xml
+from purchase.tests.test_import_bulk import _det, _nfe
+
+
+User = get_user_model()
+
+
+class PurchaseXmlStorageTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_import_stores_compressed_and_retrieve_decompresses(self):
+        xml = _nfe([_det(f"C{i}", f"Produto {i}", "1", "2.00") for i in range(30)])
+        inv = PurchaseInvoice.objects.get(pk=import_nfe_xml(xml)["invoice_id"])
+        assert inv.xml == ""
+        blob = PurchaseInvoiceXML.objects.get(invoice=inv)
+        assert blob.size == len(xml.encode("utf-8"))
+        assert len(blob.payload) < blob.size / 3
+
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get("/api/v1/purchase/invoices/")
+        assert r.status_code == 200, r.content
+        assert "xml" not in r.json()["results"][0]
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        assert '"xml"' not in sql and "payload" not in sql
+
+        r2 = self.client.get(f"/api/v1/purchase/invoices/{inv.uuid}/?include_xml=1")
+        assert r2.status_code == 200, r2.content
+        assert r2.json()["xml"] == xml
+        assert len(r2.json()["items"]) == 30
+
+    def test_command_compresses_legacy_rows(self):
+        supplier = Supplier.objects.create(corporate_name="Fornecedor", cnpj="12345678000190")
+        xml = _nfe([_det("A1", "Cabo", "1", "2.00")], number="7")
+        legacy = [
+            PurchaseInvoice.objects.create(number=str(i), supplier=supplier, total_value="1.00", xml=xml) for i in range(5)
+        ]
+        out = StringIO()
+        call_command("compress_purchase_xml", "--batch-size", "2", stdout=out)
+        assert "Notas compactadas: 5" in out.getvalue()
+        assert PurchaseInvoice.objects.exclude(xml="").count() == 0
+        assert PurchaseInvoiceXML.objects.count() == 5
+        assert PurchaseInvoice.objects.get(pk=legacy[0].pk).xml_text == xml
+
+        out = StringIO()
+        call_command("compress_purchase_xml", stdout=out)
+        assert "não compactado: 0" in out.getvalue()
@@ -4,25 +4,46 @@ from rest_framework.response import Response
 from rest_framework import status
 from drf_spectacular.utils import extend_schema
 
-from .serializers import NFeImportSerializer, PurchaseInvoiceSerializer
+from .serializers import NFeImportJobSerializer, NFeImportSerializer, PurchaseInvoiceSerializer
 from .services.nfe_import import import_nfe_xml
-from .models import PurchaseInstallment, PurchaseInvoice
+from .services.nfe_batch import import_nfe_batch, sources_from_uploads, sources_from_zip, sources_to_zip, sync_max_files
+from .services.import_jobs import enqueue_import
+from .services.installment_summary import bump_summary_version, installment_summary
+from .services.cost_analytics import best_suppliers, cost_alerts, cost_history
+from .models import NFeImportJob, PurchaseInstallment, PurchaseInvoice
 import datetime
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncMonth
+import io
+
+
+def _wants_async(request) -> bool:
+    return str(request.query_params.get("async") or request.data.get("async") or "").lower() in ("1", "true")
+
+
+def _queued(job) -> Response:
+    return Response(NFeImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
 class NFeImportView(APIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
-    @extend_schema(request=NFeImportSerializer, responses={200: None}, tags=["purchase"], summary="Importar XML de NFe")
+    @extend_schema(
+        request=NFeImportSerializer,
+        responses={200: None},
+        tags=["purchase"],
+        summary="Importar XML de NFe",
+        description="Com async=1 a nota vai para a fila e a resposta (202) traz o job; acompanhe em purchase/import-jobs/<id>/.",
+    )
     def post(self, request):
         xml_text = request.data.get("xml_text")
+        filename = ""
         if not xml_text and "xml" in request.FILES:
             xml_file = request.FILES["xml"]
+            filename = xml_file.name
             xml_text = xml_file.read().decode("utf-8", errors="ignore")
         if not xml_text:
             return Response({"detail": "Informe xml_text ou arquivo xml."}, status=status.HTTP_400_BAD_REQUEST)
+        if _wants_async(request):
+            return _queued(enqueue_import(xml_text.encode("utf-8"), filename=filename))
 
         try:
             result = import_nfe_xml(xml_text)
@@ -31,6 +52,39 @@ class NFeImportView(APIView):
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class NFeBatchImportView(APIView):
+    parser_classes = [MultiPartParser, FormParser]
+
+    @extend_schema(
+        tags=["purchase"],
+        summary="Importar lote de XMLs de NFe (ZIP ou vários arquivos)",
+        description=(
+            "Lotes pequenos são importados na própria requisição (200). Com async=1, ou acima de "
+            "NFE_BATCH_SYNC_MAX_FILES arquivos, o lote vai para a fila e a resposta (202) traz o job."
+        ),
+    )
+    def post(self, request):
+        try:
+            if "file" in request.FILES:
+                upload = request.FILES["file"]
+                raw, filename = upload.read(), upload.name
+                sources = sources_from_zip(io.BytesIO(raw))
+            else:
+                sources = sources_from_uploads(request.FILES.getlist("xml"))
+                raw, filename = None, f"{len(sources)} arquivos"
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not sources:
+            return Response({"detail": "Informe um arquivo ZIP (file) ou arquivos XML (xml)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if _wants_async(request) or len(sources) > sync_max_files():
+            # Vários XMLs: guardados como um ZIP, o mesmo formato que o worker lê
+            return _queued(enqueue_import(raw or sources_to_zip(sources), filename=filename, kind="LOTE"))
+        # Na requisição o parsing roda no próprio processo: nada de pool de processos no servidor web
+        report = import_nfe_batch(sources, workers=1)
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class ReprocessInstallmentsView(APIView):
     @extend_schema(tags=["purchase"], summary="Reprocessar parcelas para marcar atrasos")
     def post(self, request):
@@ -42,6 +96,8 @@ class ReprocessInstallmentsView(APIView):
 
         qs = PurchaseInstallment.objects.filter(status="PENDENTE", due_date__lt=ref_date)
         count = qs.update(status="ATRASADO")
+        if count:
+            bump_summary_version()
         return Response({"updated": count, "reference_date": str(ref_date)}, status=status.HTTP_200_OK)
 
 
@@ -55,105 +111,83 @@ class InstallmentSummaryView(APIView):
         except Exception:
             return Response({"detail": "Data inválida. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
 
-        qs = PurchaseInstallment.objects.select_related("invoice", "invoice__supplier")
-        if supplier_id:
-            qs = qs.filter(invoice__supplier_id=supplier_id)
-
-        # Totais gerais
-        agg = qs.aggregate(total_value=Sum("value"))
-        total_value = agg.get("total_value") or 0
-        total_count = qs.count()
-
-        # Por status
-        by_status_qs = qs.values("status").annotate(count=Count("id"), total_value=Sum("value")).order_by("status")
-        by_status = {row["status"]: {"count": row["count"], "value": row["total_value"] or 0} for row in by_status_qs}
-
-        # Em atraso
-        overdue = qs.filter(due_date__lt=ref_date).aggregate(count=Count("id"), value=Sum("value"))
-        overdue_count = overdue.get("count") or 0
-        overdue_value = overdue.get("value") or 0
-
-        # Por fornecedor (se não filtrado)
-        suppliers = []
-        supplier_group_qs = (
-            qs.values("invoice__supplier_id", "invoice__supplier__corporate_name")
-            .annotate(
-                count=Count("id"),
-                total_value=Sum("value"),
-                overdue_count=Count("id", filter=Q(due_date__lt=ref_date)),
-                overdue_value=Sum("value", filter=Q(due_date__lt=ref_date)),
-            )
-            .order_by("invoice__supplier__corporate_name")
-        )
-        for row in supplier_group_qs:
-            suppliers.append(
-                {
-                    "supplier_id": row["invoice__supplier_id"],
-                    "supplier_name": row["invoice__supplier__corporate_name"],
-                    "count": row["count"],
-                    "value": row["total_value"] or 0,
-                    "overdue_count": row["overdue_count"] or 0,
-                    "overdue_value": row["overdue_value"] or 0,
-                }
-            )
-
-        # Upcoming windows (pending only)
-        in_7 = qs.filter(status="PENDENTE", due_date__gte=ref_date, due_date__lte=ref_date + datetime.timedelta(days=7)).aggregate(
-            count=Count("id"), value=Sum("value")
-        )
-        in_30 = qs.filter(status="PENDENTE", due_date__gt=ref_date + datetime.timedelta(days=7), due_date__lte=ref_date + datetime.timedelta(days=30)).aggregate(
-            count=Count("id"), value=Sum("value")
-        )
-
-        # Overdue aging buckets by due_date
-        overdue_1_7 = qs.filter(due_date__lt=ref_date, due_date__gte=ref_date - datetime.timedelta(days=7)).aggregate(
-            count=Count("id"), value=Sum("value")
-        )
-        overdue_8_30 = qs.filter(due_date__lt=ref_date - datetime.timedelta(days=7), due_date__gte=ref_date - datetime.timedelta(days=30)).aggregate(
-            count=Count("id"), value=Sum("value")
-        )
-        overdue_gt_30 = qs.filter(due_date__lt=ref_date - datetime.timedelta(days=30)).aggregate(
-            count=Count("id"), value=Sum("value")
-        )
-
-        # Monthly totals for next 6 months (including current month)
-        six_months_ahead = ref_date + datetime.timedelta(days=31 * 6)
-        monthly_qs = (
-            qs.filter(due_date__gte=ref_date, due_date__lt=six_months_ahead)
-            .annotate(month=TruncMonth("due_date"))
-            .values("month")
-            .annotate(count=Count("id"), value=Sum("value"))
-            .order_by("month")
-        )
-        monthly_next = [
-            {"month": row["month"].strftime("%Y-%m"), "count": row["count"], "value": row["value"] or 0}
-            for row in monthly_qs
-        ]
-
-        return Response(
-            {
-                "total": {"count": total_count, "value": total_value},
-                "by_status": by_status,
-                "overdue": {"count": overdue_count, "value": overdue_value},
-                "suppliers": suppliers,
-                "upcoming": {
-                    "7d": {"count": in_7.get("count") or 0, "value": in_7.get("value") or 0},
-                    "30d": {"count": in_30.get("count") or 0, "value": in_30.get("value") or 0},
-                },
-                "overdue_buckets": {
-                    "1-7": {"count": overdue_1_7.get("count") or 0, "value": overdue_1_7.get("value") or 0},
-                    "8-30": {"count": overdue_8_30.get("count") or 0, "value": overdue_8_30.get("value") or 0},
-                    ">30": {"count": overdue_gt_30.get("count") or 0, "value": overdue_gt_30.get("value") or 0},
-                },
-                "monthly_next": monthly_next,
-            }
-        )
+        return Response(installment_summary(supplier_id, ref_date))
+
+
+def _date_param(request, name, default=None):
+    raw = request.query_params.get(name)
+    return datetime.date.fromisoformat(raw) if raw else default
+
+
+def _int_param(request, name, default=None):
+    raw = request.query_params.get(name)
+    return int(raw) if raw not in (None, "") else default
+
+
+class CostHistoryView(APIView):
+    @extend_schema(tags=["purchase"], summary="Histórico de custo de compra de um produto por fornecedor")
+    def get(self, request):
+        try:
+            product_id = _int_param(request, "product")
+            supplier_id = _int_param(request, "supplier")
+            date_from = _date_param(request, "date_from")
+            date_to = _date_param(request, "date_to")
+        except ValueError:
+            return Response({"detail": "Parâmetros inválidos. Use ids numéricos e datas YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        if not product_id:
+            return Response({"detail": "Informe o produto (?product=)."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(cost_history(product_id, supplier_id, date_from, date_to))
+
+
+class BestSuppliersView(APIView):
+    @extend_schema(tags=["purchase"], summary="Fornecedor de menor custo médio por produto no período")
+    def get(self, request):
+        try:
+            ref_date = _date_param(request, "date", datetime.date.today())
+            days = _int_param(request, "days")
+            product_id = _int_param(request, "product")
+        except ValueError:
+            return Response({"detail": "Parâmetros inválidos. Use números e datas YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(best_suppliers(ref_date, days, product_id))
+
+
+class CostAlertsView(APIView):
+    @extend_schema(tags=["purchase"], summary="Compras com variação de custo acima do limite")
+    def get(self, request):
+        try:
+            ref_date = _date_param(request, "date", datetime.date.today())
+            days = _int_param(request, "days")
+            raw = request.query_params.get("threshold")
+            threshold = float(raw) if raw else None
+        except ValueError:
+            return Response({"detail": "Parâmetros inválidos. Use números e datas YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(cost_alerts(ref_date, days, threshold))
+
 
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters as drf_filters
-from drf_spectacular.utils import extend_schema_view, extend_schema
+from drf_spectacular.utils import OpenApiParameter, extend_schema_view, extend_schema
 from rest_framework.response import Response
+from catalog.models import Product
+from .models import ProductMatchReview, PurchaseInvoiceItem
+from .serializers import ProductMatchResolveSerializer, ProductMatchReviewSerializer
+from .services.nfe_import import resolve_match_review
+
+
+class PurchaseInvoiceFilter(django_filters.FilterSet):
+    # Compras de um produto; valor não numérico vira 400
+    product = django_filters.NumberFilter(method="filter_product")
+
+    class Meta:
+        model = PurchaseInvoice
+        fields = {"supplier": ["exact"], "issue_date": ["gte", "lte"], "created_at": ["gte", "lte"]}
+
+    def filter_product(self, queryset, name, value):
+        # Índice (product, invoice) em PurchaseInvoiceItem
+        return queryset.filter(id__in=PurchaseInvoiceItem.objects.filter(product_id=value).values("invoice_id"))
 
 
 @extend_schema_view(
@@ -161,12 +195,13 @@ from rest_framework.response import Response
     retrieve=extend_schema(tags=["purchase"], summary="Detalhar nota de fornecedor"),
 )
 class PurchaseInvoiceViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseInvoice.objects.select_related('supplier').all().order_by('-created_at')
+    # O XML (legado ou compactado) só é lido no retrieve
+    queryset = PurchaseInvoice.objects.select_related('supplier').defer('xml').order_by('-created_at')
     serializer_class = PurchaseInvoiceSerializer
     lookup_field = 'uuid'
     http_method_names = ['get', 'delete', 'head', 'options']
     filter_backends = [DjangoFilterBackend, drf_filters.SearchFilter, drf_filters.OrderingFilter]
-    filterset_fields = {"supplier": ["exact"], "issue_date": ["gte", "lte"], "created_at": ["gte", "lte"]}
+    filterset_class = PurchaseInvoiceFilter
     search_fields = ["number", "series", "supplier__corporate_name"]
     ordering_fields = ["created_at", "issue_date", "total_value"]
 
@@ -176,15 +211,70 @@ class PurchaseInvoiceViewSet(viewsets.ModelViewSet):
             return PurchaseInvoiceDetailSerializer
         return super().get_serializer_class()
 
-    @extend_schema(tags=["purchase"], summary="Detalhar nota de fornecedor")
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == 'retrieve':
+            qs = qs.prefetch_related('items')
+        return qs
+
+    @extend_schema(
+        tags=["purchase"],
+        summary="Detalhar nota de fornecedor",
+        parameters=[OpenApiParameter("include_xml", bool, description="Inclui o XML original (descompactado)")],
+    )
     def retrieve(self, request, *args, **kwargs):
         obj = self.get_object()
-        serializer = self.get_serializer(obj)
-        data = serializer.data
-        try:
+        data = dict(self.get_serializer(obj).data)
+        if not data["items"]:
+            # Nota importada antes das linhas persistidas (ver backfill_purchase_items)
             from .services.nfe_import import extract_items
-            data = dict(data)
-            data["items"] = extract_items(obj.xml)
-        except Exception:
-            pass
+            data["items"] = extract_items(obj.xml_text)
+        if request.query_params.get("include_xml") in ("1", "true", "True"):
+            data["xml"] = obj.xml_text
         return Response(data)
+
+
+@extend_schema_view(
+    list=extend_schema(tags=["purchase"], summary="Listar itens de NF-e aguardando revisão de produto"),
+    retrieve=extend_schema(tags=["purchase"], summary="Detalhar revisão de produto"),
+)
+class ProductMatchReviewViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ProductMatchReview.objects.select_related('invoice', 'supplier', 'product').order_by('-created_at', '-id')
+    serializer_class = ProductMatchReviewSerializer
+    filter_backends = [DjangoFilterBackend, drf_filters.SearchFilter]
+    filterset_fields = {"status": ["exact"], "supplier": ["exact"], "invoice": ["exact"]}
+    search_fields = ["item_name", "supplier_code"]
+
+    @extend_schema(
+        request=ProductMatchResolveSerializer,
+        responses={200: ProductMatchReviewSerializer},
+        tags=["purchase"],
+        summary="Vincular item a um produto existente ou descartar a sugestão",
+    )
+    @action(detail=True, methods=["post"])
+    def resolve(self, request, pk=None):
+        review = self.get_object()
+        if review.status != "PENDENTE":
+            return Response({"detail": "Revisão já resolvida."}, status=status.HTTP_400_BAD_REQUEST)
+        payload = ProductMatchResolveSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        product = None
+        product_id = payload.validated_data.get("product")
+        if product_id:
+            product = Product.objects.filter(pk=product_id).first()
+            if product is None:
+                return Response({"detail": "Produto não encontrado."}, status=status.HTTP_400_BAD_REQUEST)
+        resolve_match_review(review, product)
+        return Response(ProductMatchReviewSerializer(review).data)
+
+
+@extend_schema_view(
+    list=extend_schema(tags=["purchase"], summary="Listar importações enfileiradas"),
+    retrieve=extend_schema(tags=["purchase"], summary="Progresso de uma importação enfileirada"),
+)
+class NFeImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = NFeImportJob.objects.defer('payload').order_by('-created_at', '-id')
+    serializer_class = NFeImportJobSerializer
+    lookup_field = 'uuid'
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {"status": ["exact"], "kind": ["exact"]}
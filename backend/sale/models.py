@@ -9,7 +9,10 @@ from people.models import Customer, Seller
 from catalog.models import Product, Promotion
 from stock.models import StockMovement
 from stock.models import Stock
-from payment.models import PaymentMethod, Receivable, PaymentEvent
+from payment.models import PaymentMethod, PaymentEvent
+from payment.services.card_fees import order_fee
+from payment.services import method_cache
+from payment.services.installments import create_receivables, split_amount
 from cashier.models import CashierSession, CashMovement
 
 
@@ -46,7 +49,7 @@ class Order(TimeStampedModel):
     payment_metadata = models.JSONField(null=True, blank=True)
     # Computed fee amount (absolute) charged by payment method at confirm time
     payment_fee = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
-    # Número de pedido de venda (gerado na confirmação): formato YYYYMMDD-HHMM
+    # Número de pedido de venda (gerado na confirmação): formato YYYYMMDD-<id>
     sales_order = models.CharField(max_length=20, blank=True, null=True, unique=True, db_index=True)
 
     def clean(self):
@@ -155,13 +158,21 @@ class OrderItem(TimeStampedModel):
 def confirm_order(order: Order):
     if order.status != "DRAFT":
         raise ValidationError("Somente pedidos em rascunho podem ser confirmados.")
-    if not order.payment_method:
+    # Método (e taxas) do cache por processo: sem consulta por confirmação
+    pm = method_cache.get_method(order.payment_method_id) if order.payment_method_id else None
+    if not pm:
         raise ValidationError("Selecione o método de pagamento antes de confirmar.")
     # Enforce open cashier for cash payments if configured
-    if getattr(settings, "CASHIER_REQUIRED_FOR_SALE", True) and order.payment_method.type == "cash":
+    if getattr(settings, "CASHIER_REQUIRED_FOR_SALE", True) and pm.type == "cash":
         sess = CashierSession.objects.filter(status="OPEN").order_by("-opened_at").first()
         if not sess:
             raise ValidationError("É necessário um caixa aberto para confirmar venda em dinheiro.")
+    # Taxa calculada no servidor (faixa da bandeira/parcelas ou taxa do método); fee_percent/fee_value
+    # enviados pelo PDV são só exibição e são sobrescritos abaixo. Parcelas fora da faixa recusam a venda
+    try:
+        fee_info = order_fee(pm, order.total, order.payment_metadata)
+    except ValueError as exc:
+        raise ValidationError(str(exc))
     # Stock availability check
 
 
@@ -188,60 +199,42 @@ def confirm_order(order: Order):
 
     # Create receivable for the order total using selected payment method
     logger = logging.getLogger("sale.payment")
-    pm = order.payment_method
     # Log payment metadata for debugging fee_percent
     try:
         logger.info("[sale] payment_metadata for order=%s: %s", order.id, order.payment_metadata)
     except Exception:
         pass
     from datetime import date, timedelta
-    due = date.today() + timedelta(days=int(pm.settlement_days or 0))
-    Receivable.objects.create(
-        method=pm,
-        reference=f"ORDER {order.id}",
-        due_date=due,
-        amount=order.total,
+    due = date.today() + timedelta(days=fee_info["settlement_days"])
+    # Crédito parcelado: um recebível por parcela (a primeira vence no prazo da faixa/método)
+    recs = create_receivables(pm, f"ORDER {order.id}", order.total, fee_info["installments"], due)
+    order.payment_fee = fee_info["fee"]
+    if isinstance(order.payment_metadata, dict):
+        order.payment_metadata = {
+            **order.payment_metadata,
+            "fee_percent": format(fee_info["fee_percent"], "f"),
+            "fee_value": format(fee_info["fee"], "f"),
+        }
+    order.save(update_fields=["payment_fee", "payment_metadata"])
+    logger.info(
+        "[sale] receivable created order=%s method=%s amount=%s due=%s installments=%s", order.id, pm.code, order.total, due, len(recs)
     )
-    # Compute fee amount based on stored metadata (prefer metadata fee_percent) or payment method
-    try:
-        fee_pct = None
-        if order.payment_metadata and isinstance(order.payment_metadata, dict) and order.payment_metadata.get('fee_percent') is not None:
-            fee_pct = Decimal(str(order.payment_metadata.get('fee_percent') or 0))
-        else:
-            fee_pct = Decimal(str(pm.fee_percent or 0))
-        fee_fixed = Decimal(str(getattr(pm, 'fee_fixed', 0) or 0))
-        # Prefer explicit absolute fee_value when provided by frontend
-        fee = None
-        if order.payment_metadata and isinstance(order.payment_metadata, dict) and order.payment_metadata.get('fee_value') is not None:
-            try:
-                fee = Decimal(str(order.payment_metadata.get('fee_value') or 0))
-            except Exception:
-                fee = None
-        if fee is None:
-            fee = (order.total * (fee_pct or Decimal('0')) / Decimal('100')) + fee_fixed
-        order.payment_fee = fee.quantize(Decimal('0.01'))
-        order.save(update_fields=['payment_fee'])
-    except Exception:
-        order.payment_fee = Decimal('0.00')
-        try: order.save(update_fields=['payment_fee'])
-        except Exception: pass
-    logger.info("[sale] receivable created order=%s method=%s amount=%s due=%s", order.id, pm.code, order.total, due)
     # Auto-settle for immediate methods (e.g., settlement_days=0)
-    rec = Receivable.objects.filter(reference=f"ORDER {order.id}", method=pm).first()
-    if getattr(pm, "auto_settle", False) and rec and rec.amount > 0:
+    if getattr(pm, "auto_settle", False) and order.total > 0:
         from datetime import date
-        # Calculate optional fees
-        fee = (rec.amount * (pm.fee_percent or 0) / Decimal("100")) + (pm.fee_fixed or Decimal("0"))
-        evt = PaymentEvent.objects.create(
-            receivable=rec,
-            amount=rec.amount,
-            fee_amount=Decimal(str(fee)),
-            paid_date=date.today(),
-            external_id=f"AUTO-ORDER-{order.id}",
-            metadata={"auto": True},
-        )
-        evt.apply()
-        logger.info("[sale] receivable auto-settled order=%s method=%s amount=%s fee=%s", order.id, pm.code, rec.amount, fee)
+        # Taxa dividida entre as parcelas como o valor
+        for rec, fee in zip(recs, split_amount(Decimal(str(fee_info["fee"])), len(recs))):
+            suffix = f"-{rec.installment}" if rec.installment > 1 else ""
+            evt = PaymentEvent.objects.create(
+                receivable=rec,
+                amount=rec.amount,
+                fee_amount=fee,
+                paid_date=date.today(),
+                external_id=f"AUTO-ORDER-{order.id}{suffix}",
+                metadata={"auto": True},
+            )
+            evt.apply()
+            logger.info("[sale] receivable auto-settled order=%s method=%s amount=%s fee=%s", order.id, pm.code, rec.amount, fee)
         # For cash payments, record cash inflow in current session
         if pm.type == "cash":
             sess = CashierSession.objects.filter(status="OPEN").order_by("-opened_at").first()
@@ -250,10 +243,10 @@ def confirm_order(order: Order):
 
     from django.utils import timezone
     order.status = "CONFIRMED"
-    # Gerar número de pedido se ainda não definido
+    # Gerar número de pedido se ainda não definido: YYYYMMDD-<id> (único mesmo com vendas no mesmo minuto)
     if not order.sales_order:
         now = timezone.localtime(timezone.now())
-        order.sales_order = now.strftime("%Y%m%d-%H%M")
+        order.sales_order = f"{now:%Y%m%d}-{order.id:06d}"
     order.save(update_fields=["status", "sales_order", "updated_at"])
 
 
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from decimal import Decimal
 from .models import Order, OrderItem, confirm_order, cancel_order
 from payment.models import PaymentMethod
+from payment.serializers import CachedPaymentMethodField
 from catalog.models import Product
 from people.models import Seller, Customer
 
@@ -34,7 +35,7 @@ class OrderSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all(), required=False, allow_null=True)
     seller = serializers.PrimaryKeyRelatedField(queryset=Seller.objects.all())
-    payment_method = serializers.PrimaryKeyRelatedField(queryset=PaymentMethod.objects.all(), required=False, allow_null=True)
+    payment_method = CachedPaymentMethodField(queryset=PaymentMethod.objects.all(), required=False, allow_null=True)
     order_type = serializers.CharField(required=False)
     sales_order = serializers.CharField(read_only=True)
     subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -65,8 +66,9 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         # Prevent changing payment_method if not in DRAFT
-        new_pm = validated_data.get("payment_method", instance.payment_method)
-        if instance.status != "DRAFT" and instance.payment_method_id != (new_pm.id if new_pm else None):
+        new_pm = validated_data.get("payment_method")
+        new_pm_id = (new_pm.id if new_pm else None) if "payment_method" in validated_data else instance.payment_method_id
+        if instance.status != "DRAFT" and instance.payment_method_id != new_pm_id:
             raise serializers.ValidationError({"payment_method": "Não é permitido alterar o método de pagamento após confirmação."})
         # Allow setting payment_metadata and order_discount_abs in DRAFT only
         if instance.status != "DRAFT" and ("payment_metadata" in validated_data or "order_discount_abs" in validated_data):
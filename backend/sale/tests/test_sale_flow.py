@@ -205,3 +205,25 @@ class SaleFlowTest(TestCase):
         assert r2.status_code == 201
         r3 = self.client.post(f"/api/v1/sale/orders/{order_id}/action/", {"action": "confirm"}, format="json")
         assert r3.status_code == 400
+
+    def test_sales_order_is_unique_within_the_same_minute(self):
+        pm = PaymentMethod.objects.create(code="pix", name="PIX", type="pix")
+        numbers = []
+        for _ in range(2):
+            r = self.client.post(
+                "/api/v1/sale/orders/",
+                {"seller": self.seller.id, "customer": self.customer.id, "payment_method": pm.id},
+                format="json",
+            )
+            order_id = r.json()["id"]
+            self.client.post(
+                f"/api/v1/sale/orders/{order_id}/add-item/",
+                {"product": self.product.id, "quantity": "1", "unit_price": "200.00"},
+                format="json",
+            )
+            r3 = self.client.post(f"/api/v1/sale/orders/{order_id}/action/", {"action": "confirm"}, format="json")
+            assert r3.status_code == 200, r3.content
+            numbers.append((order_id, r3.json()["sales_order"]))
+        # YYYYMMDD-<id>: duas vendas no mesmo minuto não colidem na coluna única
+        assert len({n for _, n in numbers}) == 2
+        assert all(n.endswith(f"-{oid:06d}") for oid, n in numbers)
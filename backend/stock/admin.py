@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Stock, StockMovement
+from .models import (
+    Stock,
+    StockMovement,
+    StockMovementMonthlySummary,
+    StockMovementArchive,
+    StockLedgerCheckpoint,
+    StockLedgerCheckRun,
+)
 
 
 @admin.register(Stock)
@@ -19,3 +26,33 @@ class StockMovementAdmin(admin.ModelAdmin):
     autocomplete_fields = ("product",)
     ordering = ("-created_at",)
 
+
+@admin.register(StockMovementMonthlySummary)
+class StockMovementMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = ("id", "product", "month", "entrada_qty", "saida_qty", "ajuste_qty", "movement_count")
+    search_fields = ("product__name", "product__sku")
+    autocomplete_fields = ("product",)
+    ordering = ("-month",)
+
+
+@admin.register(StockMovementArchive)
+class StockMovementArchiveAdmin(admin.ModelAdmin):
+    list_display = ("id", "product", "month", "movement_count", "codec", "archived_at")
+    search_fields = ("product__name", "product__sku")
+    exclude = ("payload",)
+    ordering = ("-month",)
+
+
+@admin.register(StockLedgerCheckpoint)
+class StockLedgerCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("id", "product", "last_movement_id", "balance", "drift", "checked_at")
+    list_filter = ("checked_at",)
+    search_fields = ("product__name", "product__sku")
+    readonly_fields = ("product", "last_movement_id", "balance", "drift", "checked_at")
+
+
+@admin.register(StockLedgerCheckRun)
+class StockLedgerCheckRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "started_at", "finished_at", "repair", "products_checked", "movements_scanned", "drift_count", "repaired_count")
+    list_filter = ("repair",)
+    ordering = ("-started_at",)
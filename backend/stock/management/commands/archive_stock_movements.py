@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from stock.models import StockMovement
+from stock.services.archive import MIN_RETENTION_DAYS, archive_movements, retention_cutoff
+from stock.services.ledger import check_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva movimentações de estoque mais antigas que a retenção em lotes compactados, "
+        "mantendo totais mensais por produto"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", dest="retention_days", type=int, help="Dias mantidos na tabela quente")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=5000, help="Movimentações por transação")
+        parser.add_argument("--dry-run", action="store_true", dest="dry", help="Apenas conta o que seria arquivado")
+
+    def handle(self, *args, **options):
+        days = options.get("retention_days") or getattr(settings, "STOCK_MOVEMENT_RETENTION_DAYS", 365)
+        if days < MIN_RETENTION_DAYS:
+            raise CommandError(f"Retenção mínima é {MIN_RETENTION_DAYS} dias (usada pelo giro de reposição).")
+        cutoff = retention_cutoff(days)
+        pending = StockMovement.objects.filter(created_at__lt=cutoff).count()
+        self.stdout.write(f"Movimentações anteriores a {cutoff:%Y-%m-%d}: {pending}")
+        if options.get("dry") or not pending:
+            return
+        # Avança os checkpoints do razão antes de os movimentos saírem da tabela quente
+        run = check_ledger()
+        if run.drift_count:
+            self.stdout.write(self.style.WARNING(f"Divergências de saldo encontradas antes do arquivamento: {run.drift_count}"))
+        moved = archive_movements(cutoff, batch_size=max(1, options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Movimentações arquivadas: {moved}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from stock.services.ledger import check_ledger
+
+
+class Command(BaseCommand):
+    help = "Confere o saldo em cache de cada produto contra as movimentações desde o último checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="Corrige saldos divergentes para o valor do razão")
+
+    def handle(self, *args, **options):
+        run = check_ledger(repair=options["repair"])
+        self.stdout.write(
+            f"Produtos conferidos: {run.products_checked} | movimentações lidas: {run.movements_scanned}"
+        )
+        for d in run.details[:50]:
+            self.stdout.write(f"  produto={d['product_id']} cache={d['cached']} razão={d['ledger']} diferença={d['drift']}")
+        if run.drift_count and not run.repair:
+            self.stdout.write(self.style.WARNING(f"Divergências: {run.drift_count} (use --repair para corrigir)"))
+        elif run.drift_count:
+            self.stdout.write(self.style.SUCCESS(f"Divergências corrigidas: {run.repaired_count}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Razão consistente."))
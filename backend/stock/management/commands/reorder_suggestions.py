@@ -0,0 +1,53 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from stock.services.reorder import compute_reorder_suggestions
+
+
+class Command(BaseCommand):
+    help = "Calcula sugestões de compra por fornecedor com base no giro de vendas (7/30/90 dias)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", dest="date", help="Data de referência YYYY-MM-DD (opcional)")
+        parser.add_argument("--cover-days", dest="cover_days", type=int, help="Dias de cobertura desejados")
+        parser.add_argument("--window", dest="window", type=int, help="Janela (dias) usada para o giro")
+        parser.add_argument("--supplier", dest="supplier", type=int, help="Filtrar por fornecedor (id)")
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Saída em JSON")
+
+    def handle(self, *args, **options):
+        ref_str = options.get("date")
+        try:
+            ref_date = datetime.date.fromisoformat(ref_str) if ref_str else None
+        except ValueError:
+            raise CommandError("Data inválida. Use YYYY-MM-DD.")
+        # Mesma regra do endpoint: zero ou negativo divide por zero ou gera sugestão sem sentido
+        for name, flag in (("cover_days", "--cover-days"), ("window", "--window")):
+            if options.get(name) is not None and options[name] <= 0:
+                raise CommandError(f"{flag} deve ser positivo.")
+
+        started = time.perf_counter()
+        data = compute_reorder_suggestions(
+            ref_date=ref_date,
+            cover_days=options.get("cover_days"),
+            velocity_window=options.get("window"),
+            supplier_id=options.get("supplier"),
+        )
+        elapsed = time.perf_counter() - started
+
+        if options.get("as_json"):
+            self.stdout.write(json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+            return
+
+        for bucket in data["suppliers"]:
+            name = bucket["supplier_name"] or "(sem fornecedor)"
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} - total {bucket['total_cost']}"))
+            for it in bucket["items"]:
+                self.stdout.write(
+                    f"  {it['sku']:<10} {it['name'][:40]:<40} atual={it['quantity_current']} "
+                    f"giro30={it['velocity_30d']}/dia cobertura={it['days_of_cover']} sugerido={it['suggested_quantity']}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Itens sugeridos: {data['count']} ({elapsed:.2f}s)"))
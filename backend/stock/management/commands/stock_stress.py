@@ -0,0 +1,83 @@
+import json
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from stock.services.stress import SUPPORTED_VENDORS, run_stress
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de contenção: N processos vendendo os mesmos produtos via confirm_order/StockMovement. "
+        "Mede vazão, espera por lock da linha de estoque (SELECT ... FOR UPDATE, só no Postgres), tempo de "
+        "escritas e deadlocks, e valida que o saldo nunca fica negativo nem diverge das movimentações. "
+        "No SQLite não há lock de linha: a espera pelo lock do banco fica no tempo das escritas. "
+        "Use um banco descartável (ex.: DJANGO_DB_NAME=/tmp/stress.sqlite3)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Processos concorrentes")
+        parser.add_argument("--ops", type=int, default=100, help="Vendas por processo")
+        parser.add_argument("--products", type=int, default=3, help="Produtos disputados")
+        parser.add_argument("--mode", choices=["order", "movement"], default="order", help="Camada exercitada")
+        parser.add_argument("--initial", type=Decimal, help="Saldo inicial por produto (padrão: metade da demanda)")
+        parser.add_argument("--quantity", type=Decimal, default=Decimal("1"), help="Quantidade por venda")
+        parser.add_argument("--retries", type=int, default=10, help="Tentativas em deadlock/lock timeout")
+        parser.add_argument(
+            "--lock-timeout-ms", type=int, default=5000, dest="lock_timeout_ms",
+            help="Espera máxima por lock (lock_timeout no Postgres, busy_timeout no SQLite)",
+        )
+        parser.add_argument("--no-wal", action="store_true", dest="no_wal", help="Não ativar WAL no SQLite")
+        parser.add_argument("--inline", action="store_true", help="Executar no processo atual (sem paralelismo)")
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Saída em JSON")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["ops"] < 1 or options["products"] < 1 or options["lock_timeout_ms"] < 1:
+            raise CommandError("workers, ops, products e lock-timeout-ms devem ser positivos.")
+        if connection.vendor not in SUPPORTED_VENDORS:
+            raise CommandError(f"Banco {connection.vendor} não suportado (use sqlite ou postgresql).")
+        report = run_stress(
+            workers=options["workers"],
+            ops=options["ops"],
+            products=options["products"],
+            mode=options["mode"],
+            initial_qty=options.get("initial"),
+            quantity=options["quantity"],
+            retries=options["retries"],
+            wal=not options["no_wal"],
+            inline=options["inline"],
+            lock_timeout_ms=options["lock_timeout_ms"],
+        )
+        if options["as_json"]:
+            self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, indent=2))
+        else:
+            self.stdout.write(
+                f"{report['vendor']} wal={report['wal']} mode={report['mode']} workers={report['workers']} "
+                f"ok={report['ok']} rejeitadas={report['rejected']} desistências={report['aborted']} erros={report['errors']}"
+            )
+            self.stdout.write(
+                f"vazão={report['throughput_ops_s']} ops/s latência p50={report['latency_ms']['p50']}ms "
+                f"p95={report['latency_ms']['p95']}ms"
+            )
+            wait = report["lock_wait_ms"]
+            if wait["measured"]:
+                self.stdout.write(
+                    f"espera por lock (FOR UPDATE) n={wait['count']} total={wait['total']}ms "
+                    f"p95={wait['p95']}ms max={wait['max']}ms"
+                )
+            else:
+                self.stdout.write("espera por lock: não medida à parte no SQLite (incluída no tempo de escritas)")
+            self.stdout.write(
+                f"tempo de escritas total={report['write_stmt_ms']['total']}ms p95={report['write_stmt_ms']['p95']}ms "
+                f"deadlocks={report['deadlock']} lock_timeouts={report['lock_timeout']}"
+            )
+            self.stdout.write(f"saldo mínimo visto por produto: {report['min_balance']}")
+        if not report["passed"]:
+            raise CommandError(
+                f"Invariantes violadas: negativos={report['negative']} negativos durante a carga={report['negative_seen']} "
+                f"razão negativo={report['negative_ledger']} divergências={report['drift']} "
+                f"erros={report['errors']} {report['error_samples']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Estoque consistente."))
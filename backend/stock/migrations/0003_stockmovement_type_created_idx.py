@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_stock_uuid_stockmovement_uuid'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['type', 'created_at'], name='stockmov_type_created_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:26
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_needs_review'),
+        ('stock', '0003_stockmovement_type_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovementMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('month', models.DateField(help_text='Primeiro dia do mês')),
+                ('entrada_qty', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('saida_qty', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('ajuste_qty', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('movement_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_monthly_summaries', to='catalog.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovementArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('movement_count', models.PositiveIntegerField()),
+                ('first_movement_id', models.BigIntegerField()),
+                ('last_movement_id', models.BigIntegerField()),
+                ('codec', models.CharField(default='zlib', max_length=10)),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movement_archives', to='catalog.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockmovementmonthlysummary',
+            constraint=models.UniqueConstraint(fields=('product', 'month'), name='uniq_stock_summary_product_month'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovementarchive',
+            index=models.Index(fields=['product', 'month'], name='stockarch_product_month_idx'),
+        ),
+    ]
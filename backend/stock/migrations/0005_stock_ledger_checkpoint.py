@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:31
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_needs_review'),
+        ('stock', '0004_stock_movement_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLedgerCheckRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('repair', models.BooleanField(default=False)),
+                ('products_checked', models.PositiveIntegerField(default=0)),
+                ('movements_scanned', models.PositiveIntegerField(default=0)),
+                ('drift_count', models.PositiveIntegerField(default=0)),
+                ('repaired_count', models.PositiveIntegerField(default=0)),
+                ('details', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockLedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_movement_id', models.BigIntegerField(default=0)),
+                ('balance', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('drift', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('checked_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_checkpoint', to='catalog.product')),
+            ],
+        ),
+    ]
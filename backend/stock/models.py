@@ -1,4 +1,6 @@
 from decimal import Decimal
+import json
+import zlib
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
@@ -67,6 +69,12 @@ class StockMovement(TimeStampedModel):
     reference = models.CharField(max_length=60, blank=True)
     note = models.CharField(max_length=255, blank=True)
 
+    class Meta:
+        indexes = [
+            # Agregações de giro (SAIDA por período) e listagens por data
+            models.Index(fields=["type", "created_at"], name="stockmov_type_created_idx"),
+        ]
+
     def clean(self):
         errors = {}
         if self.type in ("ENTRADA", "SAIDA"):
@@ -99,10 +107,86 @@ class StockMovement(TimeStampedModel):
     def save(self, *args, **kwargs):
         creating = self.pk is None
         self.full_clean()
-        result = super().save(*args, **kwargs)
-        if creating:
-            self.apply()
+        # Movimento e saldo na mesma transação: se apply() rejeitar, o movimento não fica no histórico
+        with transaction.atomic():
+            result = super().save(*args, **kwargs)
+            if creating:
+                self.apply()
         return result
 
     def __str__(self):
         return f"{self.type} {self.quantity} ({self.product_id})"
+
+
+class StockMovementMonthlySummary(TimeStampedModel):
+    """Totais mensais por produto das movimentações já arquivadas."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_monthly_summaries")
+    month = models.DateField(help_text="Primeiro dia do mês")
+    entrada_qty = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    saida_qty = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    ajuste_qty = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    movement_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "month"], name="uniq_stock_summary_product_month"),
+        ]
+
+    @property
+    def net_quantity(self):
+        return self.entrada_qty - self.saida_qty + self.ajuste_qty
+
+    def __str__(self):
+        return f"Resumo {self.product_id} {self.month:%Y-%m}"
+
+
+class StockMovementArchive(models.Model):
+    """Lote compactado (JSON + zlib) de movimentações removidas da tabela quente."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_movement_archives")
+    month = models.DateField()
+    movement_count = models.PositiveIntegerField()
+    first_movement_id = models.BigIntegerField()
+    last_movement_id = models.BigIntegerField()
+    codec = models.CharField(max_length=10, default="zlib")
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "month"], name="stockarch_product_month_idx"),
+        ]
+
+    def movements(self):
+        return json.loads(zlib.decompress(bytes(self.payload)).decode("utf-8"))
+
+    def __str__(self):
+        return f"Arquivo {self.product_id} {self.month:%Y-%m} ({self.movement_count})"
+
+
+class StockLedgerCheckpoint(models.Model):
+    """Último ponto verificado do razão de estoque por produto (checagem incremental)."""
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="ledger_checkpoint")
+    last_movement_id = models.BigIntegerField(default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    drift = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    checked_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Checkpoint {self.product_id} @{self.last_movement_id}: {self.balance}"
+
+
+class StockLedgerCheckRun(models.Model):
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    repair = models.BooleanField(default=False)
+    products_checked = models.PositiveIntegerField(default=0)
+    movements_scanned = models.PositiveIntegerField(default=0)
+    drift_count = models.PositiveIntegerField(default=0)
+    repaired_count = models.PositiveIntegerField(default=0)
+    details = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"Checagem {self.id} ({self.drift_count} divergências)"
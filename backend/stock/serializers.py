@@ -2,7 +2,56 @@ from rest_framework import serializers
 from catalog.models import Product
 from .models import Stock, StockMovement
 from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 from decimal import Decimal
+import datetime
+import uuid
+
+
+# Listagem de estoque: colunas lidas via values() com os campos do produto já no JOIN
+STOCK_LIST_VALUES = {
+    "product_name": F("product__name"),
+    "product_sku": F("product__sku"),
+    "product_barcode": F("product__barcode"),
+    "sale_price": F("product__sale_price"),
+    "category": F("product__category_id"),
+    "category_name": F("product__category__name"),
+    "brand": F("product__brand_id"),
+    "brand_name": F("product__brand__name"),
+}
+STOCK_LIST_FIELDS = [
+    "id",
+    "uuid",
+    "product",
+    "quantity_current",
+    "minimum",
+    "maximum",
+    "status",
+    "created_at",
+    "updated_at",
+]
+
+
+def _plain(value):
+    # Mesmo formato que os campos DRF produziriam (decimais como string, datas ISO no fuso local)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        out = timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+        return out[:-6] + "Z" if out.endswith("+00:00") else out
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def stock_list_values(queryset):
+    return queryset.values(*STOCK_LIST_FIELDS, **STOCK_LIST_VALUES)
+
+
+def stock_list_rows(rows):
+    """Linhas de estoque prontas para JSON, sem instanciar models nem campos de serializer."""
+    return [{key: _plain(val) for key, val in row.items()} for row in rows]
 
 
 class StockSerializer(serializers.ModelSerializer):
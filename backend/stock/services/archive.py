@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import bisect
+import datetime
+import json
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import StockMovement, StockMovementArchive, StockMovementMonthlySummary
+
+
+# Janela mínima mantida na tabela quente (o giro de reposição usa até 90 dias)
+MIN_RETENTION_DAYS = 90
+
+
+def retention_cutoff(retention_days: int, today: Optional[datetime.date] = None) -> datetime.datetime:
+    """Início do mês que contém (hoje - retenção): só meses completos são arquivados."""
+    today = today or timezone.localdate()
+    first = (today - datetime.timedelta(days=retention_days)).replace(day=1)
+    return timezone.make_aware(datetime.datetime.combine(first, datetime.time.min))
+
+
+def _month_of(dt: datetime.datetime) -> datetime.date:
+    return timezone.localtime(dt).date().replace(day=1)
+
+
+def _compress(rows: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def archive_batch(cutoff: datetime.datetime, batch_size: int = 5000) -> int:
+    """Arquiva um lote de movimentações anteriores a `cutoff`. Retorna quantas foram movidas."""
+    from ..serializers import StockMovementSerializer
+
+    with transaction.atomic():
+        batch = list(
+            StockMovement.objects.select_for_update()
+            .filter(created_at__lt=cutoff)
+            .order_by("id")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        groups: Dict[tuple, List[StockMovement]] = defaultdict(list)
+        for mv in batch:
+            groups[(mv.product_id, _month_of(mv.created_at))].append(mv)
+
+        chunks = []
+        for (product_id, month), movements in groups.items():
+            # Mesma representação da API, para o modo include_archived
+            rows = StockMovementSerializer(movements, many=True).data
+            chunks.append(
+                StockMovementArchive(
+                    product_id=product_id,
+                    month=month,
+                    movement_count=len(movements),
+                    first_movement_id=movements[0].id,
+                    last_movement_id=movements[-1].id,
+                    payload=_compress([dict(r) for r in rows]),
+                )
+            )
+            totals = {"entrada_qty": Decimal("0"), "saida_qty": Decimal("0"), "ajuste_qty": Decimal("0")}
+            for mv in movements:
+                totals[f"{mv.type.lower()}_qty"] += mv.quantity
+            summary, created = StockMovementMonthlySummary.objects.select_for_update().get_or_create(
+                product_id=product_id, month=month, defaults={**totals, "movement_count": len(movements)}
+            )
+            if not created:
+                StockMovementMonthlySummary.objects.filter(pk=summary.pk).update(
+                    entrada_qty=F("entrada_qty") + totals["entrada_qty"],
+                    saida_qty=F("saida_qty") + totals["saida_qty"],
+                    ajuste_qty=F("ajuste_qty") + totals["ajuste_qty"],
+                    movement_count=F("movement_count") + len(movements),
+                    updated_at=timezone.now(),
+                )
+        StockMovementArchive.objects.bulk_create(chunks)
+        StockMovement.objects.filter(id__in=[mv.id for mv in batch]).delete()
+    return len(batch)
+
+
+def archive_movements(cutoff: datetime.datetime, batch_size: int = 5000) -> int:
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size=batch_size)
+        if not moved:
+            return total
+        total += moved
+
+
+def archived_movements(
+    product_id: int,
+    types: Optional[Iterable[str]] = None,
+    created_gte: Optional[datetime.datetime] = None,
+    created_lte: Optional[datetime.datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Movimentações arquivadas de um produto, já no formato da API (mais recentes primeiro)."""
+    qs = StockMovementArchive.objects.filter(product_id=product_id)
+    if created_gte is not None:
+        qs = qs.filter(month__gte=_month_of(created_gte))
+    if created_lte is not None:
+        qs = qs.filter(month__lte=_month_of(created_lte))
+    types = set(types or [])
+    rows: List[Dict[str, Any]] = []
+    for chunk in qs.order_by("-month", "-last_movement_id"):
+        for row in chunk.movements():
+            if types and row["type"] not in types:
+                continue
+            created = parse_created(row)
+            if created_gte is not None and created < created_gte:
+                continue
+            if created_lte is not None and created > created_lte:
+                continue
+            row["archived"] = True
+            rows.append(row)
+    rows.sort(key=lambda r: (parse_created(r), r["id"]), reverse=True)
+    return rows
+
+
+def parse_created(row: Dict[str, Any]) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(str(row["created_at"]).replace("Z", "+00:00"))
+
+
+def _archived_key(row: Dict[str, Any], field: str):
+    value = parse_created(row) if field == "created_at" else Decimal(str(row[field]))
+    return value, row["id"]
+
+
+class MergedMovements:
+    """Movimentações da tabela quente + arquivadas de um produto, como uma lista paginável só.
+
+    A parte quente fica no banco, ordenada por (campo, id) no ORDER BY; as arquivadas do produto
+    (já descompactadas, ordenadas igual) ficam em memória. Uma página [início, fim) só lê da
+    tabela quente a fatia [início - arquivadas, fim): nenhuma linha quente que caia antes ou
+    depois da página pode estar nela. A posição de cada linha na lista mesclada é o índice no
+    seu lado mais quantas do outro lado vêm antes dela.
+    """
+
+    def __init__(self, hot, archived: List[Dict[str, Any]], field: str, descending: bool, serialize: Callable):
+        sign = "-" if descending else ""
+        self.hot = hot.order_by(f"{sign}{field}", f"{sign}id")
+        self.field = field
+        self.descending = descending
+        self.serialize = serialize
+        self.archived = sorted(archived, key=lambda r: _archived_key(r, field), reverse=descending)
+        self._keys = sorted(_archived_key(r, field) for r in archived)
+        self._hot_count: Optional[int] = None
+
+    def count(self) -> int:
+        if self._hot_count is None:
+            self._hot_count = self.hot.count()
+        return self._hot_count + len(self.archived)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def _archived_before(self, obj) -> int:
+        pos = bisect.bisect_left(self._keys, (getattr(obj, self.field), obj.id))
+        return len(self._keys) - pos if self.descending else pos
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        total = self.count()
+        start = max(0, item.start or 0)
+        stop = min(total, total if item.stop is None else item.stop)
+        if start >= stop:
+            return []
+        base = max(0, start - len(self.archived))
+        window = list(self.hot[base:stop])
+        positions = [base + i + self._archived_before(obj) for i, obj in enumerate(window)]
+        # Arquivadas antes do início = início - quentes antes do início (todas as de índice < base estão lá)
+        next_archived = start - (base + sum(1 for p in positions if p < start))
+        on_page = {p: obj for p, obj in zip(positions, window) if start <= p < stop}
+        serialized = dict(zip(on_page, self.serialize(list(on_page.values()))))
+        rows = []
+        for pos in range(start, stop):
+            if pos in serialized:
+                rows.append(serialized[pos])
+            else:
+                rows.append(self.archived[next_archived])
+                next_archived += 1
+        return rows
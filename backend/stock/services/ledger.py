@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Min, Q, Sum, When
+from django.utils import timezone
+
+from catalog.models import Product
+
+from ..models import (
+    Stock,
+    StockLedgerCheckpoint,
+    StockLedgerCheckRun,
+    StockMovement,
+    StockMovementMonthlySummary,
+)
+
+
+QTY = DecimalField(max_digits=14, decimal_places=3)
+ZERO = Decimal("0")
+# Movimentos mais novos que isso entram na conferência mas não avançam o checkpoint:
+# transações ainda abertas podem confirmar ids menores depois da leitura.
+SETTLE_SECONDS = 60
+
+
+def signed_quantity():
+    """ENTRADA soma, SAIDA subtrai, AJUSTE já vem com sinal."""
+    return Case(When(type="SAIDA", then=-F("quantity")), default=F("quantity"), output_field=QTY)
+
+
+def movement_deltas(product_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, Any]]:
+    """Soma das movimentações posteriores ao checkpoint de cada produto.
+
+    `delta` cobre todas; `settled_delta`/`settled_last_id` só as anteriores à janela de assentamento.
+    Produtos com checkpoint: faixa de ids acima do menor checkpoint (PK) e o corte por produto no
+    JOIN com a tabela de checkpoints. Produtos sem checkpoint (primeira checagem): todas as
+    movimentações deles, pelo índice de product_id.
+    """
+    horizon = timezone.now() - datetime.timedelta(seconds=SETTLE_SECONDS)
+    settled = Q(created_at__lt=horizon)
+    checkpoints = StockLedgerCheckpoint.objects.all()
+    new_products = Product.objects.filter(ledger_checkpoint__isnull=True)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        checkpoints = checkpoints.filter(product_id__in=product_ids)
+        new_products = new_products.filter(id__in=product_ids)
+    floor = checkpoints.aggregate(floor=Min("last_movement_id"))["floor"]
+
+    querysets = [StockMovement.objects.filter(product_id__in=new_products.values("id"))]
+    if floor is not None:
+        tracked = StockMovement.objects.filter(id__gt=floor, product__ledger_checkpoint__last_movement_id__lt=F("id"))
+        if product_ids is not None:
+            tracked = tracked.filter(product_id__in=product_ids)
+        querysets.append(tracked)
+
+    result: Dict[int, Dict[str, Any]] = {}
+    for qs in querysets:
+        rows = (
+            qs.values("product_id")
+            .annotate(
+                delta=Sum(signed_quantity()),
+                count=Count("id"),
+                settled_delta=Sum(signed_quantity(), filter=settled),
+                settled_last_id=Max("id", filter=settled),
+            )
+            .order_by()
+        )
+        result.update((row["product_id"], row) for row in rows)
+    return result
+
+
+def _archived_net_without_checkpoint() -> Dict[int, Decimal]:
+    """Saldo já arquivado de produtos ainda sem checkpoint (base da primeira checagem)."""
+    net = F("entrada_qty") - F("saida_qty") + F("ajuste_qty")
+    rows = (
+        StockMovementMonthlySummary.objects.filter(product__ledger_checkpoint__isnull=True)
+        .values("product_id")
+        .annotate(net=Sum(net, output_field=QTY))
+        .order_by()
+    )
+    return {row["product_id"]: row["net"] or ZERO for row in rows}
+
+
+def check_ledger(repair: bool = False) -> StockLedgerCheckRun:
+    """Confere Stock.quantity_current contra o razão, lendo só movimentações desde o último checkpoint.
+
+    Com repair=True os saldos divergentes são corrigidos para o valor do razão (sob lock de linha).
+    """
+    run = StockLedgerCheckRun.objects.create(repair=repair)
+    deltas = movement_deltas()
+    archived = _archived_net_without_checkpoint()
+    checkpoints = {
+        row["product_id"]: row
+        for row in StockLedgerCheckpoint.objects.values("id", "product_id", "last_movement_id", "balance", "drift")
+    }
+    cached = dict(Stock.objects.values_list("product_id", "quantity_current"))
+
+    expected: Dict[int, Decimal] = {}
+    for pid in set(cached) | set(deltas) | set(checkpoints):
+        cp = checkpoints.get(pid)
+        base = cp["balance"] if cp else archived.get(pid, ZERO)
+        expected[pid] = base + (deltas[pid]["delta"] if pid in deltas else ZERO)
+
+    drifted = [pid for pid, value in expected.items() if cached.get(pid, ZERO) != value]
+    details = []
+    repaired = 0
+    if drifted:
+        with transaction.atomic():
+            # Revalida sob lock: movimentos concorrentes desde a leitura não contam como divergência
+            locked = {st.product_id: st for st in Stock.objects.select_for_update().filter(product_id__in=drifted)}
+            fresh = movement_deltas(drifted)
+            to_fix = []
+            for pid in drifted:
+                cp = checkpoints.get(pid)
+                base = cp["balance"] if cp else archived.get(pid, ZERO)
+                if pid in fresh:
+                    deltas[pid] = fresh[pid]
+                value = base + (deltas[pid]["delta"] if pid in deltas else ZERO)
+                expected[pid] = value
+                st = locked.get(pid)
+                current = st.quantity_current if st else ZERO
+                if current == value:
+                    continue
+                details.append({"product_id": pid, "cached": str(current), "ledger": str(value), "drift": str(current - value)})
+                if repair and st is not None:
+                    st.quantity_current = value
+                    st.recalc_status()
+                    st.updated_at = timezone.now()
+                    to_fix.append(st)
+            if to_fix:
+                Stock.objects.bulk_update(to_fix, ["quantity_current", "status", "updated_at"])
+                repaired = len(to_fix)
+
+    drift_by_product = {int(d["product_id"]): Decimal(d["drift"]) for d in details}
+    new_cps, upd_cps = [], []
+    for pid in expected:
+        cp = checkpoints.get(pid)
+        base = cp["balance"] if cp else archived.get(pid, ZERO)
+        row = deltas.get(pid)
+        if row and row["settled_last_id"]:
+            last_id, balance = row["settled_last_id"], base + (row["settled_delta"] or ZERO)
+        else:
+            last_id, balance = (cp["last_movement_id"] if cp else 0), base
+        drift = ZERO if repair else drift_by_product.get(pid, ZERO)
+        if cp is None:
+            new_cps.append(StockLedgerCheckpoint(product_id=pid, last_movement_id=last_id, balance=balance, drift=drift))
+        elif last_id != cp["last_movement_id"] or drift != cp["drift"]:
+            upd_cps.append(
+                StockLedgerCheckpoint(
+                    id=cp["id"], product_id=pid, last_movement_id=last_id, balance=balance, drift=drift,
+                    checked_at=timezone.now(),
+                )
+            )
+    StockLedgerCheckpoint.objects.bulk_create(new_cps, batch_size=1000)
+    StockLedgerCheckpoint.objects.bulk_update(upd_cps, ["last_movement_id", "balance", "drift", "checked_at"], batch_size=1000)
+    # Produtos sem movimentação nova não têm nada entre o checkpoint e o maior id assentado lido:
+    # avançam até ele, senão um produto parado seguraria o piso da faixa de ids para sempre
+    idle_to = max((row["settled_last_id"] or 0 for row in deltas.values()), default=0)
+    if idle_to:
+        StockLedgerCheckpoint.objects.filter(last_movement_id__lt=idle_to).exclude(product_id__in=list(deltas)).update(
+            last_movement_id=idle_to
+        )
+
+    run.products_checked = len(expected)
+    run.movements_scanned = sum(d["count"] for d in deltas.values())
+    run.drift_count = len(details)
+    run.repaired_count = repaired
+    run.details = details[:500]
+    run.finished_at = timezone.now()
+    run.save()
+    return run
+
+
+def run_as_dict(run: StockLedgerCheckRun) -> Dict[str, Any]:
+    return {
+        "id": run.id,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "repair": run.repair,
+        "products_checked": run.products_checked,
+        "movements_scanned": run.movements_scanned,
+        "drift_count": run.drift_count,
+        "repaired_count": run.repaired_count,
+        "details": run.details,
+    }
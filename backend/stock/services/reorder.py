@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal, ROUND_CEILING
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from purchase.models import SupplierProduct
+from ..models import Stock, StockMovement
+
+
+DEFAULT_WINDOWS = (7, 30, 90)
+Q3 = Decimal("0.001")
+Q2 = Decimal("0.01")
+
+
+def _window_start(ref_date: datetime.date, days: int) -> datetime.datetime:
+    """Início (inclusivo) da janela de `days` dias terminando no fim de ref_date."""
+    start = ref_date - datetime.timedelta(days=days - 1)
+    return timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+
+
+def sales_velocities(ref_date: datetime.date, windows: Iterable[int] = DEFAULT_WINDOWS) -> Dict[int, Dict[int, Decimal]]:
+    """Quantidade vendida por produto em cada janela, numa única consulta agrupada.
+
+    Saídas de pedidos cancelados (ENTRADA com referência ORDER_CANCEL) são descontadas.
+    Retorna {product_id: {janela: quantidade}}.
+    """
+    windows = sorted(set(int(w) for w in windows))
+    end = _window_start(ref_date + datetime.timedelta(days=1), 1)
+    oldest = _window_start(ref_date, windows[-1])
+    sold = Q(type="SAIDA")
+    cancelled = Q(type="ENTRADA", reference__startswith="ORDER_CANCEL")
+    annotations = {}
+    for w in windows:
+        in_window = Q(created_at__gte=_window_start(ref_date, w))
+        annotations[f"out_{w}"] = Sum("quantity", filter=sold & in_window)
+        annotations[f"back_{w}"] = Sum("quantity", filter=cancelled & in_window)
+    rows = (
+        StockMovement.objects.filter(created_at__gte=oldest, created_at__lt=end)
+        .filter(sold | cancelled)
+        .values("product_id")
+        .annotate(**annotations)
+        .order_by()
+    )
+    result: Dict[int, Dict[int, Decimal]] = {}
+    for row in rows:
+        per_window = {}
+        for w in windows:
+            qty = (row[f"out_{w}"] or Decimal("0")) - (row[f"back_{w}"] or Decimal("0"))
+            per_window[w] = max(qty, Decimal("0"))
+        result[row["product_id"]] = per_window
+    return result
+
+
+def _best_suppliers() -> Dict[int, Dict[str, Any]]:
+    """Fornecedor de menor last_cost por produto (desempate: compra mais recente)."""
+    best: Dict[int, Dict[str, Any]] = {}
+    rows = (
+        SupplierProduct.objects.filter(last_cost__isnull=False)
+        .values("product_id", "supplier_id", "supplier__corporate_name", "last_cost", "last_purchase_date")
+        .order_by("product_id", "last_cost", "-last_purchase_date")
+    )
+    for row in rows:
+        if row["product_id"] not in best:
+            best[row["product_id"]] = row
+    return best
+
+
+def compute_reorder_suggestions(
+    ref_date: Optional[datetime.date] = None,
+    cover_days: Optional[int] = None,
+    velocity_window: Optional[int] = None,
+    supplier_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Sugestão de compra agrupada por fornecedor.
+
+    Três consultas no total (vendas agrupadas, saldos e custos por fornecedor); o cálculo
+    é um único passe em memória sobre as linhas retornadas, sem consultas por produto.
+    """
+    ref_date = ref_date or timezone.localdate()
+    cover_days = int(cover_days or getattr(settings, "REORDER_COVER_DAYS", 30))
+    velocity_window = int(velocity_window or getattr(settings, "REORDER_VELOCITY_WINDOW", 30))
+    windows = sorted(set(DEFAULT_WINDOWS) | {velocity_window})
+
+    sold = sales_velocities(ref_date, windows)
+    suppliers = _best_suppliers()
+
+    stocks = (
+        Stock.objects.filter(product__active=True)
+        .values("product_id", "product__sku", "product__name", "quantity_current", "minimum", "maximum")
+        .order_by("product__name")
+    )
+
+    grouped: Dict[Any, Dict[str, Any]] = {}
+    count = 0
+    for st in stocks:
+        pid = st["product_id"]
+        per_window = sold.get(pid)
+        current = st["quantity_current"] or Decimal("0")
+        minimum = st["minimum"] or Decimal("0")
+        maximum = st["maximum"] or Decimal("0")
+        if per_window is None and current >= minimum:
+            continue
+        per_window = per_window or {w: Decimal("0") for w in windows}
+        velocities = {w: (per_window[w] / Decimal(w)).quantize(Q3) for w in windows}
+        velocity = per_window[velocity_window] / Decimal(velocity_window)
+
+        target = max(velocity * cover_days, minimum)
+        if maximum > 0:
+            target = max(min(target, maximum), minimum)
+        suggested = (target - current).to_integral_value(rounding=ROUND_CEILING)
+        if suggested <= 0:
+            continue
+
+        sp = suppliers.get(pid)
+        if supplier_id is not None and (sp is None or sp["supplier_id"] != supplier_id):
+            continue
+        unit_cost = sp["last_cost"] if sp else None
+        key = sp["supplier_id"] if sp else None
+        bucket = grouped.setdefault(
+            key,
+            {
+                "supplier_id": key,
+                "supplier_name": sp["supplier__corporate_name"] if sp else None,
+                "items": [],
+                "total_cost": Decimal("0.00"),
+            },
+        )
+        total_cost = (unit_cost * suggested).quantize(Q2) if unit_cost is not None else None
+        bucket["items"].append(
+            {
+                "product_id": pid,
+                "sku": st["product__sku"],
+                "name": st["product__name"],
+                "quantity_current": current,
+                "minimum": minimum,
+                "maximum": maximum,
+                **{f"velocity_{w}d": velocities[w] for w in DEFAULT_WINDOWS},
+                "days_of_cover": (current / velocity).quantize(Decimal("0.1")) if velocity > 0 else None,
+                "suggested_quantity": suggested.quantize(Q3),
+                "unit_cost": unit_cost,
+                "total_cost": total_cost,
+            }
+        )
+        if total_cost is not None:
+            bucket["total_cost"] += total_cost
+        count += 1
+
+    # Fornecedores com maior valor primeiro; itens sem fornecedor ao final
+    ordered: List[Dict[str, Any]] = sorted(
+        grouped.values(), key=lambda b: (b["supplier_id"] is None, -b["total_cost"])
+    )
+    return {
+        "reference_date": ref_date.isoformat(),
+        "cover_days": cover_days,
+        "velocity_window": velocity_window,
+        "count": count,
+        "suppliers": ordered,
+    }
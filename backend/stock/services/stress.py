@@ -0,0 +1,310 @@
+"""Teste de contenção de estoque com vários processos vendendo os mesmos produtos.
+
+Roda contra o banco configurado; o caminho sai de `connection.vendor`:
+- postgresql: cada processo usa `lock_timeout`, e a espera pelo lock da linha de estoque
+  (SELECT ... FOR UPDATE por chave) é medida à parte das escritas;
+- sqlite: modo WAL e `busy_timeout`. Não há lock de linha (o SQLite não emite FOR UPDATE): a
+  espera pelo lock do banco acontece dentro da primeira escrita da transação e fica no tempo das
+  escritas, sem medida isolada.
+Use sempre um banco descartável: os pedidos, produtos e movimentações criados não são removidos.
+"""
+from __future__ import annotations
+
+import os
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Sum
+
+# Sem import de models no topo: os processos filhos (spawn) carregam este módulo antes do django.setup()
+
+WRITE_SQL_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+SUPPORTED_VENDORS = ("sqlite", "postgresql")
+
+
+def _is_lock_error(exc: Exception) -> str | None:
+    msg = str(exc).lower()
+    if "deadlock" in msg:
+        return "deadlock"
+    if "locked" in msg or "lock timeout" in msg or "could not serialize" in msg:
+        return "lock_timeout"
+    return None
+
+
+class _LockTimer:
+    """execute_wrapper que separa a espera por lock do tempo das escritas.
+
+    SELECT ... FOR UPDATE vai para `lock_wait`: é a busca de uma linha de estoque pela chave, então o
+    tempo do comando é praticamente só a espera pelo lock. INSERT/UPDATE/DELETE vão para `writes`.
+    """
+
+    def __init__(self):
+        self.lock_wait: List[float] = []
+        self.writes: List[float] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        locking = "FOR UPDATE" in sql.upper()
+        if not locking and sql.lstrip()[:6].upper() not in WRITE_SQL_PREFIXES:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            (self.lock_wait if locking else self.writes).append(time.perf_counter() - started)
+
+
+def set_lock_timeout(ms: int) -> None:
+    """Tempo máximo de espera por lock nesta conexão, conforme o banco."""
+    with connection.cursor() as cur:
+        if connection.vendor == "postgresql":
+            cur.execute(f"SET lock_timeout = '{int(ms)}ms'")
+        elif connection.vendor == "sqlite":
+            cur.execute(f"PRAGMA busy_timeout = {int(ms)}")
+
+
+def enable_wal() -> bool:
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cur:
+        cur.execute("PRAGMA journal_mode=WAL")
+        return str(cur.fetchone()[0]).lower() == "wal"
+
+
+def setup_fixture(products: int, initial_qty: Decimal) -> Dict[str, Any]:
+    from django.contrib.auth import get_user_model
+    from catalog.models import Brand, Category, Product
+    from payment.models import PaymentMethod
+    from people.models import Seller
+    from stock.models import StockMovement
+
+    tag = uuid.uuid4().hex[:8]
+    cat, _ = Category.objects.get_or_create(name="STRESS")
+    brand, _ = Brand.objects.get_or_create(name="STRESS")
+    method, _ = PaymentMethod.objects.get_or_create(code="stress-pix", defaults={"name": "Stress PIX", "type": "pix"})
+    user = get_user_model().objects.create_user(username=f"stress-{tag}")
+    seller = Seller.objects.create(user=user, name=f"Stress {tag}", access_level="total")
+    ids = []
+    for i in range(products):
+        p = Product.objects.create(
+            name=f"STRESS-{tag}-{i}", category=cat, brand=brand, cost_price=Decimal("1.00"), margin=Decimal("10.00")
+        )
+        StockMovement.objects.create(product=p, type="ENTRADA", quantity=initial_qty, reference=f"STRESS {tag}")
+        ids.append(p.id)
+    return {"tag": tag, "product_ids": ids, "seller_id": seller.id, "method_id": method.id}
+
+
+def _sell(mode: str, product_id: int, fixture: Dict[str, Any], qty: Decimal):
+    from stock.models import StockMovement
+
+    if mode == "movement":
+        StockMovement.objects.create(product_id=product_id, type="SAIDA", quantity=qty, reference="STRESS")
+        return
+    from catalog.models import Product
+    from sale.models import Order, OrderItem, confirm_order
+
+    with transaction.atomic():
+        order = Order.objects.create(seller_id=fixture["seller_id"], payment_method_id=fixture["method_id"])
+        product = Product.objects.get(pk=product_id)
+        OrderItem(order=order, product=product, quantity=qty, unit_price=product.sale_price).save()
+        confirm_order(order)
+
+
+def worker(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Ponto de entrada de cada processo (compatível com spawn)."""
+    if args.get("spawned"):
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MVPSale.settings.dev")
+        import django
+
+        django.setup()
+    rnd = random.Random(args["seed"])
+    fixture = args["fixture"]
+    from stock.models import Stock
+
+    set_lock_timeout(args["lock_timeout_ms"])
+    timer = _LockTimer()
+    stats = {
+        "ok": 0, "rejected": 0, "aborted": 0, "deadlock": 0, "lock_timeout": 0, "errors": 0,
+        "latencies": [], "error_samples": [], "min_seen": {},
+    }
+    qty = Decimal(str(args["quantity"]))
+    with connection.execute_wrapper(timer):
+        for _ in range(args["ops"]):
+            product_id = rnd.choice(fixture["product_ids"])
+            for attempt in range(args["retries"] + 1):
+                started = time.perf_counter()
+                try:
+                    _sell(args["mode"], product_id, fixture, qty)
+                    stats["ok"] += 1
+                    stats["latencies"].append(time.perf_counter() - started)
+                    break
+                except ValidationError:
+                    stats["rejected"] += 1
+                    break
+                except DatabaseError as exc:
+                    kind = _is_lock_error(exc)
+                    if kind is None:
+                        stats["errors"] += 1
+                        stats["error_samples"].append(str(exc)[:200])
+                        break
+                    stats[kind] += 1
+                    if attempt == args["retries"]:
+                        # Desistência após esgotar tentativas: reportada, mas não é violação de invariante
+                        stats["aborted"] += 1
+                        break
+                    time.sleep(rnd.uniform(0.001, 0.01) * (attempt + 1))
+            # Saldo confirmado logo após cada operação: um negativo no meio da carga aparece aqui
+            seen = Stock.objects.filter(product_id=product_id).values_list("quantity_current", flat=True).first()
+            if seen is not None and seen < stats["min_seen"].get(product_id, seen + 1):
+                stats["min_seen"][product_id] = seen
+    stats["lock_wait"] = timer.lock_wait
+    stats["write_time"] = timer.writes
+    if args.get("spawned"):
+        connections.close_all()
+    return stats
+
+
+def check_invariants(product_ids: List[int]) -> Dict[str, Any]:
+    """Saldo final não negativo e igual à soma das movimentações (drift); razão nunca negativo na ordem de gravação."""
+    from stock.models import Stock, StockMovement
+    from stock.services.ledger import signed_quantity
+
+    running: Dict[int, Decimal] = {}
+    negative_ledger = set()
+    rows = (
+        StockMovement.objects.filter(product_id__in=product_ids)
+        .annotate(signed=signed_quantity())
+        .order_by("product_id", "id")
+        .values_list("product_id", "signed")
+    )
+    for product_id, signed in rows.iterator():
+        running[product_id] = running.get(product_id, Decimal("0")) + signed
+        if running[product_id] < 0:
+            negative_ledger.add(product_id)
+
+    ledger = {
+        row["product_id"]: row["total"] or Decimal("0")
+        for row in StockMovement.objects.filter(product_id__in=product_ids)
+        .values("product_id")
+        .annotate(total=Sum(signed_quantity()))
+        .order_by()
+    }
+    negative, drift = [], []
+    for st in Stock.objects.filter(product_id__in=product_ids).values("product_id", "quantity_current"):
+        if st["quantity_current"] < 0:
+            negative.append(st["product_id"])
+        expected = ledger.get(st["product_id"], Decimal("0"))
+        if expected != st["quantity_current"]:
+            drift.append({"product_id": st["product_id"], "cached": st["quantity_current"], "ledger": expected})
+    return {"negative": negative, "negative_ledger": sorted(negative_ledger), "drift": drift}
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_stress(
+    workers: int = 4,
+    ops: int = 100,
+    products: int = 3,
+    mode: str = "order",
+    initial_qty: Decimal | None = None,
+    quantity: Decimal = Decimal("1"),
+    retries: int = 10,
+    wal: bool = True,
+    inline: bool = False,
+    lock_timeout_ms: int = 5000,
+) -> Dict[str, Any]:
+    """Executa a carga e devolve o relatório. inline=True roda no processo atual (sem paralelismo)."""
+    vendor = connection.vendor
+    if vendor not in SUPPORTED_VENDORS:
+        raise ValueError(f"Banco {vendor} não suportado pelo teste de contenção (use sqlite ou postgresql).")
+    wal_enabled = enable_wal() if wal and vendor == "sqlite" else False
+    if initial_qty is None:
+        # Metade da demanda total: força disputa pelo último item e rejeições por falta de estoque
+        # (no mínimo 1: a entrada inicial precisa ser positiva)
+        initial_qty = max(Decimal("1"), (Decimal(workers * ops) * quantity / Decimal(products) / 2).quantize(Decimal("1")))
+    fixture = setup_fixture(products, initial_qty)
+    jobs = [
+        {
+            "seed": i,
+            "ops": ops,
+            "mode": mode,
+            "quantity": str(quantity),
+            "retries": retries,
+            "lock_timeout_ms": lock_timeout_ms,
+            "fixture": fixture,
+            "spawned": not inline,
+        }
+        for i in range(workers)
+    ]
+
+    started = time.perf_counter()
+    if inline:
+        results = [worker(job) for job in jobs]
+    else:
+        import multiprocessing
+
+        connections.close_all()
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(processes=workers) as pool:
+            results = pool.map(worker, jobs)
+    elapsed = time.perf_counter() - started
+
+    totals = {k: sum(r[k] for r in results) for k in ("ok", "rejected", "aborted", "deadlock", "lock_timeout", "errors")}
+    latencies = [x for r in results for x in r["latencies"]]
+    lock_wait = [x for r in results for x in r["lock_wait"]]
+    write_time = [x for r in results for x in r["write_time"]]
+    min_balance: Dict[int, Decimal] = {}
+    for r in results:
+        for product_id, seen in r["min_seen"].items():
+            min_balance[product_id] = min(seen, min_balance.get(product_id, seen))
+    negative_seen = sorted(pid for pid, seen in min_balance.items() if seen < 0)
+    invariants = check_invariants(fixture["product_ids"])
+    return {
+        "vendor": vendor,
+        "wal": wal_enabled,
+        "mode": mode,
+        "workers": workers,
+        "ops_per_worker": ops,
+        "products": fixture["product_ids"],
+        "initial_qty": initial_qty,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops_s": round(totals["ok"] / elapsed, 1) if elapsed else 0.0,
+        **totals,
+        "latency_ms": {
+            "p50": round(_pct(latencies, 0.50) * 1000, 2),
+            "p95": round(_pct(latencies, 0.95) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2),
+        },
+        # Só o Postgres trava a linha (FOR UPDATE); no SQLite a espera está dentro de write_stmt_ms
+        "lock_wait_ms": {
+            "measured": vendor == "postgresql",
+            "count": len(lock_wait),
+            "total": round(sum(lock_wait) * 1000, 1),
+            "mean": round(statistics.fmean(lock_wait) * 1000, 3) if lock_wait else 0.0,
+            "p95": round(_pct(lock_wait, 0.95) * 1000, 2),
+            "max": round(max(lock_wait, default=0) * 1000, 2),
+        },
+        "write_stmt_ms": {
+            "total": round(sum(write_time) * 1000, 1),
+            "mean": round(statistics.fmean(write_time) * 1000, 3) if write_time else 0.0,
+            "p95": round(_pct(write_time, 0.95) * 1000, 2),
+        },
+        "min_balance": min_balance,
+        "negative_seen": negative_seen,
+        "error_samples": [s for r in results for s in r["error_samples"]][:5],
+        **invariants,
+        "passed": (
+            not invariants["negative"] and not invariants["negative_ledger"] and not invariants["drift"]
+            and not negative_seen and totals["errors"] == 0
+        ),
+    }
@@ -0,0 +1,106 @@
+import datetime
+from io import StringIO
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+
+from catalog.models import Category, Brand, Product
+from stock.models import Stock, StockMovement, StockMovementArchive, StockMovementMonthlySummary
+
+
+User = get_user_model()
+
+
+class StockArchiveTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        self.product = Product.objects.create(name="Cabo", category=cat, brand=brand, cost_price="10.00", margin="10.00")
+        old = timezone.now() - datetime.timedelta(days=500)
+        for mtype, qty in (("ENTRADA", "10"), ("SAIDA", "4"), ("AJUSTE", "-1")):
+            mv = StockMovement.objects.create(product=self.product, type=mtype, quantity=Decimal(qty))
+            StockMovement.objects.filter(pk=mv.pk).update(created_at=old)
+        StockMovement.objects.create(product=self.product, type="SAIDA", quantity=Decimal("2"))
+
+    def test_archive_keeps_summary_and_balance(self):
+        call_command("archive_stock_movements", "--retention-days", "365", "--batch-size", "2", stdout=StringIO())
+        assert StockMovement.objects.count() == 1
+        assert StockMovementArchive.objects.count() == 2  # lotes de 2 movimentações
+        summary = StockMovementMonthlySummary.objects.get(product=self.product)
+        assert summary.movement_count == 3
+        assert summary.net_quantity == Decimal("5")
+        # Saldo em cache não é afetado pelo arquivamento
+        assert Stock.objects.get(product=self.product).quantity_current == Decimal("3")
+
+        r = self.client.get(f"/api/v1/stock/movements/monthly/?product={self.product.id}")
+        assert r.status_code == 200, r.content
+        net = sum(Decimal(str(m["net"])) for m in r.json()["months"])
+        assert net == Decimal("3")
+
+    def test_listing_hot_by_default_and_opt_in_archived(self):
+        call_command("archive_stock_movements", "--retention-days", "365", stdout=StringIO())
+        r = self.client.get(f"/api/v1/stock/movements/?product={self.product.id}")
+        assert r.json()["count"] == 1
+
+        r2 = self.client.get(f"/api/v1/stock/movements/?product={self.product.id}&include_archived=1")
+        assert r2.status_code == 200, r2.content
+        data = r2.json()
+        assert data["count"] == 4
+        assert data["results"][0]["archived"] is False
+        assert {row["type"] for row in data["results"] if row["archived"]} == {"ENTRADA", "SAIDA", "AJUSTE"}
+
+        r3 = self.client.get(f"/api/v1/stock/movements/?product={self.product.id}&include_archived=1&type=ENTRADA")
+        assert r3.json()["count"] == 1
+
+    def test_merged_listing_orders_and_slices_like_a_single_list(self):
+        from stock.services.archive import MergedMovements, archived_movements
+        from stock.serializers import StockMovementSerializer
+
+        call_command("archive_stock_movements", "--retention-days", "365", stdout=StringIO())
+        for qty in ("7", "1", "5", "3"):
+            StockMovement.objects.create(product=self.product, type="ENTRADA", quantity=Decimal(qty))
+
+        r = self.client.get(f"/api/v1/stock/movements/?product={self.product.id}&include_archived=1&ordering=quantity")
+        quantities = [Decimal(str(row["quantity"])) for row in r.json()["results"]]
+        assert quantities == sorted(quantities) and len(quantities) == 8
+
+        def serialize(objs):
+            return [dict(row, archived=False) for row in StockMovementSerializer(objs, many=True).data]
+
+        for field, descending in (("created_at", True), ("quantity", False), ("quantity", True)):
+            merged = MergedMovements(
+                StockMovement.objects.filter(product=self.product), archived_movements(self.product.id),
+                field=field, descending=descending, serialize=serialize,
+            )
+            rows = merged[0:8]
+            full = [row["id"] for row in rows]
+            assert len(set(full)) == 8
+            if field == "quantity":
+                values = [Decimal(str(row["quantity"])) for row in rows]
+                assert values == sorted(values, reverse=descending)
+            else:
+                assert [row["archived"] for row in rows] == [False] * 5 + [True] * 3
+            # Qualquer fatia é a mesma da lista inteira
+            for start in range(8):
+                for size in (1, 3):
+                    assert [row["id"] for row in merged[start:start + size]] == full[start:start + size]
+
+    def test_include_archived_requires_product(self):
+        r = self.client.get("/api/v1/stock/movements/?include_archived=1")
+        assert r.status_code == 400
+
+    def test_retention_below_minimum_rejected(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command("archive_stock_movements", "--retention-days", "30", stdout=StringIO())
@@ -0,0 +1,99 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+
+from catalog.models import Category, Brand, Product
+from stock.models import Stock, StockMovement, StockLedgerCheckpoint
+from stock.services.archive import archive_movements, retention_cutoff
+from stock.services.ledger import check_ledger
+
+
+User = get_user_model()
+
+
+@mock.patch("stock.services.ledger.SETTLE_SECONDS", 0)
+class StockLedgerCheckTest(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        self.p1 = Product.objects.create(name="Cabo", category=cat, brand=brand, cost_price="10.00", margin="10.00")
+        self.p2 = Product.objects.create(name="Fonte", category=cat, brand=brand, cost_price="10.00", margin="10.00")
+        StockMovement.objects.create(product=self.p1, type="ENTRADA", quantity=Decimal("10"))
+        StockMovement.objects.create(product=self.p1, type="SAIDA", quantity=Decimal("3"))
+        StockMovement.objects.create(product=self.p2, type="AJUSTE", quantity=Decimal("5"))
+
+    def test_consistent_and_incremental(self):
+        run = check_ledger()
+        assert run.drift_count == 0
+        assert run.movements_scanned == 3
+        cp = StockLedgerCheckpoint.objects.get(product=self.p1)
+        assert cp.balance == Decimal("7")
+
+        StockMovement.objects.create(product=self.p1, type="SAIDA", quantity=Decimal("2"))
+        run2 = check_ledger()
+        assert run2.drift_count == 0
+        assert run2.movements_scanned == 1
+        cp.refresh_from_db()
+        assert cp.balance == Decimal("5")
+
+    def test_idle_checkpoint_does_not_widen_scan(self):
+        check_ledger()
+        # p2 fica parado enquanto p1 movimenta: o checkpoint de p2 avança e o piso da faixa sobe
+        for _ in range(3):
+            last = StockMovement.objects.create(product=self.p1, type="ENTRADA", quantity=Decimal("1"))
+            check_ledger()
+        assert StockLedgerCheckpoint.objects.get(product=self.p2).last_movement_id == last.id
+
+        StockMovement.objects.create(product=self.p2, type="SAIDA", quantity=Decimal("1"))
+        with CaptureQueriesContext(connection) as ctx:
+            run = check_ledger()
+        assert run.movements_scanned == 1 and run.drift_count == 0
+        scans = [q["sql"] for q in ctx.captured_queries if 'FROM "stock_stockmovement"' in q["sql"]]
+        assert scans and all(f'"stock_stockmovement"."id" > {last.id}' in sql for sql in scans if "INNER JOIN" in sql)
+        assert any("INNER JOIN" in sql for sql in scans)
+
+    def test_drift_reported_then_repaired(self):
+        check_ledger()
+        Stock.objects.filter(product=self.p2).update(quantity_current=Decimal("9"))
+        run = check_ledger()
+        assert run.drift_count == 1
+        assert run.details[0]["product_id"] == self.p2.id
+        assert Decimal(run.details[0]["drift"]) == Decimal("4")
+        assert Stock.objects.get(product=self.p2).quantity_current == Decimal("9")
+
+        fixed = check_ledger(repair=True)
+        assert fixed.repaired_count == 1
+        st = Stock.objects.get(product=self.p2)
+        assert st.quantity_current == Decimal("5")
+        assert st.status == "OK"
+        assert check_ledger().drift_count == 0
+
+    def test_archived_movements_count_towards_first_check(self):
+        old = timezone.now() - datetime.timedelta(days=500)
+        StockMovement.objects.filter(product=self.p1).update(created_at=old)
+        archive_movements(retention_cutoff(365))
+        assert not StockMovement.objects.filter(product=self.p1).exists()
+        run = check_ledger()
+        assert run.drift_count == 0
+        assert StockLedgerCheckpoint.objects.get(product=self.p1).balance == Decimal("7")
+
+    def test_admin_endpoint(self):
+        client = APIClient()
+        User.objects.create_user(username="tester", password="pass1234")
+        User.objects.create_superuser(username="admin", password="pass1234")
+        client.login(username="tester", password="pass1234")
+        assert client.post("/api/v1/stock/ledger-check/", {}, format="json").status_code == 403
+
+        client.login(username="admin", password="pass1234")
+        assert client.get("/api/v1/stock/ledger-check/").status_code == 404
+        r = client.post("/api/v1/stock/ledger-check/", {"repair": True}, format="json")
+        assert r.status_code == 201, r.content
+        assert r.json()["drift_count"] == 0
+        r2 = client.get("/api/v1/stock/ledger-check/")
+        assert r2.json()["id"] == r.json()["id"]
@@ -0,0 +1,77 @@
+import datetime
+from decimal import Decimal
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+
+from catalog.models import Category, Brand, Product
+from people.models import Supplier
+from purchase.models import SupplierProduct
+from stock.models import Stock, StockMovement
+
+
+User = get_user_model()
+
+
+class ReorderSuggestionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        self.fast = Product.objects.create(name="Giro alto", category=cat, brand=brand, cost_price="10.00", margin="10.00")
+        self.idle = Product.objects.create(name="Parado", category=cat, brand=brand, cost_price="10.00", margin="10.00")
+        self.sup_a = Supplier.objects.create(corporate_name="Forn A", cnpj="11111111111111")
+        self.sup_b = Supplier.objects.create(corporate_name="Forn B", cnpj="22222222222222")
+        SupplierProduct.objects.create(supplier=self.sup_a, product=self.fast, supplier_code="A1", last_cost=Decimal("9.50"))
+        SupplierProduct.objects.create(supplier=self.sup_b, product=self.fast, supplier_code="B1", last_cost=Decimal("8.00"))
+
+        StockMovement.objects.create(product=self.fast, type="ENTRADA", quantity=Decimal("100"))
+        StockMovement.objects.create(product=self.idle, type="ENTRADA", quantity=Decimal("50"))
+        # 60 unidades vendidas nos últimos 30 dias (2/dia), sendo 14 nos últimos 7
+        old = StockMovement.objects.create(product=self.fast, type="SAIDA", quantity=Decimal("46"))
+        StockMovement.objects.filter(pk=old.pk).update(created_at=timezone.now() - datetime.timedelta(days=20))
+        StockMovement.objects.create(product=self.fast, type="SAIDA", quantity=Decimal("14"))
+
+    def test_velocities_and_supplier_grouping(self):
+        r = self.client.get("/api/v1/stock/reorder/?cover_days=30")
+        assert r.status_code == 200, r.content
+        data = r.json()
+        assert data["count"] == 1
+        bucket = data["suppliers"][0]
+        # Menor last_cost vence
+        assert bucket["supplier_id"] == self.sup_b.id
+        item = bucket["items"][0]
+        assert item["product_id"] == self.fast.id
+        assert Decimal(str(item["velocity_7d"])) == Decimal("2.000")
+        assert Decimal(str(item["velocity_30d"])) == Decimal("2.000")
+        assert Decimal(str(item["days_of_cover"])) == Decimal("20.0")
+        # alvo 2/dia * 30 dias = 60; saldo 40 -> sugerido 20
+        assert Decimal(str(item["suggested_quantity"])) == Decimal("20")
+        assert Decimal(str(item["total_cost"])) == Decimal("160.00")
+
+    def test_below_minimum_without_sales_is_suggested(self):
+        Stock.objects.filter(product=self.idle).update(minimum=Decimal("80"))
+        r = self.client.get("/api/v1/stock/reorder/")
+        data = r.json()
+        items = {it["product_id"]: it for b in data["suppliers"] for it in b["items"]}
+        assert Decimal(str(items[self.idle.id]["suggested_quantity"])) == Decimal("30")
+        assert items[self.idle.id]["days_of_cover"] is None
+
+    def test_single_pass_query_count(self):
+        from stock.services.reorder import compute_reorder_suggestions
+
+        with self.assertNumQueries(3):
+            compute_reorder_suggestions()
+
+    def test_command_rejects_non_positive_cover_and_window(self):
+        for args in (["--cover-days", "0"], ["--window", "-7"]):
+            with self.assertRaises(CommandError):
+                call_command("reorder_suggestions", *args)
@@ -88,3 +88,13 @@ class StockApiTest(TestCase):
         )
         assert r2.status_code == 400
 
+    def test_rejected_movement_is_not_kept_in_history(self):
+        from django.core.exceptions import ValidationError
+        from stock.models import Stock, StockMovement
+
+        StockMovement.objects.create(product=self.product, type="ENTRADA", quantity="2")
+        with self.assertRaises(ValidationError):
+            StockMovement.objects.create(product=self.product, type="SAIDA", quantity="5")
+        # Movimento e saldo gravados juntos: a saída recusada não fica no histórico
+        assert StockMovement.objects.filter(product=self.product).count() == 1
+        assert str(Stock.objects.get(product=self.product).quantity_current) == "2.000"
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from django.test import TestCase
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+
+from catalog.models import Category, Brand, Product
+from stock.models import Stock, StockMovement
+from stock.serializers import StockSerializer
+
+
+User = get_user_model()
+
+
+class StockListTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="tester", password="pass1234")
+        token = self.client.post("/api/token/", {"username": "tester", "password": "pass1234"}, format="json").json()[
+            "access"
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        self.cat = Category.objects.create(name="Cabos")
+        self.other_cat = Category.objects.create(name="Fontes")
+        self.brand = Brand.objects.create(name="Marca")
+        self.cabo = Product.objects.create(
+            name="Cabo USB", category=self.cat, brand=self.brand, cost_price="10.00", margin="10.00", barcode="789000000001"
+        )
+        self.fonte = Product.objects.create(name="Fonte 12V", category=self.other_cat, brand=self.brand, cost_price="20.00", margin="10.00")
+        StockMovement.objects.create(product=self.cabo, type="ENTRADA", quantity=Decimal("7"))
+        StockMovement.objects.create(product=self.fonte, type="ENTRADA", quantity=Decimal("3"))
+
+    def test_list_matches_serializer_output(self):
+        r = self.client.get("/api/v1/stock/")
+        assert r.status_code == 200, r.content
+        rows = {row["product"]: row for row in r.json()["results"]}
+        stock = Stock.objects.get(product=self.cabo)
+        expected = StockSerializer(stock).data
+        for key in expected:
+            assert rows[self.cabo.id][key] == expected[key], key
+        assert rows[self.cabo.id]["product_barcode"] == "789000000001"
+        assert rows[self.cabo.id]["category_name"] == "Cabos"
+        assert rows[self.cabo.id]["sale_price"] == str(self.cabo.sale_price)
+
+    def test_filters_and_search(self):
+        r = self.client.get(f"/api/v1/stock/?category={self.other_cat.id}")
+        assert [row["product"] for row in r.json()["results"]] == [self.fonte.id]
+        r = self.client.get(f"/api/v1/stock/?brand={self.brand.id}&category={self.cat.id}")
+        assert [row["product"] for row in r.json()["results"]] == [self.cabo.id]
+        assert self.client.get("/api/v1/stock/?brand=x").status_code == 400
+        assert self.client.get("/api/v1/stock/?category=abc").status_code == 400
+        r = self.client.get("/api/v1/stock/?search=789000000001")
+        assert [row["product"] for row in r.json()["results"]] == [self.cabo.id]
+        r = self.client.get("/api/v1/stock/?search=fonte")
+        assert [row["product"] for row in r.json()["results"]] == [self.fonte.id]
+
+    def test_list_query_count_is_constant(self):
+        for i in range(20):
+            p = Product.objects.create(name=f"Extra {i}", category=self.cat, brand=self.brand, cost_price="1.00", margin="10.00")
+            Stock.objects.create(product=p)
+        # usuário do token + count + página
+        with self.assertNumQueries(3):
+            r = self.client.get("/api/v1/stock/")
+        assert r.json()["count"] == 22
@@ -0,0 +1,49 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from catalog.models import Category, Brand, Product
+from stock.models import Stock, StockMovement
+from stock.services.stress import _LockTimer, check_invariants, run_stress
+
+
+class StockStressTest(TestCase):
+    """Execução inline do teste de contenção (a versão multiprocesso roda via `manage.py stock_stress`)."""
+
+    def test_order_mode_keeps_ledger_consistent(self):
+        report = run_stress(workers=2, ops=6, products=2, mode="order", wal=False, inline=True)
+        assert report["passed"], report
+        # Saldo inicial = metade da demanda: 3 por produto, 6 vendas aceitas no total
+        assert report["ok"] == 6
+        assert report["rejected"] == 6
+        # Saldo visto depois de cada operação nunca fica negativo; termina zerado
+        assert report["negative_seen"] == [] and set(report["min_balance"].values()) == {Decimal("0")}
+        # SQLite não emite FOR UPDATE: espera por lock não é medida à parte
+        assert report["vendor"] == "sqlite" and report["lock_wait_ms"]["measured"] is False
+        assert report["lock_wait_ms"]["count"] == 0 and report["write_stmt_ms"]["total"] > 0
+
+    def test_lock_timer_separates_for_update_from_writes(self):
+        def run(sql, params, many, context):
+            return None
+
+        timer = _LockTimer()
+        timer(run, 'SELECT "stock_stock"."id" FROM "stock_stock" WHERE "product_id" = %s FOR UPDATE', [1], False, {})
+        timer(run, 'UPDATE "stock_stock" SET "quantity_current" = %s', [1], False, {})
+        timer(run, 'SELECT 1', [], False, {})
+        assert (len(timer.lock_wait), len(timer.writes)) == (1, 1)
+
+    def test_movement_mode_keeps_ledger_consistent(self):
+        report = run_stress(workers=2, ops=5, products=1, mode="movement", wal=False, inline=True)
+        assert report["passed"], report
+        assert report["ok"] + report["rejected"] == 10
+
+    def test_rejected_movement_is_not_persisted(self):
+        cat = Category.objects.create(name="A")
+        brand = Brand.objects.create(name="B")
+        product = Product.objects.create(name="Cabo", category=cat, brand=brand, cost_price="10.00", margin="10.00")
+        StockMovement.objects.create(product=product, type="ENTRADA", quantity=Decimal("1"))
+        with self.assertRaises(ValidationError):
+            StockMovement.objects.create(product=product, type="SAIDA", quantity=Decimal("5"))
+        assert StockMovement.objects.filter(product=product).count() == 1
+        assert Stock.objects.get(product=product).quantity_current == Decimal("1")
+        assert check_invariants([product.id]) == {"negative": [], "negative_ledger": [], "drift": []}
@@ -1,10 +1,54 @@
+import datetime
+
 from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema_view, extend_schema
 
-from .models import Stock, StockMovement
-from .serializers import StockSerializer, StockMovementSerializer
+from .models import Stock, StockMovement, StockMovementMonthlySummary
+from .serializers import StockSerializer, StockMovementSerializer, stock_list_rows, stock_list_values
+
+
+def _truthy(value) -> bool:
+    return str(value or "").strip().lower() in {"1", "true", "yes", "sim"}
+
+
+def _parse_dt_param(value):
+    from django.utils import timezone
+    from django.utils.dateparse import parse_date, parse_datetime
+
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValueError(value)
+        dt = datetime.datetime.combine(d, datetime.time.min)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+class StockFilter(django_filters.FilterSet):
+    # Apelidos curtos de product__category/product__brand; valor não numérico vira 400
+    category = django_filters.NumberFilter(field_name="product__category")
+    brand = django_filters.NumberFilter(field_name="product__brand")
+
+    class Meta:
+        model = Stock
+        fields = {
+            "product": ["exact"],
+            "product__uuid": ["exact"],
+            "product__category": ["exact"],
+            "product__brand": ["exact"],
+            "status": ["exact"],
+            "created_at": ["gte", "lte"],
+            "updated_at": ["gte", "lte"],
+        }
 
 
 @extend_schema_view(
@@ -18,10 +62,57 @@ class StockViewSet(viewsets.ModelViewSet):
     serializer_class = StockSerializer
     lookup_field = "pk"
     from rest_framework import filters as drf_filters
-    filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
-    filterset_fields = {"product": ["exact"], "product__uuid": ["exact"], "status": ["exact"], "created_at": ["gte", "lte"], "updated_at": ["gte", "lte"]}
+    filter_backends = [DjangoFilterBackend, drf_filters.SearchFilter, drf_filters.OrderingFilter]
+    filterset_class = StockFilter
+    search_fields = ["product__name", "product__sku", "=product__barcode"]
     ordering_fields = ["updated_at", "created_at", "quantity_current"]
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            # values() na listagem: o JOIN com produto não precisa de select_related
+            qs = qs.select_related(None)
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        rows = stock_list_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(stock_list_rows(page))
+        return Response(stock_list_rows(rows))
+
+    @extend_schema(tags=["stock"], summary="Sugestão de compra por fornecedor (giro de vendas)")
+    @action(detail=False, methods=["get"], url_path="reorder")
+    def reorder(self, request):
+        from .services.reorder import compute_reorder_suggestions
+
+        params = request.query_params
+        try:
+            ref_date = datetime.date.fromisoformat(params["date"]) if params.get("date") else None
+            cover_days = int(params["cover_days"]) if params.get("cover_days") else None
+            window = int(params["window"]) if params.get("window") else None
+            supplier_id = int(params["supplier"]) if params.get("supplier") else None
+        except ValueError:
+            return Response({"detail": "Parâmetros inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+        if (cover_days is not None and cover_days <= 0) or (window is not None and window <= 0):
+            return Response({"detail": "cover_days e window devem ser positivos."}, status=status.HTTP_400_BAD_REQUEST)
+        data = compute_reorder_suggestions(ref_date=ref_date, cover_days=cover_days, velocity_window=window, supplier_id=supplier_id)
+        return Response(data)
+
+    @extend_schema(tags=["stock"], summary="Conferência do razão de estoque (última execução / executar)")
+    @action(detail=False, methods=["get", "post"], url_path="ledger-check", permission_classes=[IsAdminUser])
+    def ledger_check(self, request):
+        from .models import StockLedgerCheckRun
+        from .services.ledger import check_ledger, run_as_dict
+
+        if request.method.lower() == "get":
+            run = StockLedgerCheckRun.objects.order_by("-id").first()
+            if run is None:
+                return Response({"detail": "Nenhuma conferência executada."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(run_as_dict(run))
+        run = check_ledger(repair=_truthy(request.data.get("repair")))
+        return Response(run_as_dict(run), status=status.HTTP_201_CREATED)
+
 
 @extend_schema_view(
     list=extend_schema(tags=["stock"], summary="Listar movimentações"),
@@ -34,3 +125,82 @@ class StockMovementViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, views
     filter_backends = [DjangoFilterBackend, drf_filters.OrderingFilter]
     filterset_fields = {"product": ["exact"], "type": ["exact"], "created_at": ["gte", "lte"]}
     ordering_fields = ["created_at", "quantity"]
+
+    def list(self, request, *args, **kwargs):
+        # Por padrão só a tabela quente; include_archived=1 mescla os lotes arquivados do produto
+        if not _truthy(request.query_params.get("include_archived")):
+            return super().list(request, *args, **kwargs)
+        from .services.archive import MergedMovements, archived_movements
+
+        params = request.query_params
+        try:
+            product_id = int(params.get("product") or "")
+            created_gte = _parse_dt_param(params.get("created_at__gte"))
+            created_lte = _parse_dt_param(params.get("created_at__lte"))
+        except ValueError:
+            return Response(
+                {"detail": "include_archived exige o filtro product e datas válidas."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        hot = self.filter_queryset(self.get_queryset())
+        order = [o for o in hot.query.order_by if isinstance(o, str) and o.lstrip("-") in self.ordering_fields]
+        order = order[0] if order else "-created_at"
+        types = [params["type"]] if params.get("type") else None
+        rows = MergedMovements(
+            hot,
+            archived_movements(product_id, types=types, created_gte=created_gte, created_lte=created_lte),
+            field=order.lstrip("-"),
+            descending=order.startswith("-"),
+            serialize=lambda objs: [dict(r, archived=False) for r in self.get_serializer(objs, many=True).data],
+        )
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(rows[:])
+
+    @extend_schema(tags=["stock"], summary="Totais mensais de movimentação (arquivado + atual)")
+    @action(detail=False, methods=["get"], url_path="monthly")
+    def monthly(self, request):
+        from django.db.models import Sum, Count, Q
+        from django.db.models.functions import TruncMonth
+
+        try:
+            product_id = int(request.query_params.get("product") or "")
+        except ValueError:
+            return Response({"detail": "Informe o produto."}, status=status.HTTP_400_BAD_REQUEST)
+        months = {}
+        for row in StockMovementMonthlySummary.objects.filter(product_id=product_id).values(
+            "month", "entrada_qty", "saida_qty", "ajuste_qty", "movement_count"
+        ):
+            months[row["month"]] = {
+                "entrada": row["entrada_qty"],
+                "saida": row["saida_qty"],
+                "ajuste": row["ajuste_qty"],
+                "count": row["movement_count"],
+            }
+        live = (
+            StockMovement.objects.filter(product_id=product_id)
+            .annotate(month=TruncMonth("created_at"))
+            .values("month")
+            .annotate(
+                entrada=Sum("quantity", filter=Q(type="ENTRADA")),
+                saida=Sum("quantity", filter=Q(type="SAIDA")),
+                ajuste=Sum("quantity", filter=Q(type="AJUSTE")),
+                count=Count("id"),
+            )
+            .order_by()
+        )
+        for row in live:
+            month = row["month"].date() if isinstance(row["month"], datetime.datetime) else row["month"]
+            cur = months.setdefault(month, {"entrada": 0, "saida": 0, "ajuste": 0, "count": 0})
+            for key in ("entrada", "saida", "ajuste", "count"):
+                cur[key] += row[key] or 0
+        result = [
+            {
+                "month": month.strftime("%Y-%m"),
+                **vals,
+                "net": vals["entrada"] - vals["saida"] + vals["ajuste"],
+            }
+            for month, vals in sorted(months.items())
+        ]
+        return Response({"product": product_id, "months": result})